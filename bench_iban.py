@@ -0,0 +1,125 @@
+"""
+Micro-benchmark de la validation IBAN sur un flux synthétique de candidats OCR.
+
+Usage :
+    python bench_iban.py [nb_candidats] [graine]
+
+Flux (100 000 par défaut) proche de ce que voient extract_iban / extract_best_bank_ids :
+IBAN valides répétés (le même IBAN sur chaque page), IBAN avec un caractère abîmé,
+suites de chiffres trop longues ou trop courtes, codes pays inconnus.
+Compare l'ancienne validation (chaîne de chiffres + blocs de 7) à ocr.iban_validator,
+sans puis avec le mémo, puis mesure la latence de repair_iban sur les candidats invalides.
+"""
+import sys
+import time
+import random
+import string
+
+from ocr.iban_validator import (
+    IBAN_LENGTHS, iban_mod97, iban_length_ok, bban_structure_ok, validate_iban, repair_iban, _is_valid_compact,
+)
+
+
+def legacy_validate_iban(iban: str) -> bool:
+    # ancienne version de supplier_model.validate_iban (référence)
+    import re
+    s = (iban or "").replace(" ", "").upper().strip()
+    if not re.fullmatch(r"[A-Z]{2}\d{2}[A-Z0-9]{11,30}", s):
+        return False
+
+    rearr = s[4:] + s[:4]
+    digits = ""
+    for ch in rearr:
+        digits += ch if ch.isdigit() else str(ord(ch) - 55)  # A=10
+
+    mod = 0
+    for i in range(0, len(digits), 7):
+        mod = int(str(mod) + digits[i:i + 7]) % 97
+    return mod == 1
+
+
+def make_iban(rng: random.Random, country: str) -> str:
+    bban = "".join(rng.choice(string.digits) for _ in range(IBAN_LENGTHS[country] - 4))
+    check = 98 - iban_mod97(country + "00" + bban)
+    return f"{country}{check:02d}{bban}"
+
+
+def make_stream(n: int, seed: int) -> list:
+    rng = random.Random(seed)
+    countries = ["FR", "DE", "ES", "IT", "NL", "BE", "LU", "PL", "PT", "AT"]
+    known = [make_iban(rng, rng.choice(countries)) for _ in range(200)]
+
+    out = []
+    for _ in range(n):
+        kind = rng.random()
+        if kind < 0.35:
+            out.append(rng.choice(known))                       # IBAN du fournisseur, répété
+        elif kind < 0.55:
+            s = list(rng.choice(known))                         # un caractère abîmé
+            i = rng.randrange(4, len(s))
+            s[i] = rng.choice("0123456789OISB")
+            out.append("".join(s))
+        elif kind < 0.85:
+            c = rng.choice(countries)                           # suite de chiffres collée (mauvaise longueur)
+            extra = rng.choice([-3, -1, 2, 5, 9])
+            out.append(c + "".join(rng.choice(string.digits) for _ in range(IBAN_LENGTHS[c] - 2 + extra)))
+        else:
+            cc = "".join(rng.choice(string.ascii_uppercase) for _ in range(2))   # pays inconnu / bruit
+            out.append(cc + "".join(rng.choice(string.digits) for _ in range(rng.randint(13, 30))))
+    return out
+
+
+def run(fn, stream: list) -> tuple:
+    t0 = time.perf_counter()
+    n_valid = sum(1 for s in stream if fn(s))
+    return time.perf_counter() - t0, n_valid
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    stream = make_stream(n, seed)
+
+    t_old, v_old = run(legacy_validate_iban, stream)
+
+    # sans mémo : même chemin que validate_iban, fonction non décorée
+    check = _is_valid_compact.__wrapped__
+
+    def no_memo(iban):
+        s = iban.replace(" ", "").upper().strip()
+        return iban_length_ok(s) and check(s)
+
+    t_new, v_new = run(no_memo, stream)
+    _is_valid_compact.cache_clear()
+    t_memo, v_memo = run(validate_iban, stream)
+
+    # l'ancienne version acceptait une longueur / structure fausse pour le pays si le checksum tombait juste
+    v_expected = sum(
+        1 for s in stream
+        if legacy_validate_iban(s) and iban_length_ok(s) and bban_structure_ok(s)
+    )
+    if not (v_expected == v_new == v_memo):
+        print(f"⚠️ résultats différents : {v_expected} / {v_new} / {v_memo}")
+
+    print(f"{n} candidats, {v_new} valides ({v_old - v_new} rejetés en plus par la longueur / structure pays)\n")
+    for name, t in (("ancienne", t_old), ("table + longueur", t_new), ("+ mémo", t_memo)):
+        print(f"{name:>17} : {t * 1000:8.1f} ms | {t / n * 1e6:6.2f} µs/candidat | x{t_old / t:.1f}")
+    print(f"\nmémo : {_is_valid_compact.cache_info()}")
+
+    # réparation OCR des candidats invalides de bonne longueur
+    damaged = [s for s in dict.fromkeys(stream) if iban_length_ok(s) and not validate_iban(s)]
+    lat = []
+    repaired = 0
+    for s in damaged:
+        t0 = time.perf_counter()
+        repaired += bool(repair_iban(s))
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+    if lat:
+        print(f"\nréparation : {len(damaged)} candidats invalides, {repaired} corrigés | "
+              f"p50 {lat[len(lat) // 2] * 1000:.3f} ms | p99 {lat[int(len(lat) * .99)] * 1000:.3f} ms | "
+              f"max {lat[-1] * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
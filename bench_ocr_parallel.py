@@ -0,0 +1,79 @@
+"""
+Benchmark OCR série vs OCR parallèle (pool de process) en fonction du nombre de pages.
+
+Usage :
+    python bench_ocr_parallel.py [pdf_scanné] [nb_pages_max] [workers]
+
+Le PDF doit être un scan (sans texte natif), sinon l'OCR n'est pas déclenché.
+Le pool compte OCR_WORKERS process : workers au-delà est ramené à OCR_WORKERS
+(augmenter la variable d'environnement OCR_WORKERS pour mesurer plus de process).
+"""
+import os
+import sys
+import time
+import tempfile
+
+import fitz
+
+from ocr.ocr_engine import (
+    extract_text_from_pdf,
+    shutdown_ocr_pool,
+    get_ocr_stats,
+    reset_ocr_stats,
+    OCR_WORKERS,
+)
+
+PDF_PATH = r"C:\Users\hrouillard\Documents\clients\ED trans\OCR\modeles\2025-56994.pdf"
+
+
+def _sub_pdf(src: str, n_pages: int, dest_dir: str) -> str:
+    """Copie les n premières pages (répétées si besoin) dans un PDF temporaire."""
+    out_path = os.path.join(dest_dir, f"bench_{n_pages}p.pdf")
+    with fitz.open(src) as doc, fitz.open() as out:
+        for i in range(n_pages):
+            p = i % doc.page_count
+            out.insert_pdf(doc, from_page=p, to_page=p)
+        out.save(out_path)
+    return out_path
+
+
+def _timed(pdf_path: str, workers: int) -> float:
+    t0 = time.perf_counter()
+    extract_text_from_pdf(pdf_path, workers=workers, use_cache=False)
+    return time.perf_counter() - t0
+
+
+def main():
+    pdf_path = sys.argv[1] if len(sys.argv) > 1 else PDF_PATH
+    max_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    workers = min(int(sys.argv[3]), OCR_WORKERS) if len(sys.argv) > 3 else OCR_WORKERS
+
+    print(f"PDF : {pdf_path}")
+    print(f"workers parallèles : {workers}\n")
+    print(f"{'pages':>5} | {'série (s)':>10} | {'parallèle (s)':>13} | {'speedup':>7}")
+    print("-" * 46)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # chauffe le pool (le démarrage des process ne doit pas fausser la 1re mesure) :
+        # une page par process, sinon l'OCR passe en série et le pool n'est jamais lancé
+        warm = _sub_pdf(pdf_path, max(2, workers), tmp)
+        _timed(warm, workers)
+        reset_ocr_stats()
+
+        for n in (1, 2, 4, 6, 8, 12):
+            if n > max_pages:
+                break
+            sub = _sub_pdf(pdf_path, n, tmp)
+            t_serial = _timed(sub, 1)
+            t_par = _timed(sub, workers)
+            print(f"{n:>5} | {t_serial:>10.2f} | {t_par:>13.2f} | {t_serial / max(t_par, 1e-9):>6.2f}x")
+
+    print("\ncompteurs OCR (fallbacks) :")
+    for k, v in sorted(get_ocr_stats().items()):
+        print(f"  {k:<16} {v}")
+
+    shutdown_ocr_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Micro-benchmark de parse_invoice sur les ocr_text des factures sauvegardées (JSON).
+
+Usage :
+    python bench_parse.py [dossier_json] [répétitions]
+
+Affiche le temps de parse par facture (moyenne / p50 / p95 / max) et la part
+de la construction de l'index texte partagé.
+"""
+import os
+import sys
+import json
+import time
+import statistics
+
+from ocr.invoice_parser import parse_invoice
+from ocr.text_index import TextIndex
+
+# même dossier que ocr.batch_pipeline.INVOICE_JSON_DIR (import évité : tire l'OCR)
+INVOICE_JSON_DIR = r"C:\git\OCR\OCR\models"
+
+
+def load_corpus(json_dir: str) -> list:
+    texts = []
+    for name in sorted(os.listdir(json_dir)):
+        if not name.lower().endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(json_dir, name), "r", encoding="utf-8") as f:
+                data = json.load(f) or {}
+        except Exception:
+            continue
+        text = data.get("ocr_text")
+        if isinstance(text, str) and text.strip():
+            texts.append(text)
+    return texts
+
+
+def _pct(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+
+def main():
+    json_dir = sys.argv[1] if len(sys.argv) > 1 else INVOICE_JSON_DIR
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    texts = load_corpus(json_dir)
+    if not texts:
+        print(f"Aucun ocr_text trouvé dans {json_dir}")
+        return
+
+    per_invoice = []
+    per_index = []
+    for text in texts:
+        best = best_ix = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            TextIndex(text)
+            t1 = time.perf_counter()
+            parse_invoice(text)
+            t2 = time.perf_counter()
+            best_ix = min(best_ix, t1 - t0)
+            best = min(best, t2 - t1)
+        per_invoice.append(best * 1000)
+        per_index.append(best_ix * 1000)
+
+    chars = sum(len(t) for t in texts)
+    print(f"{len(texts)} factures, {chars / len(texts):.0f} caractères en moyenne, meilleur de {repeat}\n")
+    print(f"parse_invoice (ms) : moy {statistics.mean(per_invoice):.2f} | p50 {_pct(per_invoice, .5):.2f} "
+          f"| p95 {_pct(per_invoice, .95):.2f} | max {max(per_invoice):.2f}")
+    print(f"dont index texte   : moy {statistics.mean(per_index):.3f} ms")
+    print(f"débit              : {len(texts) / (sum(per_invoice) / 1000):.0f} factures/s")
+
+
+if __name__ == "__main__":
+    main()
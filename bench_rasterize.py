@@ -0,0 +1,121 @@
+"""
+Benchmark rasterisation des pages : fitz (en mémoire) vs poppler (pdf2image + PNG temporaires).
+
+Usage :
+    python bench_rasterize.py [pdf] [nb_pages_max]
+
+Chaque rasteriseur tourne dans un process séparé pour mesurer proprement le pic mémoire
+(pour poppler, le pic de pdftoppm est compté à part : c'est un sous-process).
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+
+PDF_PATH = r"C:\Users\hrouillard\Documents\clients\ED trans\OCR\modeles\2025-56994.pdf"
+
+
+def _peak_rss_mb() -> dict:
+    """Pic mémoire du process (et des sous-process terminés quand l'OS le permet), en Mo."""
+    try:
+        import psutil
+
+        mi = psutil.Process().memory_info()
+        peak = getattr(mi, "peak_wset", 0) or mi.rss  # Windows : peak working set
+        return {"self": peak / 1e6, "children": 0.0}
+    except ImportError:
+        pass
+
+    try:
+        import resource
+
+        scale = 1 if sys.platform == "darwin" else 1024  # Linux : Ko, macOS : octets
+        return {
+            "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6,
+            "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1e6,
+        }
+    except ImportError:
+        return {"self": 0.0, "children": 0.0}
+
+
+def _child(rasterizer: str, pdf_path: str, n_pages: int) -> None:
+    import fitz
+    from PIL import Image
+    from ocr.ocr_engine import _render_page, OCR_DPI, POPPLER_PATH
+
+    timings = []
+    if rasterizer == "fitz":
+        with fitz.open(pdf_path) as doc:
+            for i in range(n_pages):
+                t0 = time.perf_counter()
+                img = _render_page(doc, i % doc.page_count, OCR_DPI)
+                img.load()
+                timings.append(time.perf_counter() - t0)
+    else:
+        from pdf2image import convert_from_path
+
+        with fitz.open(pdf_path) as doc:
+            page_count = doc.page_count
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(n_pages):
+                p = i % page_count + 1
+                t0 = time.perf_counter()
+                paths = convert_from_path(
+                    pdf_path,
+                    dpi=OCR_DPI,
+                    first_page=p,
+                    last_page=p,
+                    output_folder=tmp,
+                    output_file=f"b{i:04d}_",
+                    fmt="png",
+                    poppler_path=POPPLER_PATH,
+                    paths_only=True,
+                )
+                with Image.open(paths[0]) as img:
+                    img.load()
+                timings.append(time.perf_counter() - t0)
+
+    timings.sort()
+    print(json.dumps({
+        "pages": n_pages,
+        "mean_ms": 1000 * sum(timings) / len(timings),
+        "p50_ms": 1000 * timings[len(timings) // 2],
+        "max_ms": 1000 * timings[-1],
+        "rss_mb": _peak_rss_mb(),
+    }))
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        _child(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        return
+
+    pdf_path = sys.argv[1] if len(sys.argv) > 1 else PDF_PATH
+    n_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    print(f"PDF : {pdf_path} ({n_pages} pages)\n")
+    print(f"{'rasteriseur':>11} | {'moy (ms)':>9} | {'p50 (ms)':>9} | {'max (ms)':>9} | {'RSS (Mo)':>9} | {'sous-proc (Mo)':>14}")
+    print("-" * 76)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    for rasterizer in ("fitz", "poppler"):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", rasterizer, pdf_path, str(n_pages)],
+            capture_output=True,
+            text=True,
+            cwd=here,
+        )
+        if out.returncode != 0:
+            print(f"{rasterizer:>11} | erreur : {out.stderr.strip().splitlines()[-1:]}")
+            continue
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(
+            f"{rasterizer:>11} | {r['mean_ms']:>9.1f} | {r['p50_ms']:>9.1f} | {r['max_ms']:>9.1f} | "
+            f"{r['rss_mb']['self']:>9.1f} | {r['rss_mb']['children']:>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Plans d'exécution avant / après des recherches par TourNr et par IBAN (prédicats sargables).
+
+Usage :
+    python bench_sql_plans.py [--setup [nb_tours]] [--migrate] [répétitions]
+
+Connexion : variable BENCH_SQL_CONN (chaîne ODBC complète), sinon celle de config.py.
+Conteneur local :
+    docker run -e ACCEPT_EULA=Y -e MSSQL_SA_PASSWORD=Bench_Pass123 -p 1433:1433 -d mcr.microsoft.com/mssql/server:2022-latest
+    set BENCH_SQL_CONN=DRIVER={ODBC Driver 18 for SQL Server};SERVER=localhost,1433;UID=sa;PWD=Bench_Pass123;TrustServerCertificate=yes;
+
+--setup   crée la base ocr_bench et des tables xxatour / xxaslauf / xxakunbank synthétiques
+          (200 000 tours par défaut, TourNr BIGINT, index sur TourNr et IBAN comme en production)
+--migrate applique db/migrations/001_sargable_keys.sql (IBAN_Norm) avant la mesure
+
+Pour chaque requête : opérateurs d'accès aux tables (seek / scan) et lectures logiques
+du plan réel (SET STATISTICS XML), puis temps p50 / p95 sur les répétitions.
+"""
+import os
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+import pyodbc
+
+from db import tour_repository
+from db.tour_repository import TOURNR_TYPE_QUERY, normalize_tournr, set_tournr_column_type, _tournr_in
+from db.transporter_repository import normalize_bank_key
+
+BENCH_DB = "ocr_bench"
+MIGRATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db", "migrations", "001_sargable_keys.sql")
+_SHOWPLAN_NS = {"p": "http://schemas.microsoft.com/sqlserver/2004/07/showplan"}
+
+
+def _pct(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+
+def connect() -> pyodbc.Connection:
+    conn_str = os.getenv("BENCH_SQL_CONN")
+    if not conn_str:
+        from config import get_connection_string
+        conn_str = get_connection_string()
+    return pyodbc.connect(conn_str, autocommit=True)
+
+
+def setup(cur, n_tours: int) -> None:
+    cur.execute(f"IF DB_ID('{BENCH_DB}') IS NULL CREATE DATABASE {BENCH_DB}")
+    cur.execute(f"USE {BENCH_DB}")
+    for t in ("xxaslauf", "xxatour", "xxakunbank"):
+        cur.execute(f"IF OBJECT_ID('dbo.{t}') IS NOT NULL DROP TABLE dbo.{t}")
+
+    cur.execute("""
+        CREATE TABLE dbo.xxatour (
+            TourIntNr INT NOT NULL PRIMARY KEY, TourNr BIGINT NOT NULL, Kosten DECIMAL(12, 2) NULL
+        );
+        CREATE TABLE dbo.xxaslauf (
+            AufIntNr INT NOT NULL PRIMARY KEY, TourNr BIGINT NOT NULL, AufNr VARCHAR(20) NOT NULL
+        );
+        CREATE TABLE dbo.xxakunbank (
+            KundenNr INT NOT NULL PRIMARY KEY, IBAN VARCHAR(64) NOT NULL, SWIFT VARCHAR(32) NOT NULL,
+            BankName VARCHAR(100) NULL
+        );
+    """)
+    # séries générées côté serveur (pas d'INSERT ligne à ligne)
+    cur.execute(f"""
+        WITH n AS (
+            SELECT TOP ({n_tours}) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS i
+            FROM sys.all_objects a CROSS JOIN sys.all_objects b
+        )
+        INSERT INTO dbo.xxatour (TourIntNr, TourNr, Kosten)
+        SELECT i, 100000000 + i, (i % 5000) + 0.5 FROM n;
+
+        INSERT INTO dbo.xxaslauf (AufIntNr, TourNr, AufNr)
+        SELECT TourIntNr * 2 + k.k, TourNr, CONCAT('A', TourIntNr, '-', k.k)
+        FROM dbo.xxatour CROSS JOIN (VALUES (0), (1)) k(k);
+
+        INSERT INTO dbo.xxakunbank (KundenNr, IBAN, SWIFT, BankName)
+        SELECT TourIntNr,
+               CONCAT('FR76 ', RIGHT(CONCAT('0000', TourIntNr % 10000), 4), ' ', RIGHT(CONCAT('00000000', TourIntNr), 8)),
+               'BNPAFRPP', 'Banque'
+        FROM dbo.xxatour WHERE TourIntNr % 10 = 0;
+
+        CREATE INDEX IX_xxatour_TourNr ON dbo.xxatour (TourNr) INCLUDE (Kosten);
+        CREATE INDEX IX_xxaslauf_TourNr ON dbo.xxaslauf (TourNr) INCLUDE (AufNr);
+        CREATE INDEX IX_xxakunbank_IBAN ON dbo.xxakunbank (IBAN);
+    """)
+    while cur.nextset():
+        pass
+    print(f"base {BENCH_DB} : {n_tours} tours, {n_tours * 2} commandes, {n_tours // 10} comptes bancaires")
+
+
+def migrate(cur) -> None:
+    with open(MIGRATION_PATH, "r", encoding="utf-8") as f:
+        script = f.read()
+    for batch in re.split(r"^\s*GO\s*$", script, flags=re.MULTILINE):
+        if batch.strip():
+            cur.execute(batch)
+    print(f"migration appliquée : {os.path.basename(MIGRATION_PATH)}")
+
+
+def sample_keys(cur) -> tuple:
+    cur.execute("SELECT TOP 30 CONVERT(VARCHAR(20), TourNr) FROM xxatour ORDER BY TourIntNr DESC")
+    tours = [r[0] for r in cur.fetchall()]
+    cur.execute("SELECT TOP 1 IBAN, SWIFT FROM xxakunbank ORDER BY KundenNr DESC")
+    bank = cur.fetchone()
+    return tours, (bank[0], bank[1]) if bank else ("", "")
+
+
+def build_cases(cur, tours: list, bank: tuple) -> list:
+    t0 = tours[0]
+    iban, bic = bank
+    iban_key, bic_key = normalize_bank_key(iban, bic)
+    if not tour_repository.TOURNR_COLUMN_TYPE:
+        # même détection que l'application (TourRepository.detect_tournr_column_type)
+        cur.execute(TOURNR_TYPE_QUERY)
+        row = cur.fetchone()
+        set_tournr_column_type(row[0] if row else None)
+    keys = [normalize_tournr(t) for t in tours]
+
+    cases = [
+        (
+            "xxatour : Kosten d'un TourNr",
+            "SELECT TOP 1 Kosten FROM xxatour WHERE CONVERT(VARCHAR(20), TourNr) = ?", (t0,),
+            f"SELECT TOP 1 Kosten FROM xxatour WHERE TourNr = {tour_repository.TOURNR_PARAM}", (normalize_tournr(t0),),
+        ),
+        (
+            f"xxatour : {len(tours)} TourNr (IN)",
+            "SELECT LTRIM(RTRIM(CAST(TourNr AS VARCHAR(20)))) AS TourNr FROM xxatour "
+            f"WHERE LTRIM(RTRIM(CAST(TourNr AS VARCHAR(20)))) IN ({','.join(['?'] * len(tours))})", tuple(tours),
+            f"SELECT TourNr FROM xxatour WHERE {_tournr_in('TourNr', len(keys))}", tuple(keys),
+        ),
+        (
+            "xxaslauf : commandes d'un TourNr",
+            "SELECT AufNr FROM xxaslauf WHERE LTRIM(RTRIM(CAST(TourNr AS VARCHAR(20)))) = ?", (t0,),
+            f"SELECT AufNr FROM xxaslauf WHERE TourNr = {tour_repository.TOURNR_PARAM}", (normalize_tournr(t0),),
+        ),
+    ]
+
+    cur.execute("SELECT COL_LENGTH('dbo.xxakunbank', 'IBAN_Norm')")
+    if cur.fetchone()[0] is not None and iban_key:
+        cases.append((
+            "xxakunbank : transporteur par IBAN/BIC",
+            "SELECT KundenNr FROM xxakunbank bank "
+            "WHERE REPLACE(UPPER(bank.IBAN), ' ', '') = REPLACE(UPPER(?), ' ', '') "
+            "AND REPLACE(UPPER(bank.SWIFT), ' ', '') = REPLACE(UPPER(?), ' ', '')", (iban, bic),
+            "SELECT KundenNr FROM xxakunbank bank WHERE bank.IBAN_Norm = CAST(? AS VARCHAR(64)) "
+            "AND REPLACE(UPPER(bank.SWIFT), ' ', '') = CAST(? AS VARCHAR(32))", (iban_key, bic_key),
+        ))
+    else:
+        print("⚠️ colonne xxakunbank.IBAN_Norm absente (--migrate) : recherche IBAN non mesurée")
+    return cases
+
+
+def actual_plan(cur, sql: str, params: tuple) -> tuple:
+    """(accès aux tables [(opérateur, objet)], lectures logiques) du plan réel."""
+    cur.execute("SET STATISTICS XML ON")
+    try:
+        cur.execute(sql, params)
+        plan_xml = None
+        while True:
+            if cur.description is not None:
+                rows = cur.fetchall()
+                if cur.description[0][0].endswith("Showplan") and rows:
+                    plan_xml = rows[0][0]
+            if not cur.nextset():
+                break
+    finally:
+        cur.execute("SET STATISTICS XML OFF")
+
+    if not plan_xml:
+        return [], 0
+    root = ET.fromstring(plan_xml)
+    access = []
+    reads = 0
+    for rel in root.iter(f"{{{_SHOWPLAN_NS['p']}}}RelOp"):
+        for counters in rel.findall("p:RunTimeInformation/p:RunTimeCountersPerThread", _SHOWPLAN_NS):
+            reads += int(counters.get("ActualLogicalReads") or 0)
+        obj = rel.find("p:IndexScan/p:Object", _SHOWPLAN_NS)
+        if obj is None:
+            obj = rel.find("p:TableScan/p:Object", _SHOWPLAN_NS)
+        if obj is not None:
+            name = (obj.get("Index") or obj.get("Table") or "").strip("[]")
+            access.append((rel.get("PhysicalOp"), name))
+    return access, reads
+
+
+def timed(cur, sql: str, params: tuple, repeat: int) -> list:
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        cur.execute(sql, params)
+        cur.fetchall()
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def main():
+    args = sys.argv[1:]
+    n_tours = None
+    if "--setup" in args:
+        i = args.index("--setup")
+        n_tours = 200_000
+        if i + 1 < len(args) and args[i + 1].isdigit():
+            n_tours = int(args.pop(i + 1))
+        args.pop(i)
+    do_migrate = "--migrate" in args
+    args = [a for a in args if a != "--migrate"]
+    repeat = int(args[0]) if args else 50
+
+    conn = connect()
+    cur = conn.cursor()
+    if n_tours:
+        setup(cur, n_tours)
+    if do_migrate:
+        migrate(cur)
+
+    tours, bank = sample_keys(cur)
+    if not tours:
+        print("⚠️ xxatour vide : lancer avec --setup")
+        return
+
+    for name, before_sql, before_params, after_sql, after_params in build_cases(cur, tours, bank):
+        print(f"\n{name}")
+        for label, sql, params in (("avant", before_sql, before_params), ("après", after_sql, after_params)):
+            access, reads = actual_plan(cur, sql, params)
+            t = timed(cur, sql, params, repeat)
+            ops = ", ".join(f"{op} {obj}" for op, obj in access) or "?"
+            print(f"  {label:>5} : {ops}")
+            print(f"          {reads} lectures logiques | p50 {_pct(t, .5) * 1000:.2f} ms | p95 {_pct(t, .95) * 1000:.2f} ms")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
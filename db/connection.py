@@ -1,7 +1,297 @@
 # db/connection.py
 
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
 import pyodbc
-from typing import Optional
+
+
+# =========================
+# Pool de connexions
+# =========================
+# Chaque pyodbc.connect coûte TCP + TLS (Encrypt=yes) + login : les repositories
+# empruntent une connexion du pool au lieu d'en ouvrir une par requête.
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "8"))
+# connexion inutilisée depuis plus longtemps -> fermée (sans descendre sous DB_POOL_MIN)
+DB_POOL_IDLE_S = float(os.getenv("DB_POOL_IDLE_S", "300"))
+# connexion inutilisée depuis plus longtemps -> "SELECT 1" avant de la rendre
+DB_POOL_PING_AFTER_S = float(os.getenv("DB_POOL_PING_AFTER_S", "30"))
+# attente max d'une connexion libre quand le pool est plein
+DB_POOL_TIMEOUT_S = float(os.getenv("DB_POOL_TIMEOUT_S", "30"))
+
+
+class PoolTimeoutError(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Pool thread-safe de connexions pyodbc (une chaîne de connexion = un pool).
+
+    - checkout par thread : un thread qui emprunte déjà une connexion la réutilise
+      (appels imbriqués repository -> repository), les autres threads ont chacun la leur,
+    - au plus max_size connexions ouvertes ; au-delà, attente (timeout -> PoolTimeoutError),
+    - health check : "SELECT 1" sur une connexion restée inutilisée plus de ping_after_s,
+      connexion fermée si une requête l'a laissée dans un état douteux (erreur pyodbc),
+    - éviction des connexions inutilisées depuis plus de idle_s, en gardant min_size connexions
+      (au checkout / checkin, et par un thread de fond lancé à la première connexion, arrêté par close_all),
+    - les connexions sont toujours fermées hors verrou (un close réseau lent ne bloque pas les autres threads).
+    stats() : emprunts, attentes (nb / total / max, timeouts inclus), timeouts,
+    connexions créées / fermées (churn).
+    """
+
+    def __init__(
+        self,
+        conn_str: str,
+        min_size: int = DB_POOL_MIN,
+        max_size: int = DB_POOL_MAX,
+        idle_s: float = DB_POOL_IDLE_S,
+        ping_after_s: float = DB_POOL_PING_AFTER_S,
+        timeout_s: float = DB_POOL_TIMEOUT_S,
+    ):
+        self._conn_str = conn_str
+        self.max_size = max(1, max_size)
+        self.min_size = max(0, min(min_size, self.max_size))
+        self.idle_s = idle_s
+        self.ping_after_s = ping_after_s
+        self.timeout_s = timeout_s
+
+        self._cond = threading.Condition()
+        self._idle: List[Tuple[pyodbc.Connection, float]] = []   # (connexion, rendue à) ; la plus récente en fin
+        self._size = 0                                            # connexions ouvertes (libres + empruntées)
+        self._local = threading.local()                           # connexion empruntée par ce thread + profondeur
+        self._reaper: Optional[threading.Thread] = None           # éviction de fond (voir _reap)
+        self._reaper_stop = threading.Event()
+        self._stats = {
+            "checkouts": 0, "reused": 0, "waits": 0, "wait_s_total": 0.0, "wait_s_max": 0.0, "timeouts": 0,
+            "created": 0, "closed": 0, "evicted_idle": 0, "ping_failures": 0, "discarded": 0,
+        }
+
+    # ---------- emprunt / retour ----------
+
+    @contextmanager
+    def connection(self) -> Iterator[pyodbc.Connection]:
+        """
+        Connexion empruntée pour la durée du bloc ; commit à la sortie (rollback si exception)
+        du bloc le plus externe, comme `with pyodbc.connect(...) as conn`.
+        """
+        local = self._local
+        conn = getattr(local, "conn", None)
+        if conn is not None:
+            # appel imbriqué dans le même thread : même connexion, la transaction reste à l'appelant
+            local.depth += 1
+            with self._cond:
+                self._stats["reused"] += 1
+            try:
+                yield conn
+            finally:
+                local.depth -= 1
+            return
+
+        conn = self._checkout()
+        local.conn, local.depth = conn, 1
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException as e:
+            broken = isinstance(e, pyodbc.Error)
+            try:
+                conn.rollback()
+            except pyodbc.Error:
+                broken = True
+            raise
+        finally:
+            local.conn, local.depth = None, 0
+            self._checkin(conn, broken)
+
+    def _checkout(self) -> pyodbc.Connection:
+        t0 = time.monotonic()
+        waited = timed_out = False
+        expired: List[pyodbc.Connection] = []
+        with self._cond:
+            self._stats["checkouts"] += 1
+            while True:
+                expired += self._take_expired_locked()
+                if self._idle:
+                    conn, since = self._idle.pop()      # LIFO : la plus chaude, les autres vieillissent et sont évincées
+                    break
+                if self._size < self.max_size:
+                    self._size += 1                     # place réservée, connexion ouverte hors verrou
+                    conn, since = None, None
+                    break
+                remaining = self.timeout_s - (time.monotonic() - t0)
+                if remaining <= 0:
+                    timed_out = True
+                    self._stats["timeouts"] += 1
+                    break
+                waited = True
+                self._cond.wait(remaining)
+
+            if waited or timed_out:
+                # attente comptée aussi en cas d'échec : ce sont les pires
+                self._record_wait_locked(time.monotonic() - t0)
+
+        self._close_quietly(expired)
+        if timed_out:
+            raise PoolTimeoutError(
+                f"⚠️ Pool SQL Server plein ({self.max_size} connexions), aucune libérée en {self.timeout_s:g}s"
+            )
+
+        if conn is not None and time.monotonic() - since > self.ping_after_s and not self._ping(conn):
+            with self._cond:
+                self._stats["ping_failures"] += 1
+            self._close(conn)
+            conn = None
+
+        if conn is None:
+            try:
+                conn = pyodbc.connect(self._conn_str)
+            except BaseException:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats["created"] += 1
+                self._start_reaper_locked()
+        return conn
+
+    def _record_wait_locked(self, dt: float) -> None:
+        self._stats["waits"] += 1
+        self._stats["wait_s_total"] += dt
+        self._stats["wait_s_max"] = max(self._stats["wait_s_max"], dt)
+
+    def _checkin(self, conn: pyodbc.Connection, broken: bool) -> None:
+        if broken:
+            with self._cond:
+                self._stats["discarded"] += 1
+            self._close(conn)
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            expired = self._take_expired_locked()
+            self._cond.notify()
+        self._close_quietly(expired)
+
+    # ---------- santé / éviction ----------
+
+    @staticmethod
+    def _ping(conn: pyodbc.Connection) -> bool:
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _close(self, conn: pyodbc.Connection) -> None:
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+        with self._cond:
+            self._stats["closed"] += 1
+
+    @staticmethod
+    def _close_quietly(conns: List[pyodbc.Connection]) -> None:
+        # hors verrou : déjà décomptées de _size / stats par l'appelant
+        for conn in conns:
+            try:
+                conn.close()
+            except pyodbc.Error:
+                pass
+
+    def _take_expired_locked(self) -> List[pyodbc.Connection]:
+        """Retire du pool les connexions inutilisées depuis plus de idle_s (à fermer hors verrou)."""
+        # appelé verrou tenu ; les plus anciennes sont en tête de self._idle
+        expired: List[pyodbc.Connection] = []
+        if self.idle_s <= 0:
+            return expired
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.idle_s:
+            conn, _ = self._idle.pop(0)
+            self._size -= 1
+            expired.append(conn)
+        self._stats["evicted_idle"] += len(expired)
+        self._stats["closed"] += len(expired)
+        return expired
+
+    def evict_idle(self) -> int:
+        """Ferme les connexions inutilisées depuis plus de idle_s ; renvoie leur nombre."""
+        with self._cond:
+            expired = self._take_expired_locked()
+        self._close_quietly(expired)
+        return len(expired)
+
+    def _start_reaper_locked(self) -> None:
+        if self.idle_s <= 0 or (self._reaper is not None and self._reaper.is_alive() and not self._reaper_stop.is_set()):
+            return
+        self._reaper_stop = threading.Event()
+        self._reaper = threading.Thread(
+            target=self._reap, args=(self._reaper_stop,), name="sql-pool-reaper", daemon=True
+        )
+        self._reaper.start()
+
+    def _reap(self, stop: threading.Event) -> None:
+        # sans emprunt (application au repos), les connexions inutilisées sont quand même rendues au serveur
+        while not stop.wait(self.idle_s / 2):
+            self.evict_idle()
+
+    def close_all(self) -> None:
+        """Ferme les connexions libres (fin d'application, changement de base) et arrête l'éviction de fond."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._stats["closed"] += len(idle)
+            self._reaper_stop.set()     # relancée à la prochaine connexion ouverte
+            self._cond.notify_all()
+        self._close_quietly([conn for conn, _ in idle])
+
+    # ---------- métriques ----------
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            s = dict(self._stats)
+            s["size"] = self._size
+            s["idle"] = len(self._idle)
+            s["in_use"] = self._size - len(self._idle)
+        s["wait_s_avg"] = s["wait_s_total"] / s["waits"] if s["waits"] else 0.0
+        return s
+
+
+# un pool par chaîne de connexion : les SqlServerConnection créées dans les workers le partagent
+_POOLS: Dict[str, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(conn_str: str) -> ConnectionPool:
+    with _POOLS_LOCK:
+        pool = _POOLS.get(conn_str)
+        if pool is None:
+            pool = _POOLS[conn_str] = ConnectionPool(conn_str)
+        return pool
+
+
+def close_all_pools() -> None:
+    """Ferme les connexions libres de tous les pools (fermeture de la fenêtre, fin de process)."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    for pool in pools:
+        pool.close_all()
+
+
+atexit.register(close_all_pools)
 
 
 class SqlServerConnection:
@@ -21,23 +311,32 @@ class SqlServerConnection:
         self.driver = driver
         self.trusted_connection = trusted_connection
 
-    def connect(self) -> pyodbc.Connection:
+    def connection_string(self) -> str:
         if self.trusted_connection:
-            conn_str = (
+            return (
                 f"DRIVER={{{self.driver}}};"
                 f"SERVER={self.server};"
                 f"DATABASE={self.database};"
                 "Trusted_Connection=yes;"
             )
-        else:
-            conn_str = (
-                f"DRIVER={{{self.driver}}};"
-                f"SERVER={self.server};"
-                f"DATABASE={self.database};"
-                f"UID={self.username};"
-                f"PWD={self.password};"
-                "Encrypt=yes;"
-                "TrustServerCertificate=yes;"
-            )
+        return (
+            f"DRIVER={{{self.driver}}};"
+            f"SERVER={self.server};"
+            f"DATABASE={self.database};"
+            f"UID={self.username};"
+            f"PWD={self.password};"
+            "Encrypt=yes;"
+            "TrustServerCertificate=yes;"
+        )
+
+    def connect(self) -> pyodbc.Connection:
+        """Connexion dédiée (hors pool), à fermer par l'appelant."""
+        return pyodbc.connect(self.connection_string())
+
+    @property
+    def pool(self) -> ConnectionPool:
+        return get_pool(self.connection_string())
 
-        return pyodbc.connect(conn_str)
+    def acquire(self):
+        """Connexion du pool pour un bloc `with` (commit / rollback à la sortie, puis rendue au pool)."""
+        return self.pool.connection()
@@ -0,0 +1,45 @@
+-- =========================================================================
+-- Optionnel : index pour les recherches par TourNr / IBAN des repositories
+-- (db/tour_repository.py, db/transporter_repository.py)
+--
+-- Idempotent, à passer une fois par base (SSMS / sqlcmd, séparateurs GO).
+-- Après application : DB_IBAN_NORM_COLUMN=IBAN_Norm dans .env
+-- Vérification avant / après : python bench_sql_plans.py
+-- =========================================================================
+
+-- 1) IBAN normalisé (sans espaces, majuscules) : colonne calculée persistée + index
+--    find_transporter_by_bank / find_transporters_by_banks passent d'un scan à un seek.
+IF COL_LENGTH('dbo.xxakunbank', 'IBAN_Norm') IS NULL
+    ALTER TABLE dbo.xxakunbank
+    ADD IBAN_Norm AS CAST(REPLACE(UPPER(IBAN), ' ', '') AS VARCHAR(64)) PERSISTED;
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE object_id = OBJECT_ID('dbo.xxakunbank') AND name = 'IX_xxakunbank_IBAN_Norm'
+)
+    CREATE INDEX IX_xxakunbank_IBAN_Norm
+    ON dbo.xxakunbank (IBAN_Norm)
+    INCLUDE (SWIFT, KundenNr, BankName);
+GO
+
+-- 2) TourNr : les prédicats "TourNr = ?" (type natif, cf. TOURNR_COLUMN_TYPE) ont besoin d'un index
+IF NOT EXISTS (
+    SELECT 1 FROM sys.index_columns ic
+    JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+    WHERE ic.object_id = OBJECT_ID('dbo.xxatour') AND ic.key_ordinal = 1 AND c.name = 'TourNr'
+)
+    CREATE INDEX IX_xxatour_TourNr
+    ON dbo.xxatour (TourNr)
+    INCLUDE (TourIntNr, Kosten);
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.index_columns ic
+    JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+    WHERE ic.object_id = OBJECT_ID('dbo.xxaslauf') AND ic.key_ordinal = 1 AND c.name = 'TourNr'
+)
+    CREATE INDEX IX_xxaslauf_TourNr
+    ON dbo.xxaslauf (TourNr)
+    INCLUDE (AufIntNr, AufNr);
+GO
@@ -1,6 +1,9 @@
 # db/repository.py
 
-from typing import Any, List, Dict
+from typing import Any, List, Dict, Sequence
+
+import pyodbc
+
 from db.connection import SqlServerConnection
 
 
@@ -9,7 +12,7 @@ class BaseRepository:
         self._connection = connection
 
     def fetch_all(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
-        with self._connection.connect() as conn:
+        with self._connection.acquire() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
 
@@ -23,7 +26,59 @@ class BaseRepository:
         return results[0] if results else None
 
     def execute(self, query: str, params: tuple = ()) -> None:
-        with self._connection.connect() as conn:
+        with self._connection.acquire() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             conn.commit()
+
+    def fetch_all_sets(self, query: str, params: tuple = ()) -> List[List[Dict[str, Any]]]:
+        """Lot de plusieurs SELECT (un aller-retour) : une liste de lignes par jeu de résultats."""
+        with self._connection.acquire() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+
+            sets = []
+            while True:
+                if cursor.description is not None:
+                    columns = [col[0] for col in cursor.description]
+                    sets.append([dict(zip(columns, row)) for row in cursor.fetchall()])
+                if not cursor.nextset():
+                    break
+            return sets
+
+    def fetch_all_with_keys(
+        self, table: str, columns: str, keys: Sequence[tuple], query: str, params: tuple = ()
+    ) -> List[Dict[str, Any]]:
+        """
+        fetch_all sur un lot de clés : les clés sont chargées dans la table temporaire `table`
+        (ex. "#ocr_keys", colonnes `columns` en DDL) puis `query` fait la jointure côté serveur.
+        Colonnes texte : `COLLATE DATABASE_DEFAULT` (une table temporaire prend la collation de tempdb).
+        Une seule connexion / un aller-retour par lot, au lieu d'une requête (ou d'un IN (?, ?...)
+        limité à 2100 paramètres) par clé.
+        """
+        if not keys:
+            return []
+        n_cols = len(keys[0])
+        with self._connection.acquire() as conn:
+            cursor = conn.cursor()
+            # connexion du pool : une table du même nom peut rester d'un appel interrompu
+            cursor.execute(f"IF OBJECT_ID('tempdb..{table}') IS NOT NULL DROP TABLE {table}")
+            cursor.execute(f"CREATE TABLE {table} ({columns})")
+            try:
+                cursor.fast_executemany = True
+                cursor.executemany(
+                    f"INSERT INTO {table} VALUES ({','.join(['?'] * n_cols)})",
+                    [tuple(k) for k in keys],
+                )
+                cursor.execute(query, params)
+
+                columns_out = [col[0] for col in cursor.description]
+                rows = cursor.fetchall()
+            finally:
+                # ne masque pas l'erreur d'origine : table déjà supprimée ou connexion cassée
+                try:
+                    cursor.execute(f"IF OBJECT_ID('tempdb..{table}') IS NOT NULL DROP TABLE {table}")
+                except pyodbc.Error:
+                    pass
+
+            return [dict(zip(columns_out, row)) for row in rows]
@@ -1,34 +1,140 @@
 # db/tour_repository.py
+import os
+
 from db.repository import BaseRepository
-from typing import Dict, List, Optional, Union, Any,Set
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Union, Any,Set
+
+# Type SQL de TourNr (XXATour, XXASLAuf, vues XXAV_*) : les TourNr sont normalisés côté Python
+# et liés avec ce type natif, pour des prédicats "TourNr = ?" sargables (index seek).
+# Envelopper la colonne (CONVERT / CAST / LTRIM / RTRIM) force un scan de la table.
+# bigint / int / decimal -> entier Python ; varchar / char -> CAST(? AS VARCHAR(20)) (pas de nvarchar implicite)
+# Vide : type lu une fois dans INFORMATION_SCHEMA au démarrage (TourRepository.detect_tournr_column_type) ;
+# d'ici là (ou si la lecture échoue) TourNr est lié en texte : un paramètre varchar est converti vers une
+# colonne numérique sans scan, l'inverse convertirait toute la colonne (et échouerait sur un TourNr non numérique).
+TOURNR_COLUMN_TYPE = os.getenv("TOURNR_COLUMN_TYPE", "").strip().lower()
+TOURNR_DEFAULT_TYPE = "varchar"
+_NUMERIC_TYPES = ("bigint", "int", "smallint", "tinyint", "numeric", "decimal")
+
+TOURNR_TYPE_QUERY = """
+    SELECT TOP 1 DATA_TYPE
+    FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_NAME = 'XXATour' AND COLUMN_NAME = 'TourNr'
+"""
+
+_TOURNR_TYPE_RESOLVED = False
+
+
+def set_tournr_column_type(column_type: Optional[str]) -> None:
+    """Lie désormais TourNr avec ce type SQL (types inconnus : texte)."""
+    global _TOURNR_TYPE, _TOURNR_IS_TEXT, TOURNR_PARAM, TOURNR_KEY_TYPE
+    _TOURNR_TYPE = (column_type or TOURNR_DEFAULT_TYPE).strip().lower()
+    _TOURNR_IS_TEXT = not _TOURNR_TYPE.startswith(_NUMERIC_TYPES)
+    TOURNR_PARAM = "CAST(? AS VARCHAR(20))" if _TOURNR_IS_TEXT else "?"
+    # clés en table temporaire : collation de la base (sinon celle de tempdb -> conflit de collation à la jointure)
+    TOURNR_KEY_TYPE = "VARCHAR(20) COLLATE DATABASE_DEFAULT" if _TOURNR_IS_TEXT else "BIGINT"
+
+
+set_tournr_column_type(TOURNR_COLUMN_TYPE)
+
+TourNrKey = Union[int, str]
+
+
+def normalize_tournr(tour_nr: Any) -> Optional[TourNrKey]:
+    """Valeur à lier pour TourNr (None : vide, ou non numérique pour une colonne numérique -> introuvable)."""
+    t = str(tour_nr if tour_nr is not None else "").strip()
+    if not t:
+        return None
+    if _TOURNR_IS_TEXT:
+        return t
+    return int(t) if t.isascii() and t.isdigit() and len(t) <= 18 else None
+
+
+def normalize_tournrs(tour_numbers: Optional[Iterable[Any]]) -> Dict[TourNrKey, str]:
+    """{valeur liée -> TourNr (texte, tel que demandé)} ; doublons et valeurs invalides retirés."""
+    out: Dict[TourNrKey, str] = {}
+    for t in tour_numbers or []:
+        key = normalize_tournr(t)
+        if key is not None:
+            out.setdefault(key, str(t).strip())
+    return out
+
+
+def _tournr_in(column: str, n: int) -> str:
+    return f"{column} IN ({','.join([TOURNR_PARAM] * n)})"
+
+# au-delà : get_existing_tournrs_in_xxatour passe par une table temporaire
+TOURNR_IN_LIST_MAX = 200
+# TourNr par lot dans get_tour_snapshots (SQL Server : 2100 paramètres max)
+TOUR_SNAPSHOT_CHUNK = 1000
+
+
+class TourSnapshot(NamedTuple):
+    """Données BDD d'un dossier lues en lot (get_tour_snapshots)."""
+    tour_nr: str
+    exists: bool                # présent dans XXATour
+    tour_int_nr: Optional[int]
+    kosten: Optional[float]
+    vat_percent: Optional[float]
+    depart: str
+    arrivee: str
+    date_tour: str
+    date_livraison: str
+    total_poids: Any
+    total_mpl: Any
+    auf_nrs: FrozenSet[str]
+
+    def extended_info(self) -> Dict[str, Any]:
+        """Même clés que get_tour_extended_info."""
+        return {
+            "TourNr": self.tour_nr,
+            "Depart": self.depart,
+            "Arrivee": self.arrivee,
+            "DateTour": self.date_tour,
+            "DateLivraison": self.date_livraison,
+            "Total_Poids": self.total_poids,
+            "Total_MPL": self.total_mpl,
+        }
+
 
 class TourRepository(BaseRepository):
     def __init__(self, connection):
         super().__init__(connection)
 
+    def detect_tournr_column_type(self) -> str:
+        """
+        Type de XXATour.TourNr lu une fois dans INFORMATION_SCHEMA (TOURNR_COLUMN_TYPE vide),
+        puis utilisé pour lier les TourNr. Renvoie le type retenu.
+        """
+        global _TOURNR_TYPE_RESOLVED
+        if not TOURNR_COLUMN_TYPE and not _TOURNR_TYPE_RESOLVED:
+            row = self.fetch_one(TOURNR_TYPE_QUERY)
+            set_tournr_column_type(row.get("DATA_TYPE") if row else None)
+            _TOURNR_TYPE_RESOLVED = True
+        return _TOURNR_TYPE
+
     def find_by_tournr(self, tour_nr: str):
-        tour_nr = (tour_nr or "").strip()
-        if not tour_nr:
+        key = normalize_tournr(tour_nr)
+        if key is None:
             return None
 
-        query = """
+        query = f"""
             SELECT CONVERT(VARCHAR(20), TourNr) AS TourNr, TourIntnr
             FROM xxatour
-            WHERE CONVERT(VARCHAR(20), TourNr) = ?
+            WHERE TourNr = {TOURNR_PARAM}
         """
-        return self.fetch_one(query, (tour_nr,))
+        return self.fetch_one(query, (key,))
 
     def get_kosten_by_tournr(self, tour_nr: str) -> Optional[float]:
-        tour_nr = (tour_nr or "").strip()
-        if not tour_nr:
+        key = normalize_tournr(tour_nr)
+        if key is None:
             return None
 
-        query = """
+        query = f"""
             SELECT TOP 1 Kosten
             FROM xxatour
-            WHERE CONVERT(VARCHAR(20), TourNr) = ?
+            WHERE TourNr = {TOURNR_PARAM}
         """
-        row = self.fetch_one(query, (tour_nr,))
+        row = self.fetch_one(query, (key,))
         if not row:
             return None
 
@@ -39,21 +145,22 @@ class TourRepository(BaseRepository):
             return None
 
     def get_kosten_by_tournrs(self, tour_numbers: List[str]) -> Dict[str, Optional[float]]:
-        tour_numbers = [str(t).strip() for t in tour_numbers if t and str(t).strip()]
-        if not tour_numbers:
+        keys = normalize_tournrs(tour_numbers)
+        if not keys:
             return {}
 
-        placeholders = ",".join(["?"] * len(tour_numbers))
         query = f"""
-            SELECT CONVERT(VARCHAR(20), TourNr) AS TourNr, Kosten
+            SELECT TourNr, Kosten
             FROM xxatour
-            WHERE CONVERT(VARCHAR(20), TourNr) IN ({placeholders})
+            WHERE {_tournr_in("TourNr", len(keys))}
         """
-        rows = self.fetch_all(query, tuple(tour_numbers))
+        rows = self.fetch_all(query, tuple(keys))
 
         out: Dict[str, Optional[float]] = {}
         for r in rows:
-            k = str(r.get("TourNr") or r.get("tournr") or "").strip()
+            k = keys.get(normalize_tournr(r.get("TourNr")))
+            if k is None:
+                continue
             v = r.get("Kosten") if "Kosten" in r else r.get("kosten")
             try:
                 out[k] = float(v) if v is not None else None
@@ -66,11 +173,11 @@ class TourRepository(BaseRepository):
         Retourne les infos palettes par TourNr :
         TourNr, VPE, SUM(VPEAnz) as sumVPE
         """
-        tour_nr = (tour_nr or "").strip()
-        if not tour_nr:
+        key = normalize_tournr(tour_nr)
+        if key is None:
             return []
 
-        query = """
+        query = f"""
             SELECT
                 LTRIM(RTRIM(CAST(auf.TourNr AS VARCHAR(20)))) AS Dossier,
                 pos.VPE,
@@ -80,23 +187,23 @@ class TourRepository(BaseRepository):
             LEFT JOIN xxaslauf auf ON auf.AufIntNr = leg.leg_AufIntNr
             LEFT JOIN xxaaufpos pos ON pos.aufintnr = leg.MAin_aufintnr
             WHERE pos.VPE IS NOT NULL and
-			LTRIM(RTRIM(CAST(auf.TourNr AS VARCHAR(20)))) = ?
+			auf.TourNr = {TOURNR_PARAM}
             GROUP BY
                 LTRIM(RTRIM(CAST(auf.TourNr AS VARCHAR(20)))),
                 pos.VPE
             ORDER BY pos.VPE
         """
-        return self.fetch_all(query, (tour_nr,))
+        return self.fetch_all(query, (key,))
         
     def set_infosymbol18_for_tournr(self, tour_nr: str, value: int = 600) -> None:
-        tour_nr = (tour_nr or "").strip()
-        if not tour_nr:
+        tour_nr = normalize_tournr(tour_nr)
+        if tour_nr is None:
             return
 
-        sub = """
+        sub = f"""
             SELECT AufIntNr
             FROM xxaslauf
-            WHERE LTRIM(RTRIM(CAST(TourNr AS VARCHAR(20)))) = ?
+            WHERE TourNr = {TOURNR_PARAM}
         """
 
         q1 = f"""
@@ -117,35 +224,46 @@ class TourRepository(BaseRepository):
             WHERE AufIntNr IN ({sub})
         """
 
-        with self._connection.connect() as conn:
+        with self._connection.acquire() as conn:
             cur = conn.cursor()
             cur.execute(q1, (value, tour_nr))
             cur.execute(q2, (value, tour_nr))
             conn.commit()
 
-        sql = """
+        sql = f"""
             UPDATE sym
             SET sym.InfoSymbol4 = ?
             FROM XXATourInfSym sym
             LEFT JOIN XXATour tour ON tour.TourIntNr = sym.TourIntNr
-            WHERE tour.TourNr = ?;
+            WHERE tour.TourNr = {TOURNR_PARAM};
         """
         self.execute(sql, (value, tour_nr))
 
 
     def get_existing_tournrs_in_xxatour(self, tournrs: List[str]) -> Set[str]:
-        tournrs = [str(t).strip() for t in (tournrs or []) if str(t).strip()]
-        if not tournrs:
+        keys = normalize_tournrs(tournrs)
+        if not keys:
             return set()
 
-        placeholders = ",".join(["?"] * len(tournrs))
-        query = f"""
-            SELECT LTRIM(RTRIM(CAST(TourNr AS VARCHAR(20)))) AS TourNr
-            FROM xxatour
-            WHERE LTRIM(RTRIM(CAST(TourNr AS VARCHAR(20)))) IN ({placeholders})
-        """
-        rows = self.fetch_all(query, tuple(tournrs))
-        return {str(r.get("TourNr") or r.get("tournr") or "").strip() for r in rows}
+        if len(keys) > TOURNR_IN_LIST_MAX:
+            # lot (tous les dossiers d'un répertoire) : table temporaire + jointure,
+            # SQL Server refuse plus de 2100 paramètres et un long IN (...) se compile mal
+            query = """
+                SELECT DISTINCT k.TourNr
+                FROM #ocr_tournr_keys k
+                JOIN xxatour t ON t.TourNr = k.TourNr
+            """
+            rows = self.fetch_all_with_keys(
+                "#ocr_tournr_keys", f"TourNr {TOURNR_KEY_TYPE} NOT NULL PRIMARY KEY", [(k,) for k in keys], query
+            )
+        else:
+            query = f"""
+                SELECT TourNr
+                FROM xxatour
+                WHERE {_tournr_in("TourNr", len(keys))}
+            """
+            rows = self.fetch_all(query, tuple(keys))
+        return {keys[k] for k in (normalize_tournr(r.get("TourNr")) for r in rows) if k in keys}
 
 
     def get_theoretical_vat_percent_by_tournr(self, tour_nr: str) -> Optional[float]:
@@ -153,19 +271,19 @@ class TourRepository(BaseRepository):
         Retourne le taux de TVA théorique (en %) pour une tournée/dossier (TourNr).
         Source : XXAV_FR_UNION_XXAPreFakAuf_XXAFakAuf + XXAUC (champ Prozent).
         """
-        tour_nr = (tour_nr or "").strip()
-        if not tour_nr:
+        key = normalize_tournr(tour_nr)
+        if key is None:
             return None
 
-        query = """
+        query = f"""
             SELECT TOP 1 COALESCE(uc.Prozent, 0) AS Prozent
             FROM XXAV_FR_UNION_XXAPreFakAuf_XXAFakAuf auf
             LEFT JOIN XXAUC uc ON auf.FFUC = uc.UC
             WHERE auf.AufDK = 'K'
-            AND LTRIM(RTRIM(CAST(auf.TourNr AS VARCHAR(20)))) = ?
+            AND auf.TourNr = {TOURNR_PARAM}
         """
 
-        row = self.fetch_one(query, (tour_nr,))
+        row = self.fetch_one(query, (key,))
         if not row:
             return None
 
@@ -176,21 +294,21 @@ class TourRepository(BaseRepository):
             return None
     
     def get_tour_extended_info(self, tour_nr: str) -> Optional[Dict[str, Any]]:
-        tour_nr = (tour_nr or "").strip()
-        if not tour_nr:
+        key = normalize_tournr(tour_nr)
+        if key is None:
             return None
 
-        query = """
+        query = f"""
         WITH allpos AS (
             SELECT
                 SUM(pos.TatsGew) AS totalPoids,
                 SUM(pos.LMAnz)   AS TotMpl,
-                LTRIM(RTRIM(CAST(auf.TourNr AS VARCHAR(20)))) AS TourNr
+                auf.TourNr
             FROM XXAV_FR_MainAufIntNrByLegs leg
             LEFT JOIN XXASLAuf auf ON auf.AufIntNr = leg.leg_AufIntNr
             LEFT JOIN xxaaufpos pos ON pos.AufIntNr = leg.MAIN_AufIntNr
-            WHERE LTRIM(RTRIM(CAST(auf.TourNr AS VARCHAR(20)))) = ?
-            GROUP BY LTRIM(RTRIM(CAST(auf.TourNr AS VARCHAR(20))))
+            WHERE auf.TourNr = {TOURNR_PARAM}
+            GROUP BY auf.TourNr
         )
         SELECT
             LTRIM(RTRIM(CAST(tour.TourNr AS VARCHAR(20)))) AS TourNr,
@@ -202,19 +320,127 @@ class TourRepository(BaseRepository):
             COALESCE(pos.TotMpl, 0)     AS Total_MPL
         FROM XXATour tour
         LEFT JOIN allpos pos
-            ON pos.TourNr = LTRIM(RTRIM(CAST(tour.TourNr AS VARCHAR(20))))
-        WHERE LTRIM(RTRIM(CAST(tour.TourNr AS VARCHAR(20)))) = ?
+            ON pos.TourNr = tour.TourNr
+        WHERE tour.TourNr = {TOURNR_PARAM}
         """
-        return self.fetch_one(query, (tour_nr, tour_nr))   
+        return self.fetch_one(query, (key, key))   
 
 
+    def get_tour_snapshots(self, tour_numbers: List[str]) -> Dict[str, "TourSnapshot"]:
+        """
+        Tout ce que le tableau des dossiers affiche, pour un lot de TourNr, en un aller-retour
+        (par tranche de TOUR_SNAPSHOT_CHUNK) : Kosten, TVA théorique, trajet / dates, poids / MPL, AufNr.
+        Un TourNr demandé a toujours son snapshot (exists=False s'il n'est pas dans XXATour).
+        """
+        tour_numbers = sorted({str(t).strip() for t in (tour_numbers or []) if str(t).strip()})
+        keys = normalize_tournrs(tour_numbers)
+        key_items = list(keys.items())
+        out: Dict[str, TourSnapshot] = {}
+        for i in range(0, len(key_items), TOUR_SNAPSHOT_CHUNK):
+            out.update(self._fetch_tour_snapshots(dict(key_items[i:i + TOUR_SNAPSHOT_CHUNK])))
+        # TourNr impossible pour le type de la colonne : introuvable, sans requête
+        for t in tour_numbers:
+            if t not in out:
+                out[t] = TourSnapshot(t, False, None, None, None, "", "", "", "", 0, 0, frozenset())
+        return out
+
+    def _fetch_tour_snapshots(self, keys: Dict[TourNrKey, str]) -> Dict[str, "TourSnapshot"]:
+        values = ",".join([f"({TOURNR_PARAM})"] * len(keys))
+        query = f"""
+            SET NOCOUNT ON;
+            DECLARE @k TABLE (TourNr {TOURNR_KEY_TYPE} NOT NULL PRIMARY KEY);
+            INSERT INTO @k (TourNr) VALUES {values};
+
+            -- 1) tournée
+            SELECT
+                k.TourNr,
+                tour.TourIntNr,
+                tour.Kosten,
+                tour.BelOrt AS Depart,
+                tour.EmgOrt AS Arrivee,
+                CONVERT(VARCHAR(10), tour.TourDatum, 103)   AS DateTour,
+                CONVERT(VARCHAR(10), tour.TourEntDat, 103)  AS DateLivraison
+            FROM @k k
+            JOIN XXATour tour ON tour.TourNr = k.TourNr;
+
+            -- 2) TVA théorique (même règle que get_theoretical_vat_percent_by_tournr)
+            SELECT k.TourNr, vat.Prozent
+            FROM @k k
+            CROSS APPLY (
+                SELECT TOP 1 COALESCE(uc.Prozent, 0) AS Prozent
+                FROM XXAV_FR_UNION_XXAPreFakAuf_XXAFakAuf auf
+                LEFT JOIN XXAUC uc ON auf.FFUC = uc.UC
+                WHERE auf.AufDK = 'K'
+                AND auf.TourNr = k.TourNr
+            ) vat;
+
+            -- 3) poids / MPL (même règle que get_tour_extended_info)
+            SELECT
+                k.TourNr,
+                SUM(pos.TatsGew) AS Total_Poids,
+                SUM(pos.LMAnz)   AS Total_MPL
+            FROM XXAV_FR_MainAufIntNrByLegs leg
+            JOIN XXASLAuf auf ON auf.AufIntNr = leg.leg_AufIntNr
+            JOIN @k k ON k.TourNr = auf.TourNr
+            LEFT JOIN xxaaufpos pos ON pos.AufIntNr = leg.MAIN_AufIntNr
+            GROUP BY k.TourNr;
+
+            -- 4) commandes (même règle que get_palette_details_with_trajet_by_tournrs)
+            SELECT DISTINCT k.TourNr, auf.AufNr
+            FROM XXAV_FR_MainAufIntNrByLegs leg
+            JOIN xxaslauf auf ON auf.AufIntNr = leg.leg_AufIntNr
+            JOIN @k k ON k.TourNr = auf.TourNr
+            LEFT JOIN xxaaufpos pos ON pos.aufintnr = leg.MAin_aufintnr
+            WHERE pos.VPE IS NOT NULL AND auf.AufNr IS NOT NULL;
+        """
+        tours, vats, weights, orders = self.fetch_all_sets(query, tuple(keys))
+
+        def _num(v):
+            try:
+                return float(v) if v is not None else None
+            except Exception:
+                return None
+
+        def _nr(r):
+            return keys.get(normalize_tournr(r["TourNr"]))
+
+        tour_by_nr = {}
+        for r in tours:
+            tour_by_nr.setdefault(_nr(r), r)       # comme TOP 1
+        vat_by_nr = {_nr(r): _num(r["Prozent"]) for r in vats}
+        weight_by_nr = {_nr(r): r for r in weights}
+        orders_by_nr: Dict[str, Set[str]] = {}
+        for r in orders:
+            auf = str(r.get("AufNr") or "").strip()
+            if auf:
+                orders_by_nr.setdefault(_nr(r), set()).add(auf)
+
+        out: Dict[str, TourSnapshot] = {}
+        for t in keys.values():
+            tour = tour_by_nr.get(t) or {}
+            w = weight_by_nr.get(t) or {}
+            out[t] = TourSnapshot(
+                tour_nr=t,
+                exists=bool(tour),
+                tour_int_nr=tour.get("TourIntNr"),
+                kosten=_num(tour.get("Kosten")),
+                vat_percent=vat_by_nr.get(t),
+                depart=tour.get("Depart") or "",
+                arrivee=tour.get("Arrivee") or "",
+                date_tour=tour.get("DateTour") or "",
+                date_livraison=tour.get("DateLivraison") or "",
+                total_poids=w.get("Total_Poids") or 0,
+                total_mpl=w.get("Total_MPL") or 0,
+                auf_nrs=frozenset(orders_by_nr.get(t, ())),
+            )
+        return out
+
     def get_palette_details_with_trajet_by_tournrs(self, tour_numbers: List[str]) -> List[Dict[str, Any]]:
         """Retourne les lignes palettes/poids + trajet + AufNr pour une liste de TourNr."""
-        tour_numbers = [str(t).strip() for t in (tour_numbers or []) if str(t).strip()]
-        if not tour_numbers:
+        keys = normalize_tournrs(tour_numbers)
+        if not keys:
             return []
 
-        placeholders = ",".join(["?"] * len(tour_numbers))
         query = f"""
             SELECT
                 LTRIM(RTRIM(CAST(auf.TourNr AS VARCHAR(20)))) AS Dossier,
@@ -232,7 +458,7 @@ class TourRepository(BaseRepository):
             LEFT JOIN xxaaufpos pos ON pos.aufintnr = leg.MAin_aufintnr
             LEFT JOIN XXATour tour ON tour.TourNr = auf.TourNr
             WHERE pos.VPE IS NOT NULL
-            AND LTRIM(RTRIM(CAST(auf.TourNr AS VARCHAR(20)))) IN ({placeholders})
+            AND {_tournr_in("auf.TourNr", len(keys))}
             GROUP BY
                 LTRIM(RTRIM(CAST(auf.TourNr AS VARCHAR(20)))),
                 pos.VPE,
@@ -242,18 +468,18 @@ class TourRepository(BaseRepository):
                 auf.AufNr,
                 pos.VPE
         """
-        return self.fetch_all(query, tuple(tour_numbers))
+        return self.fetch_all(query, tuple(keys))
     
     def set_block_status_for_tournr(self, tour_nr: str, is_blocked: bool, motif: str = ""):
         """
         Met à jour XXATourExt.isBloqued + MotifBlocage pour un TourNr.
         Upsert si la ligne XXATourExt n'existe pas encore.
         """
-        sql = """
+        sql = f"""
             DECLARE @TourIntNr INT;
             SELECT TOP 1 @TourIntNr = TourIntNr
             FROM XXATour
-            WHERE TourNr = ?;
+            WHERE TourNr = {TOURNR_PARAM};
 
             IF @TourIntNr IS NULL
                 RETURN;
@@ -274,6 +500,9 @@ class TourRepository(BaseRepository):
         """
         # si pas bloqué -> motif NULL (plus propre)
         motif_db = (motif or "").strip() if is_blocked else None
-        self.execute(sql, (tour_nr, 1 if is_blocked else 0, motif_db, 1 if is_blocked else 0, motif_db))
+        key = normalize_tournr(tour_nr)
+        if key is None:
+            return
+        self.execute(sql, (key, 1 if is_blocked else 0, motif_db, 1 if is_blocked else 0, motif_db))
 
 
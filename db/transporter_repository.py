@@ -1,12 +1,35 @@
 # db/transporter_repository.py
 
+import os
+from typing import Any, Dict, List, Tuple
+
 from db.repository import BaseRepository
 
 
+# Colonne calculée persistée REPLACE(UPPER(IBAN), ' ', '') indexée (db/migrations/001_sargable_keys.sql).
+# Vide = migration non appliquée : la normalisation reste dans le prédicat (scan de xxakunbank).
+IBAN_NORM_COLUMN = os.getenv("DB_IBAN_NORM_COLUMN", "").strip()
+
+
+def normalize_bank_key(iban: str, bic: str) -> Tuple[str, str]:
+    return (
+        str(iban or "").replace(" ", "").upper(),
+        str(bic or "").replace(" ", "").upper(),
+    )
+
+
+def _iban_predicate(alias: str, value_sql: str) -> str:
+    # valeur déjà normalisée côté Python, liée en VARCHAR (un NVARCHAR convertirait la colonne)
+    if IBAN_NORM_COLUMN:
+        return f"{alias}.{IBAN_NORM_COLUMN} = {value_sql}"
+    return f"REPLACE(UPPER({alias}.IBAN), ' ', '') = {value_sql}"
+
+
 class TransporterRepository(BaseRepository):
 
     def find_transporter_by_bank(self, iban: str, bic: str):
-        query = """
+        iban_key, bic_key = normalize_bank_key(iban, bic)
+        query = f"""
             SELECT 
                 bank.IBAN,
                 bank.SWIFT,
@@ -19,16 +42,88 @@ class TransporterRepository(BaseRepository):
             FROM xxakunbank bank
             LEFT JOIN xxakun kun 
                 ON kun.KundenNr = bank.KundenNr
-            WHERE REPLACE(UPPER(bank.IBAN), ' ', '') = REPLACE(UPPER(?), ' ', '')
-            AND REPLACE(UPPER(bank.SWIFT), ' ', '') = REPLACE(UPPER(?), ' ', '')
+            WHERE {_iban_predicate("bank", "CAST(? AS VARCHAR(64))")}
+            AND REPLACE(UPPER(bank.SWIFT), ' ', '') = CAST(? AS VARCHAR(32))
         """
 
 
-        result = self.fetch_one(query, (iban, bic))       
+        result = self.fetch_one(query, (iban_key, bic_key))       
 
 
         return result
 
+    def find_transporters_by_banks(self, pairs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """
+        find_transporter_by_bank pour un lot de (IBAN, BIC) en une requête.
+        Clé du résultat : (IBAN, BIC) normalisés (majuscules, sans espaces) ; paires introuvables absentes.
+        """
+        keys = sorted({normalize_bank_key(iban, bic) for iban, bic in pairs if iban and bic})
+        if not keys:
+            return {}
+
+        query = f"""
+            SELECT
+                k.IBAN AS KeyIBAN,
+                k.SWIFT AS KeySWIFT,
+                bank.IBAN,
+                bank.SWIFT,
+                bank.BankName,
+                kun.name1,
+                kun.Strasse,
+                kun.Ort,
+                kun.LKZ,
+                bank.KundenNr
+            FROM #ocr_bank_keys k
+            JOIN xxakunbank bank
+                ON {_iban_predicate("bank", "k.IBAN")}
+                AND REPLACE(UPPER(bank.SWIFT), ' ', '') = k.SWIFT
+            LEFT JOIN xxakun kun
+                ON kun.KundenNr = bank.KundenNr
+        """
+        rows = self.fetch_all_with_keys(
+            "#ocr_bank_keys",
+            # collation de la base : la table temporaire prendrait celle de tempdb (conflit à la jointure)
+            "IBAN VARCHAR(64) COLLATE DATABASE_DEFAULT NOT NULL, SWIFT VARCHAR(32) COLLATE DATABASE_DEFAULT NOT NULL",
+            keys,
+            query,
+        )
+
+        out: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for r in rows:
+            key = (r.pop("KeyIBAN"), r.pop("KeySWIFT"))
+            out.setdefault(key, r)      # comme fetch_one : la première ligne trouvée
+        return out
+
+    def get_bank_directory(self, changed_column: str = "", changed_since: Any = None) -> List[Dict[str, Any]]:
+        """
+        Annuaire banque -> transporteur (mêmes colonnes que find_transporter_by_bank + LfdNr),
+        en une requête. Avec changed_column / changed_since : seulement les lignes modifiées depuis.
+        """
+        where = ""
+        params: tuple = ()
+        if changed_column and changed_since is not None:
+            where = f"WHERE bank.{changed_column} > ?"
+            params = (changed_since,)
+        changed = f", bank.{changed_column} AS ChangedAt" if changed_column else ""
+
+        query = f"""
+            SELECT
+                bank.IBAN,
+                bank.SWIFT,
+                bank.BankName,
+                kun.name1,
+                kun.Strasse,
+                kun.Ort,
+                kun.LKZ,
+                bank.KundenNr,
+                bank.LfdNr{changed}
+            FROM xxakunbank bank
+            LEFT JOIN xxakun kun
+                ON kun.KundenNr = bank.KundenNr
+            {where}
+        """
+        return self.fetch_all(query, params)
+
     def search_transporters_by_name(self, name_part: str):
         query = """
             SELECT TOP 10 kundennr, name1
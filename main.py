@@ -1,8 +1,13 @@
 import sys
+import multiprocessing
 from PySide6.QtWidgets import QApplication
 from ui.main_window import MainWindow
 
-app = QApplication(sys.argv)
-window = MainWindow()
-window.showMaximized()
-sys.exit(app.exec())
+if __name__ == "__main__":
+    # ⚠️ obligatoire sous Windows : les process du pool OCR ré-importent ce module
+    multiprocessing.freeze_support()
+
+    app = QApplication(sys.argv)
+    window = MainWindow()
+    window.showMaximized()
+    sys.exit(app.exec())
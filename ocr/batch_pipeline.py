@@ -0,0 +1,299 @@
+# ocr/batch_pipeline.py
+"""
+Pipeline OCR "headless" (sans widgets) pour traiter un lot de PDFs :
+OCR -> parse_invoice -> IBAN/BIC fiables -> modèle fournisseur -> JSON facture.
+
+Chaque document est traité dans un process séparé (pool borné) ; l'appelant
+récupère les résultats au fil de l'eau (UI via signaux Qt, ou script).
+"""
+import os
+import json
+import time
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .ocr_engine import extract_text_from_pdf, get_ocr_stats, reset_ocr_stats, OCR_WORKERS
+from .invoice_parser import parse_invoice, best_ht_amount_for_tour, parse_amount
+from .text_index import TextIndex
+from .supplier_model import (
+    build_supplier_key,
+    get_compiled_model,
+    apply_model_to_fields,
+    extract_best_bank_ids,
+    validate_iban,
+    validate_bic,
+)
+from .supplier_index import identify_supplier
+from .roi_ocr import extract_fields_from_regions
+
+
+INVOICE_JSON_DIR = r"C:\git\OCR\OCR\models"
+
+# Nombre de documents OCRisés en parallèle (chaque document est OCRisé en série dans son process)
+BATCH_WORKERS = int(os.getenv("OCR_BATCH_WORKERS", str(OCR_WORKERS)))
+
+# (pdf_path, json_path, entry_id[, supplier_key]) ; supplier_key = fournisseur présumé (OCR par zones)
+BatchJob = Tuple[str, ...]
+
+
+def invoice_json_path(pdf_path: str, json_dir: str = INVOICE_JSON_DIR) -> str:
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    return os.path.join(json_dir, f"{base_name}.json")
+
+
+def _timed(timings: Optional[Dict[str, float]], name: str, fn: Callable, *args, **kwargs):
+    """fn(*args) ; si timings est fourni, cumule la durée (s) sous timings[name]."""
+    if timings is None:
+        return fn(*args, **kwargs)
+    t0 = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - t0
+
+
+def _apply_model(fields: Dict[str, Any], text: str, timings: Optional[Dict[str, float]] = None) -> None:
+    supplier_key = build_supplier_key(fields["iban"], fields["bic"])
+    model = _timed(timings, "supplier_model", get_compiled_model, supplier_key)
+    if not model:
+        return
+    _apply_loaded_model(fields, text, model, timings)
+
+
+def _apply_loaded_model(fields: Dict[str, Any], text: str, model, timings: Optional[Dict[str, float]] = None) -> None:
+    fields.update(_timed(timings, "supplier_model", apply_model_to_fields, fields, text, model))
+
+    # dossier : exemple du modèle si aucun dossier trouvé
+    if not fields["folders"]:
+        example = model.get("folder_number_example", "")
+        if example:
+            fields["folders"] = [{"tour_nr": example, "amount_ht_ocr": ""}]
+
+
+def _folders_with_amounts(data, ix: TextIndex) -> List[Dict[str, str]]:
+    folders = []
+    for tour_nr in data.folder_numbers or ([data.folder_number] if data.folder_number else []):
+        best = best_ht_amount_for_tour(ix, tour_nr) if ix.lines else None
+        folders.append({"tour_nr": tour_nr, "amount_ht_ocr": f"{best:.2f}" if best is not None else ""})
+    return folders
+
+
+def analyze_text(text: str, timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    Même enchaînement que l'écran (analyse PDF), sur des données pures.
+    timings (optionnel) : durée cumulée par extracteur (parse_invoice, folder_amounts, bank_ids, supplier_model,
+    supplier_index).
+    """
+    # un seul index texte (lignes, labels, dossiers) pour le parse et les montants par dossier
+    ix = _timed(timings, "parse_invoice", TextIndex, text)
+    data = _timed(timings, "parse_invoice", parse_invoice, ix)
+    folders = _timed(timings, "folder_amounts", _folders_with_amounts, data, ix)
+
+    fields: Dict[str, Any] = {
+        "iban": data.iban or "",
+        "bic": data.bic or "",
+        "invoice_date": data.invoice_date or "",
+        "invoice_number": data.invoice_number or "",
+        "folders": folders,
+        "vat_lines": list(data.vat_lines or []),
+    }
+
+    _apply_model(fields, text, timings)
+
+    best = _timed(
+        timings, "bank_ids", extract_best_bank_ids,
+        text, prefer_iban=fields["iban"].strip(), prefer_bic=fields["bic"].strip(),
+    )
+    if best["iban"] and not fields["iban"].strip():
+        fields["iban"] = best["iban"]
+    if best["bic"] and not fields["bic"].strip():
+        fields["bic"] = best["bic"]
+
+    _apply_model(fields, text, timings)
+
+    # IBAN/BIC illisibles : fournisseur reconnu par l'empreinte du document
+    if not build_supplier_key(fields["iban"], fields["bic"]):
+        hit = _timed(timings, "supplier_index", identify_supplier, text)
+        if hit:
+            _, model = hit
+            if not validate_iban(fields["iban"]):
+                fields["iban"] = ""
+            if not validate_bic(fields["bic"]):
+                fields["bic"] = ""
+            _apply_loaded_model(fields, text, model, timings)
+
+    for k in ("iban", "bic", "invoice_date", "invoice_number"):
+        fields[k] = (fields[k] or "").strip()
+    return fields
+
+
+def analyze_regions(pdf_path: str, supplier_key: str) -> Optional[Tuple[Dict[str, Any], str]]:
+    """
+    Fournisseur connu : lit seulement les zones apprises du modèle.
+    (fields, texte des zones) si tous les champs obligatoires sont validés, sinon None.
+    """
+    model = get_compiled_model(supplier_key)
+    if not model or not model.get("regions"):
+        return None
+
+    res = extract_fields_from_regions(pdf_path, model)
+    if not res["ok"]:
+        return None
+
+    found = res["fields"]
+    fields: Dict[str, Any] = {
+        "iban": found.get("iban", ""),
+        "bic": found.get("bic", ""),
+        "invoice_date": found.get("invoice_date", ""),
+        "invoice_number": found.get("invoice_number", ""),
+        "folders": [{"tour_nr": f, "amount_ht_ocr": ""} for f in found.get("folders") or []],
+        "vat_lines": [],
+    }
+    if not fields["folders"] and model.get("folder_number_example"):
+        fields["folders"] = [{"tour_nr": model["folder_number_example"], "amount_ht_ocr": ""}]
+
+    text = "\n\n".join(f"===== ZONE {field} =====\n{t}" for field, t in res["texts"].items())
+    return fields, text
+
+
+def build_invoice_payload(fields: Dict[str, Any], text: str, entry_id: str = "") -> Dict[str, Any]:
+    """JSON facture au même format que la sauvegarde manuelle (status draft)."""
+    base_total = 0.0
+    vat_total = 0.0
+    for ln in fields["vat_lines"]:
+        b = parse_amount((ln.get("base") or "").strip())
+        v = parse_amount((ln.get("vat") or "").strip())
+        if b is not None:
+            base_total += b
+        if v is not None:
+            vat_total += v
+
+    folders = fields["folders"]
+    return {
+        "iban": fields["iban"],
+        "bic": fields["bic"],
+        "invoice_date": fields["invoice_date"],
+        "invoice_number": fields["invoice_number"],
+        "folders": folders,
+        "folder_number": folders[0]["tour_nr"] if folders else "",
+        "fees": [],
+        "vat_lines": fields["vat_lines"],
+        "total_base_ht": round(base_total, 2),
+        "total_vat": round(vat_total, 2),
+        "total_ttc": round(base_total + vat_total, 2),
+        "ocr_text": text,
+        # le transporteur est résolu par IBAN/BIC à l'ouverture (pas de BDD dans les process)
+        "transporter_kundennr": "",
+        "status": "draft",
+        "validated_at": "",
+        "entry_id": (entry_id or "").strip(),
+        "cmr_attachments": [],
+        "tags": [],
+    }
+
+
+def _write_json(json_path: str, data: Dict[str, Any]) -> None:
+    """Écriture atomique (évite les JSON tronqués en cas d'arrêt brutal)."""
+    folder = os.path.dirname(json_path)
+    os.makedirs(folder, exist_ok=True)
+    # tmp unique : deux PDF de même nom (dossiers différents) donnent le même JSON
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(json_path) + ".", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, json_path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _error_result(pdf_path: str, json_path: str, error: str, ocr_stats: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    return {
+        "pdf_path": pdf_path,
+        "json_path": json_path,
+        "ok": False,
+        "iban": "",
+        "bic": "",
+        "error": error,
+        "ocr_mode": "",
+        "ocr_stats": ocr_stats or {},
+    }
+
+
+def process_pdf(pdf_path: str, json_path: str, entry_id: str = "", supplier_key: str = "") -> Dict[str, Any]:
+    """Traite un PDF de bout en bout. Ne lève jamais : l'erreur est dans le résultat."""
+    reset_ocr_stats()
+    try:
+        # 1) fournisseur présumé : zones apprises seulement ; 2) sinon OCR pleine page
+        roi = analyze_regions(pdf_path, supplier_key) if supplier_key else None
+        if roi is not None:
+            fields, text = roi
+            ocr_mode = "roi"
+        else:
+            # OCR série dans ce process : c'est le lot qui est parallélisé
+            text = extract_text_from_pdf(pdf_path, workers=1)
+            fields = analyze_text(text)
+            ocr_mode = "full"
+
+        payload = build_invoice_payload(fields, text, entry_id)
+        payload["ocr_mode"] = ocr_mode
+        _write_json(json_path, payload)
+        return {
+            "pdf_path": pdf_path,
+            "json_path": json_path,
+            "ok": True,
+            "iban": fields["iban"],
+            "bic": fields["bic"],
+            "error": "",
+            "ocr_mode": ocr_mode,
+            "ocr_stats": get_ocr_stats(),
+        }
+    except Exception as e:
+        return _error_result(pdf_path, json_path, str(e), get_ocr_stats())
+
+
+def run_batch(
+    jobs: List[BatchJob],
+    *,
+    workers: Optional[int] = None,
+    should_cancel: Optional[Callable[[], bool]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Traite les jobs en parallèle et rend chaque résultat dès qu'il est prêt
+    (ordre de fin, pas ordre d'entrée). should_cancel() est testé entre deux résultats.
+    Un worker mort (BrokenProcessPool : crash natif, mémoire) donne un résultat en erreur
+    pour les documents concernés, le lot continue.
+    """
+    if not jobs:
+        return
+
+    workers = BATCH_WORKERS if workers is None else max(1, int(workers))
+    workers = min(workers, len(jobs))
+
+    if workers <= 1:
+        for job in jobs:
+            if should_cancel and should_cancel():
+                return
+            yield process_pdf(*job)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_pdf, *job): job for job in jobs}
+        try:
+            for fut in as_completed(futures):
+                if should_cancel and should_cancel():
+                    return
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    # process_pdf ne lève pas : c'est le worker qui est tombé
+                    job = futures[fut]
+                    res = _error_result(job[0], job[1], f"{type(e).__name__}: {e}")
+                yield res
+        finally:
+            for fut in futures:
+                fut.cancel()
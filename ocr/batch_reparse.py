@@ -0,0 +1,245 @@
+# ocr/batch_reparse.py
+"""
+Re-parse "headless" des factures déjà sauvegardées (JSON du dossier models) :
+ocr_text -> analyze_text (parse_invoice, IBAN/BIC, modèle fournisseur), sans OCR ni Qt.
+
+Sert de référence avant toute modification des extracteurs :
+- précision : écarts avec les champs sauvegardés (validés par l'opérateur),
+- débit : documents/s et latence p50/p95 par extracteur.
+
+Usage :
+    python -m ocr.batch_reparse [--json-dir DIR] [--workers N] [--all] [--report diff.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .batch_pipeline import INVOICE_JSON_DIR, BATCH_WORKERS, analyze_text
+from .invoice_parser import parse_amount
+
+
+COMPARED_FIELDS = ("iban", "bic", "invoice_date", "invoice_number", "folders", "vat_lines")
+
+
+def load_saved_invoices(json_dir: str, *, validated_only: bool = True) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    (nom du JSON, contenu) des factures avec un ocr_text ; par défaut seulement les validées.
+    Les factures lues par zones (ocr_mode "roi") sont exclues : leur ocr_text ne contient que
+    les extraits des zones, pas le document (précision faussée).
+    """
+    out = []
+    for name in sorted(os.listdir(json_dir)):
+        if not name.lower().endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(json_dir, name), "r", encoding="utf-8") as f:
+                data = json.load(f) or {}
+        except Exception:
+            continue
+        if not isinstance(data, dict):
+            continue
+        text = data.get("ocr_text")
+        if not isinstance(text, str) or not text.strip():
+            continue
+        if validated_only and (data.get("status") or "").strip() != "validated":
+            continue
+        if data.get("ocr_mode") == "roi":
+            continue
+        out.append((name, data))
+    return out
+
+
+def reparse_text(item: Tuple[str, str]) -> Dict[str, Any]:
+    """Point d'entrée du pool : (nom, ocr_text) -> champs + durées (ms) par extracteur."""
+    name, text = item
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    try:
+        fields = analyze_text(text, timings)
+        error = ""
+    except Exception as e:
+        fields, error = {}, str(e)
+    total = time.perf_counter() - t0
+
+    ms = {k: v * 1000 for k, v in timings.items()}
+    ms["total"] = total * 1000
+    return {"name": name, "fields": fields, "timings_ms": ms, "error": error}
+
+
+# =========================
+# Comparaison
+# =========================
+
+def _norm_text(v: Any) -> str:
+    return "".join(str(v or "").split()).upper()
+
+
+def _norm_amount(v: Any) -> str:
+    f = parse_amount(str(v or "").strip())
+    return f"{f:.2f}" if f is not None else _norm_text(v)
+
+
+def _norm_folders(folders: Any) -> List[str]:
+    out = set()
+    for f in folders or []:
+        tour_nr = f.get("tour_nr") if isinstance(f, dict) else f
+        if str(tour_nr or "").strip():
+            out.add(_norm_text(tour_nr))
+    return sorted(out)
+
+
+def _norm_vat_lines(lines: Any) -> List[Tuple[str, str, str]]:
+    out = set()
+    for ln in lines or []:
+        if not isinstance(ln, dict):
+            continue
+        rate = _norm_amount(ln.get("rate")) if str(ln.get("rate") or "").strip() else ""
+        out.add((rate, _norm_amount(ln.get("base")), _norm_amount(ln.get("vat"))))
+    return sorted(out)
+
+
+def normalize_field(field: str, value: Any) -> Any:
+    if field == "folders":
+        return _norm_folders(value)
+    if field == "vat_lines":
+        return _norm_vat_lines(value)
+    return _norm_text(value)
+
+
+def diff_fields(saved: Dict[str, Any], parsed: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """{champ: {"saved", "parsed"}} pour chaque champ qui diffère (après normalisation)."""
+    diffs = {}
+    for field in COMPARED_FIELDS:
+        a = normalize_field(field, saved.get(field))
+        b = normalize_field(field, parsed.get(field))
+        if a != b:
+            diffs[field] = {"saved": a, "parsed": b}
+    return diffs
+
+
+# =========================
+# Lot
+# =========================
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+
+def run_reparse(
+    invoices: List[Tuple[str, Dict[str, Any]]],
+    *,
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Re-parse les factures en parallèle (process) et compare aux champs sauvegardés.
+    Retour : {"documents", "elapsed_s", "docs_per_s", "accuracy", "latency_ms", "diffs", "errors"}
+    """
+    workers = BATCH_WORKERS if workers is None else max(1, int(workers))
+    workers = max(1, min(workers, len(invoices) or 1))
+    items = [(name, data["ocr_text"]) for name, data in invoices]
+
+    t0 = time.perf_counter()
+    if workers <= 1:
+        results = [reparse_text(it) for it in items]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # beaucoup de petits documents : on envoie par paquets
+            chunksize = max(1, len(items) // (workers * 8))
+            results = list(pool.map(reparse_text, items, chunksize=chunksize))
+    elapsed = time.perf_counter() - t0
+
+    saved_by_name = dict(invoices)
+    matches = {f: 0 for f in COMPARED_FIELDS}
+    latencies: Dict[str, List[float]] = {}
+    diffs: Dict[str, Dict[str, Any]] = {}
+    errors: Dict[str, str] = {}
+
+    for r in results:
+        for k, v in r["timings_ms"].items():
+            latencies.setdefault(k, []).append(v)
+        if r["error"]:
+            errors[r["name"]] = r["error"]
+            continue
+        d = diff_fields(saved_by_name[r["name"]], r["fields"])
+        for f in COMPARED_FIELDS:
+            if f not in d:
+                matches[f] += 1
+        if d:
+            diffs[r["name"]] = d
+
+    n = len(results)
+    return {
+        "documents": n,
+        "workers": workers,
+        "elapsed_s": elapsed,
+        "docs_per_s": n / elapsed if elapsed > 0 else 0.0,
+        "accuracy": {f: (matches[f] / n if n else 0.0) for f in COMPARED_FIELDS},
+        "latency_ms": {
+            k: {"p50": _pct(v, .5), "p95": _pct(v, .95), "max": max(v)}
+            for k, v in latencies.items()
+        },
+        "diffs": diffs,
+        "errors": errors,
+    }
+
+
+def print_report(report: Dict[str, Any], *, max_diffs: int = 20) -> None:
+    n = report["documents"]
+    print(f"{n} factures re-parsées en {report['elapsed_s']:.2f} s "
+          f"({report['docs_per_s']:.1f} docs/s, {report['workers']} process)\n")
+
+    print(f"{'extracteur':>15} | {'p50 (ms)':>9} | {'p95 (ms)':>9} | {'max (ms)':>9}")
+    print("-" * 52)
+    for name, lat in sorted(report["latency_ms"].items(), key=lambda kv: kv[0] == "total"):
+        print(f"{name:>15} | {lat['p50']:>9.2f} | {lat['p95']:>9.2f} | {lat['max']:>9.2f}")
+
+    print(f"\n{'champ':>15} | {'identiques':>10}")
+    print("-" * 30)
+    for field, acc in report["accuracy"].items():
+        print(f"{field:>15} | {acc * 100:>9.1f}%")
+
+    diffs = report["diffs"]
+    if diffs:
+        print(f"\n{len(diffs)} facture(s) avec écarts (sauvegardé -> re-parsé) :")
+        for name in list(diffs)[:max_diffs]:
+            for field, d in diffs[name].items():
+                print(f"  {name} | {field} : {d['saved']!r} -> {d['parsed']!r}")
+        if len(diffs) > max_diffs:
+            print(f"  ... {len(diffs) - max_diffs} autre(s) (voir --report)")
+
+    for name, err in report["errors"].items():
+        print(f"⚠️ {name} : {err}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Re-parse des JSON factures sauvegardés (précision + débit).")
+    ap.add_argument("--json-dir", default=INVOICE_JSON_DIR, help="dossier des JSON factures")
+    ap.add_argument("--workers", type=int, default=None, help=f"process parallèles (défaut {BATCH_WORKERS})")
+    ap.add_argument("--all", action="store_true", help="inclure les brouillons (pas seulement status=validated)")
+    ap.add_argument("--report", default="", help="écrit le rapport complet (écarts inclus) dans ce JSON")
+    args = ap.parse_args(argv)
+
+    invoices = load_saved_invoices(args.json_dir, validated_only=not args.all)
+    if not invoices:
+        print(f"Aucune facture avec ocr_text dans {args.json_dir}")
+        return 1
+
+    report = run_reparse(invoices, workers=args.workers)
+    print_report(report)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nRapport : {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
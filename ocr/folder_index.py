@@ -0,0 +1,115 @@
+# ocr/folder_index.py
+"""
+Numéros de dossier (TourNr) d'un document, localisés en UNE passe.
+
+- dossiers "compacts" : DOSSIER_PATTERN directement sur le texte,
+- dossiers avec séparateurs : une suite de groupes de chiffres d'une même ligne
+  ("1 2345 6789", "150-123-45") qui, recollée EN ENTIER, suit les mêmes règles
+  (pas de morceau pris dans un IBAN / n° de téléphone espacé).
+On ne recolle jamais à travers un retour ligne : "2506710166\\n35093233" = deux nombres.
+
+Résultat : pour chaque TourNr, ses occurrences (offsets dans TextIndex.text + index de ligne),
+réutilisées par l'extraction des dossiers et la recherche du montant HT par dossier.
+"""
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+
+# =========================
+# DOSSIERS (multi) - ROBUSTE
+# =========================
+# Règles:
+# - 1 + 8 chiffres => 9
+# - ou préfixes 84/25/35/44/64/67/69/72/78 + 6..8 chiffres => 8..10
+# Strict : numéro compact sans séparateurs
+DOSSIER_PATTERN = re.compile(
+    r"(?<!\d)(?:"
+    r"1\d{8}"                    # 9 chiffres commençant par 1
+    r"|150\d{5,8}"               # 150 + 5..8 chiffres  (ex: 15000003)
+    r"|(?:845|255|355|445|645|675|695|725|785)\d{6,8}"  # autres : 3 + 6..8 chiffres
+    r")(?!\d)"
+)
+
+# Mêmes règles, séparateurs visuels (espace / NBSP / tiret, pas \n) tolérés entre les chiffres
+# qui suivent le préfixe ; le préfixe reste compact ("44 57 24…" = téléphone, pas 445…).
+_DOSSIER_RULES = (
+    (("150",), 5, 8),
+    (("1",), 8, 8),
+    (("845", "255", "355", "445", "645", "675", "695", "725", "785"), 6, 8),
+)
+_SEP = r"[ \u00A0-]*"
+
+
+_DOSSIER_SPACED_RE = re.compile(
+    r"(?<!\d)(?:"
+    + "|".join(
+        "(?:" + "|".join(prefixes) + ")" + f"(?:{_SEP}\\d){{{lo},{hi}}}"
+        for prefixes, lo, hi in _DOSSIER_RULES
+    )
+    + r")(?!\d)"
+)
+_SEP_RE = re.compile(r"[ \u00A0-]")
+# au moins deux groupes de chiffres sur une ligne
+_DIGIT_RUN_RE = re.compile(r"\d+(?:[ \u00A0-]+\d+)+")
+
+
+class FolderMatch(NamedTuple):
+    tour_nr: str
+    start: int      # offsets dans TextIndex.text
+    end: int
+    line: int       # index dans TextIndex.lines
+    compact: bool   # écrit sans séparateur
+
+
+class FolderIndex:
+    """
+    Toutes les occurrences de numéros de dossier d'un TextIndex.
+    numbers() : dossiers distincts (ordre d'extraction) ; lines_of(tour_nr) : lignes où il apparaît ;
+    line_has_other(i, tour_nr) : un autre dossier est sur la ligne i.
+    """
+
+    def __init__(self, ix):
+        src = ix.text
+        matches: List[FolderMatch] = []
+
+        # 1) écrits compacts
+        for m in DOSSIER_PATTERN.finditer(src):
+            matches.append(FolderMatch(m.group(0), m.start(), m.end(), ix.line_at(m.start()), True))
+
+        # 2) écrits avec séparateurs : toute la suite de groupes doit former le dossier
+        for run in _DIGIT_RUN_RE.finditer(src):
+            if _DOSSIER_SPACED_RE.fullmatch(src, run.start(), run.end()):
+                tour_nr = _SEP_RE.sub("", run.group(0))
+                matches.append(FolderMatch(tour_nr, run.start(), run.end(), ix.line_at(run.start()), False))
+
+        self._matches = matches
+        self._by_tour: Dict[str, List[FolderMatch]] = {}
+        self._by_line: Dict[int, List[FolderMatch]] = {}
+        for m in matches:
+            self._by_tour.setdefault(m.tour_nr, []).append(m)
+            self._by_line.setdefault(m.line, []).append(m)
+
+    def numbers(self) -> List[str]:
+        """Dossiers distincts : écrits compacts d'abord, puis avec séparateurs (chacun dans l'ordre du texte)."""
+        seen = set()
+        out: List[str] = []
+        for compact in (True, False):
+            for m in self._matches:
+                if m.compact == compact and m.tour_nr not in seen:
+                    seen.add(m.tour_nr)
+                    out.append(m.tour_nr)
+        return out
+
+    def find(self, tour_nr: str) -> List[FolderMatch]:
+        return self._by_tour.get(tour_nr, [])
+
+    def lines_of(self, tour_nr: str) -> List[int]:
+        """Index (croissants) des lignes où le dossier apparaît (avec ou sans séparateurs)."""
+        return sorted({m.line for m in self.find(tour_nr)})
+
+    def first_line(self, tour_nr: str) -> Optional[int]:
+        lines = self.lines_of(tour_nr)
+        return lines[0] if lines else None
+
+    def line_has_other(self, line: int, tour_nr: str) -> bool:
+        return any(m.tour_nr != tour_nr for m in self._by_line.get(line, []))
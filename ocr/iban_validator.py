@@ -0,0 +1,253 @@
+# ocr/iban_validator.py
+"""
+Validation IBAN rapide (appelée sur chaque candidat regex du texte OCR).
+
+- longueur par pays (ISO 13616) : un candidat de mauvaise longueur est rejeté avant le checksum,
+- structure BBAN par pays (chiffres / lettres / alphanumérique par position),
+- mod-97 par table : un octet = une transition de reste (pas de chaîne de chiffres intermédiaire),
+- mémo des chaînes déjà vérifiées (le même IBAN revient sur chaque page / chaque extracteur).
+
+repair_iban : correction des confusions OCR (O/0, I/1, S/5, B/8...) guidée par la structure
+BBAN et le mod 97, pour tous les pays décrits dans BBAN_FORMATS.
+"""
+import re
+from functools import lru_cache
+
+
+# Longueur totale de l'IBAN par code pays (registre SWIFT).
+IBAN_LENGTHS = {
+    "AD": 24, "AE": 23, "AL": 28, "AT": 20, "AZ": 28, "BA": 20, "BE": 16, "BG": 22,
+    "BH": 22, "BR": 29, "BY": 28, "CH": 21, "CR": 22, "CY": 28, "CZ": 24, "DE": 22,
+    "DK": 18, "DO": 28, "EE": 20, "EG": 29, "ES": 24, "FI": 18, "FO": 18, "FR": 27,
+    "GB": 22, "GE": 22, "GI": 23, "GL": 18, "GR": 27, "GT": 28, "HR": 21, "HU": 28,
+    "IE": 22, "IL": 23, "IQ": 23, "IS": 26, "IT": 27, "JO": 30, "KW": 30, "KZ": 20,
+    "LB": 28, "LC": 32, "LI": 21, "LT": 20, "LU": 20, "LV": 21, "MC": 27, "MD": 24,
+    "ME": 22, "MK": 19, "MR": 27, "MT": 31, "MU": 30, "NL": 18, "NO": 15, "PK": 24,
+    "PL": 28, "PS": 29, "PT": 25, "QA": 29, "RO": 24, "RS": 22, "SA": 24, "SC": 31,
+    "SE": 24, "SI": 19, "SK": 24, "SM": 27, "ST": 25, "SV": 28, "TL": 23, "TN": 24,
+    "TR": 26, "UA": 29, "VA": 22, "VG": 24, "XK": 20,
+}
+
+# Structure du BBAN (registre SWIFT) : n = chiffre, a = lettre, c = alphanumérique
+BBAN_FORMATS = {
+    "AD": "4n4n12c", "AT": "5n11n", "BE": "3n7n2n", "BG": "4a4n2n8c", "CH": "5n12c",
+    "CY": "3n5n16c", "CZ": "4n6n10n", "DE": "8n10n", "DK": "4n9n1n", "EE": "2n2n11n1n",
+    "ES": "4n4n1n1n10n", "FI": "3n11n", "FR": "5n5n11c2n", "GB": "4a6n8n", "GI": "4a15c",
+    "GR": "3n4n16c", "HR": "7n10n", "HU": "3n4n1n15n1n", "IE": "4a6n8n", "IS": "4n2n6n10n",
+    "IT": "1a5n5n12c", "LI": "5n12c", "LT": "5n11n", "LU": "3n13c", "LV": "4a13c",
+    "MC": "5n5n11c2n", "MT": "4a5n18c", "NL": "4a10n", "NO": "4n6n1n", "PL": "8n16n",
+    "PT": "4n4n11n2n", "RO": "4a16c", "SE": "3n16n1n", "SI": "5n8n2n", "SK": "4n6n10n",
+    "SM": "1a5n5n12c", "VA": "3n15n",
+}
+
+
+def _expand_format(fmt: str) -> str:
+    return "".join(cls * int(n) for n, cls in re.findall(r"(\d+)([nac])", fmt))
+
+
+_BBAN_CLASSES = {cc: _expand_format(fmt) for cc, fmt in BBAN_FORMATS.items()}
+_CLASS_RE = {"n": "[0-9]", "a": "[A-Z]", "c": "[A-Z0-9]"}
+_BBAN_RES = {cc: re.compile("".join(_CLASS_RE[c] for c in classes)) for cc, classes in _BBAN_CLASSES.items()}
+
+
+# pays inconnu : bornes du format générique
+IBAN_MIN_LEN = 15
+IBAN_MAX_LEN = 34
+
+IBAN_CACHE_SIZE = 8192
+
+_IBAN_RE = re.compile(r"[A-Z]{2}[0-9]{2}[A-Z0-9]{11,30}")
+
+
+def _build_mod97_table():
+    # _MOD97_STEP[r][octet] = reste après avoir "ajouté" le caractère (chiffre : x10, lettre A=10 : x100)
+    table = []
+    for r in range(97):
+        row = bytearray(256)
+        for b in range(ord("0"), ord("9") + 1):
+            row[b] = (r * 10 + b - ord("0")) % 97
+        for b in range(ord("A"), ord("Z") + 1):
+            row[b] = (r * 100 + b - ord("A") + 10) % 97
+        table.append(bytes(row))
+    return table
+
+
+_MOD97_STEP = _build_mod97_table()
+
+
+def iban_mod97(iban: str) -> int:
+    """Reste mod 97 de l'IBAN réarrangé (valide <=> 1). Entrée : majuscules, [A-Z0-9] uniquement."""
+    step = _MOD97_STEP
+    r = 0
+    for b in (iban[4:] + iban[:4]).encode("ascii"):
+        r = step[r][b]
+    return r
+
+
+def iban_length_ok(iban: str) -> bool:
+    """Élagage avant checksum : longueur attendue pour le pays (bornes génériques si pays inconnu)."""
+    expected = IBAN_LENGTHS.get(iban[:2])
+    if expected is not None:
+        return len(iban) == expected
+    return IBAN_MIN_LEN <= len(iban) <= IBAN_MAX_LEN
+
+
+def bban_structure_ok(iban: str) -> bool:
+    """Structure BBAN du pays (ex. DE : chiffres uniquement) ; True si le pays n'est pas décrit."""
+    bban_re = _BBAN_RES.get(iban[:2])
+    return bban_re is None or bban_re.fullmatch(iban, 4) is not None
+
+
+@lru_cache(maxsize=IBAN_CACHE_SIZE)
+def _is_valid_compact(s: str) -> bool:
+    if not _IBAN_RE.fullmatch(s):
+        return False
+    return bban_structure_ok(s) and iban_mod97(s) == 1
+
+
+def validate_iban(iban: str) -> bool:
+    s = (iban or "").replace(" ", "").upper().strip()
+    # rejet sans passer par le mémo : les candidats de mauvaise longueur ne l'encombrent pas
+    if not iban_length_ok(s):
+        return False
+    return _is_valid_compact(s)
+
+
+# =========================
+# Réparation OCR (tous pays SEPA)
+# =========================
+
+# Matrice de confusion OCR : lettre lue à la place d'un chiffre, et l'inverse
+OCR_DIGIT_FOR_LETTER = {
+    "O": "0", "Q": "0", "D": "0", "U": "0", "I": "1", "L": "1", "J": "1",
+    "Z": "2", "A": "4", "S": "5", "G": "6", "T": "7", "B": "8",
+}
+OCR_LETTER_FOR_DIGIT = {"0": "O", "1": "I", "2": "Z", "4": "A", "5": "S", "6": "G", "7": "T", "8": "B"}
+# confusions dans la même classe (chiffre lu pour un autre chiffre...)
+OCR_SAME_CLASS = {
+    "0": "86", "1": "7", "3": "8", "5": "6", "6": "58", "7": "1", "8": "036",
+    "O": "DQ", "D": "O", "Q": "O", "I": "L", "L": "I", "M": "N", "N": "M",
+    "C": "G", "G": "C", "E": "F", "F": "E", "U": "V", "V": "U",
+}
+
+# Coûts (seules les corrections "au choix" comptent) :
+# - caractère impossible à cette position (lettre dans une zone chiffres) : correction forcée, coût 0,
+# - lettre confusable dans une zone alphanumérique : chiffre à coût 0, lettre gardée à coût 1,
+# - chiffre <-> chiffre / lettre <-> lettre : coût 3.
+# Le mod 97 ne vérifie qu'environ 6,6 bits : chaque correction au choix multiplie les candidats
+# qui passent par hasard, d'où un budget par défaut d'une seule correction au choix.
+REPAIR_COST_FORCED = 0
+REPAIR_COST_CROSS = 1
+REPAIR_COST_SAME = 3
+IBAN_REPAIR_MAX_COST = 1
+# plafond de transitions (position, reste) explorées par candidat
+IBAN_REPAIR_MAX_EXPANSIONS = 6000
+
+
+def _fits(ch: str, cls: str) -> bool:
+    if cls == "n":
+        return ch.isdigit()
+    if cls == "a":
+        return ch.isalpha()
+    return True
+
+
+_ALNUM = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def _build_repair_options():
+    # (caractère lu, classe attendue) -> [(caractère retenu, octet, coût)]
+    options = {}
+    for ch in _ALNUM:
+        for cls in "nac":
+            opts = []
+            if cls == "c" and ch in OCR_DIGIT_FOR_LETTER:
+                # zone alphanumérique : les comptes sont presque toujours numériques,
+                # la lettre relue en chiffre est préférée (garder la lettre coûte une correction)
+                opts.append((OCR_DIGIT_FOR_LETTER[ch], REPAIR_COST_FORCED))
+                opts.append((ch, REPAIR_COST_CROSS))
+            elif _fits(ch, cls):
+                opts.append((ch, 0))
+                for alt in OCR_SAME_CLASS.get(ch, ""):
+                    opts.append((alt, REPAIR_COST_SAME))
+            else:
+                alt = OCR_DIGIT_FOR_LETTER.get(ch) if cls == "n" else OCR_LETTER_FOR_DIGIT.get(ch)
+                if alt:
+                    opts.append((alt, REPAIR_COST_FORCED))
+            options[(ch, cls)] = [(c, ord(c), cost) for c, cost in opts]
+    return options
+
+
+_REPAIR_OPTIONS = _build_repair_options()
+
+
+def repair_iban(
+    iban: str,
+    *,
+    max_cost: int = IBAN_REPAIR_MAX_COST,
+    max_expansions: int = IBAN_REPAIR_MAX_EXPANSIONS,
+) -> str:
+    """
+    IBAN corrigé (substitutions OCR les plus probables) ou "" si aucune correction sûre.
+
+    Recherche de Viterbi sur (position, reste mod 97), dans l'ordre du checksum (BBAN puis pays + clé) :
+    à chaque position, seuls les caractères permis par la structure BBAN du pays sont essayés
+    (caractère lu à coût 0, confusions de la matrice avec leur coût) ; par reste, seul le chemin
+    le moins coûteux est gardé (<= 97 états), au-delà de max_cost le chemin est abandonné.
+    Deux corrections différentes au même coût minimal = ambiguïté -> "".
+    """
+    s = (iban or "").replace(" ", "").replace("\u00A0", "").replace("-", "").upper().strip()
+    if validate_iban(s):
+        return s
+    classes = _BBAN_CLASSES.get(s[:2])
+    if classes is None or len(s) != len(classes) + 4 or not s.isalnum() or not s.isascii():
+        return ""
+
+    # pays fixe (sans alternative), clé = 2 chiffres
+    order = [(s[i], classes[i - 4]) for i in range(4, len(s))]
+    order += [(s[0], ""), (s[1], ""), (s[2], "n"), (s[3], "n")]
+
+    step = _MOD97_STEP
+    options = _REPAIR_OPTIONS
+    # reste -> (coût, ambigu) ; back[k][reste] = (reste précédent, caractère)
+    states = {0: (0, False)}
+    back = []
+    expansions = 0
+
+    for ch, cls in order:
+        opts = options[(ch, cls)] if cls else [(ch, ord(ch), 0)]
+        nxt = {}
+        ptr = {}
+        for r, (cost, amb) in states.items():
+            row = step[r]
+            for alt, b, c in opts:
+                nc = cost + c
+                if nc > max_cost:
+                    continue
+                r2 = row[b]
+                cur = nxt.get(r2)
+                if cur is None or nc < cur[0]:
+                    nxt[r2] = (nc, amb)
+                    ptr[r2] = (r, alt)
+                elif nc == cur[0]:
+                    nxt[r2] = (nc, True)
+            expansions += len(opts)
+        if not nxt or expansions > max_expansions:
+            return ""
+        states = nxt
+        back.append(ptr)
+
+    final = states.get(1)
+    if final is None or final[1]:
+        return ""
+
+    # remontée du chemin
+    chars = []
+    r = 1
+    for ptr in reversed(back):
+        r, alt = ptr[r]
+        chars.append(alt)
+    chars.reverse()
+    bban, head = chars[:-4], chars[-4:]
+    fixed = "".join(head + bban)
+    return fixed if validate_iban(fixed) else ""
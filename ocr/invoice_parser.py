@@ -1,8 +1,10 @@
 import re
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional
-from collections import Counter
-from .supplier_model import validate_iban
+from typing import List, Dict, NamedTuple, Optional, Tuple, Union
+from bisect import bisect_left, bisect_right
+from .iban_validator import validate_iban, iban_length_ok, repair_iban
+from .text_index import TextIndex, as_index
+from .folder_index import DOSSIER_PATTERN
 
 
 @dataclass
@@ -34,58 +36,15 @@ BIC_BLACKLIST = {
     "PAYMENT", "INVOICE", "FACTURE", "BANK", "IBAN", "BIC"
 }
 
-# =========================
-# DOSSIERS (multi) - ROBUSTE
-# =========================
-# Règles:
-# - 1 + 8 chiffres => 9
-# - ou préfixes 84/25/35/44/64/67/69/72/78 + 6..8 chiffres => 8..10
-# Strict : numéro compact sans séparateurs
-DOSSIER_PATTERN = re.compile(
-    r"(?<!\d)(?:"
-    r"1\d{8}"                    # 9 chiffres commençant par 1
-    r"|150\d{5,8}"               # 150 + 5..8 chiffres  (ex: 15000003)
-    r"|(?:845|255|355|445|645|675|695|725|785)\d{6,8}"  # autres : 3 + 6..8 chiffres
-    r")(?!\d)"
-)
-
-# Large : accepte espaces/NBSP/tirets (et je te conseille d'accepter \n aussi, OCR coupe souvent)
-DOSSIER_CANDIDATE = re.compile(
-    r"(?<!\d)(?:1|150|845|255|355|445|645|675|695|725|785)"
-    r"[0-9 \u00A0\-\n]{4,25}\d(?!\d)"
-)
-BASE_LABEL_RE = re.compile(r"(BASE\s*HT|TOTAL\s*HT|TOTAL\s*HT\s*NET)", re.IGNORECASE)
-VAT_LABEL_RE  = re.compile(r"(MONTANT\s*TVA|TOTAL\s*TVA)", re.IGNORECASE)
-RATE_LABEL_RE = re.compile(r"(\bTAUX\b|%?\s*TVA\b)", re.IGNORECASE)
-
-def _clean_dossier_candidate(s: str) -> str:
-    return re.sub(r"[ \u00A0-]", "", s or "").strip()
-
+# Labels (IBAN, BIC, N° FACTURE, BASE HT, TOTAL TVA, TAUX...) : voir label_index.DEFAULT_LABELS
 
-def extract_folder_numbers(text: str) -> List[str]:
+def extract_folder_numbers(text: Union[str, TextIndex]) -> List[str]:
     """
     Extrait TOUS les numéros de dossier de façon robuste, sans casser le cas:
     2506710166\n35093233 (ne doit PAS être collé en 250671016635093233)
+    Compacts d'abord, puis écrits avec séparateurs (espace/NBSP/tiret) : voir FolderIndex.
     """
-    src = text or ""
-
-    seen = set()
-    out: List[str] = []
-
-    # 1) match direct sur texte brut
-    for m in DOSSIER_PATTERN.findall(src):
-        if m not in seen:
-            seen.add(m)
-            out.append(m)
-
-    # 2) match "candidat" avec séparateurs internes (espace/NBSP/tiret), sans traverser les \n
-    for mm in DOSSIER_CANDIDATE.finditer(src):
-        cleaned = _clean_dossier_candidate(mm.group(0))
-        if DOSSIER_PATTERN.fullmatch(cleaned) and cleaned not in seen:
-            seen.add(cleaned)
-            out.append(cleaned)
-
-    return out
+    return as_index(text).folders.numbers()
 
 
 def extract_folder_number(text: str) -> Optional[str]:
@@ -107,94 +66,66 @@ def _normalize_for_folder_search(text: str) -> str:
 # =========================
 # EXTRACTIONS
 # =========================
-OCR_DIGIT_FIX = {
-    "O": "0",
-    "Q": "0",
-    "D": "0",
-    "I": "1",
-    "L": "1",
-    "S": "5",
-    "B": "8",
-    "Z": "2",
-    "G": "6",
-    "T": "7",
-}
-
 def _fix_iban_ocr(iban: str) -> str:
     """
-    Corrige les confusions OCR courantes, surtout sur les IBAN FR
-    (après FRkk, le reste doit être des chiffres).
-    Retourne "" si impossible.
+    Corrige les confusions OCR (O/0, I/1, S/5, B/8...) selon la structure BBAN du pays
+    (tous pays SEPA, voir iban_validator.repair_iban).
+    Retourne "" si impossible ou ambigu.
     """
-    s = (iban or "").replace(" ", "").replace("\u00A0", "").replace("-", "").upper().strip()
-    if len(s) < 6:
-        return ""
+    return repair_iban(iban)
 
-    country = s[:2]
-    # ✅ Cas France : après FRkk => uniquement chiffres
-    if country == "FR":
-        head = s[:4]          # FRkk
-        rest = s[4:]
-        rest2 = "".join(OCR_DIGIT_FIX.get(ch, ch) for ch in rest)
-        if not rest2.isdigit():
-            return ""
-        return head + rest2
 
-    # (Optionnel) autres pays : tu peux laisser vide pour ne rien faire
-    return ""
+_IBAN_SEP_RE = re.compile(r"[ \u00A0-]")
 
-def extract_iban(text: str) -> str:
 
+def _norm_iban(s: str) -> str:
+    return _IBAN_SEP_RE.sub("", s or "").upper().strip()
 
-    # ⚠️ Ne PAS remplacer les \n par des espaces ici, sinon "...038\nBIC" => "...038BIC"
-    src = (text or "").upper().replace("\u00A0", " ")
 
-    def _norm_iban(s: str) -> str:
-        return re.sub(r"[ \u00A0-]", "", s or "").upper().strip()
+def extract_iban(text: Union[str, TextIndex]) -> str:
+
+
+    # ⚠️ Ne PAS remplacer les \n par des espaces ici, sinon "...038\nBIC" => "...038BIC"
+    ix = as_index(text)
+    src = ix.upper_sp
 
     # 1) priorité : IBAN proche du label "IBAN"
-    for m in re.finditer(r"\bIBAN\b", src, flags=re.IGNORECASE):
-        chunk = src[m.end(): m.end() + 260].replace(":", " ").replace("=", " ")
+    for m in ix.labels.find("iban"):
+        chunk = src[m.end: m.end + 260].replace(":", " ").replace("=", " ")
         for mm in IBAN_CANDIDATE_REGEX.finditer(chunk):
             iban = _norm_iban(mm.group(0))
-            if 15 <= len(iban) <= 34:
+            # longueur du pays : rejet avant checksum (la correction OCR ne change pas la longueur)
+            if iban_length_ok(iban):
                 if validate_iban(iban):
                     return iban
                 fixed = _fix_iban_ocr(iban)
                 if fixed and validate_iban(fixed):
                     return fixed
 
-    # 2) fallback global (sans recoller entre lignes)
-    candidates = []
+    # 2) fallback global (sans recoller entre lignes) : 1er candidat de longueur plausible, réparé si besoin
     for mm in IBAN_CANDIDATE_REGEX.finditer(src):
         iban = _norm_iban(mm.group(0))
-        if 15 <= len(iban) <= 34:
+        if iban_length_ok(iban):
             if validate_iban(iban):
                 return iban
             fixed = _fix_iban_ocr(iban)
-            if fixed and validate_iban(fixed):
-                return fixed
+            return fixed if fixed and validate_iban(fixed) else ""
 
-            if not candidates:
-                return ""
-
-    counts = Counter(candidates)
-    return sorted(counts.items(), key=lambda kv: (kv[1], len(kv[0])), reverse=True)[0][0]
+    return ""
 
 
-def extract_bic(text: str) -> str:
-    t = _normalize_ocr(text)
+def extract_bic(text: Union[str, TextIndex]) -> str:
+    ix = as_index(text)
+    t = ix.flat
 
-    bic = _find_best_match_near_label(
-        t,
-        label_patterns=[
-            r"\bBIC\b",
-            r"\bSWIFT\b",
-            r"\bB\.?I\.?C\.?\b"
-        ],
-        value_regex=BIC_REGEX,
-        window=120
-    )
+    # labels par priorité (BIC, puis SWIFT, puis B.I.C), valeur dans les 120 caractères qui suivent
+    bic = ""
+    for m in ix.labels.by_priority("bic"):
+        chunk = t[m.end: m.end + 120].replace(":", " ").replace("=", " ")
+        mm = BIC_REGEX.search(chunk)
+        if mm:
+            bic = mm.group(0)
+            break
 
     if not bic:
         return ""
@@ -213,27 +144,35 @@ def extract_bic(text: str) -> str:
     return bic
 
 
-def extract_date(text: str) -> str:
-    match = re.search(r"\b\d{2}[./-]\d{2}[./-]\d{4}\b", text)
+DATE_RE = re.compile(r"\b\d{2}[./-]\d{2}[./-]\d{4}\b")
+
+
+def extract_date(text: Union[str, TextIndex]) -> str:
+    match = DATE_RE.search(as_index(text).text)
     return match.group() if match else ""
 
 
-def extract_invoice_number(text: str) -> str:
-    if not text:
-        return ""
+INVOICE_NUMBER_BAD = {
+    "DESCRIPTION", "DATE", "FACTURE", "INVOICE", "TOTAL", "MONTANT", "BASE",
+    "CLIENT", "REFERENCE", "RÉFÉRENCE", "QTE", "QTÉ", "PU", "HT", "TVA", "TTC"
+}
 
-    BAD = {
-        "DESCRIPTION", "DATE", "FACTURE", "INVOICE", "TOTAL", "MONTANT", "BASE",
-        "CLIENT", "REFERENCE", "RÉFÉRENCE", "QTE", "QTÉ", "PU", "HT", "TVA", "TTC"
-    }
+INVOICE_TOKEN_RE = re.compile(r"\b[A-Z0-9][A-Z0-9\-_/\.]{2,}\b", re.IGNORECASE)
+INVOICE_FALLBACK_RE = re.compile(
+    r"(?:N[°O]\s*)?(?:INVOICE|INV\.?|FACTURE)\b[^\w]{0,20}([A-Z0-9\-_/\.]{3,})",
+    re.IGNORECASE
+)
 
-    label_rx = re.compile(
-        r"\b(N[°O]\s*FACTURE|FACTURE\s*(N[°O]|NO\.?)|INVOICE\s*(NO\.?|NUMBER)|INV\.?\s*NO\.?)\b",
-        re.IGNORECASE
-    )
-    token_rx = re.compile(r"\b[A-Z0-9][A-Z0-9\-_/\.]{2,}\b", re.IGNORECASE)
 
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+def extract_invoice_number(text: Union[str, TextIndex]) -> str:
+    ix = as_index(text)
+    if not ix.text:
+        return ""
+
+    BAD = INVOICE_NUMBER_BAD
+    token_rx = INVOICE_TOKEN_RE
+
+    lines = ix.lines
 
     def ok(tok: str) -> bool:
         t = (tok or "").strip()
@@ -249,13 +188,12 @@ def extract_invoice_number(text: str) -> str:
         return True
 
     # 1) priorité : chercher autour de "N° Facture" / "Invoice number"
-    for i, ln in enumerate(lines):
-        m = label_rx.search(ln)
-        if not m:
-            continue
+    for i in ix.labels.lines_with("invoice_number"):
+        ln = lines[i]
+        m = ix.labels.first_in_line("invoice_number", i)
 
         # a) valeur sur la même ligne (après le label)
-        after = ln[m.end():]
+        after = ln[m.end - ix.line_starts[i]:]
         for tok in token_rx.findall(after):
             if ok(tok):
                 return tok
@@ -267,8 +205,7 @@ def extract_invoice_number(text: str) -> str:
                     return tok
 
     # 2) fallback : ancien comportement, mais avec garde-fous
-    m = re.search(r"(?:N[°O]\s*)?(?:INVOICE|INV\.?|FACTURE)\b[^\w]{0,20}([A-Z0-9\-_/\.]{3,})",
-                  text, re.IGNORECASE)
+    m = INVOICE_FALLBACK_RE.search(ix.text)
     if m:
         cand = m.group(1).strip()
         if ok(cand):
@@ -289,9 +226,6 @@ ONLY_AMOUNT_RE = re.compile(
     re.IGNORECASE
 )
 
-VAT_BLOCK_HINT_RE = re.compile(r"(MONTANT\s*TVA|TOTAL\s*TVA|TAUX|BASE\s*HT|TVA)", re.IGNORECASE)
-
-
 def _norm_amount_str(s: str) -> str:
     return (s or "").replace("\u00A0", "").replace(" ", "").strip()
 
@@ -304,18 +238,14 @@ def _to_float(s: str):
         return None
 
 
-def parse_vat_lines(text: str):
+def parse_vat_lines(text: Union[str, TextIndex]):
+    ix = as_index(text)
     lines_out = []
     seen = set()
 
     # --- 1) format "TVA 20% ...": on garde ton comportement actuel ---
-    for raw in (text or "").splitlines():
-        line = raw.strip()
-        if not line:
-            continue
-
-        low = line.lower()
-        if "tva" not in low:
+    for i, line in enumerate(ix.lines):
+        if "tva" not in ix.lower_lines[i]:
             continue
 
         m_rate = VAT_RATE_RE.search(line)
@@ -323,7 +253,7 @@ def parse_vat_lines(text: str):
             continue
 
         rate = m_rate.group("rate").replace(",", ".")
-        amounts = MONEY_RE.findall(line)
+        amounts = ix.findall(MONEY_RE, i)
 
         base = ""
         vat = ""
@@ -344,20 +274,19 @@ def parse_vat_lines(text: str):
         lines_out.append({"rate": rate, "base": base, "vat": vat})
 
     # --- 2) format "table TVA" (comme ton exemple) ---
-    lines = [ln.strip() for ln in (text or "").splitlines() if ln.strip()]
-    label_table = _extract_vat_by_labels(lines)
+    label_table = _extract_vat_by_labels(ix)
 
-    centers = [i for i, ln in enumerate(lines) if VAT_BLOCK_HINT_RE.search(ln)]
+    centers = ix.labels.lines_with("vat_hint")
     # si rien trouvé, on tente quand même autour de "Total TVA"
     if not centers:
-        centers = [i for i, ln in enumerate(lines) if "TVA" in ln.upper()]
+        centers = [i for i, ln in enumerate(ix.upper_lines) if "TVA" in ln]
 
     best_table = None
     best_score = -1
 
     # on teste plusieurs centres et on garde le meilleur
     for c in centers[:40]:  # limite pour perf
-        res = _infer_vat_line_from_block(lines, c, window=25)
+        res = _infer_vat_line_from_block(ix, c, window=25)
         if not res:
             continue
 
@@ -400,8 +329,11 @@ def parse_vat_lines(text: str):
 # PARSER PRINCIPAL
 # =========================
 
-def parse_invoice(text: str) -> InvoiceData:
-    vat_lines = parse_vat_lines(text)
+def parse_invoice(text: Union[str, TextIndex]) -> InvoiceData:
+    # ✅ texte découpé / normalisé une seule fois, partagé par tous les extracteurs
+    ix = as_index(text)
+
+    vat_lines = parse_vat_lines(ix)
 
     vat_total = 0.0
     has_any = False
@@ -412,14 +344,14 @@ def parse_invoice(text: str) -> InvoiceData:
             has_any = True
     vat_total = vat_total if has_any else None
 
-    folder_numbers = extract_folder_numbers(text)
+    folder_numbers = extract_folder_numbers(ix)
     folder_number = folder_numbers[0] if folder_numbers else ""
 
     data = InvoiceData(
-        iban=extract_iban(text),
-        bic=extract_bic(text),
-        invoice_date=extract_date(text),
-        invoice_number=extract_invoice_number(text),
+        iban=extract_iban(ix),
+        bic=extract_bic(ix),
+        invoice_date=extract_date(ix),
+        invoice_number=extract_invoice_number(ix),
         folder_number=folder_number,
         folder_numbers=folder_numbers,
         vat_lines=vat_lines,
@@ -445,53 +377,66 @@ def _normalize_ocr(text: str) -> str:
     return t
 
 
-def _find_best_match_near_label(
-    text: str,
-    label_patterns: list[str],
-    value_regex: re.Pattern,
-    *,
-    window: int = 120
-) -> str:
-    """
-    Cherche une valeur (IBAN/BIC) dans une fenêtre de caractères
-    juste après un label (IBAN, BIC, SWIFT, etc.)
-    """
-    for pat in label_patterns:
-        for m in re.finditer(pat, text, flags=re.IGNORECASE):
-            start = m.end()
-            chunk = text[start:start + window]
-            chunk = chunk.replace(":", " ").replace("=", " ")
+def _line_amounts(ix: TextIndex, i: int) -> list:
+    """Montants d'une ligne : [(val, raw_str, line_idx, is_only_amount_line)] (calculé une fois)."""
+    def build():
+        only = ix.matches(ONLY_AMOUNT_RE, i)
+        out = []
+        for s in ix.findall(MONEY_RE, i):
+            v = _to_float(s)
+            if v is None:
+                continue
+            out.append((v, _norm_amount_str(s), i, only))
+        return out
 
-            mm = value_regex.search(chunk)
-            if mm:
-                return mm.group(0)
+    return ix.memo(("amounts", i), build)
 
-    return ""
 
-def _infer_vat_line_from_block(lines: list[str], center: int, window: int = 25):
+_VAT_EPS = 1e-6
+
+
+def _vat_triple_score(diff, r_only, b_only, v_only, ri, bi, vi, idx_taux, idx_base, idx_mtv):
+    """Score d'un triplet (taux, base, tva) — additions dans l'ordre historique (égalités identiques)."""
+    score = 0
+
+    # bonus cohérence
+    score += max(0, 60 - diff * 200)
+
+    # bonus si valeurs sur lignes "montant seul"
+    score += 25 if r_only else 0
+    score += 25 if b_only else 0
+    score += 35 if v_only else 0
+
+    # bonus proximité labels
+    if idx_taux is not None:
+        score += max(0, 20 - abs(ri - idx_taux) * 2)
+    if idx_base is not None:
+        score += max(0, 20 - abs(bi - idx_base) * 2)
+    if idx_mtv is not None:
+        score += max(0, 30 - abs(vi - idx_mtv) * 2)
+
+    return score
+
+
+def _infer_vat_line_from_block(lines: Union[list, TextIndex], center: int, window: int = 25):
     """
     Essaie d'inférer (taux, base, tva) dans un bloc autour d'un indice,
     en utilisant la cohérence: TVA ≈ Base * Taux / 100.
     """
+    ix = lines if isinstance(lines, TextIndex) else TextIndex("\n".join(lines))
+    up = ix.upper_lines
     start = max(0, center - window)
-    end = min(len(lines), center + window + 1)
+    end = min(len(up), center + window + 1)
 
     # indices des labels (si présents)
-    idx_taux = next((i for i in range(start, end) if "TAUX" in lines[i].upper()), None)
-    idx_base = next((i for i in range(start, end) if "BASE" in lines[i].upper()), None)
-    idx_mtv  = next((i for i in range(start, end) if "MONTANT TVA" in lines[i].upper() or "TOTAL TVA" in lines[i].upper()), None)
+    idx_taux = next((i for i in range(start, end) if "TAUX" in up[i]), None)
+    idx_base = next((i for i in range(start, end) if "BASE" in up[i]), None)
+    idx_mtv  = next((i for i in range(start, end) if "MONTANT TVA" in up[i] or "TOTAL TVA" in up[i]), None)
 
     # collect montants (val, raw_str, line_idx, is_only_amount_line)
     amounts = []
     for i in range(start, end):
-        ln = (lines[i] or "").strip()
-        if not ln:
-            continue
-        for s in MONEY_RE.findall(ln):
-            v = _to_float(s)
-            if v is None:
-                continue
-            amounts.append((v, _norm_amount_str(s), i, bool(ONLY_AMOUNT_RE.match(ln))))
+        amounts.extend(_line_amounts(ix, i))
 
     if not amounts:
         return None
@@ -501,47 +446,46 @@ def _infer_vat_line_from_block(lines: list[str], center: int, window: int = 25):
     if not rate_cands:
         return None
 
+    # TVA candidates triées par valeur : pour chaque (taux, base), recherche dichotomique
+    # dans la bande de tolérance au lieu de parcourir tous les montants
+    vat_cands = sorted(
+        ((a[0], pos) for pos, a in enumerate(amounts) if a[0] > 0),
+    )
+    vat_values = [v for v, _ in vat_cands]
+    base_cands = [a for a in amounts if a[0] > 0 and a[0] >= 10]
+
     best = None  # (score, rate_str, base_str, vat_str)
     for rv, rstr, ri, r_only in rate_cands:
-        for bv, bstr, bi, b_only in amounts:
-            if bv <= 0:
-                continue
-            # base plutôt "grande" par rapport au taux
-            if bv < 10:
+        for bv, bstr, bi, b_only in base_cands:
+            expected = (bv * rv) / 100.0
+            tol = max(0.06, expected * 0.03)  # tolérance 3%
+
+            # marge epsilon pour la bissection, le test exact (diff > tol) reste celui d'origine
+            lo = bisect_left(vat_values, expected - tol - _VAT_EPS)
+            hi = bisect_right(vat_values, expected + tol + _VAT_EPS)
+            if lo >= hi:
                 continue
 
-            expected = (bv * rv) / 100.0
-            for vv, vstr, vi, v_only in amounts:
-                if vv <= 0:
-                    continue
+            # meilleur montant TVA pour ce couple ; à score égal, le 1er dans l'ordre du texte
+            pair_best = None  # (score, pos)
+            for k in range(lo, hi):
+                pos = vat_cands[k][1]
+                vv, vstr, vi, v_only = amounts[pos]
 
                 diff = abs(vv - expected)
-                tol = max(0.06, expected * 0.03)  # tolérance 3%
                 if diff > tol:
                     continue
 
-                # scoring
-                score = 0
-
-                # bonus cohérence
-                score += max(0, 60 - diff * 200)
-
-                # bonus si valeurs sur lignes "montant seul"
-                score += 25 if r_only else 0
-                score += 25 if b_only else 0
-                score += 35 if v_only else 0
+                score = _vat_triple_score(diff, r_only, b_only, v_only, ri, bi, vi, idx_taux, idx_base, idx_mtv)
+                if pair_best is None or score > pair_best[0] or (score == pair_best[0] and pos < pair_best[1]):
+                    pair_best = (score, pos)
 
-                # bonus proximité labels
-                if idx_taux is not None:
-                    score += max(0, 20 - abs(ri - idx_taux) * 2)
-                if idx_base is not None:
-                    score += max(0, 20 - abs(bi - idx_base) * 2)
-                if idx_mtv is not None:
-                    score += max(0, 30 - abs(vi - idx_mtv) * 2)
+            if pair_best is None:
+                continue
 
-                cand = (score, rstr, bstr, vstr)
-                if best is None or cand[0] > best[0]:
-                    best = cand
+            # même ordre de parcours (taux, base) qu'avant : strictement meilleur pour remplacer
+            if best is None or pair_best[0] > best[0]:
+                best = (pair_best[0], rstr, bstr, amounts[pair_best[1]][1])
 
     if not best:
         return None
@@ -551,30 +495,29 @@ def _infer_vat_line_from_block(lines: list[str], center: int, window: int = 25):
 
 
 
-def _money_in_line_or_next(lines: list[str], idx: int) -> str:
+def _money_in_line_or_next(ix: TextIndex, idx: int) -> str:
     """Retourne le 1er montant trouvé sur la ligne idx, sinon sur idx+1 si c'est une ligne 'montant seul'."""
-    if idx is None or idx < 0 or idx >= len(lines):
+    if idx is None or idx < 0 or idx >= len(ix.lines):
         return ""
-    ln = lines[idx].strip()
 
-    m = MONEY_RE.search(ln)
-    if m:
-        return _norm_amount_str(m.group(0))
+    found = ix.findall(MONEY_RE, idx)
+    if found:
+        return _norm_amount_str(found[0])
 
-    if idx + 1 < len(lines):
-        ln2 = (lines[idx + 1] or "").strip()
-        if ONLY_AMOUNT_RE.match(ln2):
-            m2 = MONEY_RE.search(ln2)
-            if m2:
-                return _norm_amount_str(m2.group(0))
+    if idx + 1 < len(ix.lines):
+        if ix.matches(ONLY_AMOUNT_RE, idx + 1):
+            found2 = ix.findall(MONEY_RE, idx + 1)
+            if found2:
+                return _norm_amount_str(found2[0])
 
     return ""
 
-def _rate_in_line_or_next(lines: list[str], idx: int) -> str:
+def _rate_in_line_or_next(ix: TextIndex, idx: int) -> str:
     """Trouve un taux (<=30) sur la ligne idx ou idx+1."""
+    lines = ix.lines
     if idx is None or idx < 0 or idx >= len(lines):
         return ""
-    ln = lines[idx].strip()
+    ln = lines[idx]
 
     # 1) taux explicite avec %
     m = VAT_RATE_RE.search(ln)
@@ -582,9 +525,9 @@ def _rate_in_line_or_next(lines: list[str], idx: int) -> str:
         return m.group("rate").replace(",", ".")
 
     # 2) sinon un nombre <= 30 sur la ligne (ou la suivante)
-    def pick_rate_from_text(t: str) -> str:
+    def pick_rate_from_text(i: int) -> str:
         cands = []
-        for s in MONEY_RE.findall(t):
+        for s in ix.findall(MONEY_RE, i):
             v = _to_float(s)
             if v is not None and 0.0 < v <= 30.0:
                 cands.append((v, _norm_amount_str(s)))
@@ -594,33 +537,33 @@ def _rate_in_line_or_next(lines: list[str], idx: int) -> str:
         cands.sort(key=lambda x: x[0], reverse=True)
         return cands[0][1].replace(",", ".")
 
-    r = pick_rate_from_text(ln)
+    r = pick_rate_from_text(idx)
     if r:
         return r
 
     if idx + 1 < len(lines):
-        ln2 = (lines[idx + 1] or "").strip()
-        if ONLY_AMOUNT_RE.match(ln2):
-            r2 = pick_rate_from_text(ln2)
+        if ix.matches(ONLY_AMOUNT_RE, idx + 1):
+            r2 = pick_rate_from_text(idx + 1)
             if r2:
                 return r2
 
     return ""
 
-def _extract_vat_by_labels(lines: list[str]) -> dict | None:
+def _extract_vat_by_labels(ix: TextIndex) -> dict | None:
     """
     Extrait TVA via structure:
       Base HT -> montant
       % TVA / Taux -> taux
       Montant TVA / Total TVA -> montant TVA
     """
-    idx_base = next((i for i, ln in enumerate(lines) if BASE_LABEL_RE.search(ln)), None)
-    idx_vat  = next((i for i, ln in enumerate(lines) if VAT_LABEL_RE.search(ln)), None)
-    idx_rate = next((i for i, ln in enumerate(lines) if RATE_LABEL_RE.search(ln) and "TOTAL TVA" not in ln.upper()), None)
+    labels = ix.labels
+    idx_base = labels.first_line("base")
+    idx_vat  = labels.first_line("vat_total")
+    idx_rate = next((i for i in labels.lines_with("rate") if "TOTAL TVA" not in ix.upper_lines[i]), None)
 
-    base = _money_in_line_or_next(lines, idx_base) if idx_base is not None else ""
-    vat  = _money_in_line_or_next(lines, idx_vat)  if idx_vat  is not None else ""
-    rate = _rate_in_line_or_next(lines, idx_rate)  if idx_rate is not None else ""
+    base = _money_in_line_or_next(ix, idx_base) if idx_base is not None else ""
+    vat  = _money_in_line_or_next(ix, idx_vat)  if idx_vat  is not None else ""
+    rate = _rate_in_line_or_next(ix, idx_rate)  if idx_rate is not None else ""
 
     bv = _to_float(base) if base else None
     vv = _to_float(vat)  if vat  else None
@@ -642,4 +585,156 @@ def _extract_vat_by_labels(lines: list[str]) -> dict | None:
     if rate and base and vat:
         return {"rate": rate.replace(",", "."), "base": base, "vat": vat}
 
-    return None
\ No newline at end of file
+    return None
+
+
+# =========================
+# MONTANT HT PAR DOSSIER
+# =========================
+
+AMOUNT_CANDIDATE_RE = re.compile(r"\b\d+(?:[ \u00A0]\d{3})*(?:[.,]\d{2,3})\b")
+ONLY_AMOUNT_2DEC_RE = re.compile(
+    r"^\s*\d+(?:[ \u00A0]\d{3})*(?:[.,]\d{2})\s*(?:€|EUR)?\s*$",
+    re.IGNORECASE
+)
+HAS_LETTERS_RE = re.compile(r"[A-Za-z]")
+_FOLDER_SEP_RE = re.compile(r"[ \u00A0-]")
+_AMOUNT_DECIMALS_RE = re.compile(r"[.,](\d+)$")
+_QTY_RE = re.compile(r"\d{1,3}")
+
+
+def parse_amount(s: str):
+    """Montant texte ("1 250,00", "1250.00") -> float ; None si vide ou illisible."""
+    if not s:
+        return None
+    s = s.strip().replace(" ", "").replace("\u00A0", "")
+    s = s.replace(",", ".")
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+class _AmountLine(NamedTuple):
+    unit: bool                          # CO2 / kg : ignorée pour le meilleur montant
+    strict: bool                        # montant seul sur la ligne (2 décimales)
+    qty: bool                           # ligne = petit entier (quantité)
+    amounts: List[Tuple[float, int]]    # (valeur arrondie, nb décimales), >= 50 ; vide si lettres
+
+
+def _build_amount_line(raw: str) -> _AmountLine:
+    up = raw.upper()
+    amounts = []
+    # si lettres (hors € / EUR), ignorer
+    if not (HAS_LETTERS_RE.search(raw) and ("€" not in raw and "EUR" not in up)):
+        for s_amt in AMOUNT_CANDIDATE_RE.findall(raw):
+            v = parse_amount(s_amt)
+            # on évite les taux/quantités
+            if v is None or v < 50:
+                continue
+            mdec = _AMOUNT_DECIMALS_RE.search(s_amt)
+            amounts.append((round(v, 2), len(mdec.group(1)) if mdec else 0))
+    return _AmountLine(
+        unit="CO2" in up or "KG" in up,
+        strict=bool(ONLY_AMOUNT_2DEC_RE.match(raw)),
+        qty=bool(_QTY_RE.fullmatch(raw)),
+        amounts=amounts,
+    )
+
+
+def _amount_lines(ix: TextIndex) -> List[_AmountLine]:
+    """Montants candidats de chaque ligne, calculés une fois par document (partagés entre dossiers)."""
+    return ix.memo(("amount_lines",), lambda: [_build_amount_line(ln) for ln in ix.lines])
+
+
+def best_ht_amount_for_tour(lines: Union[list[str], str, TextIndex], tour_nr: str) -> float | None:
+    """
+    Meilleur montant HT (OCR) pour un dossier : fenêtre autour de la ligne du dossier,
+    bornée par les autres dossiers, avec préférence pour les montants seuls sur leur ligne.
+    Passer le TextIndex du document quand plusieurs dossiers sont cherchés : dossiers et
+    montants par ligne ne sont calculés qu'une fois.
+    """
+    ix = lines if isinstance(lines, TextIndex) else TextIndex(lines if isinstance(lines, str) else "\n".join(lines))
+    lines = ix.lines
+    folders = ix.folders
+
+    # ligne du dossier : index des dossiers du document (séparateurs tolérés)
+    idx = folders.first_line(tour_nr)
+    if idx is None:
+        # numéro hors règles DOSSIER_PATTERN (saisi à la main) : recherche dans les lignes compactées
+        compact = ix.memo(("folder_compact_lines",), lambda: [_FOLDER_SEP_RE.sub("", ln) for ln in lines])
+        idx = next((i for i, ln in enumerate(lines) if tour_nr in ln or tour_nr in compact[i]), None)
+    if idx is None:
+        return None
+
+    # ✅ fenêtre centrée sur la ligne du dossier (les montants sont souvent juste AVANT)
+    start = max(0, idx - 12)
+    end = min(len(lines), idx + 25)
+
+    # stop si autre dossier apparaît (avant / après)
+    for j in range(idx - 1, start - 1, -1):
+        if folders.line_has_other(j, tour_nr):
+            start = j + 1
+            break
+    for j in range(idx + 1, end):
+        if folders.line_has_other(j, tour_nr):
+            end = j
+            break
+
+    rows = _amount_lines(ix)
+    best = None  # (score, position, value)
+    found_2dec = False
+
+    for j in range(start, end):
+        row = rows[j]
+        # ignorer unités parasites (CO2, kg)
+        if row.unit:
+            continue
+
+        for v, dlen in row.amounts:
+            if dlen == 2:
+                found_2dec = True
+
+            # ✅ priorité à la proximité de la ligne dossier
+            score = max(0, 25 - abs(j - idx) * 2)
+
+            # décimales
+            if dlen == 2:
+                score += 30
+            elif dlen == 3:
+                score += 10
+            else:
+                score -= 40
+
+            # bonus si montant seul
+            if row.strict:
+                score += 80
+                # bonus si la ligne précédente ressemble à une quantité (rare, mais utile)
+                if j - 1 >= start and rows[j - 1].qty:
+                    score += 25
+
+            cand = (score, j, v)
+            if best is None or cand[0] > best[0] or (cand[0] == best[0] and cand[1] > best[1]):
+                best = cand
+
+    if not best:
+        return None
+
+    # si on a trouvé des montants en 2 décimales, on refuse les autres
+    if found_2dec:
+        best2 = None
+        for j in range(start, end):
+            row = rows[j]
+            for v, dlen in row.amounts:
+                if dlen != 2:
+                    continue
+                score = max(0, 25 - abs(j - idx) * 2) + 30
+                if row.strict:
+                    score += 80
+                cand = (score, j, v)
+                if best2 is None or cand[0] > best2[0] or (cand[0] == best2[0] and cand[1] > best2[1]):
+                    best2 = cand
+        if best2:
+            return best2[2]
+
+    return best[2]
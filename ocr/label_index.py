@@ -0,0 +1,260 @@
+# ocr/label_index.py
+"""
+Localisation des labels (IBAN, BIC, N° FACTURE, BASE HT, TOTAL TVA, TAUX...) en UNE passe.
+
+Tous les labels connus sont compilés dans un seul automate (trie des labels écrit en regex,
+en lookahead, le plus long d'abord) et cherchés ensemble sur le texte majuscule ;
+à chaque position, tous les labels présents sont relevés (y compris ceux qui se recouvrent).
+- blancs permis seulement là où le label a un espace ("BASE HT" = BASE\\s*HT),
+- frontières de mot comme \\b (par label : left / right).
+
+Résultat : offsets (dans TextIndex.text) + index de ligne, réutilisés par tous les extracteurs.
+
+Labels supplémentaires (autres langues) sans nouvelle regex : fichier JSON pointé par
+OCR_LABELS_PATH, ex. {"invoice_number": ["RECHNUNGSNUMMER", "FACTURA N°"], "base": [{"text": "NETTO", "left": true}]}
+Chaque entrée est un label (str ou {"text", "left", "right"}) ou une liste de variantes de même priorité.
+"""
+import os
+import re
+import json
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+
+# Ordre des entrées = priorité (ex. BIC : tous les "BIC" avant les "SWIFT").
+# Sans frontière de mot : "left"/"right" à False (même sémantique que les anciennes regex).
+DEFAULT_LABELS: Dict[str, List[Any]] = {
+    "iban": ["IBAN"],
+    "bic": ["BIC", "SWIFT", ["B.I.C", "B.IC", "BI.C", "BIC"]],
+    "invoice_number": [[
+        "N° FACTURE", "NO FACTURE",
+        "FACTURE N°", "FACTURE NO", "FACTURE NO.",
+        "INVOICE NO", "INVOICE NO.", "INVOICE NUMBER",
+        "INV NO", "INV NO.", "INV. NO", "INV. NO.",
+    ]],
+    "base": [[{"text": "BASE HT", "left": False, "right": False}, {"text": "TOTAL HT", "left": False, "right": False}]],
+    "vat_total": [[{"text": "MONTANT TVA", "left": False, "right": False}, {"text": "TOTAL TVA", "left": False, "right": False}]],
+    "rate": [["TAUX", {"text": "TVA", "left": False, "right": True}]],
+    # lignes "bloc TVA" (centres de recherche de la table TVA)
+    "vat_hint": [[
+        {"text": "TVA", "left": False, "right": False},
+        {"text": "TAUX", "left": False, "right": False},
+        {"text": "BASE HT", "left": False, "right": False},
+    ]],
+    # n° TVA intracommunautaire (empreintes fournisseurs)
+    "vat_id": [[
+        "TVA", "VAT", "UST-ID", "UST.-ID", "UST.ID", "USTID", "UST-IDNR", "UST.-IDNR", "UST.IDNR", "USTIDNR",
+        "N° TVA", "BTW", "IVA", "P IVA", "P. IVA", "NIF", "CIF", "VAT NO",
+    ]],
+}
+
+OCR_LABELS_PATH = os.getenv("OCR_LABELS_PATH", "")
+
+_WS_RE = re.compile(r"\s")
+
+
+def _is_word(ch: str) -> bool:
+    # même définition que \b des regex str
+    return ch.isalnum() or ch == "_"
+
+
+class LabelMatch(NamedTuple):
+    kind: str
+    entry: int      # index de l'entrée dans la config du kind (priorité)
+    label: str
+    start: int      # offsets dans TextIndex.text
+    end: int
+    line: int       # index dans TextIndex.lines ; -1 si le label est à cheval sur deux lignes
+
+
+class _Spec(NamedTuple):
+    kind: str
+    entry: int
+    label: str
+    gaps: frozenset  # positions (dans le label compacté) où un blanc est permis avant le caractère
+    left: bool
+    right: bool
+
+
+def _parse_label(item: Any) -> Tuple[str, bool, bool]:
+    if isinstance(item, dict):
+        return str(item.get("text") or ""), bool(item.get("left", True)), bool(item.get("right", True))
+    return str(item or ""), True, True
+
+
+class LabelConfig:
+    """Labels compilés en automate (construit une fois par process)."""
+
+    def __init__(self, labels: Dict[str, List[Any]]):
+        self.labels = labels
+        self.specs: Dict[str, List[_Spec]] = {}
+
+        for kind, entries in labels.items():
+            for entry_idx, entry in enumerate(entries):
+                for item in entry if isinstance(entry, list) else [entry]:
+                    text, left, right = _parse_label(item)
+                    words = text.upper().split()
+                    if not words:
+                        continue
+                    compact = "".join(words)
+                    gaps, pos = set(), 0
+                    for w in words[:-1]:
+                        pos += len(w)
+                        gaps.add(pos)
+                    self.specs.setdefault(compact, []).append(
+                        _Spec(kind, entry_idx, text, frozenset(gaps), left, right)
+                    )
+
+        literals = sorted(self.specs, key=len, reverse=True)
+        # littéraux présents aussi quand L est trouvé à la même position (= ses préfixes)
+        self.prefixes = {lit: [p for p in literals if lit.startswith(p)] for lit in literals}
+
+        # automate : trie des labels en regex (un seul chemin essayé par position),
+        # en lookahead pour relever aussi les labels qui se recouvrent ("TOTAL TVA" / "TVA")
+        trie: Dict[Any, Any] = {}
+        for lit in literals:
+            gaps = set().union(*(spec.gaps for spec in self.specs[lit]))
+            node = trie
+            for i, ch in enumerate(lit):
+                node = node.setdefault((ch, i in gaps), {})
+            node[None] = True
+        self.rx = re.compile("(?=(" + self._trie_pattern(trie) + "))")
+
+    @classmethod
+    def _trie_pattern(cls, node: Dict[Any, Any]) -> str:
+        alts = [
+            (r"\s*" if gap else "") + re.escape(ch) + cls._trie_pattern(child)
+            for (ch, gap), child in sorted((k, v) for k, v in node.items() if k is not None)
+        ]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        # fin de label possible ici : suite optionnelle (gourmande = le plus long d'abord)
+        return "(?:" + body + ")?" if None in node else body
+
+
+def _load_labels() -> Dict[str, List[Any]]:
+    labels = {k: list(v) for k, v in DEFAULT_LABELS.items()}
+    if not OCR_LABELS_PATH:
+        return labels
+    try:
+        with open(OCR_LABELS_PATH, "r", encoding="utf-8") as f:
+            extra = json.load(f) or {}
+    except (OSError, ValueError) as e:
+        print("⚠️ labels OCR non chargés :", e)
+        return labels
+    for kind, entries in extra.items():
+        # après les labels par défaut : ne change pas la priorité existante
+        labels.setdefault(kind, []).extend(entries if isinstance(entries, list) else [entries])
+    return labels
+
+
+_CONFIG: Optional[LabelConfig] = None
+
+
+def get_label_config() -> LabelConfig:
+    global _CONFIG
+    if _CONFIG is None:
+        _CONFIG = LabelConfig(_load_labels())
+    return _CONFIG
+
+
+class LabelIndex:
+    """
+    Toutes les occurrences de labels d'un TextIndex.
+    find(kind) : par position ; by_priority(kind) : par entrée puis position ;
+    lines_with(kind) / first_in_line(kind, i) : vues par ligne (labels sur une seule ligne).
+    """
+
+    def __init__(self, ix, config: Optional[LabelConfig] = None):
+        config = config or get_label_config()
+        src = ix.upper_sp  # même longueur que ix.text (voir TextIndex)
+        n = len(src)
+
+        by_kind: Dict[str, List[LabelMatch]] = {}
+        for m in config.rx.finditer(src):
+            found = m.group(1)
+            start = m.start()
+
+            # blancs internes : positions (dans le label compacté) devant lesquelles il y en a
+            inner = set()
+            if _WS_RE.search(found):
+                chars = []
+                for ch in found:
+                    if ch.isspace():
+                        if chars:
+                            inner.add(len(chars))
+                    else:
+                        chars.append(ch)
+                longest = "".join(chars)
+            else:
+                longest = found
+
+            before = src[start - 1] if start > 0 else ""
+            line = ix.line_at(start)
+            for lit in config.prefixes[longest]:
+                if inner:
+                    # fin du préfixe dans le texte (blancs internes compris)
+                    end, k = start, 0
+                    while k < len(lit):
+                        if not src[end].isspace():
+                            k += 1
+                        end += 1
+                    gaps = {g for g in inner if g < len(lit)}
+                    lit_line = line if ix.line_at(end - 1) == line else -1
+                else:
+                    end, gaps, lit_line = start + len(lit), inner, line
+                after = src[end] if end < n else ""
+
+                for spec in config.specs[lit]:
+                    if gaps and not gaps <= spec.gaps:
+                        continue
+                    if spec.left and _is_word(before) == _is_word(lit[0]):
+                        continue
+                    if spec.right and _is_word(after) == _is_word(lit[-1]):
+                        continue
+                    by_kind.setdefault(spec.kind, []).append(
+                        LabelMatch(spec.kind, spec.entry, spec.label, start, end, lit_line)
+                    )
+
+        for matches in by_kind.values():
+            # position, puis le plus long d'abord (comme une regex gourmande)
+            matches.sort(key=lambda m: (m.start, -m.end, m.entry))
+        self._by_kind = by_kind
+
+        self._lines: Dict[str, List[int]] = {}
+        self._first: Dict[Tuple[str, int], LabelMatch] = {}
+        for kind, matches in by_kind.items():
+            seen = []
+            for m in matches:
+                if m.line < 0:
+                    continue
+                if (kind, m.line) not in self._first:
+                    self._first[(kind, m.line)] = m
+                    seen.append(m.line)
+            self._lines[kind] = sorted(seen)
+
+    def find(self, kind: str) -> List[LabelMatch]:
+        return self._by_kind.get(kind, [])
+
+    def by_priority(self, kind: str) -> List[LabelMatch]:
+        """Entrée 0 (toutes positions), puis entrée 1... (ordre des anciennes boucles label par label)."""
+        out, last = [], None
+        for m in sorted(self.find(kind), key=lambda m: (m.entry, m.start, -m.end)):
+            # une occurrence par position et par entrée (variantes qui se recouvrent)
+            if last is not None and (m.entry, m.start) == (last.entry, last.start):
+                continue
+            out.append(m)
+            last = m
+        return out
+
+    def lines_with(self, kind: str) -> List[int]:
+        """Index (croissants) des lignes contenant ce label."""
+        return self._lines.get(kind, [])
+
+    def first_line(self, kind: str) -> Optional[int]:
+        lines = self.lines_with(kind)
+        return lines[0] if lines else None
+
+    def first_in_line(self, kind: str, line: int) -> Optional[LabelMatch]:
+        """1re occurrence (la plus longue à la position la plus à gauche) sur la ligne."""
+        return self._first.get((kind, line))
@@ -0,0 +1,335 @@
+# ocr/model_store.py
+"""
+Stockage des modèles fournisseurs (un modèle = dict JSON, clé = "<IBAN>_<BIC>").
+
+- JsonModelStore   : historique, un fichier <clé>.json par fournisseur.
+- SqliteModelStore : une base SQLite locale, indexée par clé / IBAN / BIC,
+  avec une table des règles (patterns) pour les requêtes transverses
+  (fournisseurs partageant un BIC, règles jamais revues, champs sans règle...).
+
+Choix via SUPPLIER_MODEL_STORE=json|sqlite (voir supplier_model.get_model_store).
+
+Import d'un dossier JSON existant :
+    python -m ocr.model_store import [dossier_json] [base.sqlite3]
+"""
+import os
+import re
+import sys
+import json
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+UpdateFn = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+# forme des clés de build_supplier_key : IBAN compact + "_" + BIC (8 ou 11)
+_SUPPLIER_KEY_RE = re.compile(r"[A-Z]{2}[0-9]{2}[A-Z0-9]{11,30}_[A-Z]{6}[A-Z0-9]{2}(?:[A-Z0-9]{3})?")
+
+
+def _now_iso() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _split_key(supplier_key: str) -> Tuple[str, str]:
+    iban, _, bic = (supplier_key or "").partition("_")
+    return iban, bic
+
+
+def _rule_key(rule: Dict[str, Any]) -> str:
+    """Même identité de règle que merge_patterns."""
+    if rule.get("mode") == "near_label":
+        return f"near|{rule.get('label_regex')}|{rule.get('value_regex')}|{rule.get('window')}|{rule.get('group')}"
+    return f"{rule.get('mode')}|{rule.get('regex')}|{rule.get('group')}"
+
+
+class JsonModelStore:
+    """Un fichier JSON par fournisseur (comportement historique)."""
+
+    def __init__(self, model_dir: str):
+        self.model_dir = model_dir
+        self._lock = threading.Lock()
+
+    def _path(self, supplier_key: str) -> str:
+        os.makedirs(self.model_dir, exist_ok=True)
+        return os.path.join(self.model_dir, f"{supplier_key}.json")
+
+    def get(self, supplier_key: str) -> Optional[dict]:
+        path = self._path(supplier_key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def stamp(self, supplier_key: str) -> Optional[Hashable]:
+        """Change à chaque écriture du modèle (invalidation des caches) ; None si absent."""
+        try:
+            st = os.stat(self._path(supplier_key))
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def put(self, supplier_key: str, data: dict) -> None:
+        """Écriture atomique (évite les JSON tronqués en cas d'arrêt brutal)."""
+        path = self._path(supplier_key)
+        # tmp unique par écriture (UI, workers de lot, threads d'apprentissage des zones)
+        fd, tmp = tempfile.mkstemp(prefix=f"{supplier_key}.", suffix=".tmp", dir=self.model_dir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def update(self, supplier_key: str, fn: UpdateFn) -> dict:
+        """Lecture -> fn(existant) -> écriture, sans écriture concurrente dans ce process."""
+        with self._lock:
+            data = fn(self.get(supplier_key) or {})
+            self.put(supplier_key, data)
+            return data
+
+    def keys(self) -> List[str]:
+        """Clés des <IBAN>_<BIC>.json du dossier (autres JSON ignorés, ex. ancien supplier_index.json)."""
+        try:
+            names = os.listdir(self.model_dir)
+        except OSError:
+            return []
+        return sorted(
+            n[:-5] for n in names if n.lower().endswith(".json") and _SUPPLIER_KEY_RE.fullmatch(n[:-5])
+        )
+
+
+class SqliteModelStore:
+    """
+    Modèles dans une base SQLite (WAL) :
+    - supplier_models : clé, IBAN, BIC, JSON complet, version (incrémentée à chaque écriture),
+    - supplier_rules  : une ligne par règle (champ, mode, hit_count...) pour l'analyse.
+    Une connexion par thread ; chaque écriture est une transaction.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS supplier_models (
+        supplier_key TEXT PRIMARY KEY,
+        iban         TEXT NOT NULL,
+        bic          TEXT NOT NULL,
+        data         TEXT NOT NULL,
+        version      INTEGER NOT NULL DEFAULT 1,
+        updated_at   TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS ix_supplier_models_iban ON supplier_models(iban);
+    CREATE INDEX IF NOT EXISTS ix_supplier_models_bic  ON supplier_models(bic);
+
+    CREATE TABLE IF NOT EXISTS supplier_rules (
+        supplier_key TEXT NOT NULL REFERENCES supplier_models(supplier_key) ON DELETE CASCADE,
+        field        TEXT NOT NULL,
+        rule_key     TEXT NOT NULL,
+        mode         TEXT NOT NULL,
+        hit_count    INTEGER NOT NULL DEFAULT 0,
+        last_seen    TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (supplier_key, field, rule_key)
+    );
+    CREATE INDEX IF NOT EXISTS ix_supplier_rules_field ON supplier_rules(field, hit_count);
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        d = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(d, exist_ok=True)
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None : transactions explicites (BEGIN IMMEDIATE) pour les écritures
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    # ---- lecture ----
+
+    def get(self, supplier_key: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT data FROM supplier_models WHERE supplier_key = ?", (supplier_key,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def stamp(self, supplier_key: str) -> Optional[Hashable]:
+        row = self._conn().execute(
+            "SELECT version FROM supplier_models WHERE supplier_key = ?", (supplier_key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def keys(self) -> List[str]:
+        return [r[0] for r in self._conn().execute("SELECT supplier_key FROM supplier_models ORDER BY supplier_key")]
+
+    # ---- écriture ----
+
+    def _write(self, conn: sqlite3.Connection, supplier_key: str, data: dict) -> None:
+        iban, bic = _split_key(supplier_key)
+        conn.execute(
+            """
+            INSERT INTO supplier_models (supplier_key, iban, bic, data, version, updated_at)
+            VALUES (?, ?, ?, ?, 1, ?)
+            ON CONFLICT(supplier_key) DO UPDATE SET
+                iban = excluded.iban,
+                bic = excluded.bic,
+                data = excluded.data,
+                version = supplier_models.version + 1,
+                updated_at = excluded.updated_at
+            """,
+            (
+                supplier_key,
+                (data.get("iban") or iban).upper(),
+                (data.get("bic") or bic).upper(),
+                json.dumps(data, ensure_ascii=False),
+                data.get("updated_at") or _now_iso(),
+            ),
+        )
+        conn.execute("DELETE FROM supplier_rules WHERE supplier_key = ?", (supplier_key,))
+        rows = []
+        for field, rules in (data.get("patterns") or {}).items():
+            for r in rules or []:
+                rows.append((
+                    supplier_key,
+                    field,
+                    _rule_key(r),
+                    str(r.get("mode") or ""),
+                    int(r.get("hit_count", 0)),
+                    str(r.get("last_seen") or r.get("created_at") or ""),
+                ))
+        # INSERT OR REPLACE : une règle en double dans le JSON ne doit pas bloquer l'écriture
+        conn.executemany(
+            "INSERT OR REPLACE INTO supplier_rules (supplier_key, field, rule_key, mode, hit_count, last_seen) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def put(self, supplier_key: str, data: dict) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write(conn, supplier_key, data)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def update(self, supplier_key: str, fn: UpdateFn) -> dict:
+        """
+        Lecture -> fn(existant) -> écriture dans UNE transaction (verrou d'écriture pris dès la lecture) :
+        deux postes qui valident le même fournisseur ne perdent pas les règles l'un de l'autre.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT data FROM supplier_models WHERE supplier_key = ?", (supplier_key,)
+            ).fetchone()
+            data = fn(json.loads(row[0]) if row else {})
+            self._write(conn, supplier_key, data)
+            conn.execute("COMMIT")
+            return data
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def import_json_dir(self, model_dir: str, *, overwrite: bool = False) -> int:
+        """Import en une transaction des <clé>.json d'un dossier ; retourne le nombre de modèles importés."""
+        src = JsonModelStore(model_dir)
+        conn = self._conn()
+        count = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = set() if overwrite else {r[0] for r in conn.execute("SELECT supplier_key FROM supplier_models")}
+            for key in src.keys():
+                if key in existing:
+                    continue
+                try:
+                    data = src.get(key)
+                except (OSError, ValueError) as e:
+                    print(f"⚠️ modèle ignoré ({key}) :", e)
+                    continue
+                if not isinstance(data, dict):
+                    continue
+                self._write(conn, key, data)
+                count += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+    # ---- requêtes transverses ----
+
+    def suppliers_by_bic(self, bic: str) -> List[str]:
+        return [r[0] for r in self._conn().execute(
+            "SELECT supplier_key FROM supplier_models WHERE bic = ? ORDER BY supplier_key", ((bic or "").upper(),)
+        )]
+
+    def suppliers_by_iban(self, iban: str) -> List[str]:
+        return [r[0] for r in self._conn().execute(
+            "SELECT supplier_key FROM supplier_models WHERE iban = ? ORDER BY supplier_key", ((iban or "").upper(),)
+        )]
+
+    def shared_bics(self) -> Dict[str, List[str]]:
+        """BIC utilisés par plusieurs fournisseurs -> clés."""
+        out: Dict[str, List[str]] = {}
+        for bic, key in self._conn().execute(
+            """
+            SELECT bic, supplier_key FROM supplier_models
+            WHERE bic IN (SELECT bic FROM supplier_models GROUP BY bic HAVING COUNT(*) > 1)
+            ORDER BY bic, supplier_key
+            """
+        ):
+            out.setdefault(bic, []).append(key)
+        return out
+
+    def stale_rules(self, max_hits: int = 1) -> List[Tuple[str, str, str, int]]:
+        """Règles revues au plus max_hits fois : (clé, champ, mode, hit_count)."""
+        return list(self._conn().execute(
+            "SELECT supplier_key, field, mode, hit_count FROM supplier_rules "
+            "WHERE hit_count <= ? ORDER BY hit_count, supplier_key, field",
+            (int(max_hits),),
+        ))
+
+    def suppliers_without_rule(self, field: str) -> List[str]:
+        """Fournisseurs sans aucune règle pour ce champ (ex. "invoice_number")."""
+        return [r[0] for r in self._conn().execute(
+            """
+            SELECT m.supplier_key FROM supplier_models m
+            WHERE NOT EXISTS (
+                SELECT 1 FROM supplier_rules r WHERE r.supplier_key = m.supplier_key AND r.field = ?
+            )
+            ORDER BY m.supplier_key
+            """,
+            (field,),
+        )]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from .supplier_model import MODEL_DIR, SUPPLIER_MODEL_DB
+
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] != "import":
+        print(__doc__)
+        return 1
+
+    model_dir = argv[1] if len(argv) > 1 else MODEL_DIR
+    db_path = argv[2] if len(argv) > 2 else SUPPLIER_MODEL_DB
+    n = SqliteModelStore(db_path).import_json_dir(model_dir)
+    print(f"{n} modèle(s) importé(s) de {model_dir} dans {db_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
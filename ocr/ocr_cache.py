@@ -0,0 +1,118 @@
+# ocr/ocr_cache.py
+"""
+Cache disque du texte OCR, adressé par contenu :
+clé = hash du PDF + paramètres OCR (dpi, langues, psm, version du pré-traitement)
++ version du format des entrées (CACHE_FORMAT_VERSION).
+
+Un même PDF (même renommé / déplacé) n'est donc OCRisé qu'une fois par jeu de
+paramètres. Éviction LRU (date d'accès = mtime du fichier) au-delà d'une taille max.
+"""
+import os
+import json
+import hashlib
+import tempfile
+from typing import Any, Dict, Optional
+
+# à incrémenter quand le format des entrées change : les anciennes ne sont plus adressées
+# (puis sortent par l'éviction LRU), pas de lecture des anciens formats
+CACHE_FORMAT_VERSION = 2
+
+
+class OcrCache:
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def file_hash(path: str) -> str:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def make_key(pdf_hash: str, params: Dict[str, Any]) -> str:
+        raw = f"v{CACHE_FORMAT_VERSION}|{pdf_hash}|" + json.dumps(params, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[int, str]]:
+        """Texte OCR par index de page (seulement les pages OCRisées), ou None si absent / illisible."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f) or {}
+        except (OSError, ValueError):
+            return None
+
+        pages = data.get("pages")
+        if not isinstance(pages, dict):
+            return None
+
+        # LRU : un hit rafraîchit la date
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        try:
+            return {int(i): str(t or "") for i, t in pages.items()}
+        except ValueError:
+            return None
+
+    def put(self, key: str, pages: Dict[int, str], params: Optional[Dict[str, Any]] = None) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        # tmp unique par écriture : plusieurs process / threads OCR peuvent écrire la même clé
+        fd, tmp = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"params": params or {}, "pages": {str(i): t for i, t in sorted(pages.items())}},
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """Supprime les entrées les moins récemment utilisées jusqu'à repasser sous max_bytes."""
+        if self.max_bytes <= 0:
+            return
+
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for e in it:
+                    if not e.name.endswith(".json"):
+                        continue
+                    try:
+                        st = e.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, e.path))
+                    total += st.st_size
+        except OSError:
+            return
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+            if total <= self.max_bytes:
+                break
@@ -1,11 +1,22 @@
 import pytesseract
 from pdf2image import convert_from_path
 import os
+import atexit
+import threading
+import time
 import tempfile
 import fitz
 import re
+from itertools import islice
 import numpy as np
 from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .ocr_cache import OcrCache
 
 try:
     import cv2
@@ -18,6 +29,37 @@ pytesseract.pytesseract.tesseract_cmd = (
 
 POPPLER_PATH = r"C:\poppler\Library\bin"
 
+# OCR parallèle page par page : nombre max de process (1 = OCR série historique)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+_ocr_pool: Optional[ProcessPoolExecutor] = None
+# création / arrêt du pool : appelés par le thread de flux OCR de l'UI et par le thread batch
+_ocr_pool_lock = threading.Lock()
+
+# ⚠️ à incrémenter dès que _preprocess_image_for_ocr / _clean_ocr_text changent (invalide le cache)
+PREPROCESS_VERSION = 2
+
+OCR_DPI = 200  # ⚡ plus rapide que 300
+
+# Rasterisation des pages à OCRiser : "fitz" (en mémoire) ou "poppler" (pdf2image, PNG temporaires)
+OCR_RASTERIZER = os.getenv("OCR_RASTERIZER", "fitz").strip().lower()
+
+# Cache OCR adressé par contenu : désactivé tant que OCR_CACHE_DIR (dossier inscriptible) n'est pas renseigné
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "").strip()
+OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", "512"))
+
+_ocr_cache = OcrCache(OCR_CACHE_DIR, OCR_CACHE_MAX_MB * 1024 * 1024) if OCR_CACHE_DIR else None
+
+# En dessous : la page est considérée comme scannée (pas de couche texte exploitable)
+NATIVE_PAGE_MIN_CHARS = int(os.getenv("NATIVE_PAGE_MIN_CHARS", "30"))
+
+
+@dataclass
+class PageText:
+    index: int   # 0-based
+    text: str
+    source: str  # "native" | "ocr" | "cache"
+
 _BAD_OCR_CHARS = set("□■▪▫█▌▐▎▍▏|¦│┃┆┇")
 _BAD_OCR_RE = re.compile(r"[□■▪▫█▌▐▎▍▏|¦│┃┆┇]+")
 
@@ -41,119 +83,836 @@ def _clean_ocr_text(text: str) -> str:
     return "\n".join(out)
 
 
-def _preprocess_image_for_ocr(pil_img: Image.Image) -> Image.Image:
+# Détection des traits sur une copie réduite (~largeur en px) ; le masque est appliqué en pleine résolution
+PREPROCESS_DETECT_WIDTH = int(os.getenv("PREPROCESS_DETECT_WIDTH", "850"))
+
+_pp_local = threading.local()
+
+
+def _pp_buffer(name: str, shape: tuple) -> np.ndarray:
+    """Tampon uint8 réutilisé d'une page à l'autre (par thread, par taille)."""
+    bufs = getattr(_pp_local, "bufs", None)
+    if bufs is None:
+        bufs = _pp_local.bufs = {}
+    buf = bufs.get(name)
+    if buf is None or buf.shape != shape:
+        buf = bufs[name] = np.empty(shape, dtype=np.uint8)
+    return buf
+
+
+def _otsu_threshold(gray: np.ndarray) -> int:
+    """Seuil d'Otsu vectorisé (histogramme numpy)."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256, dtype=np.float64)
+    w0 = np.cumsum(hist)
+    w1 = w0[-1] - w0
+    m0 = np.cumsum(hist * levels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mu0 = m0 / w0
+        mu1 = (m0[-1] - m0) / w1
+        between = w0 * w1 * (mu0 - mu1) ** 2
+    return int(np.nanargmax(between))
+
+
+def _np_open_1d(bw: np.ndarray, k: int, axis: int) -> np.ndarray:
+    """Ouverture morpho par un segment de longueur k (sommes cumulées, sans boucle Python)."""
+    n = bw.shape[axis]
+    if k > n:
+        return np.zeros_like(bw)
+    if axis == 0:
+        return _np_open_1d(bw.T, k, 1).T
+
+    c = np.zeros((bw.shape[0], n + 1), dtype=np.int32)
+    np.cumsum(bw, axis=1, out=c[:, 1:])
+    starts = (c[:, k:] - c[:, :-k]) == k           # érosion : fenêtres [i, i+k) pleines
+    d = np.zeros((bw.shape[0], n + 1), dtype=np.int32)
+    np.cumsum(starts, axis=1, out=d[:, 1:n - k + 2])
+    d[:, n - k + 2:] = d[:, n - k + 1:n - k + 2]
+    j = np.arange(n)
+    lo = np.maximum(0, j - k + 1)
+    hi = np.minimum(j + 1, n - k + 1)
+    return (d[:, hi] - d[:, lo]) > 0               # dilatation : couvert par au moins une fenêtre
+
+
+def _preprocess_image_for_ocr(pil_img: Image.Image, stats: Optional[Counter] = None) -> Image.Image:
     """
     Enlève les traits de tableaux (vertical/horizontal) pour éviter les "□" dans l'OCR.
-    Si OpenCV n'est pas dispo, fallback simple.
+    Les traits sont détectés sur une copie réduite, le masque est appliqué en pleine résolution.
+    Sans OpenCV : même traitement en numpy (plus lent).
+    stats : reçoit la durée de chaque étape (clés "pp_ms:<étape>").
     """
-    gray = np.array(pil_img.convert("L"))
+    t = time.perf_counter()
+
+    def lap(step: str) -> None:
+        nonlocal t
+        now = time.perf_counter()
+        if stats is not None:
+            stats[f"pp_ms:{step}"] += (now - t) * 1000.0
+        t = now
+
+    gray = np.asarray(pil_img.convert("L"))
+    h, w = gray.shape[:2]
+    lap("gray")
+
+    # Binarisation Otsu, directement inversée (texte/traits en blanc sur fond noir)
+    inv = _pp_buffer("inv", (h, w))
+    if cv2 is not None:
+        cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU, dst=inv)
+    else:
+        np.less_equal(gray, _otsu_threshold(gray), out=inv.view(bool))
+        np.multiply(inv, 255, out=inv)
+    lap("otsu")
+
+    # Copie réduite pour la détection des traits
+    scale = min(1.0, PREPROCESS_DETECT_WIDTH / float(w))
+    ws, hs = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+    if cv2 is not None:
+        small = cv2.resize(inv, (ws, hs), interpolation=cv2.INTER_AREA) if scale < 1.0 else inv
+        cv2.threshold(small, 64, 255, cv2.THRESH_BINARY, dst=small)
+    else:
+        small = np.asarray(Image.fromarray(inv).resize((ws, hs), Image.BOX)) if scale < 1.0 else inv
+    lap("downscale")
+
+    # Détection traits horizontaux/verticaux via ouverture morpho (noyaux à l'échelle)
+    kh = max(int(round(30 * scale)), ws // 35)
+    kv = max(int(round(30 * scale)), hs // 35)
+    if cv2 is not None:
+        h_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kh, 1))
+        v_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, kv))
+        lines_small = cv2.morphologyEx(small, cv2.MORPH_OPEN, h_kernel, iterations=1)
+        vert = cv2.morphologyEx(small, cv2.MORPH_OPEN, v_kernel, iterations=1)
+        cv2.bitwise_or(lines_small, vert, dst=lines_small)
+    else:
+        bw = small > 64
+        lines_small = (_np_open_1d(bw, kh, 1) | _np_open_1d(bw, kv, 0)).astype(np.uint8) * 255
+    lap("lines")
+
+    # Masque remis en pleine résolution
+    mask = _pp_buffer("mask", (h, w))
+    if scale < 1.0:
+        if cv2 is not None:
+            cv2.resize(lines_small, (w, h), dst=mask, interpolation=cv2.INTER_NEAREST)
+        else:
+            mask[...] = np.asarray(Image.fromarray(lines_small).resize((w, h), Image.NEAREST))
+    else:
+        mask[...] = lines_small
+    lap("upscale")
+
+    # Supprimer les lignes détectées (seulement là où il y a de l'encre), puis noir sur blanc
+    if cv2 is not None:
+        cv2.bitwise_not(mask, dst=mask)
+        cv2.bitwise_and(inv, mask, dst=inv)
+        cleaned = cv2.bitwise_not(inv)  # nouveau tableau : l'image rendue ne partage pas les tampons
+    else:
+        np.invert(mask, out=mask)
+        np.bitwise_and(inv, mask, out=inv)
+        cleaned = np.invert(inv)
+    out = Image.fromarray(cleaned)
+    lap("apply")
+    return out
+
+
+def _init_ocr_worker() -> None:
+    # 1 thread OpenMP par tesseract : c'est le pool qui parallélise (évite la sur-souscription CPU)
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+    # charge les modèles de la 1re passe dès le démarrage du process (pas au 1er document)
+    backend = _get_backend()
+    if isinstance(backend, TesserocrBackend):
+        try:
+            backend._api(OCR_LANG, "--oem 3 --psm 6 -c preserve_interword_spaces=1")
+        except RuntimeError:
+            pass
+
+
+def _get_ocr_pool() -> ProcessPoolExecutor:
+    """
+    Pool de process OCR créé à la demande et réutilisé entre les documents.
+    Toujours OCR_WORKERS process : le parallélisme d'un document est borné par le nombre
+    de pages soumises à la fois (_ocr_window), pas par la taille du pool.
+    """
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, initializer=_init_ocr_worker)
+        return _ocr_pool
+
 
-    if cv2 is None:
-        # fallback simple : binarisation basique
-        # (moins bon que la suppression de lignes)
-        thr = 200
-        bw = (gray > thr).astype(np.uint8) * 255
-        return Image.fromarray(bw)
+def shutdown_ocr_pool(pool: Optional[ProcessPoolExecutor] = None) -> None:
+    """Arrête le pool ; avec `pool`, seulement s'il est encore le pool courant (pool cassé)."""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None or (pool is not None and pool is not _ocr_pool):
+            return
+        old, _ocr_pool = _ocr_pool, None
+    old.shutdown(wait=False, cancel_futures=True)
 
-    # Binarisation Otsu
-    _, th = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
 
-    # Inversion pour que le texte/traits soient en "blanc" sur fond noir
-    inv = 255 - th
+atexit.register(shutdown_ocr_pool)
 
-    h, w = inv.shape[:2]
 
-    # Détection traits horizontaux/verticaux via ouverture morpho
-    h_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(30, w // 35), 1))
-    v_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(30, h // 35)))
+# =========================
+# Backends Tesseract
+# =========================
+# "pytesseract" : 1 process tesseract lancé par appel (rechargement des traineddata à chaque fois).
+# "tesserocr"   : API Tesseract chargée une fois par (langues, psm) et gardée en vie dans le
+#                 process (les process du pool OCR sont persistants -> modèles chargés 1 fois).
 
-    hori = cv2.morphologyEx(inv, cv2.MORPH_OPEN, h_kernel, iterations=1)
-    vert = cv2.morphologyEx(inv, cv2.MORPH_OPEN, v_kernel, iterations=1)
+OCR_BACKEND = os.getenv("OCR_BACKEND", "auto").strip().lower()  # auto | tesserocr | pytesseract
+
+
+def _parse_tess_config(config: str) -> Tuple[int, int, Dict[str, str]]:
+    """'--oem 3 --psm 6 -c a=b' -> (oem, psm, {a: b})."""
+    oem, psm, variables = 3, 3, {}
+    parts = (config or "").split()
+    i = 0
+    while i < len(parts):
+        tok = parts[i]
+        nxt = parts[i + 1] if i + 1 < len(parts) else ""
+        if tok == "--oem" and nxt:
+            oem, i = int(nxt), i + 2
+        elif tok == "--psm" and nxt:
+            psm, i = int(nxt), i + 2
+        elif tok == "-c" and "=" in nxt:
+            k, v = nxt.split("=", 1)
+            variables[k] = v
+            i += 2
+        else:
+            i += 1
+    return oem, psm, variables
+
+
+class PytesseractBackend:
+    name = "pytesseract"
+
+    def image_to_string(self, img: Image.Image, lang: str, config: str) -> str:
+        return pytesseract.image_to_string(img, lang=lang, config=config)
+
+    def image_to_data(self, img: Image.Image, lang: str, config: str) -> Dict[str, list]:
+        return pytesseract.image_to_data(img, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+
+
+class TesserocrBackend:
+    """API Tesseract persistante (tesserocr), une instance par thread et par configuration."""
+
+    name = "tesserocr"
+
+    def __init__(self):
+        import tesserocr  # ImportError -> backend indisponible
+
+        self._tesserocr = tesserocr
+        self._local = threading.local()
+        self._tessdata = os.getenv("TESSDATA_PREFIX") or os.path.join(
+            os.path.dirname(pytesseract.pytesseract.tesseract_cmd), "tessdata"
+        )
+
+    def _api(self, lang: str, config: str):
+        oem, psm, variables = _parse_tess_config(config)
+        key = (lang, oem, psm, tuple(sorted(variables.items())))
+        apis = getattr(self._local, "apis", None)
+        if apis is None:
+            apis = self._local.apis = {}
+
+        api = apis.get(key)
+        if api is None:
+            tr = self._tesserocr
+            api = tr.PyTessBaseAPI(path=self._tessdata, lang=lang, psm=psm, oem=oem)
+            for k, v in variables.items():
+                api.SetVariable(k, v)
+            apis[key] = api
+        return api
+
+    def close(self) -> None:
+        for api in (getattr(self._local, "apis", None) or {}).values():
+            try:
+                api.End()
+            except Exception:
+                pass
+        self._local.apis = {}
+
+    def image_to_string(self, img: Image.Image, lang: str, config: str) -> str:
+        api = self._api(lang, config)
+        api.SetImage(img)
+        return api.GetUTF8Text()
+
+    def image_to_data(self, img: Image.Image, lang: str, config: str) -> Dict[str, list]:
+        """Même structure que pytesseract.image_to_data(output_type=DICT) (colonnes utiles)."""
+        RIL = self._tesserocr.RIL
+        api = self._api(lang, config)
+        api.SetImage(img)
+        api.Recognize()
+
+        data: Dict[str, list] = {k: [] for k in (
+            "block_num", "par_num", "line_num", "word_num", "left", "top", "width", "height", "conf", "text"
+        )}
+        it = api.GetIterator()
+        if it is None:
+            return data
+
+        block = par = line = word = 0
+        while True:
+            if it.IsAtBeginningOf(RIL.BLOCK):
+                block, par, line, word = block + 1, 0, 0, 0
+            if it.IsAtBeginningOf(RIL.PARA):
+                par, line, word = par + 1, 0, 0
+            if it.IsAtBeginningOf(RIL.TEXTLINE):
+                line, word = line + 1, 0
+            word += 1
+
+            text = it.GetUTF8Text(RIL.WORD) or ""
+            box = it.BoundingBox(RIL.WORD)
+            if box:
+                x0, y0, x1, y1 = box
+                data["block_num"].append(block)
+                data["par_num"].append(par)
+                data["line_num"].append(line)
+                data["word_num"].append(word)
+                data["left"].append(x0)
+                data["top"].append(y0)
+                data["width"].append(x1 - x0)
+                data["height"].append(y1 - y0)
+                data["conf"].append(it.Confidence(RIL.WORD))
+                data["text"].append(text)
+
+            if not it.Next(RIL.WORD):
+                break
+        return data
+
+
+_backend = None
+
+
+def _get_backend():
+    """Backend du process courant (créé à la demande : chaque process du pool a le sien)."""
+    global _backend
+    if _backend is None:
+        if OCR_BACKEND in ("auto", "tesserocr"):
+            try:
+                _backend = TesserocrBackend()
+            except ImportError:
+                if OCR_BACKEND == "tesserocr":
+                    print("⚠️ tesserocr indisponible, repli sur pytesseract")
+        if _backend is None:
+            _backend = PytesseractBackend()
+    return _backend
+
+
+def _tess_call(method: str, img: Image.Image, lang: str, config: str):
+    backend = _get_backend()
+    try:
+        return getattr(backend, method)(img, lang, config)
+    except RuntimeError:
+        # ex : traineddata introuvable pour tesserocr -> pytesseract pour cet appel
+        if isinstance(backend, PytesseractBackend):
+            raise
+        return getattr(PytesseractBackend(), method)(img, lang, config)
 
-    lines = cv2.bitwise_or(hori, vert)
 
-    # Supprimer les lignes détectées
-    inv2 = cv2.bitwise_and(inv, cv2.bitwise_not(lines))
+def ocr_backend_name() -> str:
+    return _get_backend().name
 
-    # Remettre en noir sur blanc
-    cleaned = 255 - inv2
-    return Image.fromarray(cleaned)
 
+def _close_backend() -> None:
+    if isinstance(_backend, TesserocrBackend):
+        _backend.close()
 
-def extract_text_from_pdf(pdf_path: str) -> str:
+
+atexit.register(_close_backend)
+
+
+# =========================
+# OCR d'une page : 1 passe image_to_data + fallbacks ciblés
+# =========================
+
+OCR_LANG = "fra"
+OCR_FALLBACK_LANGS = ["eng", "deu", "spa", "ita", "nld"]
+
+# ligne dont la confiance moyenne est sous ce seuil -> ré-OCR de la ligne seule (0 = désactivé)
+OCR_LINE_RETRY_CONF = float(os.getenv("OCR_LINE_RETRY_CONF", "35"))
+OCR_MAX_LINE_RETRIES = int(os.getenv("OCR_MAX_LINE_RETRIES", "6"))
+
+# mots fréquents par langue (factures / transport) pour deviner la langue d'un extrait
+_LANG_HINTS = {
+    "fra": {"le", "la", "les", "de", "du", "des", "et", "facture", "montant", "total", "tva", "date", "pour", "sur"},
+    "eng": {"the", "and", "of", "to", "invoice", "amount", "total", "vat", "date", "for", "due", "payment"},
+    "deu": {"der", "die", "das", "und", "rechnung", "betrag", "summe", "mwst", "datum", "für", "zahlung", "bis"},
+    "spa": {"el", "la", "los", "las", "y", "de", "factura", "importe", "total", "iva", "fecha", "para", "pago"},
+    "ita": {"il", "la", "di", "e", "fattura", "importo", "totale", "iva", "data", "per", "pagamento", "del"},
+    "nld": {"de", "het", "een", "en", "van", "factuur", "bedrag", "totaal", "btw", "datum", "voor", "betaling"},
+}
+
+_ocr_stats: Counter = Counter()
+
+
+def get_ocr_stats() -> Dict[str, float]:
+    """
+    Compteurs OCR du process courant (pages, fallbacks déclenchés, langues détectées...)
+    et temps cumulé de chaque étape du pré-traitement ("pp_ms:<étape>").
+    """
+    return dict(_ocr_stats)
+
+
+def reset_ocr_stats() -> None:
+    _ocr_stats.clear()
+
+
+def _ocr_words(img: Image.Image, lang: str, config: str) -> List[dict]:
+    """Mots OCR avec confiance et boîte (coordonnées de img)."""
+    data = _tess_call("image_to_data", img, lang, config)
+    words = []
+    for i, txt in enumerate(data.get("text") or []):
+        txt = (txt or "").strip()
+        if not txt:
+            continue
+        try:
+            conf = float(data["conf"][i])
+        except (TypeError, ValueError):
+            conf = -1.0
+        words.append({
+            "text": txt,
+            "conf": conf,
+            "line": (data["block_num"][i], data["par_num"][i], data["line_num"][i]),
+            "box": (data["left"][i], data["top"][i], data["width"][i], data["height"][i]),
+        })
+    return words
+
+
+def _group_lines(words: List[dict]) -> List[dict]:
+    """Regroupe les mots par ligne Tesseract (ordre de lecture conservé)."""
+    lines: Dict[tuple, dict] = {}
+    for w in words:
+        ln = lines.setdefault(w["line"], {"words": [], "box": None})
+        ln["words"].append(w)
+        x, y, bw, bh = w["box"]
+        if ln["box"] is None:
+            ln["box"] = [x, y, x + bw, y + bh]
+        else:
+            b = ln["box"]
+            b[0], b[1], b[2], b[3] = min(b[0], x), min(b[1], y), max(b[2], x + bw), max(b[3], y + bh)
+
+    out = []
+    for ln in lines.values():
+        confs = [w["conf"] for w in ln["words"] if w["conf"] >= 0]
+        out.append({
+            "text": " ".join(w["text"] for w in ln["words"]),
+            "conf": sum(confs) / len(confs) if confs else -1.0,
+            "box": tuple(ln["box"]),
+        })
+    return out
+
+
+def _lines_text(lines: List[dict]) -> str:
+    return "\n".join(ln["text"] for ln in lines)
+
+
+def _crop(img: Image.Image, box: tuple, pad: int = 6) -> Image.Image:
+    x0, y0, x1, y1 = box
+    w, h = img.size
+    return img.crop((max(0, x0 - pad), max(0, y0 - pad), min(w, x1 + pad), min(h, y1 + pad)))
+
+
+def _ink_box(img: Image.Image) -> Optional[tuple]:
+    """Boîte englobant l'encre (pixels sombres) : on n'OCRise pas les marges blanches."""
+    gray = np.asarray(img.convert("L"))
+    ys, xs = np.nonzero(gray < 160)
+    if len(xs) == 0:
+        return None
+    return int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1
+
+
+def _detect_lang(img: Image.Image, box: Optional[tuple], stats: Counter) -> str:
+    """
+    Langue secondaire probable, à partir d'un petit extrait (bandeau haut de la zone encrée)
+    OCRisé une fois en multi-langues, puis scoré par mots fréquents.
+    """
+    stats["lang_detect"] += 1
+    w, h = img.size
+    x0, y0, x1, y1 = box or (0, 0, w, h)
+    band = (x0, y0, x1, min(y1, y0 + max(200, (y1 - y0) // 4)))
+
+    cfg = "--oem 3 --psm 11"
+    words = _ocr_words(_crop(img, band, pad=0), "+".join([OCR_LANG] + OCR_FALLBACK_LANGS), cfg)
+    tokens = [re.sub(r"[^\w]", "", wd["text"].lower()) for wd in words]
+
+    best_lang, best_score = OCR_FALLBACK_LANGS[0], 0
+    for lang in OCR_FALLBACK_LANGS:
+        score = sum(1 for t in tokens if t in _LANG_HINTS[lang])
+        if score > best_score:
+            best_lang, best_score = lang, score
+    stats[f"lang:{best_lang}"] += 1
+    return best_lang
+
+
+def _retry_low_conf_lines(img_pp: Image.Image, lines: List[dict], stats: Counter) -> None:
+    """Ré-OCR (psm 7, multi-langues) des seules lignes peu fiables ; remplace si mieux."""
+    if OCR_LINE_RETRY_CONF <= 0:
+        return
+    weak = [ln for ln in lines if 0 <= ln["conf"] < OCR_LINE_RETRY_CONF]
+    if not weak:
+        return
+
+    stats["line_retry"] += 1
+    weak.sort(key=lambda ln: ln["conf"])
+    lang = "+".join([OCR_LANG] + OCR_FALLBACK_LANGS)
+    for ln in weak[:OCR_MAX_LINE_RETRIES]:
+        stats["lines_retried"] += 1
+        words = _ocr_words(_crop(img_pp, ln["box"]), lang, "--oem 3 --psm 7 -c preserve_interword_spaces=1")
+        if not words:
+            continue
+        confs = [wd["conf"] for wd in words if wd["conf"] >= 0]
+        conf = sum(confs) / len(confs) if confs else -1.0
+        if conf > ln["conf"]:
+            ln["text"] = " ".join(wd["text"] for wd in words)
+            ln["conf"] = conf
+            stats["lines_replaced"] += 1
+
+
+def _ocr_page_image(image: Image.Image, stats: Optional[Counter] = None) -> str:
+    """OCR d'une page (pré-traitement + Tesseract + fallbacks)."""
+    stats = _ocr_stats if stats is None else stats
+    stats["pages"] += 1
+
+    # ✅ Pré-traitement : enlève les traits (évite les carrés)
+    img_pp = _preprocess_image_for_ocr(image, stats)
+
+    # ✅ config plus adaptée aux tableaux ; image_to_data -> confiance par mot
+    cfg_main = "--oem 3 --psm 6 -c preserve_interword_spaces=1"
+    lines = _group_lines(_ocr_words(img_pp, OCR_LANG, cfg_main))
+
+    text = _clean_ocr_text(_lines_text(lines))
+    if len(text.strip()) >= 50:
+        stats["first_pass_ok"] += 1
+        _retry_low_conf_lines(img_pp, lines, stats)
+        return _clean_ocr_text(_lines_text(lines))
+
+    # Résultat pauvre → langue devinée sur un extrait, puis psm permissif limité à la zone encrée
+    box = _ink_box(img_pp)
+    if box is None:
+        stats["blank_page"] += 1
+        return text
+
+    lang = f"{OCR_LANG}+{_detect_lang(img_pp, box, stats)}"
+    stats["sparse_pass"] += 1
+    text = _tess_call(
+        "image_to_string",
+        _crop(img_pp, box),
+        lang,
+        "--oem 3 --psm 11 -c preserve_interword_spaces=1",
+    )
+
+    # ✅ Nettoyage des barres/carrés
+    text = _clean_ocr_text(text)
+
+    # Toujours pauvre → image brute (le pré-traitement a pu effacer du texte)
+    if len(text.strip()) < 50:
+        stats["raw_pass"] += 1
+        raw_box = _ink_box(image) or box
+        text = _tess_call("image_to_string", _crop(image, raw_box), lang, "--psm 11")
+
+    return text
+
+
+def _render_page(doc: "fitz.Document", page_idx: int, dpi: int = OCR_DPI) -> Image.Image:
+    """Rasterise une page directement en mémoire (pas de sous-process, pas de PNG)."""
+    zoom = dpi / 72.0
+    pix = doc[page_idx].get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csRGB, alpha=False)
+    return Image.frombuffer("RGB", (pix.width, pix.height), pix.samples, "raw", "RGB", pix.stride, 1)
+
+
+# Les points d'entrée du pool renvoient (texte, compteurs) : les compteurs des process
+# sont remontés dans _ocr_stats du process appelant.
+PageResult = Tuple[str, Dict[str, float]]
+
+
+def _ocr_page_file(image_path: str) -> PageResult:
+    """Point d'entrée des process du pool : la page est relue depuis le PNG temporaire."""
+    stats: Counter = Counter()
+    with Image.open(image_path) as image:
+        image.load()
+        return _ocr_page_image(image, stats), dict(stats)
+
+
+def _ocr_pdf_page(job: Tuple[str, int, int]) -> PageResult:
+    """Point d'entrée des process du pool : (pdf_path, page_idx, dpi), rendu fitz dans le process."""
+    pdf_path, page_idx, dpi = job
+    stats: Counter = Counter()
+    with fitz.open(pdf_path) as doc:
+        image = _render_page(doc, page_idx, dpi)
+    return _ocr_page_image(image, stats), dict(stats)
+
+
+def _ocr_parallelism(workers: int, n_items: int) -> int:
+    return min(workers, OCR_WORKERS, n_items)
+
+
+def _ocr_window(pool: ProcessPoolExecutor, fn, items: list, limit: int) -> Iterator[PageResult]:
+    """
+    Résultats de fn(item) dans l'ordre des items, au plus `limit` pages en cours dans le pool
+    (la page suivante est soumise dès qu'un résultat est rendu).
+    """
+    pending = iter(items)
+    futures = deque(pool.submit(fn, it) for it in islice(pending, limit))
+    try:
+        while futures:
+            result = futures.popleft().result()
+            for it in islice(pending, 1):
+                futures.append(pool.submit(fn, it))
+            yield result
+    finally:
+        # consommateur arrêté en cours de route : on libère le pool
+        for fut in futures:
+            fut.cancel()
+
+
+def _ocr_map(fn, items: list, workers: int) -> List[str]:
+    """OCR des pages dans l'ordre, en parallèle si possible."""
+    limit = _ocr_parallelism(workers, len(items))
+    if limit <= 1:
+        results = [fn(it) for it in items]
+    else:
+        pool = _get_ocr_pool()
+        results = []
+        try:
+            results.extend(_ocr_window(pool, fn, items, limit))
+        except BrokenProcessPool:
+            # process tué (mémoire, antivirus...) -> le reste en série
+            shutdown_ocr_pool(pool)
+            results += [fn(it) for it in items[len(results):]]
+
+    for _, stats in results:
+        _ocr_stats.update(stats)
+    return [text for text, _ in results]
+
+
+def _ocr_page_files(image_paths: List[str], workers: int) -> List[str]:
+    return _ocr_map(_ocr_page_file, image_paths, workers)
+
+
+def _ocr_params(rasterizer: Optional[str] = None) -> dict:
+    """
+    Tout ce qui change le texte OCR d'une page : fait partie de la clé de cache.
+    rasterizer : moteur de rendu réellement utilisé (par défaut OCR_RASTERIZER).
+    """
+    return {
+        "dpi": OCR_DPI,
+        "lang": OCR_LANG,
+        "psm": 6,
+        "fallback_langs": OCR_FALLBACK_LANGS,
+        "fallback_psm": 11,
+        "line_retry": [OCR_LINE_RETRY_CONF, OCR_MAX_LINE_RETRIES],
+        "preprocess": PREPROCESS_VERSION,
+        "cv2": cv2 is not None,
+        "rasterizer": rasterizer or OCR_RASTERIZER,
+        "backend": ocr_backend_name(),
+    }
+
+
+def _join_pages(texts: List[str]) -> str:
+    parts = [f"\n\n===== PAGE {idx + 1} =====\n{text}" for idx, text in enumerate(texts)]
+    return "".join(parts).strip()
+
+
+def _page_runs(indexes: List[int]) -> List[List[int]]:
+    """[0, 1, 2, 5, 6] -> [[0, 1, 2], [5, 6]] (1 appel poppler par plage contiguë)."""
+    runs: List[List[int]] = []
+    for idx in indexes:
+        if runs and runs[-1][-1] == idx - 1:
+            runs[-1].append(idx)
+        else:
+            runs.append([idx])
+    return runs
+
+
+def _iter_ocr_pdf_pages(pdf_path: str, indexes: List[int], workers: int) -> Iterator[Tuple[int, str]]:
+    """
+    Rasterise + OCR uniquement les pages demandées (index 0-based).
+    Rend (index, texte) dans l'ordre des pages, chacune dès qu'elle est prête.
+    """
+    if OCR_RASTERIZER == "poppler":
+        yield from _ocr_pdf_pages_poppler(pdf_path, indexes, workers).items()
+        return
+
+    limit = _ocr_parallelism(workers, len(indexes))
+    if limit <= 1:
+        # série : un seul fitz.open pour toutes les pages
+        with fitz.open(pdf_path) as doc:
+            for idx in indexes:
+                yield idx, _ocr_page_image(_render_page(doc, idx))
+        return
+
+    # parallèle : chaque process rend sa page (seul le chemin transite, pas l'image)
+    pool = _get_ocr_pool()
+    jobs = [(pdf_path, idx, OCR_DPI) for idx in indexes]
+    done = 0
+    try:
+        for text, stats in _ocr_window(pool, _ocr_pdf_page, jobs, limit):
+            _ocr_stats.update(stats)
+            yield indexes[done], text
+            done += 1
+    except BrokenProcessPool:
+        # process tué (mémoire, antivirus...) -> le reste en série
+        shutdown_ocr_pool(pool)
+        with fitz.open(pdf_path) as doc:
+            for idx in indexes[done:]:
+                yield idx, _ocr_page_image(_render_page(doc, idx))
+
+
+def _ocr_pdf_pages_poppler(pdf_path: str, indexes: List[int], workers: int) -> Dict[int, str]:
+    image_paths: List[str] = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for run in _page_runs(indexes):
+            image_paths += convert_from_path(
+                pdf_path,
+                dpi=OCR_DPI,
+                first_page=run[0] + 1,
+                last_page=run[-1] + 1,
+                output_folder=temp_dir,
+                output_file=f"p{run[0]:04d}_",
+                fmt="png",
+                poppler_path=POPPLER_PATH,
+                paths_only=True,
+            )
+
+        texts = _ocr_page_files(image_paths, workers)
+
+    return dict(zip(indexes, texts))
+
+
+def iter_pages_from_pdf(
+    pdf_path: str, workers: Optional[int] = None, use_cache: bool = True
+) -> Iterator[PageText]:
+    """
+    Texte page par page, rendu dans l'ordre dès que chaque page est prête :
+    couche texte native quand elle est exploitable, OCR (ou cache OCR) pour les autres pages.
+    Le cache n'est alimenté que si le document est lu jusqu'au bout.
+    """
     if not os.path.exists(pdf_path):
         raise FileNotFoundError(f"PDF introuvable : {pdf_path}")
 
     # =========================
-    # 1️⃣ Tentative extraction TEXTE NATIF (rapide)
+    # 1️⃣ Texte natif, page par page (un seul fitz.open)
     # =========================
+    native: List[str] = []
     try:
-        doc = fitz.open(pdf_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        doc.close()
-
-        # Si le PDF contient déjà du texte exploitable → on s'arrête là
-        if len(text.strip()) > 100:
-            return text.strip()
-
+        with fitz.open(pdf_path) as doc:
+            native = [page.get_text() for page in doc]
     except Exception:
-        pass  # fallback OCR image
+        native = []  # PDF illisible par fitz : tout passe par l'OCR
+
+    if not native:
+        # nombre de pages inconnu : poppler rasterise tout le document
+        yield from _extract_all_pages_ocr(pdf_path, workers, use_cache)
+        return
+
+    pages = [PageText(i, t, "native") for i, t in enumerate(native)]
+    if sum(len(t.strip()) for t in native) > 100:
+        to_ocr = [p.index for p in pages if len(p.text.strip()) < NATIVE_PAGE_MIN_CHARS]
+    else:
+        # quasi aucun texte sur tout le document (tampon, n° de scan...) -> scan complet
+        to_ocr = [p.index for p in pages]
+    if not to_ocr:
+        yield from pages
+        return
 
     # =========================
-    # 2️⃣ OCR IMAGE (fallback)
+    # 2️⃣ OCR des pages sans texte (cache d'abord)
     # =========================
-    full_text = ""
+    workers = OCR_WORKERS if workers is None else max(1, int(workers))
+
+    cache_key = None
+    cached: Dict[int, str] = {}
+    if use_cache and _ocr_cache is not None:
+        try:
+            cache_key = OcrCache.make_key(OcrCache.file_hash(pdf_path), _ocr_params())
+            cached = _ocr_cache.get(cache_key) or {}
+        except OSError:
+            cache_key = None
+
+    to_ocr_set = set(to_ocr)
+    missing = [i for i in to_ocr if i not in cached]
+    ocr_iter = _iter_ocr_pdf_pages(pdf_path, missing, workers) if missing else None
+    fresh: Dict[int, str] = {}
+
+    try:
+        for page in pages:
+            idx = page.index
+            if idx not in to_ocr_set:
+                yield page
+            elif idx in cached:
+                yield PageText(idx, cached[idx], "cache")
+            else:
+                _, text = next(ocr_iter)  # même ordre que missing
+                fresh[idx] = text
+                yield PageText(idx, text, "ocr")
+    finally:
+        if ocr_iter is not None:
+            ocr_iter.close()  # annule les pages encore en file si on s'arrête avant la fin
+
+    if fresh and cache_key is not None:
+        try:
+            _ocr_cache.put(cache_key, {**cached, **fresh}, _ocr_params())
+        except OSError:
+            pass  # cache best-effort : jamais bloquant
+
+
+def extract_pages_from_pdf(
+    pdf_path: str, workers: Optional[int] = None, use_cache: bool = True
+) -> List[PageText]:
+    """Toutes les pages (voir iter_pages_from_pdf)."""
+    return list(iter_pages_from_pdf(pdf_path, workers=workers, use_cache=use_cache))
+
+
+def _extract_all_pages_ocr(pdf_path: str, workers: Optional[int], use_cache: bool) -> List[PageText]:
+    workers = OCR_WORKERS if workers is None else max(1, int(workers))
+    # fitz n'a pas pu lire le PDF : le rendu passe toujours par poppler, quel que soit OCR_RASTERIZER
+    params = _ocr_params("poppler")
+
+    cache_key = None
+    if use_cache and _ocr_cache is not None:
+        try:
+            cache_key = OcrCache.make_key(OcrCache.file_hash(pdf_path), params)
+            cached = _ocr_cache.get(cache_key)
+            if cached:
+                return [PageText(i, cached[i], "cache") for i in sorted(cached)]
+        except OSError:
+            cache_key = None
 
     with tempfile.TemporaryDirectory() as temp_dir:
-        images = convert_from_path(
+        image_paths = convert_from_path(
             pdf_path,
-            dpi=200,  # ⚡ plus rapide que 300
+            dpi=OCR_DPI,
             output_folder=temp_dir,
             fmt="png",
-            poppler_path=POPPLER_PATH
+            poppler_path=POPPLER_PATH,
+            paths_only=True,
         )
+        texts = _ocr_page_files(image_paths, workers)
 
-        for idx, image in enumerate(images):
-
-            # Tentative rapide en anglais d'abord
-            # ✅ Pré-traitement : enlève les traits (évite les carrés)
-            img_pp = _preprocess_image_for_ocr(image)
-
-            # ✅ config plus adaptée aux tableaux
-            cfg_main = "--oem 3 --psm 6 -c preserve_interword_spaces=1"
-
-            text = pytesseract.image_to_string(
-                img_pp,
-                lang="fra",
-                config=cfg_main
-            )
+    if cache_key is not None:
+        try:
+            _ocr_cache.put(cache_key, dict(enumerate(texts)), params)
+        except OSError:
+            pass
 
-            # Si résultat pauvre → fallback multi-langues + psm plus permissif
-            if len(text.strip()) < 50:
-                text = pytesseract.image_to_string(
-                    img_pp,
-                    lang="fra+eng+deu+spa+ita+nld",
-                    config="--oem 3 --psm 11 -c preserve_interword_spaces=1"
-                )
+    return [PageText(i, t, "ocr") for i, t in enumerate(texts)]
 
-            # ✅ Nettoyage des barres/carrés
-            text = _clean_ocr_text(text)
 
-            # Si résultat pauvre → fallback multi-langues
-            if len(text.strip()) < 50:
-                text = pytesseract.image_to_string(
-                    image,
-                    lang="fra+eng+deu+spa+ita+nld",
-                    config="--psm 11"
-                )
-
-            full_text += f"\n\n===== PAGE {idx + 1} =====\n{text}"
-
-    return full_text.strip()
+def pages_to_text(pages: List[PageText]) -> str:
+    """
+    Tout natif -> texte brut comme avant (les parseurs/modèles existants s'appuient dessus).
+    Dès qu'une page est OCRisée -> séparateurs "===== PAGE n =====" sur toutes les pages.
+    """
+    if all(p.source == "native" for p in pages):
+        return "".join(p.text for p in pages).strip()
+    return _join_pages([p.text.strip() if p.source == "native" else p.text for p in pages])
 
 
+def extract_text_from_pdf(pdf_path: str, workers: Optional[int] = None, use_cache: bool = True) -> str:
+    """
+    workers : nombre de process OCR en parallèle (None = OCR_WORKERS, 1 = série).
+    use_cache : False pour forcer l'OCR (benchmarks).
+    """
+    return pages_to_text(extract_pages_from_pdf(pdf_path, workers=workers, use_cache=use_cache))
 
 
 def extract_text_fast(pdf_path: str) -> str:
@@ -0,0 +1,343 @@
+# ocr/roi_ocr.py
+"""
+OCR par zones (ROI) pour les fournisseurs connus.
+
+- Apprentissage : à la sauvegarde du modèle fournisseur, on retrouve la page et la boîte
+  (coordonnées normalisées 0..1) de chaque champ validé (IBAN, BIC, n° facture, date, dossiers).
+  Pages natives : mots fitz ; pages scannées : mots OCR (image_to_data).
+- Application : seules ces zones sont lues (texte natif découpé, sinon OCR de la zone seule).
+  Si un validateur échoue, l'appelant repasse en OCR pleine page.
+"""
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import fitz
+from PIL import Image
+
+from .ocr_engine import (
+    OCR_LANG,
+    NATIVE_PAGE_MIN_CHARS,
+    _render_page,
+    _preprocess_image_for_ocr,
+    _ocr_words,
+    _tess_call,
+)
+from .invoice_parser import DOSSIER_PATTERN, extract_folder_numbers
+from .supplier_model import (
+    validate_iban,
+    validate_bic,
+    extract_best_bank_ids,
+    as_compiled_model,
+    _value_group_regex,
+    CompiledSupplierModel,
+)
+
+
+REGION_FIELDS = ("iban", "bic", "invoice_number", "invoice_date", "folders")
+
+# Champs qui doivent tous être validés pour se passer de l'OCR pleine page
+ROI_REQUIRED_FIELDS = ("iban", "bic", "invoice_number", "invoice_date")
+
+# Pages scannées OCRisées au plus pour retrouver les positions (coût à la sauvegarde du modèle)
+ROI_LEARN_MAX_PAGES = 2
+
+# Les zones sont rendues plus finement que la page entière (petite surface -> coût faible)
+ROI_DPI = 300
+
+_DATE_RE = re.compile(r"\b\d{1,2}[./-]\d{1,2}[./-]\d{2,4}\b")
+# formats de date de facture reconnus (jour en tête, comme les modèles fournisseurs)
+_DATE_FORMATS = ("%d/%m/%Y", "%d.%m.%Y", "%d-%m-%Y", "%d/%m/%y", "%d.%m.%y", "%d-%m-%y")
+
+Box = Tuple[float, float, float, float]
+
+
+def _now_iso() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _norm(s: str) -> str:
+    return re.sub(r"[\s\u00A0]", "", (s or "").upper())
+
+
+# =========================
+# Apprentissage des positions
+# =========================
+
+def _page_words(doc: "fitz.Document", page_idx: int, use_ocr: bool) -> List[Tuple[Box, tuple, str]]:
+    """Mots de la page : (boîte normalisée, clé de ligne, texte)."""
+    page = doc[page_idx]
+    pw, ph = page.rect.width, page.rect.height
+
+    if not use_ocr:
+        out = []
+        for x0, y0, x1, y1, txt, block, line, _ in page.get_text("words"):
+            out.append(((x0 / pw, y0 / ph, x1 / pw, y1 / ph), (block, line), txt))
+        return out
+
+    img = _render_page(doc, page_idx)
+    iw, ih = img.size
+    words = _ocr_words(_preprocess_image_for_ocr(img), OCR_LANG, "--oem 3 --psm 6 -c preserve_interword_spaces=1")
+    out = []
+    for w in words:
+        x, y, bw, bh = w["box"]
+        out.append(((x / iw, y / ih, (x + bw) / iw, (y + bh) / ih), w["line"], w["text"]))
+    return out
+
+
+def _find_value_box(words: List[Tuple[Box, tuple, str]], value: str) -> Optional[Box]:
+    """Boîte des mots consécutifs d'une même ligne dont la concaténation contient la valeur."""
+    target = _norm(value)
+    if not target:
+        return None
+
+    lines: Dict[tuple, List[Tuple[Box, str]]] = {}
+    for box, key, txt in words:
+        lines.setdefault(key, []).append((box, _norm(txt)))
+
+    for items in lines.values():
+        joined = ""
+        starts = []
+        for _, t in items:
+            starts.append(len(joined))
+            joined += t
+
+        pos = joined.find(target)
+        if pos < 0:
+            continue
+        end = pos + len(target)
+
+        covered = [items[i][0] for i, s in enumerate(starts) if s < end and s + len(items[i][1]) > pos]
+        return (
+            min(b[0] for b in covered),
+            min(b[1] for b in covered),
+            max(b[2] for b in covered),
+            max(b[3] for b in covered),
+        )
+    return None
+
+
+def learn_field_regions(
+    pdf_path: str,
+    values: Dict[str, Any],
+    *,
+    skip_fields: Optional[set] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    values : {"iban": ..., "bic": ..., "invoice_number": ..., "invoice_date": ..., "folders": [...]}
+    Retour : {field: [{"page", "bbox", "hit_count", "created_at"}]} (format stocké dans le modèle).
+    """
+    skip_fields = skip_fields or set()
+    wanted: List[Tuple[str, str]] = []
+    for field in REGION_FIELDS:
+        if field in skip_fields:
+            continue
+        v = values.get(field)
+        for vv in (v if isinstance(v, list) else [v]):
+            vv = (vv or "").strip()
+            if vv:
+                wanted.append((field, vv))
+
+    regions: Dict[str, List[Dict[str, Any]]] = {}
+    if not wanted:
+        return regions
+
+    ocr_pages = 0
+    with fitz.open(pdf_path) as doc:
+        for page_idx in range(doc.page_count):
+            use_ocr = len(doc[page_idx].get_text().strip()) < NATIVE_PAGE_MIN_CHARS
+            if use_ocr:
+                if ocr_pages >= ROI_LEARN_MAX_PAGES:
+                    continue
+                ocr_pages += 1
+
+            words = _page_words(doc, page_idx, use_ocr)
+            remaining = []
+            for field, value in wanted:
+                box = _find_value_box(words, value)
+                if box is None:
+                    remaining.append((field, value))
+                    continue
+                regions.setdefault(field, []).append({
+                    "page": page_idx,
+                    "bbox": [round(c, 4) for c in box],
+                    "hit_count": 0,
+                    "created_at": _now_iso(),
+                })
+            wanted = remaining
+            if not wanted:
+                break
+
+    return regions
+
+
+def _iou(a: List[float], b: List[float]) -> float:
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def merge_regions(
+    existing: Optional[Dict[str, List[Dict[str, Any]]]],
+    new: Dict[str, List[Dict[str, Any]]],
+    *,
+    max_regions_per_field: int = 4,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Même logique que merge_patterns : une zone revue (même page, recouvrement) gagne un hit."""
+    existing = existing or {}
+    merged: Dict[str, List[Dict[str, Any]]] = {}
+
+    for field in set(existing.keys()) | set(new.keys()):
+        out = [dict(r) for r in (existing.get(field) or [])]
+
+        for r in new.get(field) or []:
+            same = next(
+                (o for o in out if o.get("page") == r["page"] and _iou(o.get("bbox") or [0, 0, 0, 0], r["bbox"]) > 0.3),
+                None,
+            )
+            if same is not None:
+                same["hit_count"] = int(same.get("hit_count", 0)) + 1
+                same["last_seen"] = _now_iso()
+                # la zone suit la dernière position vue (mise en page qui bouge un peu)
+                same["bbox"] = [round((a + b) / 2, 4) for a, b in zip(same["bbox"], r["bbox"])]
+            else:
+                rr = dict(r)
+                rr["hit_count"] = int(rr.get("hit_count", 0)) + 1
+                rr["last_seen"] = _now_iso()
+                out.append(rr)
+
+        out.sort(key=lambda x: int(x.get("hit_count", 0)), reverse=True)
+        merged[field] = out[:max_regions_per_field]
+
+    return merged
+
+
+# =========================
+# Lecture des zones
+# =========================
+
+def _clip_rect(page: "fitz.Page", bbox: List[float], field: str) -> "fitz.Rect":
+    """Zone apprise + marge (les valeurs n'ont pas toujours la même longueur)."""
+    x0, y0, x1, y1 = bbox
+    w = x1 - x0
+    grow_right = max(0.5 * w, 0.08) if field in ("invoice_number", "folders") else 0.25 * w
+    x0, x1 = max(0.0, x0 - 0.02), min(1.0, x1 + grow_right)
+    y0, y1 = max(0.0, y0 - 0.01), min(1.0, y1 + 0.01)
+    r = page.rect
+    return fitz.Rect(r.x0 + x0 * r.width, r.y0 + y0 * r.height, r.x0 + x1 * r.width, r.y0 + y1 * r.height)
+
+
+def read_region(doc: "fitz.Document", page_idx: int, bbox: List[float], field: str = "") -> str:
+    """Texte d'une zone : couche native découpée si présente, sinon OCR de la zone seule."""
+    page = doc[page_idx]
+    clip = _clip_rect(page, bbox, field)
+
+    text = page.get_text("text", clip=clip).strip()
+    if text:
+        return text
+
+    zoom = ROI_DPI / 72.0
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, colorspace=fitz.csGRAY, alpha=False)
+    img = Image.frombuffer("L", (pix.width, pix.height), pix.samples, "raw", "L", pix.stride, 1)
+    return _tess_call("image_to_string", img, OCR_LANG, "--oem 3 --psm 6").strip()
+
+
+def _date_format(value: str) -> Optional[str]:
+    """Format de _DATE_FORMATS dans lequel la date est valide (31/02 refusé), sinon None."""
+    for fmt in _DATE_FORMATS:
+        try:
+            datetime.strptime(value, fmt)
+            return fmt
+        except ValueError:
+            continue
+    return None
+
+
+def _validate_date(text: str, model: CompiledSupplierModel) -> Optional[str]:
+    # même format que la date d'exemple du modèle (séparateur, année sur 2 ou 4 chiffres)
+    expected = _date_format((model.get("date_example") or "").strip())
+    # d'abord la date trouvée par les motifs du modèle (ligne / libellé appris), puis les dates de la zone
+    found = (model.extract(text).get("invoice_date") or "").strip()
+    for value in [found] + [m.group(0) for m in _DATE_RE.finditer(text)]:
+        fmt = _date_format(value) if value else None
+        if fmt and (expected is None or fmt == expected):
+            return value
+    return None
+
+
+def _validate(field: str, text: str, model: CompiledSupplierModel) -> Optional[Any]:
+    """Valeur validée extraite du texte d'une zone, ou None."""
+    # prefer_iban / prefer_bic ne font que départager les candidats : la valeur rendue doit être lue
+    # dans la zone (sinon une zone vide ou mal placée "validerait" l'IBAN du modèle)
+    if field == "iban":
+        iban = extract_best_bank_ids(text, prefer_iban=model.get("iban", ""))["iban"]
+        if iban and iban not in _norm(text):
+            iban = extract_best_bank_ids(text)["iban"]     # texte seul (corrections OCR comprises)
+        return iban if iban and validate_iban(iban) else None
+
+    if field == "bic":
+        bic = extract_best_bank_ids(text, prefer_bic=model.get("bic", ""))["bic"]
+        if bic and bic not in _norm(text):
+            bic = extract_best_bank_ids(text)["bic"]
+        return bic if bic and validate_bic(bic) else None
+
+    if field == "invoice_date":
+        return _validate_date(text, model)
+
+    if field == "invoice_number":
+        found = model.extract(text).get("invoice_number")
+        if found:
+            return found
+        example = (model.get("invoice_number_example") or "").strip()
+        if not example:
+            return None
+        m = re.search(rf"\b{_value_group_regex('invoice_number', example)}\b", text.upper())
+        if m and not _DATE_RE.fullmatch(m.group(0)):
+            return m.group(0)
+        return None
+
+    if field == "folders":
+        folders = [f for f in extract_folder_numbers(text) if DOSSIER_PATTERN.fullmatch(f)]
+        return folders or None
+
+    return None
+
+
+def extract_fields_from_regions(pdf_path: str, model: Any) -> Dict[str, Any]:
+    """
+    Lit uniquement les zones apprises du modèle.
+    Retour : {"ok": bool, "fields": {...}, "texts": {field: texte lu}, "failed": [champs]}
+    ok = tous les champs de ROI_REQUIRED_FIELDS validés (sinon -> OCR pleine page).
+    """
+    model = as_compiled_model(model)
+    regions = model.get("regions") or {}
+    fields: Dict[str, Any] = {}
+    texts: Dict[str, str] = {}
+    failed: List[str] = []
+
+    if not regions:
+        return {"ok": False, "fields": fields, "texts": texts, "failed": list(ROI_REQUIRED_FIELDS)}
+
+    with fitz.open(pdf_path) as doc:
+        for field in REGION_FIELDS:
+            value = None
+            for r in regions.get(field) or []:
+                page_idx = int(r.get("page", 0))
+                bbox = r.get("bbox") or []
+                if page_idx >= doc.page_count or len(bbox) != 4:
+                    continue
+                text = read_region(doc, page_idx, bbox, field)
+                value = _validate(field, text, model)
+                if value:
+                    texts[field] = text
+                    break
+            if value:
+                fields[field] = value
+            elif field in ROI_REQUIRED_FIELDS:
+                failed.append(field)
+                # inutile de lire les autres zones : l'OCR pleine page sera nécessaire
+                break
+
+    return {"ok": not failed, "fields": fields, "texts": texts, "failed": failed}
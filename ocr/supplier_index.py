@@ -0,0 +1,313 @@
+# ocr/supplier_index.py
+"""
+Index d'empreintes fournisseurs : retrouve le modèle fournisseur quand l'IBAN/BIC
+est illisible (OCR abîmé) et que build_supplier_key ne donne rien.
+
+Empreinte d'un document validé :
+- "h:" mots distinctifs de l'en-tête (raison sociale, adresse...),
+- "v:" n° de TVA intracommunautaire après un label "vat_id" (très discriminant),
+- "s:" hash de paires de lignes consécutives normalisées (chiffres -> 0) : la mise en page.
+
+rank_suppliers(text) classe les fournisseurs connus (poids idf par empreinte) ;
+identify_supplier(text) confirme le meilleur candidat avec ses propres règles.
+
+Construction / mise à jour :
+    python -m ocr.supplier_index build [dossier_json]
+(puis chaque validation ajoute le document, voir add_document_to_index)
+"""
+import os
+import re
+import sys
+import json
+import math
+import zlib
+import tempfile
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .text_index import TextIndex
+from .supplier_model import (
+    MODEL_DIR,
+    build_supplier_key,
+    get_compiled_model,
+    validate_iban,
+    validate_bic,
+    CompiledSupplierModel,
+)
+
+
+# à côté du dossier des modèles, pas dedans : MODEL_DIR ne contient que des <clé fournisseur>.json
+SUPPLIER_INDEX_PATH = os.getenv(
+    "SUPPLIER_INDEX_PATH", os.path.join(os.path.dirname(MODEL_DIR), "supplier_index.json")
+)
+
+HEADER_LINES = 15
+SHINGLE_MAX_LINES = 200
+
+# poids par type d'empreinte (un n° TVA vaut beaucoup plus qu'un mot d'en-tête)
+FEATURE_WEIGHTS = {"h": 1.0, "s": 1.5, "v": 6.0}
+
+# candidats essayés au plus (chaque essai = application des règles du modèle)
+IDENTIFY_TOP = 3
+
+_HEADER_TOKEN_RE = re.compile(r"[A-Z][A-Z0-9&'.\-]{3,}")
+_VAT_ID_RE = re.compile(r"\b([A-Z]{2})[\s.\-]?([0-9][0-9A-Z]?(?:[\s.]?[0-9A-Z]){6,10})\b")
+_DIGIT_RE = re.compile(r"\d")
+_SPACES_RE = re.compile(r"\s+")
+
+_HEADER_STOPWORDS = {
+    "FACTURE", "INVOICE", "RECHNUNG", "FACTURA", "FATTURA", "FACTUUR",
+    "DATE", "DATUM", "PAGE", "SEITE", "TOTAL", "CLIENT", "KUNDE", "ORIGINAL", "COPIE", "DUPLICATA",
+}
+
+
+# =========================
+# Empreintes
+# =========================
+
+def _vat_ids(ix: TextIndex) -> List[str]:
+    out = []
+    up = ix.upper_sp
+    for lm in ix.labels.find("vat_id"):
+        chunk = up[lm.end: lm.end + 40].split("\n", 1)[0]
+        m = _VAT_ID_RE.search(chunk)
+        if not m:
+            continue
+        vid = m.group(1) + re.sub(r"[\s.]", "", m.group(2))
+        if sum(c.isdigit() for c in vid) >= 6:
+            out.append(vid)
+    return out
+
+
+def document_features(text: str) -> List[str]:
+    """Empreintes (dédoublonnées) d'un texte OCR."""
+    feats = set()
+    ix = TextIndex(text)
+    lines = ix.lines
+
+    for ln in lines[:HEADER_LINES]:
+        for tok in _HEADER_TOKEN_RE.findall(ln.upper()):
+            tok = tok.strip(".-'")
+            # numéros (facture, dossier...) : changent à chaque document
+            if len(tok) >= 4 and tok not in _HEADER_STOPWORDS and len(_DIGIT_RE.findall(tok)) < 3:
+                feats.add("h:" + tok)
+
+    for vid in _vat_ids(ix):
+        feats.add("v:" + vid)
+
+    norm = []
+    for ln in lines[:SHINGLE_MAX_LINES]:
+        n = _SPACES_RE.sub(" ", _DIGIT_RE.sub("0", ln.upper()))
+        if len(n) >= 6:
+            norm.append(n)
+    for a, b in zip(norm, norm[1:]):
+        feats.add("s:%08x" % zlib.crc32(f"{a}\n{b}".encode("utf-8")))
+
+    return sorted(feats)
+
+
+# =========================
+# Index
+# =========================
+
+class SupplierIndex:
+    """
+    docs     : {doc_id: {"supplier": clé, "features": [...]}} (persisté),
+    postings : {empreinte: Counter(fournisseur -> nb documents)} (recalculé au chargement).
+    """
+
+    def __init__(self, docs: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.postings: Dict[str, Counter] = {}
+        self.supplier_docs: Counter = Counter()
+        for doc_id, d in (docs or {}).items():
+            self._add(doc_id, d.get("supplier", ""), d.get("features") or [])
+
+    def _add(self, doc_id: str, supplier_key: str, features: Iterable[str]) -> None:
+        if not supplier_key:
+            return
+        features = list(features)
+        self.docs[doc_id] = {"supplier": supplier_key, "features": features}
+        self.supplier_docs[supplier_key] += 1
+        for f in features:
+            self.postings.setdefault(f, Counter())[supplier_key] += 1
+
+    def _remove(self, doc_id: str) -> None:
+        d = self.docs.pop(doc_id, None)
+        if not d:
+            return
+        key = d["supplier"]
+        self.supplier_docs[key] -= 1
+        if self.supplier_docs[key] <= 0:
+            del self.supplier_docs[key]
+        for f in d["features"]:
+            p = self.postings.get(f)
+            if p is None:
+                continue
+            p[key] -= 1
+            if p[key] <= 0:
+                del p[key]
+            if not p:
+                del self.postings[f]
+
+    def add_document(self, doc_id: str, supplier_key: str, text: str) -> None:
+        """Ajoute / remplace un document validé (une revalidation ne compte pas double)."""
+        self._remove(doc_id)
+        self._add(doc_id, supplier_key, document_features(text))
+
+    def rank(self, text: str, top: int = 5, *, features: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+        """[(clé fournisseur, score)] par score décroissant."""
+        n_sup = len(self.supplier_docs)
+        if not n_sup:
+            return []
+
+        scores: Counter = Counter()
+        for f in features if features is not None else document_features(text):
+            p = self.postings.get(f)
+            if not p:
+                continue
+            idf = math.log(1.0 + n_sup / len(p))
+            w = FEATURE_WEIGHTS.get(f[:1], 1.0) * idf
+            for key, n in p.items():
+                scores[key] += w * n / self.supplier_docs[key]
+
+        return [(k, round(s, 3)) for k, s in scores.most_common(top)]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"version": 1, "docs": self.docs}
+
+    def save(self, path: str) -> None:
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        # tmp unique par écriture : validations concurrentes (UI, lot)
+        fd, tmp = tempfile.mkstemp(prefix="supplier_index.", suffix=".tmp", dir=folder)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.to_json(), f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "SupplierIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f) or {}
+        return cls(data.get("docs") or {})
+
+    @classmethod
+    def build_from_invoices(cls, json_dir: str) -> "SupplierIndex":
+        """
+        Index des factures validées d'un dossier de JSON (IBAN/BIC sauvegardés = fournisseur).
+        Factures lues par zones (ocr_mode "roi") ignorées : ocr_text = extraits, pas le document.
+        """
+        index = cls()
+        for name in sorted(os.listdir(json_dir)):
+            if not name.lower().endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(json_dir, name), "r", encoding="utf-8") as f:
+                    data = json.load(f) or {}
+            except Exception:
+                continue
+            if not isinstance(data, dict) or (data.get("status") or "").strip() != "validated":
+                continue
+            if data.get("ocr_mode") == "roi":
+                continue
+            key = build_supplier_key(data.get("iban", ""), data.get("bic", ""))
+            text = data.get("ocr_text")
+            if key and isinstance(text, str) and text.strip():
+                index.add_document(os.path.splitext(name)[0], key, text)
+        return index
+
+
+_INDEX: Optional[SupplierIndex] = None
+_INDEX_STAMP: Optional[Tuple[int, int]] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def _stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def get_supplier_index() -> SupplierIndex:
+    """Index chargé une fois par process, rechargé si le fichier a changé (vide si pas encore construit)."""
+    global _INDEX, _INDEX_STAMP
+    stamp = _stamp(SUPPLIER_INDEX_PATH)
+    with _INDEX_LOCK:
+        if _INDEX is None or stamp != _INDEX_STAMP:
+            try:
+                _INDEX = SupplierIndex.load(SUPPLIER_INDEX_PATH) if stamp else SupplierIndex()
+            except (OSError, ValueError) as e:
+                print("⚠️ index fournisseurs illisible :", e)
+                _INDEX = SupplierIndex()
+            _INDEX_STAMP = stamp
+        return _INDEX
+
+
+def add_document_to_index(doc_id: str, supplier_key: str, text: str) -> None:
+    """Document validé -> index (mémoire + fichier)."""
+    global _INDEX_STAMP
+    index = get_supplier_index()
+    with _INDEX_LOCK:
+        index.add_document(doc_id, supplier_key, text)
+        index.save(SUPPLIER_INDEX_PATH)
+        _INDEX_STAMP = _stamp(SUPPLIER_INDEX_PATH)
+
+
+def rank_suppliers(text: str, top: int = 5) -> List[Tuple[str, float]]:
+    return get_supplier_index().rank(text, top)
+
+
+def identify_supplier(text: str, *, top: int = IDENTIFY_TOP) -> Optional[Tuple[str, CompiledSupplierModel]]:
+    """
+    Meilleur fournisseur confirmé : ses règles retrouvent son IBAN ou son BIC dans le texte,
+    ou le texte porte un n° de TVA vu sur ses factures. None sinon.
+    """
+    if not text:
+        return None
+    index = get_supplier_index()
+    feats = document_features(text)
+    vat_feats = [f for f in feats if f.startswith("v:")]
+
+    for key, _score in index.rank(text, top, features=feats):
+        model = get_compiled_model(key)
+        if not model:
+            continue
+
+        found = model.extract(text)
+        m_iban = (model.get("iban") or "").replace(" ", "").upper()
+        m_bic = (model.get("bic") or "").replace(" ", "").upper()
+        if found.get("iban") and found["iban"] == m_iban and validate_iban(m_iban):
+            return key, model
+        if found.get("bic") and found["bic"] == m_bic and validate_bic(m_bic):
+            return key, model
+        if any(index.postings.get(f, {}).get(key) for f in vat_feats):
+            return key, model
+
+    return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] != "build":
+        print(__doc__)
+        return 1
+
+    json_dir = argv[1] if len(argv) > 1 else os.path.dirname(MODEL_DIR)
+    index = SupplierIndex.build_from_invoices(json_dir)
+    index.save(SUPPLIER_INDEX_PATH)
+    print(f"{len(index.docs)} facture(s), {len(index.supplier_docs)} fournisseur(s) -> {SUPPLIER_INDEX_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,42 @@
 import os
 import json
 import re
+import threading
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
 from collections import Counter
 
+from .model_store import JsonModelStore, SqliteModelStore
+from .iban_validator import validate_iban, iban_length_ok, repair_iban
+
 
 MODEL_DIR = r"C:\git\OCR\OCR\models\suppliers"
 
+# Stockage des modèles : json (un fichier par fournisseur dans MODEL_DIR) ou sqlite (une base indexée)
+SUPPLIER_MODEL_STORE = os.getenv("SUPPLIER_MODEL_STORE", "json").strip().lower()
+SUPPLIER_MODEL_DB = os.getenv("SUPPLIER_MODEL_DB", os.path.join(MODEL_DIR, "supplier_models.sqlite3"))
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_model_store():
+    """Store des modèles fournisseurs (créé au 1er appel, dans chaque process)."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            if SUPPLIER_MODEL_STORE == "sqlite":
+                is_new = not os.path.exists(SUPPLIER_MODEL_DB)
+                _STORE = SqliteModelStore(SUPPLIER_MODEL_DB)
+                if is_new:
+                    # 1re utilisation : reprise des modèles JSON existants
+                    n = _STORE.import_json_dir(MODEL_DIR)
+                    if n:
+                        print(f"✅ {n} modèle(s) fournisseur importé(s) dans {SUPPLIER_MODEL_DB}")
+            else:
+                _STORE = JsonModelStore(MODEL_DIR)
+        return _STORE
+
 
 def build_supplier_key(iban: str, bic: str) -> Optional[str]:
     iban = (iban or "").replace(" ", "").replace("\u00A0", "").replace("-", "").upper().strip()
@@ -23,25 +52,29 @@ def build_supplier_key(iban: str, bic: str) -> Optional[str]:
     return f"{iban}_{bic}"
 
 
-def _model_path(supplier_key: str) -> str:
-    os.makedirs(MODEL_DIR, exist_ok=True)
-    return os.path.join(MODEL_DIR, f"{supplier_key}.json")
-
-
 def load_supplier_model(supplier_key: str) -> Optional[dict]:
-    path = _model_path(supplier_key)
-    if not os.path.exists(path):
+    if not supplier_key:
         return None
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return get_model_store().get(supplier_key)
+
 
 def save_supplier_model(supplier_key: str, data: dict) -> None:
-    """Écriture atomique (évite les JSON tronqués en cas d'arrêt brutal)."""
-    path = _model_path(supplier_key)
-    tmp = path + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, path)
+    """Écriture atomique (fichier remplacé / transaction SQLite)."""
+    get_model_store().put(supplier_key, data)
+    with _COMPILED_LOCK:
+        _COMPILED_CACHE.pop(supplier_key, None)
+
+
+def update_supplier_model(supplier_key: str, fn: Callable[[dict], dict]) -> dict:
+    """
+    Mise à jour atomique : fn(modèle actuel, {} si absent) -> nouveau modèle, écrit aussitôt.
+    À utiliser pour les fusions (merge_patterns / merge_regions) : on fusionne avec la version
+    la plus récente du store, pas avec une copie lue avant un OCR de plusieurs secondes.
+    """
+    data = get_model_store().update(supplier_key, fn)
+    with _COMPILED_LOCK:
+        _COMPILED_CACHE.pop(supplier_key, None)
+    return data
 
 
 # ---------------------------------------------------------------------------
@@ -159,22 +192,6 @@ def _tolerant_exact_regex(value: str) -> Optional[str]:
     return r"\b" + sep.join(map(re.escape, parts)) + r"\b"
 
 
-def validate_iban(iban: str) -> bool:
-    s = (iban or "").replace(" ", "").upper().strip()
-    if not re.fullmatch(r"[A-Z]{2}\d{2}[A-Z0-9]{11,30}", s):
-        return False
-
-    rearr = s[4:] + s[:4]
-    digits = ""
-    for ch in rearr:
-        digits += ch if ch.isdigit() else str(ord(ch) - 55)  # A=10
-
-    mod = 0
-    for i in range(0, len(digits), 7):
-        mod = int(str(mod) + digits[i:i + 7]) % 97
-    return mod == 1
-
-
 def validate_bic(bic: str) -> bool:
     s = (bic or "").replace(" ", "").upper().strip()
     return bool(re.fullmatch(r"[A-Z]{4}[A-Z]{2}[A-Z0-9]{2}([A-Z0-9]{3})?", s))
@@ -316,72 +333,190 @@ def merge_patterns(
     return merged
 
 
-def extract_fields_with_model(text: str, model: dict) -> Dict[str, str]:
-    """Applique les patterns du modèle (si présents) et retourne les champs trouvés."""
-    patterns = (model or {}).get("patterns") or {}
-    out: Dict[str, str] = {}
+_DATE_ONLY_RE = re.compile(r"\d{1,2}[./-]\d{1,2}[./-]\d{2,4}")
 
-    if not text or not patterns:
-        return out
+_MODEL_FIELDS = ("iban", "bic", "invoice_date", "invoice_number")
 
-    src = (text or "").replace("\u00A0", " ")
 
-    def apply_rule(field: str, rule: Dict[str, Any]) -> Optional[str]:
+class CompiledSupplierModel:
+    """
+    Modèle fournisseur prêt à l'emploi : regex compilées une fois, règles triées par hit_count.
+    Lecture des autres clés du modèle via get() (comme le dict JSON).
+    """
+
+    def __init__(self, data: Optional[dict]):
+        self.data = data or {}
+        patterns = self.data.get("patterns") or {}
+
+        self.rules: Dict[str, List[tuple]] = {}
+        for field in _MODEL_FIELDS:
+            rules = list(patterns.get(field, []) or [])
+            rules.sort(key=lambda x: int(x.get("hit_count", 0)), reverse=True)
+            compiled = []
+            for r in rules:
+                try:
+                    c = self._compile_rule(r)
+                except (re.error, TypeError, ValueError) as e:
+                    print(f"⚠️ règle modèle ignorée ({field}) :", e)
+                    continue
+                if c is not None:
+                    compiled.append(c)
+            self.rules[field] = compiled
+
+    @staticmethod
+    def _compile_rule(rule: Dict[str, Any]) -> Optional[tuple]:
         mode = rule.get("mode")
+        if mode == "line_regex":
+            return (mode, re.compile(rule.get("regex", ""), re.IGNORECASE | re.MULTILINE), None, 0, int(rule.get("group", 0)))
+        if mode == "near_label":
+            return (
+                mode,
+                re.compile(rule.get("label_regex", ""), re.IGNORECASE),
+                re.compile(rule.get("value_regex", ""), re.IGNORECASE),
+                int(rule.get("window", 120)),
+                int(rule.get("group", 0)),
+            )
+        if mode == "tolerant_exact":
+            return (mode, re.compile(rule.get("regex", ""), re.IGNORECASE), None, 0, 0)
+        return None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    def __bool__(self) -> bool:
+        return bool(self.data)
+
+    @staticmethod
+    def _apply_rule(rule: tuple, src: str) -> Optional[str]:
+        mode, rx, value_rx, window, group = rule
 
         if mode == "line_regex":
-            rx = re.compile(rule.get("regex", ""), re.IGNORECASE | re.MULTILINE)
             m = rx.search(src)
             if not m:
                 return None
-            g = int(rule.get("group", 0))
-            return (m.group(g) if g else m.group(0) or "").strip()
+            return (m.group(group) if group else m.group(0) or "").strip()
 
         if mode == "near_label":
-            label_rx = re.compile(rule.get("label_regex", ""), re.IGNORECASE)
-            value_rx = re.compile(rule.get("value_regex", ""), re.IGNORECASE)
-            window = int(rule.get("window", 120))
-            group = int(rule.get("group", 0))
-
-            for lm in label_rx.finditer(src):
+            for lm in rx.finditer(src):
                 chunk = src[lm.end(): lm.end() + window]
                 vm = value_rx.search(chunk)
                 if vm:
                     return (vm.group(group) if group else vm.group(0) or "").strip()
             return None
 
-        if mode == "tolerant_exact":
-            rx = re.compile(rule.get("regex", ""), re.IGNORECASE)
-            m = rx.search(src)
-            return m.group(0) if m else None
+        # tolerant_exact
+        m = rx.search(src)
+        return m.group(0) if m else None
 
-        return None
+    def extract(self, text: str) -> Dict[str, str]:
+        """Applique les patterns du modèle et retourne les champs trouvés."""
+        out: Dict[str, str] = {}
+        if not text or not any(self.rules.values()):
+            return out
 
-    for field in ("iban", "bic", "invoice_date", "invoice_number"):
-        rules = list(patterns.get(field, []) or [])
-        rules.sort(key=lambda x: int(x.get("hit_count", 0)), reverse=True)
+        src = text.replace("\u00A0", " ")
 
-        for r in rules:
-            val = apply_rule(field, r)
-            if not val:
-                continue
+        for field in _MODEL_FIELDS:
+            for r in self.rules[field]:
+                val = self._apply_rule(r, src)
+                if not val:
+                    continue
 
-            if field in ("iban", "bic"):
-                val = val.replace(" ", "").replace("\u00A0", "").upper().strip()
-            else:
-                val = val.strip()
-
-            if field == "iban" and not validate_iban(val):
-                continue
-            if field == "bic" and not validate_bic(val):
-                continue
-            if field == "invoice_number":
-                # rejette les dates du style 30/11/2025
-                if re.fullmatch(r"\d{1,2}[./-]\d{1,2}[./-]\d{2,4}", val.strip()):
+                if field in ("iban", "bic"):
+                    val = val.replace(" ", "").replace("\u00A0", "").upper().strip()
+                else:
+                    val = val.strip()
+
+                if field == "iban" and not validate_iban(val):
+                    continue
+                if field == "bic" and not validate_bic(val):
                     continue
+                if field == "invoice_number":
+                    # rejette les dates du style 30/11/2025
+                    if _DATE_ONLY_RE.fullmatch(val.strip()):
+                        continue
+
+                out[field] = val
+                break
+
+        return out
+
+
+# supplier_key -> (stamp du store, modèle compilé) ; un même process revoit souvent les mêmes fournisseurs
+_COMPILED_CACHE: Dict[str, Tuple[Hashable, CompiledSupplierModel]] = {}
+_COMPILED_LOCK = threading.Lock()
+
+
+def get_compiled_model(supplier_key: Optional[str]) -> Optional[CompiledSupplierModel]:
+    """
+    Modèle compilé depuis le cache mémoire ; relu / recompilé seulement si le modèle a changé
+    dans le store (mtime + taille du JSON, ou version SQLite). None si pas de modèle pour ce fournisseur.
+    """
+    if not supplier_key:
+        return None
+    store = get_model_store()
+    stamp = store.stamp(supplier_key)
+    if stamp is None:
+        with _COMPILED_LOCK:
+            _COMPILED_CACHE.pop(supplier_key, None)
+        return None
+
+    with _COMPILED_LOCK:
+        hit = _COMPILED_CACHE.get(supplier_key)
+    if hit and hit[0] == stamp:
+        return hit[1]
+
+    try:
+        data = store.get(supplier_key)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ modèle fournisseur illisible ({supplier_key}) :", e)
+        return None
+
+    compiled = CompiledSupplierModel(data)
+    with _COMPILED_LOCK:
+        _COMPILED_CACHE[supplier_key] = (stamp, compiled)
+    return compiled
+
+
+def as_compiled_model(model: Any) -> CompiledSupplierModel:
+    return model if isinstance(model, CompiledSupplierModel) else CompiledSupplierModel(model)
+
+
+def extract_fields_with_model(text: str, model: Any) -> Dict[str, str]:
+    """Applique les patterns du modèle (dict JSON ou CompiledSupplierModel) et retourne les champs trouvés."""
+    return as_compiled_model(model).extract(text)
+
+
+_BAD_INVOICE_NUMBERS = {"DESCRIPTION", "DATE", "FACTURE", "INVOICE"}
+
+
+def apply_model_to_fields(fields: Dict[str, str], ocr_text: str, model: Any) -> Dict[str, str]:
+    """
+    Complète iban/bic/invoice_number/invoice_date avec le modèle fournisseur
+    (patterns, sinon valeurs d'exemple), sans écraser une valeur déjà présente.
+    model : dict JSON ou CompiledSupplierModel (get_compiled_model).
+    """
+    out = dict(fields or {})
+    if not model:
+        return out
+
+    model = as_compiled_model(model)
+    found = model.extract(ocr_text or "")
+
+    # IBAN/BIC : valeur trouvée via patterns, sinon valeur stockée modèle
+    if not (out.get("iban") or "").strip():
+        out["iban"] = found.get("iban") or model.get("iban", "")
+
+    if not (out.get("bic") or "").strip():
+        out["bic"] = found.get("bic") or model.get("bic", "")
+
+    cur = (out.get("invoice_number") or "").strip()
+    is_ok = cur and any(c.isdigit() for c in cur) and cur.upper() not in _BAD_INVOICE_NUMBERS
+    if not is_ok:
+        out["invoice_number"] = found.get("invoice_number") or model.get("invoice_number_example", "")
 
-            out[field] = val
-            break
+    if not (out.get("invoice_date") or "").strip():
+        out["invoice_date"] = found.get("invoice_date") or model.get("date_example", "")
 
     return out
 
@@ -414,6 +549,9 @@ def extract_best_bank_ids(
     iban_raw = [m.group(0) for m in _IBAN_CAND_RX.finditer(txt)]
     iban_norm = [_norm_iban(x) for x in iban_raw]
     iban_valid = [x for x in iban_norm if validate_iban(x)]
+    if not iban_valid:
+        # aucun IBAN lisible : corrections OCR sûres (structure BBAN + mod97)
+        iban_valid = [f for f in (repair_iban(x) for x in iban_norm if iban_length_ok(x)) if f]
     iban_counts = Counter(iban_valid)
 
     # 2) BIC candidats -> validation format
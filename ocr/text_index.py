@@ -0,0 +1,103 @@
+# ocr/text_index.py
+"""
+Index texte partagé par les extracteurs (parse_invoice, modèles fournisseurs...).
+
+Le texte OCR est découpé / normalisé UNE seule fois :
+- variantes majuscules / NBSP / sans retours ligne (même longueur que le texte : offsets communs),
+- lignes non vides (strip) + offset de début de chaque ligne dans le texte,
+- résultats de regex par ligne mis en cache (montants, lignes "montant seul"...),
+- labels (IBAN, BIC, N° FACTURE, BASE HT...) localisés en une passe (LabelIndex),
+- numéros de dossier -> lignes / offsets, en une passe (FolderIndex).
+"""
+import re
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .label_index import LabelIndex
+from .folder_index import FolderIndex
+
+
+class TextIndex:
+    def __init__(self, text: str):
+        self.text = text or ""
+        self.upper = self.text.upper()
+        if len(self.upper) != len(self.text):
+            # ß -> SS, ligatures... : 1 caractère pour 1, les offsets restent communs à toutes les vues
+            self.upper = "".join(c if len(c.upper()) != 1 else c.upper() for c in self.text)
+        # ⚠️ on garde les \n : "...038\nBIC" ne doit pas devenir "...038BIC"
+        self.upper_sp = self.upper.replace("\u00A0", " ")
+        # une seule "ligne" (recherche label -> valeur à cheval sur deux lignes)
+        self.flat = self.upper_sp.replace("\n", " ")
+
+        # lignes non vides (strip) et offset de leur 1er caractère dans self.text
+        self.lines: List[str] = []
+        self.line_starts: List[int] = []
+        pos = 0
+        for raw in self.text.splitlines(keepends=True):
+            s = raw.strip()
+            if s:
+                self.lines.append(s)
+                self.line_starts.append(pos + len(raw) - len(raw.lstrip()))
+            pos += len(raw)
+
+        self._upper_lines: Optional[List[str]] = None
+        self._lower_lines: Optional[List[str]] = None
+        self._labels: Optional[LabelIndex] = None
+        self._folders: Optional[FolderIndex] = None
+        self._cache: Dict[Tuple[Any, ...], Any] = {}
+
+    @property
+    def upper_lines(self) -> List[str]:
+        if self._upper_lines is None:
+            self._upper_lines = [ln.upper() for ln in self.lines]
+        return self._upper_lines
+
+    @property
+    def lower_lines(self) -> List[str]:
+        if self._lower_lines is None:
+            self._lower_lines = [ln.lower() for ln in self.lines]
+        return self._lower_lines
+
+    @property
+    def labels(self) -> LabelIndex:
+        """Occurrences de tous les labels connus (une passe, calculée au 1er accès)."""
+        if self._labels is None:
+            self._labels = LabelIndex(self)
+        return self._labels
+
+    @property
+    def folders(self) -> FolderIndex:
+        """Numéros de dossier du document (une passe, calculée au 1er accès)."""
+        if self._folders is None:
+            self._folders = FolderIndex(self)
+        return self._folders
+
+    def line_at(self, offset: int) -> int:
+        """Index de la ligne (non vide) contenant / précédant l'offset dans self.text."""
+        return max(0, bisect_right(self.line_starts, offset) - 1)
+
+    def findall(self, rx: "re.Pattern", i: int) -> list:
+        """rx.findall(lines[i]) mis en cache."""
+        key = ("findall", rx, i)
+        res = self._cache.get(key)
+        if res is None:
+            res = self._cache[key] = rx.findall(self.lines[i])
+        return res
+
+    def matches(self, rx: "re.Pattern", i: int) -> bool:
+        """bool(rx.match(lines[i])) mis en cache."""
+        key = ("match", rx, i)
+        res = self._cache.get(key)
+        if res is None:
+            res = self._cache[key] = bool(rx.match(self.lines[i]))
+        return res
+
+    def memo(self, key: Tuple[Any, ...], fn):
+        """Cache générique (valeurs dérivées calculées une fois par document)."""
+        if key not in self._cache:
+            self._cache[key] = fn()
+        return self._cache[key]
+
+
+def as_index(text: Union[str, TextIndex, None]) -> TextIndex:
+    return text if isinstance(text, TextIndex) else TextIndex(text or "")
@@ -0,0 +1,245 @@
+"""
+Annuaire banque -> transporteur en mémoire (xxakunbank x xxakun), pour la correspondance IBAN/BIC
+"""
+import os
+import threading
+import time
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from db.transporter_repository import normalize_bank_key
+from ocr.iban_validator import validate_iban
+
+logger = logging.getLogger(__name__)
+
+# rechargement complet périodique (s) : prend aussi en compte les suppressions
+BANK_DIRECTORY_RELOAD_S = float(os.getenv("BANK_DIRECTORY_RELOAD_S", "600"))
+# colonne date / rowversion de xxakunbank pour les rafraîchissements delta (vide = rechargement complet)
+BANK_DIRECTORY_CHANGED_COLUMN = os.getenv("BANK_DIRECTORY_CHANGED_COLUMN", "").strip()
+# intervalle (s) entre deux rafraîchissements delta (si BANK_DIRECTORY_CHANGED_COLUMN)
+BANK_DIRECTORY_DELTA_S = float(os.getenv("BANK_DIRECTORY_DELTA_S", "30"))
+# IBAN valide absent de l'annuaire : réponse "introuvable" gardée (s) avant de redemander à SQL Server
+BANK_DIRECTORY_MISS_TTL_S = float(os.getenv("BANK_DIRECTORY_MISS_TTL_S", "60"))
+
+# saisies brutes (IBAN, BIC) déjà résolues, sans renormaliser (vidé à chaque rechargement)
+BANK_DIRECTORY_RAW_MEMO_MAX = 50_000
+
+BankKey = Tuple[str, str]
+
+
+def _exact_key(iban: str, bic: str) -> BankKey:
+    # égalité SQL Server (collation insensible à la casse, espaces finaux ignorés) de find_by_iban_bic
+    return str(iban or "").upper().rstrip(), str(bic or "").upper().rstrip()
+
+
+class BankDirectoryCache:
+    """
+    Index IBAN/BIC normalisés -> transporteur, chargé en une requête au démarrage.
+
+    - find / find_many : remplacent find_transporter_by_bank / find_transporters_by_banks
+      (même normalisation : majuscules, sans espaces), une recherche = un accès dict,
+    - has_exact : remplace BankRepository.find_by_iban_bic (égalité stricte IBAN / SWIFT),
+    - absent de l'annuaire : SQL Server n'est interrogé que pour un IBAN valide (checksum),
+      jamais pour les saisies partielles, et l'absence est mémorisée BANK_DIRECTORY_MISS_TTL_S,
+    - rafraîchissement : delta par BANK_DIRECTORY_CHANGED_COLUMN si configurée,
+      rechargement complet toutes les BANK_DIRECTORY_RELOAD_S (suppressions).
+    Les rechargements reconstruisent les index puis les remplacent en bloc ; un compte trouvé par le
+    fallback SQL est ajouté en place (sous verrou, sans recopier l'index). Les lectures ne prennent
+    pas de verrou : un accès dict / set est atomique.
+    Les dicts retournés sont partagés : ne pas les modifier.
+    """
+
+    def __init__(
+        self,
+        transporter_repo,
+        bank_repo=None,
+        reload_s: float = BANK_DIRECTORY_RELOAD_S,
+        changed_column: str = BANK_DIRECTORY_CHANGED_COLUMN,
+        delta_s: float = BANK_DIRECTORY_DELTA_S,
+        miss_ttl_s: float = BANK_DIRECTORY_MISS_TTL_S,
+    ):
+        self.transporter_repo = transporter_repo
+        self.bank_repo = bank_repo
+        self.reload_s = reload_s
+        self.changed_column = changed_column
+        self.delta_s = delta_s
+        self.miss_ttl_s = miss_ttl_s
+
+        self._lock = threading.Lock()
+        self._rows: Dict[Tuple[Any, Any], Dict[str, Any]] = {}     # (KundenNr, LfdNr) -> ligne
+        self._by_bank: Dict[BankKey, Dict[str, Any]] = {}
+        self._by_raw: Dict[BankKey, Dict[str, Any]] = {}
+        self._exact: set = set()
+        self._misses: Dict[Tuple[str, BankKey], float] = {}         # (type, clé) -> expire à
+        self._watermark: Any = None
+        self._loaded_at = 0.0
+        self._next_full = 0.0        # 0 : jamais chargé / à recharger
+        self._next_delta = 0.0
+        self._next_refresh = 0.0     # min(_next_full, _next_delta) : un seul test par recherche
+        self.stats = {"hits": 0, "misses": 0, "sql_fallbacks": 0, "full_loads": 0, "delta_loads": 0}
+
+    # ---------- chargement ----------
+
+    def load(self) -> None:
+        """Chargement complet (démarrage, puis toutes les reload_s)."""
+        rows = self.transporter_repo.get_bank_directory(self.changed_column)
+        with self._lock:
+            self._rows = {(r.get("KundenNr"), r.get("LfdNr")): r for r in rows}
+            self._watermark = self._max_changed(rows, None)
+            self._rebuild_locked()
+            now = time.monotonic()
+            self._loaded_at = now
+            self._next_full = now + self.reload_s
+            self._next_delta = self._delta_deadline(now)
+            self._next_refresh = min(self._next_full, self._next_delta)
+            self.stats["full_loads"] += 1
+        logger.info(f"✅ Annuaire bancaire chargé : {len(rows)} comptes")
+
+    def _load_delta(self) -> None:
+        rows = self.transporter_repo.get_bank_directory(self.changed_column, self._watermark)
+        with self._lock:
+            for r in rows:
+                self._rows[(r.get("KundenNr"), r.get("LfdNr"))] = r
+            self._watermark = self._max_changed(rows, self._watermark)
+            if rows:
+                self._rebuild_locked()
+            self._next_delta = self._delta_deadline(time.monotonic())
+            self._next_refresh = min(self._next_full, self._next_delta)
+            self.stats["delta_loads"] += 1
+
+    def _delta_deadline(self, now: float) -> float:
+        # sans colonne de modification : rechargements complets uniquement
+        return now + self.delta_s if self.changed_column else float("inf")
+
+    def _max_changed(self, rows: List[Dict[str, Any]], current: Any) -> Any:
+        for r in rows:
+            v = r.get("ChangedAt")
+            if v is not None and (current is None or v > current):
+                current = v
+        return current
+
+    def _rebuild_locked(self) -> None:
+        by_bank: Dict[BankKey, Dict[str, Any]] = {}
+        exact = set()
+        # comme fetch_one : une ligne par (IBAN, BIC), les comptes principaux (LfdNr le plus petit) d'abord
+        for r in sorted(self._rows.values(), key=lambda r: (str(r.get("KundenNr")), r.get("LfdNr") or 0)):
+            by_bank.setdefault(normalize_bank_key(r.get("IBAN"), r.get("SWIFT")), r)
+            exact.add(_exact_key(r.get("IBAN"), r.get("SWIFT")))
+        self._by_bank = by_bank
+        self._by_raw = {}
+        self._exact = exact
+        self._misses = {}
+
+    def mark_stale(self) -> None:
+        """Après une écriture dans xxakunbank : rechargement complet à la prochaine recherche."""
+        self._next_full = 0.0
+        self._next_refresh = 0.0
+
+    def _ensure_fresh(self) -> None:
+        now = time.monotonic()
+        if now < self._next_refresh:
+            return
+        try:
+            if now >= self._next_full:
+                self.load()
+            else:
+                self._load_delta()
+        except Exception as e:
+            if not self._loaded_at:
+                raise
+            # annuaire précédent gardé, nouvel essai au prochain intervalle
+            logger.warning(f"⚠️ Rafraîchissement de l'annuaire bancaire impossible: {e}")
+            self._next_delta = self._delta_deadline(now)
+            self._next_full = max(self._next_full, now + min(self.delta_s, self.reload_s))
+            self._next_refresh = min(self._next_full, self._next_delta)
+
+    # ---------- recherches ----------
+
+    def _miss_cached(self, kind: str, key: BankKey) -> bool:
+        exp = self._misses.get((kind, key))
+        return exp is not None and exp > time.monotonic()
+
+    def _remember_miss(self, kind: str, key: BankKey) -> None:
+        self._misses[(kind, key)] = time.monotonic() + self.miss_ttl_s
+
+    def find(self, iban: str, bic: str) -> Optional[Dict[str, Any]]:
+        """Transporteur du compte IBAN/BIC (comme find_transporter_by_bank), None si introuvable."""
+        if time.monotonic() >= self._next_refresh:
+            self._ensure_fresh()
+        # chemin chaud (même saisie relue à chaque frappe / rafraîchissement) : un accès dict
+        raw = (iban, bic)
+        rec = self._by_raw.get(raw)
+        if rec is not None:
+            self.stats["hits"] += 1
+            return rec
+
+        key = normalize_bank_key(iban, bic)
+        rec = self._by_bank.get(key)
+        if rec is not None:
+            if len(self._by_raw) < BANK_DIRECTORY_RAW_MEMO_MAX:
+                self._by_raw[raw] = rec
+            self.stats["hits"] += 1
+            return rec
+
+        self.stats["misses"] += 1
+        if not key[0] or not key[1] or not validate_iban(key[0]) or self._miss_cached("bank", key):
+            return None
+        # compte créé depuis le dernier chargement ?
+        self.stats["sql_fallbacks"] += 1
+        rec = self.transporter_repo.find_transporter_by_bank(iban, bic)
+        if rec:
+            with self._lock:
+                self._by_bank[key] = rec
+        else:
+            self._remember_miss("bank", key)
+        return rec
+
+    def find_many(self, pairs: Iterable[Tuple[str, str]]) -> Dict[BankKey, Dict[str, Any]]:
+        """Comme find_transporters_by_banks : clés (IBAN, BIC) normalisées, paires introuvables absentes."""
+        self._ensure_fresh()
+        by_bank = self._by_bank
+        out: Dict[BankKey, Dict[str, Any]] = {}
+        fallback = []
+        for iban, bic in pairs:
+            if not iban or not bic:
+                continue
+            key = normalize_bank_key(iban, bic)
+            rec = by_bank.get(key)
+            if rec is not None:
+                out[key] = rec
+            elif validate_iban(key[0]) and not self._miss_cached("bank", key):
+                fallback.append(key)
+
+        self.stats["hits"] += len(out)
+        self.stats["misses"] += len(fallback)
+        if fallback:
+            self.stats["sql_fallbacks"] += 1
+            found = self.transporter_repo.find_transporters_by_banks(fallback)
+            for key in fallback:
+                if key in found:
+                    out[key] = found[key]
+                else:
+                    self._remember_miss("bank", key)
+            if found:
+                with self._lock:
+                    self._by_bank.update(found)
+        return out
+
+    def has_exact(self, iban: str, bic: str) -> bool:
+        """Compte IBAN / SWIFT présent tel quel (comme BankRepository.find_by_iban_bic)."""
+        self._ensure_fresh()
+        key = _exact_key(iban, bic)
+        if key in self._exact:
+            self.stats["hits"] += 1
+            return True
+
+        self.stats["misses"] += 1
+        if self.bank_repo is None or not validate_iban(key[0]) or self._miss_cached("exact", key):
+            return False
+        self.stats["sql_fallbacks"] += 1
+        if self.bank_repo.find_by_iban_bic(iban, bic):
+            with self._lock:
+                self._exact.add(key)
+            return True
+        self._remember_miss("exact", key)
+        return False
@@ -0,0 +1,86 @@
+"""
+Validation en lot de l'état de traitement des factures (tableau de gauche)
+"""
+import logging
+from typing import List, NamedTuple, Sequence, Tuple
+
+from db.transporter_repository import normalize_bank_key
+
+logger = logging.getLogger(__name__)
+
+# nb max de dossiers manquants cités dans l'infobulle
+MAX_MISSING_SHOWN = 6
+
+
+class ProcessingState(NamedTuple):
+    state: str      # 'ok' | 'error' | 'unknown'
+    tooltip: str
+
+
+class ProcessingStateService:
+    """
+    Vérifie en une fois toutes les lignes (IBAN, BIC, dossiers) d'un répertoire :
+    transporteur connu pour l'IBAN/BIC, et tous les dossiers présents en xxatour.
+
+    Deux requêtes ensemblistes pour tout le lot (au lieu de deux par ligne) ;
+    avec l'annuaire bancaire en mémoire, seule celle des dossiers reste.
+    """
+
+    def __init__(self, transporter_repo, tour_repo, bank_directory=None):
+        self.transporter_repo = transporter_repo
+        self.tour_repo = tour_repo
+        # BankDirectoryCache : transporteurs résolus en mémoire (SQL seulement pour les IBAN inconnus)
+        self.bank_directory = bank_directory
+
+    def validate(self, rows: Sequence[Tuple[str, str, Sequence[str]]]) -> List[ProcessingState]:
+        """
+        Args:
+            rows: (iban, bic, tournrs) par ligne, IBAN/BIC et dossiers déjà renseignés
+
+        Returns:
+            list: un ProcessingState par ligne, dans le même ordre
+        """
+        if not rows:
+            return []
+
+        # 1) transporteurs trouvés par iban/bic
+        try:
+            pairs = [(iban, bic) for iban, bic, _ in rows]
+            if self.bank_directory is not None:
+                transporters = self.bank_directory.find_many(pairs)
+            else:
+                transporters = self.transporter_repo.find_transporters_by_banks(pairs)
+        except Exception as e:
+            logger.error(f"❌ Erreur SQL transporteur (lot de {len(rows)} lignes): {e}")
+            return [ProcessingState("error", f"Erreur SQL transporteur: {e}")] * len(rows)
+
+        # 2) dossiers existants dans xxatour (uniquement pour les lignes dont le transporteur est connu)
+        pending = [i for i, (iban, bic, _) in enumerate(rows) if normalize_bank_key(iban, bic) in transporters]
+        all_tournrs = {str(t).strip() for i in pending for t in rows[i][2]}
+        try:
+            found = self.tour_repo.get_existing_tournrs_in_xxatour(sorted(all_tournrs)) if all_tournrs else set()
+            tour_error = None
+        except Exception as e:
+            logger.error(f"❌ Erreur SQL xxatour ({len(all_tournrs)} dossiers): {e}")
+            found, tour_error = set(), e
+
+        states: List[ProcessingState] = []
+        for iban, bic, tournrs in rows:
+            if normalize_bank_key(iban, bic) not in transporters:
+                states.append(ProcessingState("error", "Transporteur introuvable en base pour cet IBAN/BIC."))
+                continue
+            if tour_error is not None:
+                states.append(ProcessingState("error", f"Erreur SQL xxatour: {tour_error}"))
+                continue
+
+            missing = sorted({str(t).strip() for t in tournrs} - found)
+            if missing:
+                more = "" if len(missing) <= MAX_MISSING_SHOWN else f" (+{len(missing) - MAX_MISSING_SHOWN})"
+                states.append(ProcessingState(
+                    "error",
+                    f"Dossier(s) manquant(s) en xxatour: {', '.join(missing[:MAX_MISSING_SHOWN])}{more}",
+                ))
+                continue
+
+            states.append(ProcessingState("ok", "OK : transporteur trouvé + tous les dossiers présents en base."))
+        return states
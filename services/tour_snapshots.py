@@ -0,0 +1,82 @@
+"""
+Cache mémoire (TTL) des snapshots de dossiers lus en lot par TourRepository.get_tour_snapshots
+"""
+import os
+import threading
+import time
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from db.tour_repository import TourSnapshot
+
+logger = logging.getLogger(__name__)
+
+# durée de validité d'un snapshot (s) ; les Kosten / commandes peuvent changer en base pendant la session
+TOUR_CACHE_TTL_S = float(os.getenv("TOUR_CACHE_TTL_S", "120"))
+
+
+class TourSnapshotCache:
+    """
+    Snapshots de dossiers partagés par le tableau des dossiers, le volet "tour" et les totaux.
+
+    get_many() ne va en base que pour les TourNr absents ou expirés, en UNE requête pour tout le lot :
+    préchargé avec les dossiers d'une facture, chaque ligne du tableau est ensuite lue en mémoire.
+    """
+
+    def __init__(self, tour_repo, ttl_s: float = TOUR_CACHE_TTL_S):
+        self.tour_repo = tour_repo
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[TourSnapshot, float]] = {}   # tour_nr -> (snapshot, expire à)
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, tour_nrs: Iterable[str]) -> Dict[str, TourSnapshot]:
+        """
+        Args:
+            tour_nrs: numéros de dossier (vides ignorés)
+
+        Returns:
+            dict: tour_nr -> TourSnapshot (exists=False si le dossier n'est pas en base)
+        """
+        wanted = {str(t).strip() for t in (tour_nrs or []) if str(t).strip()}
+        now = time.monotonic()
+        out: Dict[str, TourSnapshot] = {}
+        with self._lock:
+            for t in wanted:
+                entry = self._entries.get(t)
+                if entry is not None and entry[1] > now:
+                    out[t] = entry[0]
+            self.hits += len(out)
+            self.misses += len(wanted) - len(out)
+
+        missing = wanted - out.keys()
+        if missing:
+            fetched = self.tour_repo.get_tour_snapshots(sorted(missing))
+            expires = time.monotonic() + self.ttl_s
+            with self._lock:
+                for t, snap in fetched.items():
+                    self._entries[t] = (snap, expires)
+            out.update(fetched)
+        return out
+
+    def get(self, tour_nr: str) -> Optional[TourSnapshot]:
+        tour_nr = (tour_nr or "").strip()
+        if not tour_nr:
+            return None
+        return self.get_many([tour_nr]).get(tour_nr)
+
+    def prefetch(self, tour_nrs: Iterable[str]) -> None:
+        """Charge en une requête les dossiers qui vont être affichés ; une erreur BDD est laissée aux lectures."""
+        try:
+            self.get_many(tour_nrs)
+        except Exception as e:
+            logger.warning(f"⚠️ Préchargement des dossiers impossible: {e}")
+
+    def invalidate(self, tour_nrs: Optional[Iterable[str]] = None) -> None:
+        with self._lock:
+            if tour_nrs is None:
+                self._entries.clear()
+            else:
+                for t in tour_nrs:
+                    self._entries.pop(str(t).strip(), None)
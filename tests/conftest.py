@@ -0,0 +1,5 @@
+import os
+import sys
+
+# les tests importent les paquets du dépôt (ocr, db, services) depuis la racine
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,171 @@
+import pytest
+
+pytest.importorskip("pyodbc")
+
+from services import bank_directory
+from services.bank_directory import BankDirectoryCache
+
+IBAN = "FR7630006000011234567890189"
+BIC = "AGRIFRPP"
+NEW_IBAN = "DE89370400440532013000"
+NEW_BIC = "COBADEFF"
+
+
+def _row(kunden_nr, lfd_nr, iban, swift, changed=None):
+    return {"KundenNr": kunden_nr, "LfdNr": lfd_nr, "IBAN": iban, "SWIFT": swift, "Name": f"T{kunden_nr}", "ChangedAt": changed}
+
+
+class FakeTransporterRepo:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.delta_rows = []
+        self.sql = {}          # comptes créés après le chargement (fallback SQL)
+        self.loads = []
+        self.single_calls = 0
+        self.batch_calls = []
+        self.error = None
+
+    def get_bank_directory(self, changed_column="", since=None):
+        self.loads.append(since)
+        if self.error:
+            raise self.error
+        return list(self.rows) if since is None else list(self.delta_rows)
+
+    def find_transporter_by_bank(self, iban, bic):
+        self.single_calls += 1
+        return self.sql.get(bank_directory.normalize_bank_key(iban, bic))
+
+    def find_transporters_by_banks(self, pairs):
+        self.batch_calls.append(list(pairs))
+        return {k: self.sql[k] for k in pairs if k in self.sql}
+
+
+class FakeBankRepo:
+    def __init__(self, known=()):
+        self.known = set(known)
+        self.calls = 0
+
+    def find_by_iban_bic(self, iban, bic):
+        self.calls += 1
+        return {"IBAN": iban} if (iban, bic) in self.known else None
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(bank_directory.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _cache(repo, bank_repo=None, **kw):
+    params = {"reload_s": 600, "changed_column": "", "delta_s": 30, "miss_ttl_s": 60}
+    params.update(kw)
+    return BankDirectoryCache(repo, bank_repo, **params)
+
+
+def test_find_normalizes_and_prefers_main_account(clock):
+    repo = FakeTransporterRepo([_row(7, 2, IBAN, BIC), _row(7, 1, IBAN, BIC), _row(9, 1, NEW_IBAN, "")])
+    cache = _cache(repo)
+
+    rec = cache.find("fr76 3000 6000 0112 3456 7890 189", " agrifrpp")
+    assert (rec["KundenNr"], rec["LfdNr"]) == (7, 1)
+    assert cache.find("fr76 3000 6000 0112 3456 7890 189", " agrifrpp") is rec
+    assert repo.loads == [None]
+    assert cache.stats["hits"] == 2
+
+
+def test_find_partial_input_never_queries_sql(clock):
+    repo = FakeTransporterRepo([])
+    cache = _cache(repo)
+    assert cache.find("FR76 3000", BIC) is None
+    assert cache.find(IBAN, "") is None
+    assert repo.single_calls == 0
+
+
+def test_find_new_account_and_miss_ttl(clock):
+    repo = FakeTransporterRepo([])
+    cache = _cache(repo)
+
+    assert cache.find(NEW_IBAN, NEW_BIC) is None
+    assert cache.find(NEW_IBAN, NEW_BIC) is None
+    assert repo.single_calls == 1               # absence mémorisée
+
+    repo.sql[(NEW_IBAN, NEW_BIC)] = {"KundenNr": 11}
+    clock[0] += 61
+    assert cache.find(NEW_IBAN, NEW_BIC) == {"KundenNr": 11}
+    assert cache.find(NEW_IBAN, NEW_BIC) == {"KundenNr": 11}
+    assert repo.single_calls == 2               # ajouté à l'index
+
+
+def test_find_many_batches_sql_fallback(clock):
+    repo = FakeTransporterRepo([_row(7, 1, IBAN, BIC)])
+    repo.sql[(NEW_IBAN, NEW_BIC)] = {"KundenNr": 11}
+    cache = _cache(repo)
+    unknown = ("GB82WEST12345698765432", "WESTGB22")
+
+    out = cache.find_many([(IBAN.lower(), BIC), (NEW_IBAN, NEW_BIC), unknown, ("FR76", BIC), ("", BIC)])
+
+    assert set(out) == {(IBAN, BIC), (NEW_IBAN, NEW_BIC)}
+    assert repo.batch_calls == [[(NEW_IBAN, NEW_BIC), unknown]]
+    assert cache.find_many([(NEW_IBAN, NEW_BIC), unknown]) == {(NEW_IBAN, NEW_BIC): {"KundenNr": 11}}
+    assert len(repo.batch_calls) == 1
+
+
+def test_has_exact_is_strict_and_falls_back_once(clock):
+    bank_repo = FakeBankRepo({(NEW_IBAN, NEW_BIC)})
+    cache = _cache(FakeTransporterRepo([_row(7, 1, IBAN, BIC)]), bank_repo)
+
+    assert cache.has_exact(IBAN.lower(), BIC + " ")
+    assert not cache.has_exact("FR76 3000 6000 0112 3456 7890 189", BIC)   # espaces internes : pas égal
+    assert cache.has_exact(NEW_IBAN, NEW_BIC)
+    assert cache.has_exact(NEW_IBAN, NEW_BIC)
+    assert not cache.has_exact("GB82WEST12345698765432", "WESTGB22")
+    assert not cache.has_exact("GB82WEST12345698765432", "WESTGB22")
+    assert bank_repo.calls == 3                 # saisie espacée, compte nouveau, inconnu (une fois)
+
+
+def test_sql_fallback_adds_in_place(clock):
+    repo = FakeTransporterRepo([_row(7, 1, IBAN, BIC)])
+    repo.sql[(NEW_IBAN, NEW_BIC)] = {"KundenNr": 11}
+    repo.sql[("GB82WEST12345698765432", "WESTGB22")] = {"KundenNr": 12}
+    cache = _cache(repo, FakeBankRepo({(NEW_IBAN, NEW_BIC)}))
+    cache.load()
+    by_bank, exact = cache._by_bank, cache._exact
+
+    cache.find(NEW_IBAN, NEW_BIC)
+    cache.find_many([("GB82WEST12345698765432", "WESTGB22")])
+    cache.has_exact(NEW_IBAN, NEW_BIC)
+
+    # index complétés, pas recopiés à chaque compte ajouté
+    assert cache._by_bank is by_bank and len(by_bank) == 3
+    assert cache._exact is exact and (NEW_IBAN, NEW_BIC) in exact
+
+
+def test_reload_delta_and_failed_refresh(clock):
+    repo = FakeTransporterRepo([_row(7, 1, IBAN, BIC, changed=5)])
+    cache = _cache(repo, changed_column="ChangedAt", delta_s=30, reload_s=600)
+    assert cache.find(IBAN, BIC)["KundenNr"] == 7
+
+    repo.delta_rows = [_row(11, 1, NEW_IBAN, NEW_BIC, changed=8)]
+    clock[0] += 31
+    assert cache.find(NEW_IBAN, NEW_BIC)["KundenNr"] == 11
+    assert repo.loads == [None, 5]
+
+    # rafraîchissement en erreur : annuaire précédent gardé
+    repo.error = RuntimeError("timeout")
+    clock[0] += 601
+    assert cache.find(IBAN, BIC)["KundenNr"] == 7
+
+    # suppression vue au rechargement complet
+    repo.error = None
+    repo.rows = [_row(11, 1, NEW_IBAN, NEW_BIC)]
+    cache.mark_stale()
+    assert cache.find(IBAN, BIC) is None
+    assert cache.stats["full_loads"] == 2
+
+
+def test_first_load_error_is_raised(clock):
+    repo = FakeTransporterRepo([])
+    repo.error = RuntimeError("serveur absent")
+    with pytest.raises(RuntimeError):
+        _cache(repo).find(IBAN, BIC)
@@ -0,0 +1,146 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("pytesseract")
+pytest.importorskip("pdf2image")
+
+from ocr import batch_pipeline, supplier_model
+from ocr.batch_pipeline import build_invoice_payload, process_pdf, run_batch
+
+INVOICE_TEXT = (
+    "TRANSPORTS EXEMPLE SARL\n"
+    "12 rue des Lilas 69000 LYON\n"
+    "FACTURE N° F2024-0042\n"
+    "Date : 12/03/2024\n"
+    "IBAN : FR76 3000 6000 0112 3456 7890 189\n"
+    "BIC : AGRIFRPP\n"
+    "Total HT 1 000,00\n"
+)
+
+
+@pytest.fixture(autouse=True)
+def _model_dir(tmp_path, monkeypatch):
+    # modèles fournisseurs lus dans un dossier de test, pas celui du poste
+    monkeypatch.setattr(supplier_model, "MODEL_DIR", str(tmp_path / "suppliers"))
+    monkeypatch.setattr(supplier_model, "SUPPLIER_MODEL_STORE", "json")
+    monkeypatch.setattr(supplier_model, "_STORE", None)
+
+
+def _native_pdf(path, text: str = INVOICE_TEXT) -> str:
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((50, 72), text, fontsize=10)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def _fields(**extra) -> dict:
+    fields = {
+        "iban": "FR7630006000011234567890189",
+        "bic": "AGRIFRPP",
+        "invoice_date": "12/03/2024",
+        "invoice_number": "F2024-0042",
+        "folders": [{"tour_nr": "123456", "amount_ht_ocr": ""}, {"tour_nr": "123457", "amount_ht_ocr": ""}],
+        "vat_lines": [
+            {"rate": "20,00", "base": "1 000,00", "vat": "200,00"},
+            {"rate": "5,5", "base": "100,00", "vat": "5,50"},
+        ],
+    }
+    fields.update(extra)
+    return fields
+
+
+def test_payload_totals_and_draft_status():
+    payload = build_invoice_payload(_fields(), "texte", " E1 ")
+    assert payload["total_base_ht"] == 1100.0
+    assert payload["total_vat"] == 205.5
+    assert payload["total_ttc"] == 1305.5
+    assert payload["folder_number"] == "123456"
+    assert payload["status"] == "draft"
+    assert payload["entry_id"] == "E1"
+    assert payload["ocr_text"] == "texte"
+
+
+def test_payload_ignores_unreadable_amounts():
+    payload = build_invoice_payload(_fields(folders=[], vat_lines=[{"rate": "20", "base": "", "vat": "abc"}]), "")
+    assert payload["total_base_ht"] == payload["total_vat"] == payload["total_ttc"] == 0.0
+    assert payload["folder_number"] == ""
+
+
+def test_process_pdf_writes_invoice_json(tmp_path):
+    pdf = _native_pdf(tmp_path / "facture.pdf")
+    json_path = tmp_path / "out" / "facture.json"
+
+    res = process_pdf(pdf, str(json_path), "E1")
+
+    assert res["ok"], res["error"]
+    assert res["iban"] == "FR7630006000011234567890189"
+    data = json.loads(json_path.read_text(encoding="utf-8"))
+    assert data["iban"] == res["iban"]
+    assert data["bic"] == "AGRIFRPP"
+    assert data["entry_id"] == "E1"
+    assert "F2024-0042" in data["ocr_text"]
+    assert not list((tmp_path / "out").glob("*.tmp"))
+
+
+def test_process_pdf_never_raises(tmp_path):
+    res = process_pdf(str(tmp_path / "absent.pdf"), str(tmp_path / "absent.json"))
+    assert not res["ok"]
+    assert "absent.pdf" in res["error"]
+    assert not (tmp_path / "absent.json").exists()
+
+
+def test_run_batch_serial_keeps_order_and_stops_on_cancel(tmp_path):
+    jobs = [(str(tmp_path / f"{i}.pdf"), str(tmp_path / f"{i}.json"), "") for i in range(3)]
+
+    assert [r["pdf_path"] for r in run_batch(jobs, workers=1)] == [j[0] for j in jobs]
+
+    seen = []
+    for r in run_batch(jobs, workers=1, should_cancel=lambda: len(seen) >= 1):
+        seen.append(r)
+    assert len(seen) == 1
+
+
+def test_run_batch_parallel_returns_every_job(tmp_path):
+    pdfs = [_native_pdf(tmp_path / f"f{i}.pdf") for i in range(2)]
+    jobs = [(p, p[:-4] + ".json", "") for p in pdfs] + [(str(tmp_path / "absent.pdf"), str(tmp_path / "x.json"), "")]
+
+    results = {r["pdf_path"]: r for r in run_batch(jobs, workers=2)}
+
+    assert set(results) == {j[0] for j in jobs}
+    assert all(results[p]["ok"] for p in pdfs)
+    assert not results[str(tmp_path / "absent.pdf")]["ok"]
+
+
+def _crash_worker(pdf_path, json_path, entry_id="", supplier_key=""):
+    # crash natif simulé (Tesseract / Poppler) : le process worker meurt sans résultat
+    if "crash" in os.path.basename(pdf_path):
+        os._exit(1)
+    return _ORIGINAL_PROCESS_PDF(pdf_path, json_path, entry_id, supplier_key)
+
+
+_ORIGINAL_PROCESS_PDF = process_pdf
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="workers lancés par fork uniquement")
+def test_run_batch_survives_a_dead_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_pipeline, "process_pdf", _crash_worker)
+    pdfs = [_native_pdf(tmp_path / f"f{i}.pdf") for i in range(3)]
+    crash = str(tmp_path / "crash.pdf")
+    jobs = [(p, p[:-4] + ".json", "") for p in pdfs] + [(crash, str(tmp_path / "crash.json"), "")]
+
+    results = {r["pdf_path"]: r for r in run_batch(jobs, workers=2)}
+
+    assert set(results) == {j[0] for j in jobs}
+    assert not results[crash]["ok"]
+    assert results[crash]["error"].startswith("BrokenProcessPool")
+    assert results[crash]["json_path"] == str(tmp_path / "crash.json")
+
+
+def test_invoice_json_path():
+    assert batch_pipeline.invoice_json_path("/scans/FACT 01.pdf", "models") == os.path.join("models", "FACT 01.json")
@@ -0,0 +1,120 @@
+import json
+
+import pytest
+
+pytest.importorskip("fitz")
+pytest.importorskip("pytesseract")
+pytest.importorskip("pdf2image")
+
+from ocr import supplier_model
+from ocr.batch_reparse import (
+    _pct,
+    diff_fields,
+    load_saved_invoices,
+    main,
+    normalize_field,
+    run_reparse,
+)
+
+OCR_TEXT = (
+    "TRANSPORTS EXEMPLE SARL\n"
+    "N° facture : 20240042\n"
+    "Date : 12/03/2024\n"
+    "IBAN : FR76 3000 6000 0112 3456 7890 189\n"
+    "BIC : AGRIFRPP\n"
+)
+
+
+@pytest.fixture(autouse=True)
+def _model_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(supplier_model, "MODEL_DIR", str(tmp_path / "suppliers"))
+    monkeypatch.setattr(supplier_model, "SUPPLIER_MODEL_STORE", "json")
+    monkeypatch.setattr(supplier_model, "_STORE", None)
+
+
+def _write(json_dir, name: str, **data) -> None:
+    json_dir.mkdir(exist_ok=True)
+    (json_dir / name).write_text(json.dumps(data), encoding="utf-8")
+
+
+def test_normalization():
+    assert normalize_field("iban", " fr76 3000 6000 ") == "FR7630006000"
+    assert normalize_field("invoice_number", None) == ""
+    assert normalize_field("folders", [{"tour_nr": " 123 "}, "123", {"tour_nr": ""}, "45"]) == ["123", "45"]
+    assert normalize_field("vat_lines", [
+        {"rate": "20", "base": "1 000,00", "vat": "200"},
+        {"rate": "20,00", "base": "1000.00", "vat": "200,00"},
+        {"rate": "", "base": "abc", "vat": "5,5"},
+        "pas une ligne",
+    ]) == [("", "ABC", "5.50"), ("20.00", "1000.00", "200.00")]
+
+
+def test_diff_fields_ignores_formatting_only():
+    saved = {
+        "iban": "FR76 3000 6000 0112 3456 7890 189",
+        "bic": "agrifrpp",
+        "invoice_date": "12/03/2024",
+        "invoice_number": "F2024-0042",
+        "folders": [{"tour_nr": "123456789", "amount_ht_ocr": "10.00"}],
+        "vat_lines": [{"rate": "20", "base": "100,00", "vat": "20,00"}],
+    }
+    parsed = {
+        "iban": "FR7630006000011234567890189",
+        "bic": "AGRIFRPP",
+        "invoice_date": "12/03/2024",
+        "invoice_number": "F2024-0043",
+        "folders": [{"tour_nr": "123456789", "amount_ht_ocr": ""}],
+        "vat_lines": [{"rate": "20,00", "base": "100.00", "vat": "20"}],
+    }
+    assert diff_fields(saved, parsed) == {"invoice_number": {"saved": "F2024-0042", "parsed": "F2024-0043"}}
+
+
+def test_load_saved_invoices_filters(tmp_path):
+    d = tmp_path / "models"
+    _write(d, "a.json", status="validated", ocr_text=OCR_TEXT)
+    _write(d, "b.json", status="draft", ocr_text=OCR_TEXT)
+    _write(d, "c.json", status="validated", ocr_text="  ")
+    _write(d, "d.json", status="validated")
+    _write(d, "roi.json", status="validated", ocr_text=OCR_TEXT, ocr_mode="roi")   # extraits des zones
+    (d / "e.json").write_text("{", encoding="utf-8")
+    (d / "notes.txt").write_text("x", encoding="utf-8")
+
+    assert [n for n, _ in load_saved_invoices(str(d))] == ["a.json"]
+    assert [n for n, _ in load_saved_invoices(str(d), validated_only=False)] == ["a.json", "b.json"]
+
+
+def test_run_reparse_reports_accuracy_and_diffs(tmp_path):
+    d = tmp_path / "models"
+    _write(d, "ok.json", status="validated", ocr_text=OCR_TEXT,
+           iban="FR7630006000011234567890189", bic="AGRIFRPP", invoice_date="12/03/2024",
+           invoice_number="20240042", folders=[], vat_lines=[])
+    _write(d, "ko.json", status="validated", ocr_text=OCR_TEXT,
+           iban="FR7630006000011234567890189", bic="AGRIFRPP", invoice_date="13/03/2024",
+           invoice_number="20240042", folders=[], vat_lines=[])
+
+    report = run_reparse(load_saved_invoices(str(d)), workers=1)
+
+    assert report["documents"] == 2
+    assert report["errors"] == {}
+    assert list(report["diffs"]) == ["ko.json"]
+    assert set(report["diffs"]["ko.json"]) == {"invoice_date"}
+    assert report["accuracy"]["iban"] == 1.0
+    assert report["accuracy"]["invoice_date"] == 0.5
+    assert "total" in report["latency_ms"]
+
+
+def test_cli_writes_report(tmp_path, capsys):
+    d = tmp_path / "models"
+    _write(d, "a.json", status="validated", ocr_text=OCR_TEXT, iban="FR7630006000011234567890189")
+    out = tmp_path / "report.json"
+
+    assert main(["--json-dir", str(d), "--workers", "1", "--report", str(out)]) == 0
+    assert json.loads(out.read_text(encoding="utf-8"))["documents"] == 1
+    assert main(["--json-dir", str(tmp_path)]) == 1
+    capsys.readouterr()
+
+
+def test_percentile():
+    assert _pct([], 0.5) == 0.0
+    assert _pct([3.0, 1.0, 2.0], 0.5) == 2.0
+    assert _pct([1.0, 2.0, 3.0, 4.0], 0.95) == 4.0
@@ -0,0 +1,281 @@
+import threading
+
+import pytest
+
+pyodbc = pytest.importorskip("pyodbc")
+
+from db import connection
+from db.connection import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self, ping_ok: bool = True):
+        self.ping_ok = ping_ok
+        self.closed = False
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, *params):
+        if not self.conn.ping_ok:
+            raise pyodbc.Error("connexion perdue")
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    conns = []
+
+    def connect(conn_str):
+        conns.append(FakeConnection())
+        return conns[-1]
+
+    monkeypatch.setattr(connection.pyodbc, "connect", connect)
+    return conns
+
+
+def _pool(**kw) -> ConnectionPool:
+    params = {"min_size": 0, "max_size": 2, "idle_s": 0, "ping_after_s": 3600, "timeout_s": 0.2}
+    params.update(kw)
+    return ConnectionPool("DSN=test", **params)
+
+
+def test_checkout_reuses_idle_connection_and_commits(opened):
+    pool = _pool()
+    with pool.connection() as c1:
+        pass
+    with pool.connection() as c2:
+        pass
+
+    assert c1 is c2
+    assert len(opened) == 1
+    assert c1.commits == 2
+    s = pool.stats()
+    assert (s["checkouts"], s["created"], s["size"], s["idle"], s["in_use"]) == (2, 1, 1, 1, 0)
+
+
+def test_nested_use_in_same_thread_shares_connection(opened):
+    pool = _pool(max_size=1)
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+        assert outer.commits == 0          # la transaction reste à l'appelant
+    assert outer.commits == 1
+    assert pool.stats()["reused"] == 1
+
+
+def test_exception_rolls_back_and_keeps_connection(opened):
+    pool = _pool()
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError("boom")
+    assert conn.rollbacks == 1 and not conn.closed
+    assert pool.stats()["idle"] == 1
+
+
+def test_pyodbc_error_discards_connection(opened):
+    pool = _pool()
+    with pytest.raises(pyodbc.Error):
+        with pool.connection() as conn:
+            raise pyodbc.Error("état douteux")
+    assert conn.closed
+    s = pool.stats()
+    assert (s["discarded"], s["size"], s["idle"]) == (1, 0, 0)
+
+
+def test_full_pool_times_out(opened):
+    pool = _pool(max_size=1, timeout_s=0.05)
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.connection():
+            held.set()
+            release.wait(5)
+
+    t = threading.Thread(target=hold)
+    t.start()
+    try:
+        assert held.wait(5)
+        with pytest.raises(PoolTimeoutError):
+            with pool.connection():
+                pass
+    finally:
+        release.set()
+        t.join()
+
+    s = pool.stats()
+    assert s["size"] == 1
+    assert (s["timeouts"], s["waits"]) == (1, 1)     # attente en échec comptée
+    assert s["wait_s_max"] >= 0.05
+    with pool.connection():
+        pass
+
+
+def test_waiter_gets_connection_released_by_other_thread(opened):
+    pool = _pool(max_size=1, timeout_s=5)
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.connection():
+            held.set()
+            release.wait(5)
+
+    t = threading.Thread(target=hold)
+    t.start()
+    assert held.wait(5)
+    threading.Timer(0.05, release.set).start()
+    with pool.connection() as conn:
+        assert conn is opened[0]
+    t.join()
+
+    s = pool.stats()
+    assert s["waits"] == 1 and s["wait_s_max"] > 0
+    assert len(opened) == 1
+
+
+def test_failed_ping_replaces_connection(opened):
+    pool = _pool(ping_after_s=0)
+    with pool.connection() as first:
+        pass
+    first.ping_ok = False
+    with pool.connection() as second:
+        pass
+
+    assert second is not first and first.closed
+    assert pool.stats()["ping_failures"] == 1
+
+
+def test_idle_connections_evicted_down_to_min_size(opened, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(connection.time, "monotonic", lambda: now[0])
+    pool = _pool(min_size=1, max_size=3, idle_s=10)
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.connection():
+            held.set()
+            release.wait(5)
+
+    # 2 connexions ouvertes en même temps (une par thread), puis rendues
+    t = threading.Thread(target=hold)
+    t.start()
+    assert held.wait(5)
+    with pool.connection():
+        release.set()
+        t.join()
+    assert pool.stats()["idle"] == 2
+
+    now[0] += 60
+    with pool.connection():
+        pass
+
+    s = pool.stats()
+    assert s["evicted_idle"] == 1
+    assert (s["size"], s["idle"]) == (1, 1)
+    assert sum(c.closed for c in opened) == 1
+
+
+def test_close_all_closes_idle_connections(opened):
+    pool = _pool()
+    with pool.connection():
+        pass
+    pool.close_all()
+    assert all(c.closed for c in opened)
+    assert pool.stats()["size"] == 0
+
+
+def _lock_is_free(pool) -> bool:
+    """Vrai si un autre thread peut prendre le verrou du pool tout de suite."""
+    free = []
+
+    def probe():
+        if pool._cond.acquire(timeout=0.5):
+            pool._cond.release()
+            free.append(True)
+
+    t = threading.Thread(target=probe)
+    t.start()
+    t.join()
+    return bool(free)
+
+
+def test_connections_are_closed_outside_the_lock(opened, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(connection.time, "monotonic", lambda: now[0])
+    pool = _pool(idle_s=10)
+    closed_free = []
+    with pool.connection() as conn:
+        pass
+    conn.close = lambda: closed_free.append(_lock_is_free(pool))
+
+    now[0] += 60
+    with pool.connection():          # éviction au checkout
+        pass
+    with pool.connection() as other:
+        pass
+    other.close = lambda: closed_free.append(_lock_is_free(pool))
+    pool.close_all()
+
+    assert closed_free == [True, True]
+
+
+def test_idle_connections_evicted_without_checkout(opened):
+    pool = _pool(idle_s=0.05)
+    with pool.connection() as conn:
+        pass
+
+    for _ in range(100):
+        if conn.closed:
+            break
+        threading.Event().wait(0.02)
+    assert conn.closed
+    s = pool.stats()
+    assert (s["evicted_idle"], s["size"]) == (1, 0)
+
+    pool.close_all()
+    with pool.connection():          # l'éviction de fond repart avec la prochaine connexion
+        pass
+    assert pool._reaper.is_alive()
+    pool.close_all()
+
+
+def test_close_all_pools(opened, monkeypatch):
+    monkeypatch.setattr(connection, "_POOLS", {})
+    pools = [connection.get_pool("DSN=a"), connection.get_pool("DSN=b")]
+    for pool in pools:
+        with pool.connection():
+            pass
+
+    connection.close_all_pools()
+
+    assert all(c.closed for c in opened) and len(opened) == 2
+    assert [p.stats()["size"] for p in pools] == [0, 0]
+
+
+def test_get_pool_one_per_connection_string():
+    assert connection.get_pool("DSN=a") is connection.get_pool("DSN=a")
+    assert connection.get_pool("DSN=a") is not connection.get_pool("DSN=b")
@@ -0,0 +1,54 @@
+import pytest
+
+from ocr.invoice_parser import extract_folder_numbers
+from ocr.text_index import TextIndex
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Dossier 150123456", ["150123456"]),
+        ("Dossier 123456789", ["123456789"]),
+        ("Réf. 7851234567", ["7851234567"]),
+        ("Dossier 1 2345 6789", ["123456789"]),
+        ("Dossier 150-123-45", ["15012345"]),
+        ("Dossier 445 123 456", ["445123456"]),
+        # compacts d'abord, puis avec séparateurs
+        ("1 2345 6789 puis 150123456", ["150123456", "123456789"]),
+    ],
+)
+def test_folder_numbers(text, expected):
+    assert extract_folder_numbers(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        # préfixe coupé par un séparateur : téléphone / fax, pas un dossier
+        "Fax 44 57 24 28 86",
+        "Tél. 78 52 34 12 90",
+        # fin d'IBAN espacé
+        "IBAN DE78 5974 3071 1O24 0572 01",
+        "IBAN FR76 1503 1234 5678 9012 3456 789",
+        # jamais recollé à travers un retour ligne
+        "2506710166\n35093233",
+        # trop long / trop court
+        "1234567890",
+        "15012",
+    ],
+)
+def test_not_folder_numbers(text):
+    assert extract_folder_numbers(text) == []
+
+
+def test_occurrences_and_lines():
+    ix = TextIndex("Facture\nDossier 150123456 : 100,00\nRappel 150 123 456 et 123456789\n")
+    folders = ix.folders
+
+    assert folders.numbers() == ["150123456", "123456789"]
+    assert folders.lines_of("150123456") == [1, 2]
+    assert folders.first_line("123456789") == 2
+    assert folders.first_line("999999999") is None
+    assert [m.compact for m in folders.find("150123456")] == [True, False]
+    assert folders.line_has_other(2, "150123456")
+    assert not folders.line_has_other(1, "150123456")
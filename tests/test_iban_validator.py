@@ -0,0 +1,192 @@
+import pytest
+
+from ocr.iban_validator import (
+    BBAN_FORMATS,
+    IBAN_REPAIR_MAX_COST,
+    OCR_DIGIT_FOR_LETTER,
+    OCR_LETTER_FOR_DIGIT,
+    REPAIR_COST_CROSS,
+    _BBAN_CLASSES,
+    bban_structure_ok,
+    iban_length_ok,
+    iban_mod97,
+    repair_iban,
+    validate_iban,
+)
+
+# exemples du registre IBAN (un par pays décrit dans BBAN_FORMATS)
+VALID_IBANS = [
+    "AD1200012030200359100100",
+    "AT611904300234573201",
+    "BE68539007547034",
+    "BG80BNBG96611020345678",
+    "CH9300762011623852957",
+    "CY17002001280000001200527600",
+    "CZ6508000000192000145399",
+    "DE89370400440532013000",
+    "DK5000400440116243",
+    "EE382200221020145685",
+    "ES9121000418450200051332",
+    "FI2112345600000785",
+    "FR1420041010050500013M02606",
+    "GB82WEST12345698765432",
+    "GI75NWBK000000007099453",
+    "GR1601101250000000012300695",
+    "HR1210010051863000160",
+    "HU42117730161111101800000000",
+    "IE29AIBK93115212345678",
+    "IS140159260076545510730339",
+    "IT60X0542811101000000123456",
+    "LI21088100002324013AA",
+    "LT121000011101001000",
+    "LU280019400644750000",
+    "LV80BANK0000435195001",
+    "MC5811222000010123456789030",
+    "MT84MALT011000012345MTLCAST001S",
+    "NL91ABNA0417164300",
+    "NO9386011117947",
+    "PL61109010140000071219812874",
+    "PT50000201231234567890154",
+    "RO49AAAA1B31007593840000",
+    "SE4550000000058398257466",
+    "SI56263300012039086",
+    "SK3112000000198742637541",
+    "SM86U0322509800000000270100",
+    "VA59001123000012345678",
+]
+
+
+def _mod97_reference(iban: str) -> int:
+    rearranged = iban[4:] + iban[:4]
+    return int("".join(str(int(c, 36)) for c in rearranged)) % 97
+
+
+def _with_check_digits(country: str, bban: str) -> str:
+    check = 98 - _mod97_reference(f"{country}00{bban}")
+    return f"{country}{check:02d}{bban}"
+
+
+def _ocr_damaged(iban: str) -> str:
+    """
+    1er chiffre du BBAN remplacé par la lettre que l'OCR confond avec lui
+    (zone numérique : correction forcée ; zone alphanumérique : le chiffre est préféré).
+    """
+    classes = _BBAN_CLASSES[iban[:2]]
+    for i, cls in enumerate(classes, start=4):
+        if cls in "nc" and iban[i] in OCR_LETTER_FOR_DIGIT:
+            return iban[:i] + OCR_LETTER_FOR_DIGIT[iban[i]] + iban[i + 1:]
+    raise AssertionError(f"pas de chiffre confusable dans {iban}")
+
+
+def test_every_described_country_has_an_example():
+    assert {iban[:2] for iban in VALID_IBANS} == set(BBAN_FORMATS)
+
+
+@pytest.mark.parametrize("iban", VALID_IBANS)
+def test_valid_ibans(iban):
+    assert iban_mod97(iban) == _mod97_reference(iban) == 1
+    assert iban_length_ok(iban)
+    assert bban_structure_ok(iban)
+    assert validate_iban(iban)
+    assert repair_iban(iban) == iban
+
+
+@pytest.mark.parametrize("iban", VALID_IBANS)
+def test_bad_checksum(iban):
+    last = iban[-1]
+    bad = iban[:-1] + ("0" if last != "0" else "1") if last.isdigit() else iban[:-1] + ("A" if last != "A" else "B")
+    assert not validate_iban(bad)
+
+
+@pytest.mark.parametrize("iban", VALID_IBANS)
+def test_bad_length(iban):
+    assert not iban_length_ok(iban[:-1])
+    assert not validate_iban(iban[:-1])
+    assert not validate_iban(iban + "0")
+
+
+def _kept_letters(iban: str) -> int:
+    """Lettres confusables à garder en zone alphanumérique (coût REPAIR_COST_CROSS chacune)."""
+    classes = _BBAN_CLASSES[iban[:2]]
+    return sum(1 for i, cls in enumerate(classes, start=4) if cls == "c" and iban[i] in OCR_DIGIT_FOR_LETTER)
+
+
+@pytest.mark.parametrize("iban", [i for i in VALID_IBANS if not i.startswith("MT")])
+def test_repair_ocr_letter_in_digit_zone(iban):
+    damaged = _ocr_damaged(iban)
+    assert not validate_iban(damaged)
+    budget = max(IBAN_REPAIR_MAX_COST, _kept_letters(iban) * REPAIR_COST_CROSS)
+    assert repair_iban(damaged, max_cost=budget) == iban
+    if budget == IBAN_REPAIR_MAX_COST:
+        assert repair_iban(damaged) == iban
+
+
+def test_repair_refuses_when_many_letters_must_be_kept():
+    # compte maltais "MTLCAST001S" : 6 lettres lisibles aussi en chiffres -> trop de chemins, pas de devinette
+    iban = "MT84MALT011000012345MTLCAST001S"
+    assert _kept_letters(iban) == 6
+    damaged = _ocr_damaged(iban)
+    assert repair_iban(damaged) == ""
+    assert repair_iban(damaged, max_cost=6) == ""
+
+
+def test_validate_normalizes_spaces_and_case():
+    assert validate_iban("de89 3704 0044 0532 0130 00")
+    assert not validate_iban("")
+    assert not validate_iban(None)
+
+
+def test_bban_structure_rejects_checksum_valid_letters():
+    # mod 97 correct, mais lettre dans un BBAN allemand (chiffres uniquement)
+    iban = _with_check_digits("DE", "37040044053201300A")
+    assert iban_mod97(iban) == 1
+    assert not bban_structure_ok(iban)
+    assert not validate_iban(iban)
+
+
+def test_unknown_country_uses_generic_bounds():
+    assert iban_length_ok("XX" + "0" * 13)
+    assert iban_length_ok("XX" + "0" * 32)
+    assert not iban_length_ok("XX" + "0" * 12)
+    assert not iban_length_ok("XX" + "0" * 33)
+
+
+def test_repair_strips_separators():
+    assert repair_iban("DE89 37O4-0044 0532 0130 00") == "DE89370400440532013000"
+
+
+def test_repair_keeps_letter_when_needed_in_alnum_zone():
+    # "M" du compte français : zone alphanumérique, aucune confusion -> gardé tel quel
+    assert repair_iban("FR1420041010050500013M0260G") == "FR1420041010050500013M02606"
+
+
+def test_repair_cost_budget():
+    # chiffre lu pour un autre chiffre (3 -> 8) : correction au choix de coût 3, hors budget par défaut
+    damaged = "DE89870400440532013000"
+    assert repair_iban(damaged) == ""
+    assert repair_iban(damaged, max_cost=3) == "DE89370400440532013000"
+
+
+def test_repair_ambiguous_returns_empty():
+    # deux corrections différentes au même coût passent le mod 97
+    damaged = "DE89310400440532013000"
+    for fixed in ("DE89370400440532013000", "DE89310400440632013000"):
+        assert validate_iban(fixed)
+    assert repair_iban(damaged, max_cost=3) == ""
+
+
+def test_repair_expansion_cap():
+    assert repair_iban("DE89870400440532013000", max_cost=3, max_expansions=10) == ""
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "DE8937040044053201300",        # longueur du pays fausse
+        "BR1500000000000010932840814P3",  # pays sans structure BBAN décrite (checksum faux)
+        "DE89370400440532013000!",
+        "",
+    ],
+)
+def test_repair_refuses(text):
+    assert repair_iban(text) == ""
@@ -0,0 +1,126 @@
+"""
+LabelIndex (une passe) comparé aux regex label par label qu'il remplace dans les extracteurs.
+"""
+import random
+import re
+
+import pytest
+
+from ocr.invoice_parser import INVOICE_TOKEN_RE
+from ocr.label_index import LabelConfig, LabelIndex
+from ocr.text_index import TextIndex
+
+# regex d'origine (invoice_parser / supplier_index avant l'index de labels)
+IBAN_LABEL_RE = re.compile(r"\bIBAN\b", re.IGNORECASE)
+BIC_LABEL_RES = [
+    re.compile(r"\bBIC\b", re.IGNORECASE),
+    re.compile(r"\bSWIFT\b", re.IGNORECASE),
+    re.compile(r"\bB\.?I\.?C\b", re.IGNORECASE),
+]
+INVOICE_LABEL_RE = re.compile(
+    r"\b(N[°O]\s*FACTURE|FACTURE\s*(N[°O]|NO\.?)|INVOICE\s*(NO\.?|NUMBER)|INV\.?\s*NO\.?)\b",
+    re.IGNORECASE,
+)
+BASE_LABEL_RE = re.compile(r"(BASE\s*HT|TOTAL\s*HT|TOTAL\s*HT\s*NET)", re.IGNORECASE)
+VAT_LABEL_RE = re.compile(r"(MONTANT\s*TVA|TOTAL\s*TVA)", re.IGNORECASE)
+RATE_LABEL_RE = re.compile(r"(\bTAUX\b|%?\s*TVA\b)", re.IGNORECASE)
+VAT_BLOCK_HINT_RE = re.compile(r"(MONTANT\s*TVA|TOTAL\s*TVA|TAUX|BASE\s*HT|TVA)", re.IGNORECASE)
+
+FRAGMENTS = [
+    "IBAN", "IBAN:", "XIBAN", "IBANS", "BIC", "BIC:", "SWIFT", "SWIFTBIC", "B.I.C", "B.IC", "BI.C", "BICS",
+    "N° FACTURE", "NO FACTURE", "N°FACTURE", "FACTURE N°", "FACTURE NO.", "FACTURENO", "INVOICE NO",
+    "INVOICE  NUMBER", "INV. NO.", "INV NO", "BASE HT", "BASEHT", "TOTAL HT", "TOTAL HT NET", "MONTANT TVA",
+    "TOTAL  TVA", "TOTALTVA", "TAUX", "TAUXTVA", "% TVA", "TVA", "TVAS", "FR76", "1234", "20,00", "-", ":",
+    "facture n°", "iban", "Swift", "x", "é", " ",
+]
+
+
+def _random_text(rng: random.Random) -> str:
+    lines = []
+    for _ in range(rng.randint(1, 8)):
+        parts = [rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 6))]
+        lines.append(rng.choice(["", " ", "  "]).join(parts))
+    return "\n".join(lines)
+
+
+CORPUS = [
+    "IBAN : FR76 3000 6000 0112 3456 7890 189\nBIC : AGRIFRPP",
+    "Code SWIFT BNPAFRPP - B.I.C. BNPAFRPP",
+    "Facture N° F-2024-001 du 01/02/2024",
+    "N°FACTURE\n12345",
+    "Invoice number: INV-42",
+    "Base HT   1 000,00\nTaux 20 %\nMontant TVA 200,00\nTotal HT net 1 000,00",
+    "TOTALTVA 20,00 % TVA",
+] + [_random_text(random.Random(seed)) for seed in range(300)]
+CORPUS_IDS = [f"doc{i}" for i in range(len(CORPUS))]
+
+
+def _line_hits(ix: TextIndex, rx: "re.Pattern") -> list:
+    return [i for i, ln in enumerate(ix.lines) if rx.search(ln)]
+
+
+@pytest.mark.parametrize("text", CORPUS, ids=CORPUS_IDS)
+def test_iban_positions(text):
+    ix = TextIndex(text)
+    expected = [(m.start(), m.end()) for m in IBAN_LABEL_RE.finditer(ix.upper_sp)]
+    assert [(m.start, m.end) for m in ix.labels.find("iban")] == expected
+
+
+@pytest.mark.parametrize("text", CORPUS, ids=CORPUS_IDS)
+def test_bic_priority_order(text):
+    # ancienne boucle : labels dans l'ordre (BIC, SWIFT, B.I.C), occurrences dans l'ordre du texte
+    ix = TextIndex(text)
+    expected = []
+    for entry, rx in enumerate(BIC_LABEL_RES):
+        expected += [(entry, m.start(), m.end()) for m in rx.finditer(ix.flat)]
+    assert [(m.entry, m.start, m.end) for m in ix.labels.by_priority("bic")] == expected
+
+
+@pytest.mark.parametrize("text", CORPUS, ids=CORPUS_IDS)
+def test_invoice_number_lines(text):
+    ix = TextIndex(text)
+    labels = ix.labels
+    assert labels.lines_with("invoice_number") == _line_hits(ix, INVOICE_LABEL_RE)
+    for i in labels.lines_with("invoice_number"):
+        m = labels.first_in_line("invoice_number", i)
+        old_end = INVOICE_LABEL_RE.search(ix.lines[i]).end()
+        new_end = m.end - ix.line_starts[i]
+        # "FACTURE NO.X" : l'ancienne regex s'arrêtait avant le point, l'index prend le label le plus long ;
+        # les jetons lus après le label (extract_invoice_number) sont les mêmes
+        assert new_end - old_end in (0, 1)
+        after_old, after_new = ix.lines[i][old_end:], ix.lines[i][new_end:]
+        assert INVOICE_TOKEN_RE.findall(after_new) == INVOICE_TOKEN_RE.findall(after_old)
+
+
+@pytest.mark.parametrize("text", CORPUS, ids=CORPUS_IDS)
+def test_vat_table_lines(text):
+    ix = TextIndex(text)
+    labels = ix.labels
+    assert labels.first_line("base") == next(iter(_line_hits(ix, BASE_LABEL_RE)), None)
+    assert labels.first_line("vat_total") == next(iter(_line_hits(ix, VAT_LABEL_RE)), None)
+    assert labels.lines_with("rate") == _line_hits(ix, RATE_LABEL_RE)
+    assert labels.lines_with("vat_hint") == _line_hits(ix, VAT_BLOCK_HINT_RE)
+
+
+def test_overlapping_labels_all_reported():
+    ix = TextIndex("TOTAL TVA 20,00")
+    assert [(m.label, m.start) for m in ix.labels.find("vat_total")] == [("TOTAL TVA", 0)]
+    assert [m.start for m in ix.labels.find("vat_hint")] == [6]
+
+
+def test_label_across_lines_has_no_line():
+    ix = TextIndex("BASE\nHT 100,00")
+    [m] = ix.labels.find("base")
+    assert m.line == -1
+    assert ix.labels.lines_with("base") == []
+
+
+def test_extra_labels_config():
+    config = LabelConfig({
+        "invoice_number": [["RECHNUNGSNUMMER", "FACTURA N°"]],
+        "base": [{"text": "NETTO", "left": True}],
+    })
+    ix = TextIndex("Rechnungsnummer 42\nNetto 10,00\nNETTOBETRAG")
+    labels = LabelIndex(ix, config)
+    assert labels.lines_with("invoice_number") == [0]
+    assert labels.lines_with("base") == [1]
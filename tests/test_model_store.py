@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+
+import pytest
+
+from ocr.model_store import JsonModelStore, SqliteModelStore
+
+KEY = "FR7630006000011234567890189_AGRIFRPP"
+OTHER = "DE89370400440532013000_COBADEFF"
+
+
+def _model(key: str, **extra) -> dict:
+    iban, _, bic = key.partition("_")
+    data = {"supplier_key": key, "iban": iban, "bic": bic, "patterns": {}}
+    data.update(extra)
+    return data
+
+
+def _rule(regex: str, hits: int = 1) -> dict:
+    return {"mode": "line_regex", "regex": regex, "group": 1, "hit_count": hits}
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "json":
+        return JsonModelStore(str(tmp_path / "models"))
+    return SqliteModelStore(str(tmp_path / "models.sqlite3"))
+
+
+def test_get_put_keys(store):
+    assert store.get(KEY) is None
+    assert store.stamp(KEY) is None
+    store.put(KEY, _model(KEY, date_example="01/02/2024"))
+    assert store.get(KEY)["date_example"] == "01/02/2024"
+    assert store.keys() == [KEY]
+
+
+def test_json_keys_ignore_other_json_files(tmp_path):
+    store = JsonModelStore(str(tmp_path / "models"))
+    store.put(KEY, _model(KEY))
+    (tmp_path / "models" / "supplier_index.json").write_text(json.dumps({"version": 1, "docs": {}}), encoding="utf-8")
+    (tmp_path / "models" / "notes.json").write_text("{}", encoding="utf-8")
+
+    assert store.keys() == [KEY]
+
+    db = SqliteModelStore(str(tmp_path / "models.sqlite3"))
+    assert db.import_json_dir(store.model_dir) == 1
+    assert db.keys() == [KEY]
+
+
+def test_update_merges_with_current_version(store):
+    store.put(KEY, _model(KEY, patterns={"iban": [_rule("A")]}))
+
+    def add_rule(current):
+        data = dict(current)
+        data["patterns"] = {"iban": current["patterns"]["iban"] + [_rule("B")]}
+        return data
+
+    out = store.update(KEY, add_rule)
+    assert [r["regex"] for r in out["patterns"]["iban"]] == ["A", "B"]
+    assert store.get(KEY) == out
+
+
+def test_update_of_missing_model_starts_empty(store):
+    seen = []
+    store.update(KEY, lambda current: seen.append(current) or _model(KEY))
+    assert seen == [{}]
+    assert store.get(KEY)["supplier_key"] == KEY
+
+
+def test_concurrent_updates_are_not_lost(store):
+    store.put(KEY, _model(KEY, count=0))
+
+    def worker():
+        for _ in range(10):
+            store.update(KEY, lambda current: {**current, "count": current["count"] + 1})
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.get(KEY)["count"] == 80
+
+
+def test_json_concurrent_puts_use_their_own_temp_file(tmp_path):
+    store = JsonModelStore(str(tmp_path / "models"))
+    errors = []
+
+    def worker(n):
+        try:
+            for _ in range(20):
+                store.put(KEY, _model(KEY, writer=n))
+        except Exception as e:     # tmp partagé : FileNotFoundError sur os.replace
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert store.get(KEY)["writer"] in range(4)
+    assert os.listdir(store.model_dir) == [f"{KEY}.json"]
+
+
+def test_sqlite_version_stamp(tmp_path):
+    store = SqliteModelStore(str(tmp_path / "models.sqlite3"))
+    store.put(KEY, _model(KEY))
+    assert store.stamp(KEY) == 1
+    store.update(KEY, lambda current: current)
+    assert store.stamp(KEY) == 2
+
+
+def test_sqlite_failed_update_rolls_back(tmp_path):
+    store = SqliteModelStore(str(tmp_path / "models.sqlite3"))
+    store.put(KEY, _model(KEY, patterns={"iban": [_rule("A")]}))
+
+    def boom(current):
+        raise RuntimeError("fusion impossible")
+
+    with pytest.raises(RuntimeError):
+        store.update(KEY, boom)
+    assert store.stamp(KEY) == 1
+    assert store.get(KEY)["patterns"]["iban"][0]["regex"] == "A"
+    # la connexion du thread reste utilisable (transaction terminée)
+    store.update(KEY, lambda current: {**current, "ok": True})
+    assert store.get(KEY)["ok"] is True
+
+
+def test_sqlite_rule_table_follows_model(tmp_path):
+    store = SqliteModelStore(str(tmp_path / "models.sqlite3"))
+    store.put(KEY, _model(KEY, patterns={"iban": [_rule("A", hits=1), _rule("B", hits=5)]}))
+    store.put(OTHER, _model(OTHER, patterns={"bic": [_rule("C", hits=3)]}))
+
+    assert store.stale_rules(1) == [(KEY, "iban", "line_regex", 1)]
+    assert store.suppliers_without_rule("iban") == [OTHER]
+
+    # réécriture : les règles retirées du modèle disparaissent de la table
+    store.update(KEY, lambda current: {**current, "patterns": {"iban": [_rule("B", hits=6)]}})
+    assert store.stale_rules(1) == []
+    assert store.suppliers_by_iban("fr7630006000011234567890189") == [KEY]
+    assert store.suppliers_by_bic("COBADEFF") == [OTHER]
+
+
+def test_sqlite_shared_bics(tmp_path):
+    store = SqliteModelStore(str(tmp_path / "models.sqlite3"))
+    other_same_bic = "FR1420041010050500013M02606_AGRIFRPP"
+    for key in (KEY, OTHER, other_same_bic):
+        store.put(key, _model(key))
+    assert store.shared_bics() == {"AGRIFRPP": sorted([KEY, other_same_bic])}
+
+
+def test_sqlite_import_json_dir(tmp_path):
+    json_dir = tmp_path / "json"
+    src = JsonModelStore(str(json_dir))
+    src.put(KEY, _model(KEY, patterns={"iban": [_rule("A")]}))
+    src.put(OTHER, _model(OTHER, date_example="json"))
+    (json_dir / "broken.json").write_text("{pas du json", encoding="utf-8")
+    (json_dir / "list.json").write_text(json.dumps([1, 2]), encoding="utf-8")
+
+    store = SqliteModelStore(str(tmp_path / "models.sqlite3"))
+    store.put(OTHER, _model(OTHER, date_example="sqlite"))
+
+    # modèles déjà présents gardés, fichiers illisibles / non dict ignorés
+    assert store.import_json_dir(str(json_dir)) == 1
+    assert store.keys() == sorted([KEY, OTHER])
+    assert store.get(OTHER)["date_example"] == "sqlite"
+    assert store.get(KEY) == src.get(KEY)
+
+    assert store.import_json_dir(str(json_dir), overwrite=True) == 2
+    assert store.get(OTHER)["date_example"] == "json"
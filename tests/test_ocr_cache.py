@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+
+from ocr import ocr_cache
+from ocr.ocr_cache import OcrCache
+
+
+def _set_mtime(cache: OcrCache, key: str, t: float) -> None:
+    os.utime(cache._path(key), (t, t))
+
+
+def _keys(cache: OcrCache) -> set:
+    return {n[:-5] for n in os.listdir(cache.cache_dir) if n.endswith(".json")}
+
+
+def test_roundtrip(tmp_path):
+    cache = OcrCache(str(tmp_path), 0)
+    assert cache.get("k") is None
+    cache.put("k", {2: "page 3", 0: "page 1"}, {"dpi": 200})
+    assert cache.get("k") == {0: "page 1", 2: "page 3"}
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".tmp")]
+
+
+def test_key_depends_on_content_and_params(tmp_path):
+    a = tmp_path / "a.pdf"
+    b = tmp_path / "renamed.pdf"
+    c = tmp_path / "other.pdf"
+    a.write_bytes(b"%PDF-1.4 same")
+    b.write_bytes(b"%PDF-1.4 same")
+    c.write_bytes(b"%PDF-1.4 other")
+
+    assert OcrCache.file_hash(str(a)) == OcrCache.file_hash(str(b)) != OcrCache.file_hash(str(c))
+    h = OcrCache.file_hash(str(a))
+    assert OcrCache.make_key(h, {"dpi": 200, "lang": "fra"}) == OcrCache.make_key(h, {"lang": "fra", "dpi": 200})
+    assert OcrCache.make_key(h, {"dpi": 200}) != OcrCache.make_key(h, {"dpi": 300})
+
+
+def test_key_depends_on_format_version(monkeypatch):
+    key = OcrCache.make_key("abc", {"dpi": 200})
+    monkeypatch.setattr(ocr_cache, "CACHE_FORMAT_VERSION", ocr_cache.CACHE_FORMAT_VERSION + 1)
+    assert OcrCache.make_key("abc", {"dpi": 200}) != key
+
+
+def test_concurrent_writes_of_the_same_key(tmp_path):
+    cache = OcrCache(str(tmp_path), 0)
+    errors = []
+
+    def write(n):
+        try:
+            for _ in range(20):
+                cache.put("k", {0: f"page {n}"})
+        except Exception as e:     # tmp partagé : FileNotFoundError sur os.replace
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert cache.get("k")[0].startswith("page ")
+    assert os.listdir(tmp_path) == ["k.json"]
+
+
+def test_unreadable_entries(tmp_path):
+    cache = OcrCache(str(tmp_path), 0)
+    (tmp_path / "broken.json").write_text("{", encoding="utf-8")
+    (tmp_path / "badidx.json").write_text(json.dumps({"pages": {"x": "p"}}), encoding="utf-8")
+
+    assert cache.get("broken") is None
+    assert cache.get("badidx") is None
+
+
+def test_lru_eviction(tmp_path):
+    cache = OcrCache(str(tmp_path), 0)
+    for i, key in enumerate(("a", "b", "c")):
+        cache.put(key, {0: "x" * 1000})
+        _set_mtime(cache, key, 1_000_000 + i)
+    size = os.path.getsize(cache._path("a"))
+
+    # "a" relu : devient le plus récent ; "b" est alors le moins récemment utilisé
+    assert cache.get("a") is not None
+    cache.max_bytes = 3 * size
+    cache.put("d", {0: "x" * 1000})
+
+    assert _keys(cache) == {"a", "c", "d"}
+
+
+def test_eviction_stops_under_limit(tmp_path):
+    cache = OcrCache(str(tmp_path), 0)
+    for i, key in enumerate(("a", "b", "c", "d")):
+        cache.put(key, {0: "x" * 1000})
+        _set_mtime(cache, key, 1_000_000 + i)
+    size = os.path.getsize(cache._path("a"))
+
+    cache.max_bytes = 2 * size
+    cache.evict()
+    assert _keys(cache) == {"c", "d"}
+
+
+def test_no_eviction_without_limit(tmp_path):
+    cache = OcrCache(str(tmp_path), 0)
+    for key in ("a", "b", "c"):
+        cache.put(key, {0: "x" * 1000})
+    assert _keys(cache) == {"a", "b", "c"}
@@ -0,0 +1,196 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("pytesseract")
+pytest.importorskip("pdf2image")
+
+from ocr import ocr_engine
+from ocr.ocr_cache import OcrCache
+from ocr.ocr_engine import PageText, _page_runs, extract_pages_from_pdf, pages_to_text
+
+
+def _native_pdf(path, pages) -> str:
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page()
+        page.insert_text((50, 72), text, fontsize=10)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_page_runs():
+    assert _page_runs([]) == []
+    assert _page_runs([3]) == [[3]]
+    assert _page_runs([0, 1, 2, 5, 6, 9]) == [[0, 1, 2], [5, 6], [9]]
+
+
+def test_native_pages_skip_ocr(tmp_path):
+    texts = [
+        "FACTURE F2024-0042 page une, couche texte native exploitable",
+        "CONDITIONS GENERALES page deux, couche texte native exploitable",
+    ]
+    pdf = _native_pdf(tmp_path / "native.pdf", texts)
+
+    pages = extract_pages_from_pdf(pdf, workers=1, use_cache=False)
+
+    assert [p.source for p in pages] == ["native", "native"]
+    assert [p.index for p in pages] == [0, 1]
+    assert [p.text.strip() for p in pages] == texts
+
+
+def test_missing_pdf():
+    with pytest.raises(FileNotFoundError):
+        extract_pages_from_pdf("/nonexistent/facture.pdf")
+
+
+def test_pages_to_text_native_keeps_raw_text():
+    pages = [PageText(0, "page 1\n", "native"), PageText(1, "page 2\n", "native")]
+    assert pages_to_text(pages) == "page 1\npage 2"
+
+
+def test_pages_to_text_separators_once_a_page_is_ocr():
+    pages = [PageText(0, " natif \n", "native"), PageText(1, "scan", "ocr"), PageText(2, "relu", "cache")]
+    assert pages_to_text(pages) == (
+        "===== PAGE 1 =====\nnatif\n\n===== PAGE 2 =====\nscan\n\n===== PAGE 3 =====\nrelu"
+    )
+
+
+def test_render_page_in_memory_at_ocr_dpi(tmp_path):
+    pdf = _native_pdf(tmp_path / "a4.pdf", ["x"])
+    with fitz.open(pdf) as doc:
+        width_pt, height_pt = doc[0].rect.width, doc[0].rect.height
+        image = ocr_engine._render_page(doc, 0, 144)
+    assert image.mode == "RGB"
+    assert image.size == (round(width_pt * 2), round(height_pt * 2))
+
+
+def test_only_pages_without_text_layer_are_ocr(tmp_path, monkeypatch):
+    texts = ["FACTURE F2024-0042 couche texte native, largement plus de trente caracteres " * 2, "", "CGV " * 20]
+    pdf = _native_pdf(tmp_path / "mixed.pdf", texts)
+    monkeypatch.setattr(ocr_engine, "OCR_RASTERIZER", "fitz")
+    monkeypatch.setattr(ocr_engine, "_ocr_page_image", lambda image: f"OCR {image.size[0]}")
+
+    pages = extract_pages_from_pdf(pdf, workers=1, use_cache=False)
+
+    assert [p.source for p in pages] == ["native", "ocr", "native"]
+    assert pages[1].text.startswith("OCR ")
+    assert pages_to_text(pages).count("===== PAGE") == 3
+
+
+def _table_page(w: int = 1700, h: int = 600) -> "Image.Image":
+    # fond blanc, un trait horizontal et un trait vertical (tableau), des "lettres" (petits blocs)
+    gray = np.full((h, w), 245, dtype=np.uint8)
+    gray[300:304, 50:w - 50] = 10
+    gray[50:h - 50, 800:803] = 10
+    for x in range(100, 700, 40):
+        gray[100:120, x:x + 12] = 20
+    return Image.fromarray(gray).convert("RGB")
+
+
+@pytest.mark.parametrize("with_cv2", [True, False])
+def test_preprocess_removes_table_lines_keeps_text(monkeypatch, with_cv2):
+    if with_cv2 and ocr_engine.cv2 is None:
+        pytest.skip("OpenCV absent")
+    if not with_cv2:
+        monkeypatch.setattr(ocr_engine, "cv2", None)
+
+    out = np.asarray(ocr_engine._preprocess_image_for_ocr(_table_page()))
+
+    assert out[302, 60:1640].min() == 255          # trait horizontal effacé
+    assert out[60:540, 801].min() == 255           # trait vertical effacé
+    assert (out[100:120, 100:112] == 0).mean() > 0.9  # "lettre" conservée
+
+
+def test_preprocess_result_does_not_share_buffers():
+    first = ocr_engine._preprocess_image_for_ocr(_table_page())
+    snapshot = np.asarray(first).copy()
+    ocr_engine._preprocess_image_for_ocr(Image.new("RGB", (1700, 600), "black"))
+    assert np.array_equal(np.asarray(first), snapshot)
+
+
+def test_otsu_threshold_matches_opencv():
+    cv2 = ocr_engine.cv2
+    if cv2 is None:
+        pytest.skip("OpenCV absent")
+    rng = np.random.default_rng(7)
+    for _ in range(20):
+        gray = np.concatenate([
+            rng.normal(rng.integers(20, 90), 15, 4000),
+            rng.normal(rng.integers(150, 240), 15, 12000),
+        ]).clip(0, 255).astype(np.uint8).reshape(80, 200)
+        expected, _ = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        assert ocr_engine._otsu_threshold(gray) == int(expected)
+
+
+def test_numpy_opening_keeps_only_long_segments():
+    bw = np.zeros((3, 20), dtype=bool)
+    bw[0, 2:12] = True    # 10 px : gardé
+    bw[1, 5:9] = True     # 4 px : supprimé
+    bw[2, 0:20] = True    # ligne entière : gardée
+    out = ocr_engine._np_open_1d(bw, 6, 1)
+    assert np.array_equal(out, np.array([bw[0], np.zeros(20, bool), bw[2]]))
+    assert np.array_equal(ocr_engine._np_open_1d(bw.T, 6, 0), out.T)
+    assert not ocr_engine._np_open_1d(bw, 21, 1).any()
+
+
+@pytest.fixture
+def ocr_stub(tmp_path, monkeypatch):
+    """OCR simulé (compte les pages OCRisées) + cache OCR dans un dossier de test."""
+    calls = []
+
+    def fake_ocr(image):
+        calls.append(image.size)
+        return f"OCR page {len(calls)}"
+
+    monkeypatch.setattr(ocr_engine, "OCR_RASTERIZER", "fitz")
+    monkeypatch.setattr(ocr_engine, "_ocr_page_image", fake_ocr)
+    monkeypatch.setattr(ocr_engine, "_ocr_cache", OcrCache(str(tmp_path / "cache"), 0))
+    return calls
+
+
+def _scanned_pdf(tmp_path) -> str:
+    return _native_pdf(tmp_path / "scan.pdf", ["FACTURE couche texte native, plus de cent caracteres " * 3, "", ""])
+
+
+def test_stream_yields_pages_in_order_and_fills_cache(tmp_path, ocr_stub):
+    pdf = _scanned_pdf(tmp_path)
+
+    pages = list(ocr_engine.iter_pages_from_pdf(pdf, workers=1))
+    assert [(p.index, p.source) for p in pages] == [(0, "native"), (1, "ocr"), (2, "ocr")]
+    assert len(ocr_stub) == 2
+
+    again = list(ocr_engine.iter_pages_from_pdf(pdf, workers=1))
+    assert [p.source for p in again] == ["native", "cache", "cache"]
+    assert [p.text for p in again[1:]] == [p.text for p in pages[1:]]
+    assert len(ocr_stub) == 2
+
+
+def test_stream_closed_early_does_not_write_cache(tmp_path, ocr_stub):
+    pdf = _scanned_pdf(tmp_path)
+
+    stream = ocr_engine.iter_pages_from_pdf(pdf, workers=1)
+    assert next(stream).source == "native"
+    assert next(stream).source == "ocr"
+    stream.close()
+
+    assert len(ocr_stub) == 1
+    assert [p.source for p in ocr_engine.iter_pages_from_pdf(pdf, workers=1)] == ["native", "ocr", "ocr"]
+
+
+def test_unreadable_pdf_is_cached_under_the_poppler_key(tmp_path, ocr_stub, monkeypatch):
+    pdf = tmp_path / "broken.pdf"
+    pdf.write_bytes(b"%PDF-1.4 pas lisible par fitz")
+    monkeypatch.setattr(ocr_engine, "convert_from_path", lambda *a, **kw: ["p1.png", "p2.png"])
+    monkeypatch.setattr(ocr_engine, "_ocr_page_files", lambda paths, workers: [f"OCR {p}" for p in paths])
+
+    pages = list(ocr_engine.iter_pages_from_pdf(str(pdf), workers=1))
+    assert [(p.source, p.text) for p in pages] == [("ocr", "OCR p1.png"), ("ocr", "OCR p2.png")]
+
+    pdf_hash = OcrCache.file_hash(str(pdf))
+    cache = ocr_engine._ocr_cache
+    assert cache.get(OcrCache.make_key(pdf_hash, ocr_engine._ocr_params("poppler"))) is not None
+    assert cache.get(OcrCache.make_key(pdf_hash, ocr_engine._ocr_params())) is None   # OCR_RASTERIZER=fitz
+    assert [p.source for p in ocr_engine.iter_pages_from_pdf(str(pdf), workers=1)] == ["cache", "cache"]
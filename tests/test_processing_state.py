@@ -0,0 +1,85 @@
+import pytest
+
+pytest.importorskip("pyodbc")
+
+from services.processing_state import MAX_MISSING_SHOWN, ProcessingState, ProcessingStateService
+
+IBAN = "FR76 3000 6000 0112 3456 7890 189"
+BIC = "agrifrpp"
+
+
+class FakeTransporterRepo:
+    def __init__(self, known, error=None):
+        self.known = known
+        self.error = error
+        self.calls = []
+
+    def find_transporters_by_banks(self, pairs):
+        self.calls.append(list(pairs))
+        if self.error:
+            raise self.error
+        return {k: {"transporter_id": 1} for k in self.known}
+
+
+class FakeTourRepo:
+    def __init__(self, existing, error=None):
+        self.existing = set(existing)
+        self.error = error
+        self.calls = []
+
+    def get_existing_tournrs_in_xxatour(self, tournrs):
+        self.calls.append(list(tournrs))
+        if self.error:
+            raise self.error
+        return self.existing & set(tournrs)
+
+
+KNOWN = [("FR7630006000011234567890189", "AGRIFRPP")]
+
+
+def test_one_query_each_for_the_whole_batch():
+    transporters = FakeTransporterRepo(KNOWN)
+    tours = FakeTourRepo({"123456789", "150123456"})
+    rows = [
+        (IBAN, BIC, ["123456789"]),
+        ("DE89370400440532013000", "COBADEFF", ["999999999"]),
+        (IBAN, BIC, [" 150123456", "123456789"]),
+        (IBAN, BIC, ["150123456", "555555555"]),
+    ]
+
+    states = ProcessingStateService(transporters, tours).validate(rows)
+
+    assert [s.state for s in states] == ["ok", "error", "ok", "error"]
+    assert "Transporteur introuvable" in states[1].tooltip
+    assert states[3].tooltip.endswith("555555555")
+    assert len(transporters.calls) == 1 and len(transporters.calls[0]) == 4
+    # dossiers des lignes au transporteur inconnu : pas interrogés
+    assert tours.calls == [["123456789", "150123456", "555555555"]]
+
+
+def test_missing_folders_tooltip_is_truncated():
+    missing = [f"{n:09d}" for n in range(100000000, 100000000 + MAX_MISSING_SHOWN + 2)]
+    states = ProcessingStateService(FakeTransporterRepo(KNOWN), FakeTourRepo(set())).validate([(IBAN, BIC, missing)])
+
+    assert states[0].state == "error"
+    assert states[0].tooltip.endswith(" (+2)")
+    assert missing[MAX_MISSING_SHOWN - 1] in states[0].tooltip
+    assert missing[MAX_MISSING_SHOWN] not in states[0].tooltip
+
+
+def test_sql_errors_mark_rows_in_error():
+    rows = [(IBAN, BIC, ["123456789"]), ("DE89370400440532013000", "COBADEFF", ["123456789"])]
+
+    states = ProcessingStateService(FakeTransporterRepo(KNOWN, RuntimeError("timeout")), FakeTourRepo(set())).validate(rows)
+    assert states == [ProcessingState("error", "Erreur SQL transporteur: timeout")] * 2
+
+    tours = FakeTourRepo(set(), RuntimeError("deadlock"))
+    states = ProcessingStateService(FakeTransporterRepo(KNOWN), tours).validate(rows)
+    assert states[0] == ProcessingState("error", "Erreur SQL xxatour: deadlock")
+    assert "Transporteur introuvable" in states[1].tooltip
+
+
+def test_empty_batch_makes_no_query():
+    transporters, tours = FakeTransporterRepo(KNOWN), FakeTourRepo(set())
+    assert ProcessingStateService(transporters, tours).validate([]) == []
+    assert transporters.calls == [] and tours.calls == []
@@ -0,0 +1,64 @@
+from contextlib import contextmanager
+
+import pytest
+
+pyodbc = pytest.importorskip("pyodbc")
+
+from db.repository import BaseRepository
+
+
+class FakeCursor:
+    def __init__(self):
+        self.sql = []
+        self.description = [("TourNr",)]
+
+    def execute(self, sql, params=()):
+        self.sql.append(sql.strip())
+
+    def executemany(self, sql, rows):
+        self.sql.append(sql)
+        self.rows = rows
+
+    def fetchall(self):
+        return [(r[0],) for r in self.rows]
+
+
+class FakeDb:
+    def __init__(self, cursor):
+        self.cursor_obj = cursor
+
+    @contextmanager
+    def acquire(self):
+        yield self
+
+    def cursor(self):
+        return self.cursor_obj
+
+
+def test_fetch_all_with_keys_loads_keys_then_drops_table():
+    cursor = FakeCursor()
+    repo = BaseRepository(FakeDb(cursor))
+
+    rows = repo.fetch_all_with_keys("#k", "TourNr BIGINT", [(1,), (2,)], "SELECT TourNr FROM #k")
+
+    assert rows == [{"TourNr": 1}, {"TourNr": 2}]
+    assert cursor.sql[-1].startswith("IF OBJECT_ID('tempdb..#k') IS NOT NULL DROP TABLE #k")
+    assert repo.fetch_all_with_keys("#k", "TourNr BIGINT", [], "SELECT 1") == []
+
+
+def test_query_error_survives_cleanup_error():
+    class Cursor(FakeCursor):
+        drops = 0
+
+        def execute(self, sql, params=()):
+            if "DROP TABLE" in sql:
+                self.drops += 1
+                if self.drops > 1:
+                    raise pyodbc.Error("connexion perdue")
+                return
+            if sql.strip().startswith("SELECT"):
+                raise pyodbc.Error("requête annulée")
+
+    repo = BaseRepository(FakeDb(Cursor()))
+    with pytest.raises(pyodbc.Error, match="requête annulée"):
+        repo.fetch_all_with_keys("#k", "TourNr BIGINT", [(1,)], "SELECT TourNr FROM #k")
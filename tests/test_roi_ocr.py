@@ -0,0 +1,134 @@
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("pytesseract")
+pytest.importorskip("pdf2image")
+
+from ocr import roi_ocr
+from ocr.supplier_model import CompiledSupplierModel
+from ocr.roi_ocr import _find_value_box, _validate, extract_fields_from_regions, learn_field_regions, merge_regions
+
+IBAN = "FR7630006000011234567890189"
+BIC = "AGRIFRPP"
+
+VALUES = {
+    "iban": "FR76 3000 6000 0112 3456 7890 189",
+    "bic": BIC,
+    "invoice_number": "F2024-0042",
+    "invoice_date": "12/03/2024",
+    "folders": ["123456789"],
+}
+
+
+def _invoice_pdf(path, lines) -> str:
+    doc = fitz.open()
+    page = doc.new_page()
+    for y, text in lines:
+        page.insert_text((50, y), text, fontsize=10)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def _lines(number: str = "F2024-0042", date: str = "12/03/2024"):
+    return [
+        (60, "TRANSPORTS EXEMPLE SARL"),
+        (100, f"FACTURE N° {number}"),
+        (120, f"Date : {date}"),
+        (400, "Dossier 123456789 Lyon -> Milan"),
+        (700, "IBAN : FR76 3000 6000 0112 3456 7890 189"),
+        (715, f"BIC : {BIC}"),
+    ]
+
+
+def _model(regions) -> dict:
+    return {
+        "iban": IBAN,
+        "bic": BIC,
+        "invoice_number_example": "F2024-0042",
+        "date_example": "12/03/2024",
+        "regions": regions,
+    }
+
+
+def test_find_value_box_spans_words_of_a_line():
+    words = [
+        ((0.10, 0.50, 0.14, 0.52), (0, 0), "IBAN"),
+        ((0.20, 0.50, 0.26, 0.52), (0, 0), "FR76"),
+        ((0.27, 0.50, 0.33, 0.52), (0, 0), "3000"),
+        ((0.10, 0.60, 0.20, 0.62), (0, 1), "3000"),
+    ]
+    assert _find_value_box(words, "fr76 3000") == (0.20, 0.50, 0.33, 0.52)
+    assert _find_value_box(words, "FR7630001") is None
+
+
+def test_learned_regions_read_back_on_next_invoice(tmp_path):
+    first = _invoice_pdf(tmp_path / "a.pdf", _lines())
+    regions = learn_field_regions(first, VALUES)
+    assert set(regions) == {"iban", "bic", "invoice_number", "invoice_date", "folders"}
+    assert all(r[0]["page"] == 0 for r in regions.values())
+
+    # facture suivante du même fournisseur : même mise en page, autres valeurs
+    nxt = _invoice_pdf(tmp_path / "b.pdf", _lines("F2024-0057", "02/04/2024"))
+    res = extract_fields_from_regions(nxt, _model(merge_regions(None, regions)))
+
+    assert res["ok"], res["failed"]
+    assert res["fields"]["iban"] == IBAN
+    assert res["fields"]["bic"] == BIC
+    assert res["fields"]["invoice_number"] == "F2024-0057"
+    assert res["fields"]["invoice_date"] == "02/04/2024"
+    assert res["fields"]["folders"] == ["123456789"]
+
+
+def test_missing_required_field_fails(tmp_path, monkeypatch):
+    # zone sans couche texte -> OCR de la zone (Tesseract simulé : rien lu)
+    monkeypatch.setattr(roi_ocr, "_tess_call", lambda *a, **k: "")
+    pdf = _invoice_pdf(tmp_path / "a.pdf", _lines())
+    regions = learn_field_regions(pdf, VALUES)
+    # zone du n° de facture déplacée sur une partie vide de la page
+    regions["invoice_number"] = [{"page": 0, "bbox": [0.1, 0.3, 0.4, 0.32], "hit_count": 1}]
+
+    res = extract_fields_from_regions(pdf, _model(regions))
+
+    assert not res["ok"]
+    assert res["failed"] == ["invoice_number"]
+
+
+def test_merge_regions_counts_hits_on_overlapping_boxes():
+    r1 = {"page": 0, "bbox": [0.1, 0.1, 0.3, 0.12], "hit_count": 0}
+    r2 = {"page": 0, "bbox": [0.1, 0.1, 0.31, 0.12], "hit_count": 0}
+    other = {"page": 1, "bbox": [0.1, 0.1, 0.3, 0.12], "hit_count": 0}
+
+    merged = merge_regions(merge_regions(None, {"iban": [r1]}), {"iban": [r2, other]})
+
+    assert [(r["page"], r["hit_count"]) for r in merged["iban"]] == [(0, 2), (1, 1)]
+
+
+def test_validate_bank_ids_must_be_read_in_the_zone():
+    model = CompiledSupplierModel(_model({}))
+    assert _validate("iban", "", model) is None
+    assert _validate("iban", "Conditions de paiement : 30 jours", model) is None
+    assert _validate("bic", "TOTAL TTC 1 020,00", model) is None
+    assert _validate("iban", "IBAN : FR76 3000 6000 0112 3456 7890 189", model) == IBAN
+    assert _validate("bic", f"BIC : {BIC}", model) == BIC
+    # autre compte lu dans la zone : rendu tel quel, pas remplacé par celui du modèle
+    assert _validate("iban", "IBAN DE89 3704 0044 0532 0130 00", model) == "DE89370400440532013000"
+
+
+def test_validate_date_parses_in_the_model_format():
+    model = CompiledSupplierModel(_model({}))
+    assert _validate("invoice_date", "Date : 02/04/2024", model) == "02/04/2024"
+    assert _validate("invoice_date", "Date : 31/02/2024", model) is None      # date impossible
+    assert _validate("invoice_date", "Réf 12.45.2024", model) is None
+    assert _validate("invoice_date", "Date : 02.04.2024", model) is None      # pas le format du modèle
+    assert _validate("invoice_date", "Du 45/13/2024 au 05/04/2024", model) == "05/04/2024"
+
+    dotted = CompiledSupplierModel({**_model({}), "date_example": "12.03.24"})
+    assert _validate("invoice_date", "Datum 02/04/2024 / 02.04.24", dotted) == "02.04.24"
+
+
+def test_validate_rejects_invalid_values():
+    model = CompiledSupplierModel(_model({}))
+    assert _validate("invoice_number", "", model) is None
+    assert _validate("invoice_number", "12/03/2024", model) is None
+    assert _validate("folders", "aucun dossier", model) is None
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+
+import pytest
+
+from ocr import supplier_index, supplier_model
+from ocr.supplier_index import SupplierIndex, document_features, identify_supplier
+
+KEY_A = "FR7630006000011234567890189_AGRIFRPP"
+KEY_B = "DE89370400440532013000_COBADEFF"
+
+
+def _invoice(company: str, vat_id: str, number: str, iban: str = "") -> str:
+    return "\n".join([
+        f"{company} TRANSPORTS INTERNATIONAUX",
+        "12 rue du Port 69000 LYON",
+        f"N° TVA intracommunautaire : {vat_id}",
+        f"Facture N° {number}",
+        "Désignation Quantité Prix unitaire",
+        "Transport Lyon -> Milan 1 850,00",
+        f"IBAN {iban}" if iban else "Conditions de paiement : 30 jours",
+    ])
+
+
+# valeurs du module, avant les monkeypatch des tests
+INDEX_PATH_AT_IMPORT = supplier_index.SUPPLIER_INDEX_PATH
+MODEL_DIR_AT_IMPORT = supplier_model.MODEL_DIR
+
+TEXT_A = _invoice("EXEMPLE", "FR 12 345678901", "F2024-0042")
+TEXT_B = _invoice("AUTRE", "DE 123456789", "R-998877")
+
+
+@pytest.fixture(autouse=True)
+def _tmp_paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(supplier_model, "MODEL_DIR", str(tmp_path / "suppliers"))
+    monkeypatch.setattr(supplier_model, "SUPPLIER_MODEL_STORE", "json")
+    monkeypatch.setattr(supplier_model, "_STORE", None)
+    monkeypatch.setattr(supplier_index, "SUPPLIER_INDEX_PATH", str(tmp_path / "supplier_index.json"))
+    monkeypatch.setattr(supplier_index, "_INDEX", None)
+    monkeypatch.setattr(supplier_index, "_INDEX_STAMP", None)
+
+
+def test_document_features_ignore_document_numbers():
+    feats = document_features(TEXT_A)
+    assert "h:EXEMPLE" in feats
+    assert "v:FR12345678901" in feats
+    assert not any("2024" in f for f in feats if f.startswith("h:"))
+    # même fournisseur, autre facture : mêmes empreintes d'en-tête et de TVA
+    other = set(document_features(_invoice("EXEMPLE", "FR 12 345678901", "F2024-0057")))
+    assert {f for f in feats if f[0] in "hv"} <= other
+
+
+def test_add_and_rank():
+    index = SupplierIndex()
+    assert index.rank(TEXT_A) == []
+
+    index.add_document("a1", KEY_A, TEXT_A)
+    index.add_document("b1", KEY_B, TEXT_B)
+    index.add_document("x", "", TEXT_B)   # sans fournisseur : ignoré
+
+    ranked = index.rank(_invoice("EXEMPLE", "FR 12 345678901", "F2024-0099"))
+    assert ranked[0][0] == KEY_A
+    assert [k for k, _ in index.rank(TEXT_B, top=1)] == [KEY_B]
+    assert set(index.docs) == {"a1", "b1"}
+
+
+def test_readding_a_document_does_not_count_twice():
+    index = SupplierIndex()
+    index.add_document("a1", KEY_A, TEXT_A)
+    once = index.rank(TEXT_A)
+    index.add_document("a1", KEY_A, TEXT_A)
+    assert index.supplier_docs[KEY_A] == 1
+    assert index.rank(TEXT_A) == once
+
+
+def test_remove_cleans_postings():
+    index = SupplierIndex()
+    index.add_document("a1", KEY_A, TEXT_A)
+    index.add_document("a1", KEY_B, TEXT_B)   # document réattribué à un autre fournisseur
+
+    assert KEY_A not in index.supplier_docs
+    assert all(KEY_A not in p for p in index.postings.values())
+    assert all(p for p in index.postings.values())
+    assert [k for k, _ in index.rank(TEXT_A)] == [KEY_B]
+
+
+def test_save_load_roundtrip(tmp_path):
+    index = SupplierIndex()
+    index.add_document("a1", KEY_A, TEXT_A)
+    index.add_document("b1", KEY_B, TEXT_B)
+    path = str(tmp_path / "idx" / "supplier_index.json")
+
+    index.save(path)
+    loaded = SupplierIndex.load(path)
+
+    assert loaded.docs == index.docs
+    assert loaded.supplier_docs == index.supplier_docs
+    assert loaded.rank(TEXT_A) == index.rank(TEXT_A)
+
+
+@pytest.mark.skipif(bool(os.getenv("SUPPLIER_INDEX_PATH")), reason="SUPPLIER_INDEX_PATH défini")
+def test_default_index_path_is_outside_the_model_dir():
+    assert os.path.dirname(INDEX_PATH_AT_IMPORT) == os.path.dirname(MODEL_DIR_AT_IMPORT)
+
+
+def test_concurrent_saves_use_their_own_temp_file(tmp_path):
+    index = SupplierIndex()
+    index.add_document("a1", KEY_A, TEXT_A)
+    path = str(tmp_path / "supplier_index.json")
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(20):
+                index.save(path)
+        except Exception as e:     # tmp partagé : FileNotFoundError sur os.replace
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert SupplierIndex.load(path).docs == index.docs
+    assert os.listdir(tmp_path) == ["supplier_index.json"]
+
+
+def test_build_from_invoices_keeps_validated_only(tmp_path):
+    d = tmp_path / "invoices"
+    d.mkdir()
+    iban, bic = KEY_A.split("_")
+    rows = {
+        "ok.json": {"status": "validated", "iban": iban, "bic": bic, "ocr_text": TEXT_A},
+        "draft.json": {"status": "draft", "iban": iban, "bic": bic, "ocr_text": TEXT_A},
+        "nobank.json": {"status": "validated", "iban": "", "bic": "", "ocr_text": TEXT_A},
+        "notext.json": {"status": "validated", "iban": iban, "bic": bic},
+        "roi.json": {"status": "validated", "iban": iban, "bic": bic, "ocr_text": TEXT_A, "ocr_mode": "roi"},
+    }
+    for name, data in rows.items():
+        (d / name).write_text(json.dumps(data), encoding="utf-8")
+    (d / "broken.json").write_text("{", encoding="utf-8")
+
+    index = SupplierIndex.build_from_invoices(str(d))
+
+    assert list(index.docs) == ["ok"]
+    assert index.docs["ok"]["supplier"] == KEY_A
+
+
+def test_identify_supplier_confirms_with_vat_id():
+    supplier_model.save_supplier_model(KEY_A, {"iban": KEY_A.split("_")[0], "bic": "AGRIFRPP", "patterns": {}})
+    supplier_index.add_document_to_index("a1", KEY_A, TEXT_A)
+
+    hit = identify_supplier(_invoice("EXEMPLE", "FR 12 345678901", "F2024-0099"))
+    assert hit is not None and hit[0] == KEY_A
+    # en-tête proche mais n° de TVA inconnu et pas d'IBAN/BIC du modèle : non confirmé
+    assert identify_supplier(_invoice("EXEMPLE", "FR 99 999999999", "F2024-0099")) is None
+    assert identify_supplier("") is None
@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+from ocr import supplier_model
+from ocr.supplier_model import (
+    CompiledSupplierModel,
+    apply_model_to_fields,
+    extract_fields_with_model,
+    get_compiled_model,
+    save_supplier_model,
+)
+
+KEY = "FR7630006000011234567890189_AGRIFRPP"
+
+TEXT = (
+    "TRANSPORTS EXEMPLE SARL\n"
+    "Facture n° : F2024-0042\n"
+    "Date facture 12/03/2024\n"
+)
+
+MODEL = {
+    "iban": "FR7630006000011234567890189",
+    "bic": "AGRIFRPP",
+    "date_example": "01/01/2024",
+    "patterns": {
+        "invoice_number": [
+            {"mode": "line_regex", "regex": r"^Facture n° : (\S+)$", "group": 1, "hit_count": 1},
+            {"mode": "near_label", "label_regex": "Facture", "value_regex": r"F\d{4}-\d+", "hit_count": 5},
+        ],
+        "invoice_date": [
+            {"mode": "line_regex", "regex": "(", "hit_count": 9},   # regex cassée : ignorée
+            {"mode": "near_label", "label_regex": "Date facture", "value_regex": r"\d{2}/\d{2}/\d{4}"},
+        ],
+    },
+}
+
+
+@pytest.fixture(autouse=True)
+def _model_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(supplier_model, "MODEL_DIR", str(tmp_path / "suppliers"))
+    monkeypatch.setattr(supplier_model, "SUPPLIER_MODEL_STORE", "json")
+    monkeypatch.setattr(supplier_model, "_STORE", None)
+    supplier_model._COMPILED_CACHE.clear()
+    yield
+    supplier_model._COMPILED_CACHE.clear()
+
+
+def test_compiled_model_extracts_like_the_json_model(capsys):
+    compiled = CompiledSupplierModel(MODEL)
+    capsys.readouterr()
+
+    assert [r[0] for r in compiled.rules["invoice_number"]] == ["near_label", "line_regex"]
+    assert len(compiled.rules["invoice_date"]) == 1
+    assert compiled.extract(TEXT) == {"invoice_number": "F2024-0042", "invoice_date": "12/03/2024"}
+    assert extract_fields_with_model(TEXT, MODEL) == compiled.extract(TEXT)
+    assert compiled.extract("") == {}
+
+    fields = apply_model_to_fields({"invoice_number": "F1"}, TEXT, compiled)
+    assert fields["iban"] == MODEL["iban"]
+    assert fields["invoice_number"] == "F1"
+
+
+def test_get_compiled_model_cached_until_json_changes():
+    assert get_compiled_model(KEY) is None
+    assert get_compiled_model("") is None
+
+    save_supplier_model(KEY, dict(MODEL))
+    first = get_compiled_model(KEY)
+    assert first is not None and first.get("bic") == "AGRIFRPP"
+    assert get_compiled_model(KEY) is first
+
+    save_supplier_model(KEY, {**MODEL, "bic": "BNPAFRPP"})
+    second = get_compiled_model(KEY)
+    assert second is not first
+    assert second.get("bic") == "BNPAFRPP"
+
+    os.remove(supplier_model.get_model_store()._path(KEY))
+    assert get_compiled_model(KEY) is None
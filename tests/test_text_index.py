@@ -0,0 +1,68 @@
+import re
+
+from ocr.invoice_parser import extract_bic, extract_date, extract_iban, extract_invoice_number, parse_invoice
+from ocr.text_index import TextIndex, as_index
+
+TEXT = (
+    "  TRANSPORTS EXEMPLE SARL\n"
+    "\n"
+    "Facture N° F2024-0042\n"
+    "IBAN FR76 3000 6000 0112 3456 7890 189\n"
+    "BIC AGRIFRPP\n"
+    "Date : 12/03/2024\n"
+    "Total HT 1\u00a0000,00\n"
+)
+
+
+def test_lines_and_offsets():
+    ix = TextIndex(TEXT)
+    assert ix.lines[0] == "TRANSPORTS EXEMPLE SARL"
+    assert len(ix.lines) == 6
+    for line, start in zip(ix.lines, ix.line_starts):
+        assert TEXT[start:start + len(line)] == line
+    assert ix.line_at(TEXT.index("AGRIFRPP")) == 3
+    assert ix.line_at(0) == 0
+
+
+def test_normalized_variants():
+    ix = TextIndex(TEXT)
+    assert "\u00a0" not in ix.upper_sp
+    assert "1 000,00\n" in ix.upper_sp      # retours ligne gardés
+    assert "\n" not in ix.flat
+    assert ix.upper_lines[1] == "FACTURE N° F2024-0042"
+    assert ix.lower_lines[3] == "bic agrifrpp"
+
+
+def test_per_line_cache():
+    ix = TextIndex(TEXT)
+    rx = re.compile(r"\d+")
+    assert ix.findall(rx, 4) == ["12", "03", "2024"]
+    assert ix.findall(rx, 4) is ix.findall(rx, 4)
+    assert ix.matches(re.compile(r"BIC"), 3)
+
+    calls = []
+    assert ix.memo(("k",), lambda: calls.append(1) or 42) == 42
+    assert ix.memo(("k",), lambda: calls.append(1) or 0) == 42
+    assert calls == [1]
+
+
+def test_as_index():
+    ix = TextIndex(TEXT)
+    assert as_index(ix) is ix
+    assert as_index(None).lines == []
+
+
+def test_extractors_accept_text_or_index():
+    ix = TextIndex(TEXT)
+    for extract in (extract_iban, extract_bic, extract_date, extract_invoice_number):
+        assert extract(ix) == extract(TEXT)
+
+    data = parse_invoice(TEXT)
+    assert data.iban == "FR7630006000011234567890189"
+    assert data.bic == "AGRIFRPP"
+    assert data.invoice_date == "12/03/2024"
+
+
+def test_extract_iban_without_candidate():
+    assert extract_iban("Facture sans coordonnées bancaires") == ""
+    assert extract_iban("") == ""
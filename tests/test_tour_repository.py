@@ -0,0 +1,111 @@
+import pytest
+
+pytest.importorskip("pyodbc")
+
+from db import tour_repository
+from db.tour_repository import TourRepository, normalize_tournr, normalize_tournrs
+
+
+@pytest.fixture(autouse=True)
+def _restore_tournr_type(monkeypatch):
+    monkeypatch.setattr(tour_repository, "_TOURNR_TYPE_RESOLVED", False)
+    yield
+    tour_repository.set_tournr_column_type(tour_repository.TOURNR_COLUMN_TYPE)
+
+
+@pytest.fixture
+def numeric():
+    tour_repository.set_tournr_column_type("bigint")
+
+
+@pytest.fixture
+def text():
+    tour_repository.set_tournr_column_type("varchar")
+
+
+def test_normalize_tournr_numeric_column(numeric):
+    assert normalize_tournr(" 150123456 ") == 150123456
+    assert normalize_tournr(150123456) == 150123456
+    assert normalize_tournr("") is None
+    assert normalize_tournr(None) is None
+    assert normalize_tournr("A12") is None            # jamais égal à une valeur bigint
+    assert normalize_tournr("١٢٣") is None            # chiffres non ASCII
+    assert normalize_tournr("1" * 19) is None         # hors bigint
+    assert normalize_tournrs(["2", " 1", "01", "x", "", None, 2]) == {2: "2", 1: "1"}
+
+
+def test_normalize_tournr_text_column(text):
+    assert normalize_tournr(" 150123456 ") == "150123456"
+    assert normalize_tournr("A12") == "A12"
+    assert normalize_tournr("  ") is None
+    assert normalize_tournrs(["01", "1", " 1"]) == {"01": "01", "1": "1"}
+
+
+def test_unknown_column_type_binds_text():
+    tour_repository.set_tournr_column_type(None)
+    assert tour_repository.TOURNR_PARAM == "CAST(? AS VARCHAR(20))"
+    assert normalize_tournr("A12") == "A12"
+    tour_repository.set_tournr_column_type("int")
+    assert (tour_repository.TOURNR_PARAM, tour_repository.TOURNR_KEY_TYPE) == ("?", "BIGINT")
+    tour_repository.set_tournr_column_type("nchar")
+    assert normalize_tournr("A12") == "A12"
+
+
+def test_column_type_read_once_from_information_schema(monkeypatch):
+    monkeypatch.setattr(tour_repository, "TOURNR_COLUMN_TYPE", "")
+    repo = TourRepository(None)
+    fetch = _Recorder([{"DATA_TYPE": "bigint"}])
+    monkeypatch.setattr(repo, "fetch_all", fetch)
+
+    assert repo.detect_tournr_column_type() == "bigint"
+    assert repo.detect_tournr_column_type() == "bigint"
+    assert len(fetch.calls) == 1
+    assert "INFORMATION_SCHEMA.COLUMNS" in fetch.calls[0][0]
+    assert normalize_tournr(" 150123456 ") == 150123456
+
+
+def test_column_type_from_env_skips_the_query(monkeypatch):
+    monkeypatch.setattr(tour_repository, "TOURNR_COLUMN_TYPE", "int")
+    tour_repository.set_tournr_column_type("int")          # comme à l'import
+    repo = TourRepository(None)
+    fetch = _Recorder([{"DATA_TYPE": "varchar"}])
+    monkeypatch.setattr(repo, "fetch_all", fetch)
+
+    assert repo.detect_tournr_column_type() == "int"
+    assert fetch.calls == []
+
+
+class _Recorder:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def __call__(self, *args):
+        self.calls.append(args)
+        return self.rows
+
+
+def test_existing_tournrs_in_list_binds_native_values(numeric, monkeypatch):
+    repo = TourRepository(None)
+    fetch = _Recorder([{"TourNr": 150123456}])
+    monkeypatch.setattr(repo, "fetch_all", fetch)
+
+    assert repo.get_existing_tournrs_in_xxatour(["150123456", " 123456789", "abc"]) == {"150123456"}
+    query, params = fetch.calls[0]
+    assert params == (150123456, 123456789)
+    assert "CONVERT" not in query and "LTRIM" not in query       # prédicat sargable
+
+    assert repo.get_existing_tournrs_in_xxatour(["abc", ""]) == set()
+    assert len(fetch.calls) == 1
+
+
+def test_existing_tournrs_large_batch_uses_temp_table(numeric, monkeypatch):
+    monkeypatch.setattr(tour_repository, "TOURNR_IN_LIST_MAX", 2)
+    repo = TourRepository(None)
+    fetch = _Recorder([{"TourNr": 1}, {"TourNr": 3}])
+    monkeypatch.setattr(repo, "fetch_all_with_keys", fetch)
+
+    assert repo.get_existing_tournrs_in_xxatour(["1", "2", "3"]) == {"1", "3"}
+    table, columns, keys, _query = fetch.calls[0]
+    assert table == "#ocr_tournr_keys"
+    assert keys == [(1,), (2,), (3,)]
@@ -0,0 +1,113 @@
+import pytest
+
+pytest.importorskip("pyodbc")
+
+from db import tour_repository
+from db.tour_repository import TourRepository, TourSnapshot
+from services import tour_snapshots
+from services.tour_snapshots import TourSnapshotCache
+
+
+def _snap(t: str, exists: bool = True) -> TourSnapshot:
+    return TourSnapshot(t, exists, 1, 10.0, 20.0, "Lyon", "Milan", "", "", 0, 0, frozenset())
+
+
+class FakeTourRepo:
+    def __init__(self, known=("123456789", "150123456"), error=None):
+        self.known = set(known)
+        self.error = error
+        self.calls = []
+
+    def get_tour_snapshots(self, tour_numbers):
+        self.calls.append(list(tour_numbers))
+        if self.error:
+            raise self.error
+        return {t: _snap(t, t in self.known) for t in tour_numbers}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(tour_snapshots.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_one_query_per_batch_then_memory(clock):
+    repo = FakeTourRepo()
+    cache = TourSnapshotCache(repo, ttl_s=60)
+
+    snaps = cache.get_many(["123456789", " 150123456 ", "", "999999999"])
+    assert sorted(snaps) == ["123456789", "150123456", "999999999"]
+    assert not snaps["999999999"].exists
+    assert repo.calls == [["123456789", "150123456", "999999999"]]
+
+    assert cache.get("150123456").exists
+    assert cache.get("") is None
+    cache.get_many(["123456789", "555555555"])
+    assert repo.calls[1:] == [["555555555"]]
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_expired_and_invalidated_entries_are_reloaded(clock):
+    repo = FakeTourRepo()
+    cache = TourSnapshotCache(repo, ttl_s=60)
+    cache.get_many(["123456789", "150123456"])
+
+    clock[0] += 61
+    cache.get("123456789")
+    assert repo.calls[-1] == ["123456789"]
+
+    cache.invalidate(["150123456 "])
+    cache.get_many(["123456789", "150123456"])
+    assert repo.calls[-1] == ["150123456"]
+
+    cache.invalidate()
+    cache.get_many(["123456789", "150123456"])
+    assert repo.calls[-1] == ["123456789", "150123456"]
+
+
+def test_prefetch_keeps_db_errors_for_readers(clock):
+    cache = TourSnapshotCache(FakeTourRepo(error=RuntimeError("timeout")))
+    cache.prefetch(["123456789"])
+    with pytest.raises(RuntimeError):
+        cache.get("123456789")
+
+
+def test_get_tour_snapshots_by_chunks(monkeypatch):
+    repo = TourRepository(None)
+    calls = []
+    monkeypatch.setattr(tour_repository, "TOUR_SNAPSHOT_CHUNK", 2)
+    monkeypatch.setattr(tour_repository, "_TOURNR_IS_TEXT", False)
+    monkeypatch.setattr(
+        repo, "_fetch_tour_snapshots", lambda keys: calls.append(dict(keys)) or {t: _snap(t) for t in keys.values()}
+    )
+
+    out = repo.get_tour_snapshots(["3", " 1", "2", "1", "", "4", "5", "A12"])
+
+    assert calls == [{1: "1", 2: "2"}, {3: "3", 4: "4"}, {5: "5"}]
+    assert sorted(out) == ["1", "2", "3", "4", "5", "A12"]
+    assert not out["A12"].exists       # pas un TourNr numérique : introuvable, sans requête
+    assert repo.get_tour_snapshots([]) == {}
+
+
+def test_snapshot_assembled_from_result_sets(monkeypatch):
+    repo = TourRepository(None)
+    monkeypatch.setattr(tour_repository, "_TOURNR_IS_TEXT", False)
+    tours = [
+        {"TourNr": 1, "TourIntNr": 7, "Kosten": "850.5", "Depart": "Lyon", "Arrivee": "Milan",
+         "DateTour": "01/03/2024", "DateLivraison": "02/03/2024"},
+        {"TourNr": 1, "TourIntNr": 8, "Kosten": "1", "Depart": "", "Arrivee": "",
+         "DateTour": "", "DateLivraison": ""},
+    ]
+    vats = [{"TourNr": 1, "Prozent": 20}]
+    weights = [{"TourNr": 1, "Total_Poids": 1200, "Total_MPL": None}]
+    orders = [{"TourNr": 1, "AufNr": " A1 "}, {"TourNr": 1, "AufNr": None}, {"TourNr": 1, "AufNr": "A2"}]
+    monkeypatch.setattr(repo, "fetch_all_sets", lambda q, p: (tours, vats, weights, orders))
+
+    out = repo._fetch_tour_snapshots(tour_repository.normalize_tournrs(["1", "2"]))
+
+    s1 = out["1"]
+    assert (s1.exists, s1.tour_int_nr, s1.kosten, s1.vat_percent) == (True, 7, 850.5, 20.0)
+    assert (s1.total_poids, s1.total_mpl, s1.auf_nrs) == (1200, 0, frozenset({"A1", "A2"}))
+    assert s1.extended_info()["Depart"] == "Lyon"
+    assert out["2"] == TourSnapshot("2", False, None, None, None, "", "", "", "", 0, 0, frozenset())
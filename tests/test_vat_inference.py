@@ -0,0 +1,125 @@
+import random
+
+import pytest
+
+from ocr.invoice_parser import _infer_vat_line_from_block, _line_amounts, parse_vat_lines
+from ocr.text_index import TextIndex
+
+
+def _reference_infer(ix: TextIndex, center: int, window: int = 25):
+    """Ancienne recherche exhaustive (taux x base x tva), référence de l'équivalence."""
+    up = ix.upper_lines
+    start = max(0, center - window)
+    end = min(len(up), center + window + 1)
+
+    idx_taux = next((i for i in range(start, end) if "TAUX" in up[i]), None)
+    idx_base = next((i for i in range(start, end) if "BASE" in up[i]), None)
+    idx_mtv = next((i for i in range(start, end) if "MONTANT TVA" in up[i] or "TOTAL TVA" in up[i]), None)
+
+    amounts = []
+    for i in range(start, end):
+        amounts.extend(_line_amounts(ix, i))
+    if not amounts:
+        return None
+
+    rate_cands = [a for a in amounts if 0.0 < a[0] <= 30.0]
+    if not rate_cands:
+        return None
+
+    best = None
+    for rv, rstr, ri, r_only in rate_cands:
+        for bv, bstr, bi, b_only in amounts:
+            if bv <= 0 or bv < 10:
+                continue
+            expected = (bv * rv) / 100.0
+            for vv, vstr, vi, v_only in amounts:
+                if vv <= 0:
+                    continue
+                diff = abs(vv - expected)
+                tol = max(0.06, expected * 0.03)
+                if diff > tol:
+                    continue
+
+                score = 0
+                score += max(0, 60 - diff * 200)
+                score += 25 if r_only else 0
+                score += 25 if b_only else 0
+                score += 35 if v_only else 0
+                if idx_taux is not None:
+                    score += max(0, 20 - abs(ri - idx_taux) * 2)
+                if idx_base is not None:
+                    score += max(0, 20 - abs(bi - idx_base) * 2)
+                if idx_mtv is not None:
+                    score += max(0, 30 - abs(vi - idx_mtv) * 2)
+
+                if best is None or score > best[0]:
+                    best = (score, rstr, bstr, vstr)
+
+    if not best:
+        return None
+    _, rstr, bstr, vstr = best
+    return {"rate": rstr, "base": bstr, "vat": vstr}
+
+
+def _fmt(v: float) -> str:
+    s = f"{v:,.2f}".replace(",", " ").replace(".", ",")
+    return s
+
+
+def _random_block(rng: random.Random) -> list:
+    lines = []
+    for _ in range(rng.randint(3, 30)):
+        kind = rng.random()
+        if kind < 0.15:
+            lines.append(rng.choice(["TAUX TVA", "BASE HT", "MONTANT TVA", "TOTAL TVA", "Désignation", "Total HT"]))
+        elif kind < 0.45:
+            # montant seul sur la ligne
+            lines.append(_fmt(rng.choice([rng.uniform(0, 30), rng.uniform(10, 5000)])))
+        elif kind < 0.65:
+            # triplet cohérent (éventuellement arrondi / bruité)
+            rate = rng.choice([5.5, 10.0, 19.0, 20.0, 21.0, 7.0])
+            base = round(rng.uniform(10, 4000), 2)
+            vat = round(base * rate / 100 * rng.choice([1, 1, 1.01, 0.98, 1.2]), 2)
+            lines.append(f"{_fmt(rate)} {_fmt(base)} {_fmt(vat)}")
+        else:
+            lines.append(" ".join(_fmt(rng.uniform(0, 3000)) for _ in range(rng.randint(1, 4))))
+    return lines
+
+
+def test_matches_exhaustive_search_on_random_blocks():
+    rng = random.Random(20240312)
+    checked = 0
+    for _ in range(600):
+        ix = TextIndex("\n".join(_random_block(rng)))
+        if not ix.lines:
+            continue
+        center = rng.randrange(len(ix.lines))
+        window = rng.choice([3, 10, 25])
+        assert _infer_vat_line_from_block(ix, center, window) == _reference_infer(ix, center, window)
+        checked += 1
+    assert checked > 500
+
+
+@pytest.mark.parametrize("lines, expected", [
+    (["TAUX", "20,00", "BASE HT", "1 000,00", "MONTANT TVA", "200,00"],
+     {"rate": "20,00", "base": "1000,00", "vat": "200,00"}),
+    # même score : le 1er dans l'ordre du texte l'emporte
+    (["20,00 100,00 20,00", "20,00 100,00 20,00"], {"rate": "20,00", "base": "100,00", "vat": "20,00"}),
+    (["Total 12,00 45,00"], None),
+])
+def test_known_blocks(lines, expected):
+    ix = TextIndex("\n".join(lines))
+    assert _infer_vat_line_from_block(ix, 0, 25) == expected
+    assert _infer_vat_line_from_block(lines, 0, 25) == expected
+
+
+def test_parse_vat_lines_on_invoice_summary():
+    text = "\n".join([
+        "Récapitulatif TVA",
+        "Taux Base HT Montant TVA",
+        "20,00 1 250,00 250,00",
+        "Total TTC 1 500,00",
+    ])
+    assert {"rate": "20,00", "base": "1250,00", "vat": "250,00"} in [
+        {k: ln.get(k) for k in ("rate", "base", "vat")} for ln in parse_vat_lines(text)
+    ]
@@ -38,15 +38,22 @@ from webcolors import names
 from PySide6.QtCore import QObject, QThread, Signal, Slot
 
 from ui.pdf_viewer import PdfViewer
-from ocr.ocr_engine import extract_text_from_pdf
-from ocr.invoice_parser import parse_invoice
+from ocr.ocr_engine import iter_pages_from_pdf, pages_to_text
+from ocr.invoice_parser import parse_invoice, best_ht_amount_for_tour, DOSSIER_PATTERN
+from ocr.text_index import TextIndex
+from ocr.batch_pipeline import run_batch
+from ocr.roi_ocr import learn_field_regions, merge_regions
+from ocr.supplier_index import identify_supplier, add_document_to_index
 from ocr.supplier_model import (
     build_supplier_key,
+    validate_iban,
+    validate_bic,
     load_supplier_model,
-    save_supplier_model,
+    get_compiled_model,
+    update_supplier_model,
     learn_supplier_patterns,
     merge_patterns,
-    extract_fields_with_model,
+    apply_model_to_fields,
 )
 from PySide6.QtWidgets import QMenu
 from PySide6.QtWidgets import QDialog
@@ -75,24 +82,11 @@ from ui.folder_select_dialog import FolderSelectDialog
 
 
 
-AMOUNT_CANDIDATE_RE = re.compile(r"\b\d+(?:[ \u00A0]\d{3})*(?:[.,]\d{2,3})\b")
-ONLY_AMOUNT_2DEC_RE = re.compile(
-    r"^\s*\d+(?:[ \u00A0]\d{3})*(?:[.,]\d{2})\s*(?:€|EUR)?\s*$",
-    re.IGNORECASE
-)
-HAS_LETTERS_RE = re.compile(r"[A-Za-z]")
-
-
 class MainWindow(QMainWindow):
 
 
-    DOSSIER_PATTERN = re.compile(
-        r"(?<!\d)(?:"
-        r"1\d{8}"                    # 9 chiffres commençant par 1
-        r"|150\d{5,8}"               # 150 + 5..8 chiffres  (ex: 15000003)
-        r"|(?:845|255|355|445|645|675|695|725|785)\d{6,8}"  # autres : 3 + 6..8 chiffres
-        r")(?!\d)"
-    )
+    # mêmes règles que le parseur (ocr.folder_index)
+    DOSSIER_PATTERN = DOSSIER_PATTERN
      # Dossier affiché au démarrage (liste des PDF)
     DEFAULT_PDF_FOLDER = r"C:\Users\hrouillard\Documents\clients\ED trans\OCR\modeles2"
 
@@ -107,6 +101,9 @@ class MainWindow(QMainWindow):
         from ui.ocr_text_view import OcrTextView
         from db.tour_repository import TourRepository
         from db.geb_repository import GebRepository
+        from services.processing_state import ProcessingStateService
+        from services.tour_snapshots import TourSnapshotCache
+        from services.bank_directory import BankDirectoryCache
    
         
 
@@ -117,6 +114,22 @@ class MainWindow(QMainWindow):
         self.bank_repo = BankRepository(self.db_conn)
         self.tour_repo = TourRepository(self.db_conn)
         self.geb_repo = GebRepository(self.db_conn)
+        # type de TourNr lu une fois (TOURNR_COLUMN_TYPE vide) : recherches indexées sur le type natif
+        try:
+            self.tour_repo.detect_tournr_column_type()
+        except Exception as e:
+            print("⚠️ Type de TourNr non lu (TourNr lié en texte):", e)
+        # annuaire IBAN/BIC -> transporteur en mémoire (SQL uniquement si IBAN valide inconnu)
+        self.bank_directory = BankDirectoryCache(self.transporter_repo, self.bank_repo)
+        try:
+            self.bank_directory.load()
+        except Exception as e:
+            print("⚠️ Annuaire bancaire non chargé (nouvel essai à la première recherche):", e)
+        self.processing_state_service = ProcessingStateService(
+            self.transporter_repo, self.tour_repo, bank_directory=self.bank_directory
+        )
+        # Kosten / TVA / trajet / commandes des dossiers, lus en lot
+        self.tour_snapshots = TourSnapshotCache(self.tour_repo)
 
         # --- State ---
         self.current_pdf_path: str | None = None
@@ -135,9 +148,19 @@ class MainWindow(QMainWindow):
         self._last_main_selected_path: str | None = None
         self._did_autoload_default_folder = False
 
-        self._vat_theo_cache: dict[str, float | None] = {}
         self._pending_tags_to_add: set[str] = set()
 
+        # OCR en flux : run courant + runs annulés gardés en vie jusqu'à la fin de leur page en cours
+        self._ocr_stream_seq = 0
+        self._ocr_stream_run: int | None = None
+        self._ocr_stream_pdf: str | None = None
+        self._ocr_stream_pages = []
+        self._ocr_stream_jobs: dict[int, tuple] = {}
+        # "full" (OCR pleine page) | "roi" (JSON du lot : ocr_text = extraits des zones) | "" (pas de texte)
+        self.current_ocr_mode = ""
+        # apprentissage des zones du modèle en arrière-plan (OCR des pages scannées)
+        self._region_learn_jobs: set = set()
+
         
 
         # PDF "affiché" (peut être la facture ou une PJ)
@@ -591,6 +614,13 @@ class MainWindow(QMainWindow):
         self.btn_prev_doc.setEnabled(False)
         self.btn_next_doc.setEnabled(False)
 
+    def closeEvent(self, event):
+        # connexions SQL libres rendues au serveur dès la fermeture (atexit ne passe qu'en fin de process)
+        from db.connection import close_all_pools
+
+        close_all_pools()
+        super().closeEvent(event)
+
 
 
     # =========================
@@ -774,6 +804,9 @@ class MainWindow(QMainWindow):
         if not self.current_pdf_path:
             return
 
+        # OCR d'un autre PDF encore en cours : inutile de le finir
+        self._cancel_ocr_stream()
+
         # reset UI
         self.bank_valid = None
         self.selected_kundennr = None
@@ -805,6 +838,7 @@ class MainWindow(QMainWindow):
 
         # OCR texte + recherche
         self.ocr_text_view.setPlainText("")
+        self.current_ocr_mode = ""
         self.search_selections = []
         self.current_match_index = -1
         self.search_counter_label.setText("0 / 0")
@@ -834,9 +868,94 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Erreur", "Aucun PDF sélectionné.")
             return
 
+        pdf_path = self.current_pdf_path
+        if self._ocr_stream_run is not None:
+            if self._ocr_stream_pdf == pdf_path:
+                self.statusBar().showMessage("OCR en cours…", 3000)
+                return
+            # OCR d'un autre PDF : détaché, il se termine seul
+            self._cancel_ocr_stream()
+
+        # ✅ OCR en streaming : le texte s'affiche page par page, la page 1 est analysée tout de suite
+        self._ocr_stream_seq += 1
+        run_id = self._ocr_stream_seq
+        self._ocr_stream_run = run_id
+        self._ocr_stream_pdf = pdf_path
+        self._ocr_stream_pages = []
+        self.ocr_text_view.setPlainText("")
+        self.statusBar().showMessage("OCR en cours…")
+
+        thread = QThread(self)
+        worker = OcrStreamWorker(pdf_path)
+        worker.moveToThread(thread)
+        self._ocr_stream_jobs[run_id] = (thread, worker)
+
+        thread.started.connect(worker.run)
+        worker.page_ready.connect(lambda page: self._on_ocr_page_ready(run_id, page))
+
+        def _done(error: str, canceled: bool):
+            try:
+                thread.quit()
+            except Exception:
+                pass
+            self._ocr_stream_jobs.pop(run_id, None)
+
+            # run annulé / remplacé entre-temps : rien à afficher
+            if self._ocr_stream_run != run_id:
+                return
+            self._ocr_stream_run = None
+            if not canceled:
+                self._finish_analyze_pdf(pdf_path, error, show_message)
+
+        worker.finished.connect(_done)
+        thread.finished.connect(thread.deleteLater)
+        worker.finished.connect(worker.deleteLater)
+
+        thread.start()
+
+    def _cancel_ocr_stream(self):
+        run_id = self._ocr_stream_run
+        if run_id is None:
+            return
+        # détaché tout de suite : un nouvel OCR peut démarrer sans attendre la fin de la page en cours
+        self._ocr_stream_run = None
+        job = self._ocr_stream_jobs.get(run_id)
+        if job is not None:
+            job[1].cancel()
+
+    def _on_ocr_page_ready(self, run_id: int, page):
+        # run annulé (PDF changé entre-temps) : on ignore
+        if run_id != self._ocr_stream_run:
+            return
+
+        self._ocr_stream_pages.append(page)
+        # ✅ seule la nouvelle page est ajoutée (le texte final est remis en forme par _finish_analyze_pdf)
+        self.ocr_text_view.appendPlainText(f"===== PAGE {page.index + 1} =====\n{page.text.strip()}\n")
+        self.statusBar().showMessage(f"OCR en cours… page {page.index + 1} prête")
+
+        # ✅ 1re page : IBAN / BIC / n° / date sont presque toujours dessus -> remplis sans attendre
+        if len(self._ocr_stream_pages) == 1:
+            data = parse_invoice(pages_to_text(self._ocr_stream_pages))
+            for field, value in (
+                (self.iban_input, data.iban),
+                (self.bic_input, data.bic),
+                (self.date_input, data.invoice_date),
+                (self.invoice_number_input, data.invoice_number),
+            ):
+                if value and not field.text().strip():
+                    field.setText(value)
+
+    def _finish_analyze_pdf(self, pdf_path: str, error: str, show_message: bool = False):
+        if pdf_path != self.current_pdf_path:
+            return
+
         try:
-            text = extract_text_from_pdf(self.current_pdf_path)
+            if error:
+                raise RuntimeError(error)
+
+            text = pages_to_text(self._ocr_stream_pages)
             self.ocr_text_view.setPlainText(text)
+            self.current_ocr_mode = "full"
 
             data = parse_invoice(text)
 
@@ -849,7 +968,7 @@ class MainWindow(QMainWindow):
             iban = self.iban_input.text().strip()
             bic = self.bic_input.text().strip()
             supplier_key = build_supplier_key(iban, bic)
-            model = load_supplier_model(supplier_key)
+            model = get_compiled_model(supplier_key)
 
             if model:
                 self.apply_supplier_model(model)
@@ -867,17 +986,31 @@ class MainWindow(QMainWindow):
             if best["bic"] and not self.bic_input.text().strip():
                 self.bic_input.setText(best["bic"])
 
+            status_msg = "OCR terminé."
             supplier_key = build_supplier_key(
                 self.iban_input.text().strip(),
                 self.bic_input.text().strip(),
             )
             if supplier_key:
-                model = load_supplier_model(supplier_key)
+                model = get_compiled_model(supplier_key)
                 if model:
                     self.apply_supplier_model(model)
-
-
-            self.statusBar().showMessage("OCR terminé.", 3000)
+            else:
+                # IBAN/BIC illisibles : fournisseur reconnu par l'empreinte du document
+                hit = identify_supplier(ocr_text)
+                if hit:
+                    if not validate_iban(self.iban_input.text().strip()):
+                        self.iban_input.setText("")
+                    if not validate_bic(self.bic_input.text().strip()):
+                        self.bic_input.setText("")
+                    self.apply_supplier_model(hit[1])
+                    self.check_bank_information()
+                    self.load_transporter_information()
+                    self.highlight_missing_fields()
+                    status_msg = "OCR terminé. Fournisseur reconnu par son en-tête (IBAN/BIC illisibles)."
+
+
+            self.statusBar().showMessage(status_msg, 3000)
         except Exception as e:
             QMessageBox.critical(self, "Erreur OCR", str(e))
         if show_message:
@@ -894,6 +1027,7 @@ class MainWindow(QMainWindow):
         self.folder_table.setRowCount(0)
 
         folder_numbers = getattr(data, "folder_numbers", None)
+        self.tour_snapshots.prefetch(folder_numbers or [getattr(data, "folder_number", None)])
         if folder_numbers:
             for n in folder_numbers:
                 if n:
@@ -1133,6 +1267,7 @@ class MainWindow(QMainWindow):
             "total_vat": round(vat_total, 2),
             "total_ttc": round(ttc_total, 2),
             "ocr_text": self.ocr_text_view.toPlainText(),
+            "ocr_mode": self.current_ocr_mode,
             "transporter_kundennr": trans_kundennr,
             "status": final_status,
             "validated_at": validated_at,
@@ -1246,6 +1381,9 @@ class MainWindow(QMainWindow):
                 self.ocr_text_view.setPlainText(ocr_text)
             else:
                 self.ocr_text_view.setPlainText("")
+            self.current_ocr_mode = (data.get("ocr_mode") or "full") if self.ocr_text_view.toPlainText() else ""
+            if self.current_ocr_mode == "roi":
+                self.statusBar().showMessage("OCR par zones (fournisseur connu) : relancer l'analyse pour le texte complet.", 5000)
             if isinstance(vat_lines, list):
                 for r in vat_lines:
                     self._add_vat_row(r.get("rate", ""), r.get("base", ""), r.get("vat", ""))
@@ -1278,6 +1416,7 @@ class MainWindow(QMainWindow):
         folders = data.get("folders")
 
         if isinstance(folders, list) and folders:
+            self.tour_snapshots.prefetch(row.get("tour_nr") for row in folders if row)
             for row in folders:
                 tour_nr = "" if row is None else str(row.get("tour_nr", "") or "")
                 amt = "" if row is None else str(row.get("amount_ht_ocr", "") or "")
@@ -1298,12 +1437,14 @@ class MainWindow(QMainWindow):
             QMessageBox.information(self, "OCR", "Aucun PDF à traiter.")
             return
 
-        # sauvegarde l'état courant
-        previous_pdf = self.current_pdf_path
+        if getattr(self, "_batch_thread", None) is not None:
+            self.statusBar().showMessage("OCR en cours…", 3000)
+            return
 
-        processed = 0
+        jobs = []
         skipped = 0
-        errors = 0
+        # fournisseur déjà identifié dans le même mail (entry_id) -> OCR par zones possible
+        supplier_by_entry = {}
 
         for row in range(self.pdf_table.rowCount()):
             it0 = self.pdf_table.item(row, 0)
@@ -1314,47 +1455,87 @@ class MainWindow(QMainWindow):
             if not pdf_path or not os.path.exists(pdf_path):
                 continue
 
+            entry_id = str(it0.data(Qt.UserRole + 4) or "")
+            if entry_id.startswith("__NO_ENTRY__"):
+                entry_id = ""
+
             # ✅ On OCRise uniquement les non-sauvegardés (pas de JSON)
             if self._has_saved_json_for_pdf(pdf_path):
                 skipped += 1
+                if entry_id and entry_id not in supplier_by_entry:
+                    try:
+                        with open(self._get_saved_json_path(pdf_path), "r", encoding="utf-8") as f:
+                            saved = json.load(f) or {}
+                        key = build_supplier_key(saved.get("iban", ""), saved.get("bic", ""))
+                        if key:
+                            supplier_by_entry[entry_id] = key
+                    except Exception:
+                        pass
                 continue
 
-            try:
-                self.current_pdf_path = pdf_path
+            jobs.append((pdf_path, self._get_saved_json_path(pdf_path), entry_id))
 
-                # OCR (sans popup)
-                self.analyze_pdf(show_message=False)
+        jobs = [(p, j, e, supplier_by_entry.get(e, "")) for p, j, e in jobs]
 
-                # ✅ sauvegarde pour créer le JSON + mettre à jour IBAN/BIC dans la table
-                self.save_current_data(status="draft", show_message=False)
+        if not jobs:
+            QMessageBox.information(self, "OCR terminé", f"Traités : 0\nDéjà sauvegardés (skip) : {skipped}\nErreurs : 0")
+            return
 
-                # status en table (pour filtres)
-                self._set_left_row_status(pdf_path, "draft")
+        # ✅ progress dialog
+        self._batch_prog = QProgressDialog("OCR des PDF…", "Annuler", 0, len(jobs), self)
+        self._batch_prog.setWindowModality(Qt.NonModal)
+        self._batch_prog.setMinimumDuration(0)
+        self._batch_prog.setValue(0)
+        self._batch_prog.show()
+
+        # ✅ thread + worker (la fenêtre reste utilisable pendant le lot)
+        self._batch_thread = QThread(self)
+        self._batch_worker = BatchOcrWorker(jobs)
+        self._batch_worker.moveToThread(self._batch_thread)
+
+        self._batch_prog.canceled.connect(self._batch_worker.cancel)
+        self._batch_thread.started.connect(self._batch_worker.run)
+        self._batch_worker.progress.connect(lambda v, txt: (self._batch_prog.setValue(v), self._batch_prog.setLabelText(txt)))
+        self._batch_worker.result.connect(self._on_batch_ocr_result)
+
+        def _done(processed: int, errors: int, canceled: bool):
+            try:
+                self._batch_prog.close()
+            except Exception:
+                pass
 
-                processed += 1
+            try:
+                self._batch_thread.quit()
+            except Exception:
+                pass
+            self._batch_thread = None
 
-            except Exception as e:
-                errors += 1
-                # (optionnel) marquer en erreur pour ton futur onglet “Erreurs”
-                self._set_left_row_status(pdf_path, "error")
-                # on continue sur les autres
-                print(f"OCR error on {pdf_path}: {e}")
+            self.refresh_left_table_processing_states()
+            self.apply_left_filter_to_table()
 
-        # restore
-        self.current_pdf_path = previous_pdf
+            suffix = "\n\nLot annulé." if canceled else ""
+            QMessageBox.information(
+                self,
+                "OCR terminé",
+                f"Traités : {processed}\nDéjà sauvegardés (skip) : {skipped}\nErreurs : {errors}{suffix}"
+            )
 
-        self.refresh_left_table_processing_states()
-        self.apply_left_filter_to_table()
+        self._batch_worker.finished.connect(_done)
+        self._batch_thread.finished.connect(self._batch_thread.deleteLater)
+        self._batch_worker.finished.connect(self._batch_worker.deleteLater)
 
-        # ré-applique tes filtres si tu les as
-        if hasattr(self, "apply_left_filter_to_table"):
-            self.apply_left_filter_to_table()
+        self._batch_thread.start()
 
-        QMessageBox.information(
-            self,
-            "OCR terminé",
-            f"Traités : {processed}\nDéjà sauvegardés (skip) : {skipped}\nErreurs : {errors}"
-        )
+    def _on_batch_ocr_result(self, res: dict):
+        pdf_path = res.get("pdf_path")
+        if res.get("ok"):
+            self._update_left_table_iban_bic(pdf_path, res.get("iban", ""), res.get("bic", ""))
+            # status en table (pour filtres)
+            self._set_left_row_status(pdf_path, "draft")
+        else:
+            # (optionnel) marquer en erreur pour ton futur onglet “Erreurs”
+            self._set_left_row_status(pdf_path, "error")
+            print(f"OCR error on {pdf_path}: {res.get('error')}")
 
     def _save_data_for_pdf(self, pdf_path, data):
         base_name = os.path.splitext(os.path.basename(pdf_path))[0]
@@ -1417,10 +1598,10 @@ class MainWindow(QMainWindow):
                 self.statusBar().showMessage("Modèle transporteur non mis à jour (IBAN/BIC non fiables).", 4000)
             return False
 
-        # 2) charger l’existant
+        # 2) charger l’existant (zones déjà stables)
         existing = load_supplier_model(supplier_key) or {}
 
-        # 3) apprendre / merger les patterns
+        # 3) apprendre les patterns
         new_patterns = learn_supplier_patterns(
             ocr_text,
             iban=iban,
@@ -1428,27 +1609,46 @@ class MainWindow(QMainWindow):
             invoice_number=self.invoice_number_input.text().strip(),
             invoice_date=self.date_input.text().strip(),
         )
-        merged = merge_patterns(existing.get("patterns") or {}, new_patterns)
 
         folders = self.get_folder_numbers()
 
-        # 4) construire data
-        data = dict(existing)
-        data.update({
-            "supplier_key": supplier_key,
-            "iban": iban,
-            "bic": bic,
-            "invoice_number_example": self.invoice_number_input.text().strip(),
-            "date_example": self.date_input.text().strip(),
-            "folder_number_example": (folders[0] if folders else ""),
-            "updated_at": datetime.now().isoformat(timespec="seconds"),
-            "patterns": merged,
-            "model_version": 2,
-        })
+        # 4) construire data : fusion avec la version la plus récente du store (écriture atomique)
+        def build(current: dict) -> dict:
+            data = dict(current)
+            data.update({
+                "supplier_key": supplier_key,
+                "iban": iban,
+                "bic": bic,
+                "invoice_number_example": self.invoice_number_input.text().strip(),
+                "date_example": self.date_input.text().strip(),
+                "folder_number_example": (folders[0] if folders else ""),
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+                "patterns": merge_patterns(current.get("patterns") or {}, new_patterns),
+                "model_version": 2,
+            })
+            return data
 
-        # 5) sauver le fichier
+        # 5) sauver le modèle (+ empreinte du document : reconnaissance si IBAN/BIC illisibles)
         try:
-            save_supplier_model(supplier_key, data)
+            update_supplier_model(supplier_key, build)
+            # ⚠️ JSON lu par zones : ocr_text = extraits, pas le document -> pas d'empreinte
+            if self.current_ocr_mode != "roi":
+                try:
+                    doc_id = os.path.splitext(os.path.basename(self.current_pdf_path))[0]
+                    add_document_to_index(doc_id, supplier_key, ocr_text)
+                except Exception as e:
+                    print("⚠️ index fournisseurs non mis à jour :", e)
+            self._learn_model_regions(
+                supplier_key,
+                existing,
+                {
+                    "iban": iban,
+                    "bic": bic,
+                    "invoice_number": self.invoice_number_input.text().strip(),
+                    "invoice_date": self.date_input.text().strip(),
+                    "folders": folders,
+                },
+            )
             if show_message:
                 QMessageBox.information(self, "Modèle transporteur", "Modèle transporteur sauvegardé / mis à jour.")
             else:
@@ -1461,31 +1661,56 @@ class MainWindow(QMainWindow):
                 self.statusBar().showMessage("Erreur MAJ modèle transporteur.", 4000)
             return False
 
-    def apply_supplier_model(self, model: dict):
+    def _learn_model_regions(self, supplier_key: str, existing: dict, values: dict):
+        """
+        Positions des champs validés (OCR par zones des prochaines factures), apprises dans un thread :
+        sur un scan, retrouver les mots demande un OCR pleine page (plusieurs secondes).
+        """
+        if not self.current_pdf_path:
+            return
+        # zone déjà confirmée plusieurs fois : pas besoin de la rechercher (coût OCR sur les scans)
+        regions = existing.get("regions") or {}
+        stable = {f for f, rr in regions.items() if rr and int(rr[0].get("hit_count", 0)) >= 3}
+
+        thread = QThread(self)
+        worker = RegionLearnWorker(self.current_pdf_path, supplier_key, values, stable)
+        worker.moveToThread(thread)
+        job = (thread, worker)
+        self._region_learn_jobs.add(job)
+
+        def _done(error: str):
+            thread.quit()
+            self._region_learn_jobs.discard(job)
+            if error:
+                print("⚠️ zones modèle non apprises :", error)
+
+        thread.started.connect(worker.run)
+        worker.finished.connect(_done)
+        thread.finished.connect(thread.deleteLater)
+        worker.finished.connect(worker.deleteLater)
+        thread.start()
+
+    def apply_supplier_model(self, model):
         if not model:
             return
 
         ocr_text = self.ocr_text_view.toPlainText() or ""
-        found = extract_fields_with_model(ocr_text, model)
-
-        # IBAN/BIC : valeur trouvée via patterns, sinon valeur stockée modèle
-        if not self.iban_input.text().strip():
-            self.iban_input.setText(found.get("iban") or model.get("iban", ""))
-
-        if not self.bic_input.text().strip():
-            self.bic_input.setText(found.get("bic") or model.get("bic", ""))
-
-        cur = (self.invoice_number_input.text() or "").strip()
-        is_ok = cur and any(c.isdigit() for c in cur) and cur.upper() not in {"DESCRIPTION", "DATE", "FACTURE", "INVOICE"}
-        if not is_ok:
-            self.invoice_number_input.setText(
-                found.get("invoice_number") or model.get("invoice_number_example", "")
-            )
+        current = {
+            "iban": self.iban_input.text(),
+            "bic": self.bic_input.text(),
+            "invoice_number": self.invoice_number_input.text(),
+            "invoice_date": self.date_input.text(),
+        }
+        updated = apply_model_to_fields(current, ocr_text, model)
 
-        if not self.date_input.text().strip():
-            self.date_input.setText(
-                found.get("invoice_date") or model.get("date_example", "")
-            )
+        for key, field in (
+            ("iban", self.iban_input),
+            ("bic", self.bic_input),
+            ("invoice_number", self.invoice_number_input),
+            ("invoice_date", self.date_input),
+        ):
+            if updated.get(key, "") != current[key]:
+                field.setText(updated.get(key, ""))
 
         # dossier : on garde le comportement actuel (exemple)
         if not self.get_folder_numbers():
@@ -1578,7 +1803,7 @@ class MainWindow(QMainWindow):
         if not iban or not bic:
             return
 
-        record = self.bank_repo.find_by_iban_bic(iban, bic)
+        record = self.bank_directory.has_exact(iban, bic)
         if record:
             self.bank_valid = True
             self.iban_input.setStyleSheet("background-color: #e6ffe6;")
@@ -1608,7 +1833,7 @@ class MainWindow(QMainWindow):
 
             # 2) sinon comportement existant : chercher par banque
             elif iban and bic:
-                record = self.transporter_repo.find_transporter_by_bank(iban, bic)
+                record = self.bank_directory.find(iban, bic)
 
             if not record:
                 self.transporter_info.setPlainText("❌ Transporteur non trouvé en base.")
@@ -1720,6 +1945,7 @@ class MainWindow(QMainWindow):
 
         if msg.exec() == QMessageBox.Yes:
             self.transporter_repo.update_bank(kundennr, new_iban, new_bic)
+            self.bank_directory.mark_stale()
 
             # IMPORTANT: on ne relance PAS load_transporter_information() ici,
             # sinon ça risque de re-lire la BDD (pas encore commit/latence) et
@@ -1763,12 +1989,12 @@ class MainWindow(QMainWindow):
             return
 
         try:
-            record = self.tour_repo.find_by_tournr(tour_nr)
-            if not record:
+            snap = self.tour_snapshots.get(tour_nr)
+            if not snap or not snap.exists:
                 self.transporter_info.setPlainText(f"❌ Tour non trouvée : {tour_nr}")
                 return
 
-            info = self.tour_repo.get_tour_extended_info(tour_nr) or {}
+            info = snap.extended_info()
 
             invoice_tours = self._get_current_invoice_tours()
             cmr_tours = self._get_cmr_attached_tours_for_entry()
@@ -1860,152 +2086,14 @@ class MainWindow(QMainWindow):
     def _format_amount_2(self, v: float) -> str:
         return f"{v:.2f}"
 
-    def _best_ht_amount_for_tour(self, lines: list[str], tour_nr: str) -> float | None:
-        dossier_re = re.compile(r"\b\d{8}\b")
-        def contains_tour(ln: str) -> bool:
-            if tour_nr in ln:
-                return True
-            # fallback si OCR a mis des espaces / tirets dans le numéro
-            compact = re.sub(r"[ \u00A0-]", "", ln)
-            return tour_nr in compact
-
-        idx = next((i for i, ln in enumerate(lines) if contains_tour(ln)), None)
-        if idx is None:
-            return None
-
-        # ✅ fenêtre centrée sur la ligne du dossier (les montants sont souvent juste AVANT)
-        start = max(0, idx - 12)
-        end = min(len(lines), idx + 25)
-
-        # stop si autre dossier apparaît (avant)
-        for j in range(idx - 1, start - 1, -1):
-            ln = lines[j]
-            for d in dossier_re.findall(ln):
-                if d != tour_nr:
-                    start = j + 1
-                    break
-            else:
-                continue
-            break
-
-        # stop si autre dossier apparaît (après)
-        for j in range(idx + 1, end):
-            ln = lines[j]
-            for d in dossier_re.findall(ln):
-                if d != tour_nr:
-                    end = j
-                    break
-            else:
-                continue
-            break
-
-        best = None  # (score, position, value)
-        found_2dec = False
-
-        def prev_nonempty(k: int) -> str:
-            for x in range(k - 1, start - 1, -1):
-                t = lines[x].strip()
-                if t:
-                    return t
-            return ""
-
-        for j in range(start, end):
-            raw = lines[j].strip()
-            if not raw:
-                continue
-
-            up = raw.upper()
-
-            # ignorer unités parasites
-            if "CO2" in up or "CO2E" in up or "KG" in up:
-                continue
-
-            # si lettres (hors € / EUR), ignorer
-            if HAS_LETTERS_RE.search(raw) and ("€" not in raw and "EUR" not in up):
-                continue
-
-            strict_line = bool(ONLY_AMOUNT_2DEC_RE.match(raw))
-
-            for s_amt in AMOUNT_CANDIDATE_RE.findall(raw):
-                v = self._parse_amount(s_amt)
-                if v is None or v <= 0:
-                    continue
-
-                # on évite les taux/quantités
-                if v < 50:
-                    continue
-
-                mdec = re.search(r"[.,](\d+)$", s_amt)
-                dlen = len(mdec.group(1)) if mdec else 0
-                if dlen == 2:
-                    found_2dec = True
-
-                score = 0
-
-                # ✅ priorité à la proximité de la ligne dossier
-                dist = abs(j - idx)
-                score += max(0, 25 - dist * 2)
-
-                # décimales
-                if dlen == 2:
-                    score += 30
-                elif dlen == 3:
-                    score += 10
-                else:
-                    score -= 40
-
-                # bonus si montant seul
-                if strict_line:
-                    score += 80
-                    # bonus si la ligne précédente ressemble à une quantité (rare, mais utile)
-                    prev = prev_nonempty(j)
-                    if re.fullmatch(r"\d{1,3}", prev.strip()):
-                        score += 25
-
-                cand = (score, j, round(v, 2))
-                if best is None or cand[0] > best[0] or (cand[0] == best[0] and cand[1] > best[1]):
-                    best = cand
-
-        if not best:
-            return None
-
-        # si on a trouvé des montants en 2 décimales, on refuse les autres
-        if found_2dec:
-            best2 = None
-            for j in range(start, end):
-                raw = lines[j].strip()
-                if not raw:
-                    continue
-                up = raw.upper()
-                if HAS_LETTERS_RE.search(raw) and ("€" not in raw and "EUR" not in up):
-                    continue
-                strict_line = bool(ONLY_AMOUNT_2DEC_RE.match(raw))
-                for s_amt in AMOUNT_CANDIDATE_RE.findall(raw):
-                    v = self._parse_amount(s_amt)
-                    if v is None or v < 50:
-                        continue
-                    mdec = re.search(r"[.,](\d+)$", s_amt)
-                    dlen = len(mdec.group(1)) if mdec else 0
-                    if dlen != 2:
-                        continue
-
-                    dist = abs(j - idx)
-                    score = max(0, 25 - dist * 2) + 30
-                    if strict_line:
-                        score += 80
-                    cand = (score, j, round(v, 2))
-                    if best2 is None or cand[0] > best2[0] or (cand[0] == best2[0] and cand[1] > best2[1]):
-                        best2 = cand
-            if best2:
-                return best2[2]
-
-        return best[2]
+    def _best_ht_amount_for_tour(self, lines: list[str] | TextIndex, tour_nr: str) -> float | None:
+        return best_ht_amount_for_tour(lines, tour_nr)
 
 
     def autofill_folder_amounts_from_ocr(self, ocr_text: str):
-        txt = ocr_text or ""
-        lines = [ln.strip() for ln in txt.splitlines() if ln.strip()]
-        if not lines:
+        # index construit une fois (lignes, dossiers, montants) pour toutes les lignes du tableau
+        ix = TextIndex(ocr_text or "")
+        if not ix.lines:
             return
 
         for r in range(self.folder_table.rowCount()):
@@ -2021,7 +2109,7 @@ class MainWindow(QMainWindow):
             if (amount_le.text() or "").strip():
                 continue
 
-            best = self._best_ht_amount_for_tour(lines, tour_nr)
+            best = self._best_ht_amount_for_tour(ix, tour_nr)
             if best is not None:
                 amount_le.setText(self._format_amount_2(best))
 
@@ -2039,7 +2127,8 @@ class MainWindow(QMainWindow):
         rows = self.get_folder_rows()
 
         tour_nrs = [r["tour_nr"] for r in rows if r.get("tour_nr")]
-        kosten_map = self.tour_repo.get_kosten_by_tournrs(tour_nrs) if tour_nrs else {}
+        snaps = self.tour_snapshots.get_many(tour_nrs) if tour_nrs else {}
+        kosten_map = {t: snap.kosten for t, snap in snaps.items()}
 
         total_db = 0.0
         has_db = False
@@ -2165,17 +2254,24 @@ class MainWindow(QMainWindow):
 
         cmr_lbl = self._get_row_cmr_widget(row)
 
+        # snapshot BDD du dossier (cache, préchargé avec les dossiers de la facture)
+        snap = None
+        snap_error = None
+        if tour_nr:
+            try:
+                snap = self.tour_snapshots.get(tour_nr)
+            except Exception as e:
+                snap_error = e
+
         # CMR icon
         if cmr_lbl is not None:
             if not tour_nr:
                 cmr_lbl.setText("")
                 cmr_lbl.setToolTip("")
             else:
-                ok, missing_by_tour = self._check_all_orders_have_cmr()
-                required = self._get_required_orders_by_tour({tour_nr})
                 attached = self._get_cmr_attached_orders_for_entry()
 
-                req = required.get(tour_nr, set())
+                req = set(snap.auf_nrs) if snap else set()
                 att = attached.get(tour_nr, set())
 
                 if not tour_nr:
@@ -2209,32 +2305,24 @@ class MainWindow(QMainWindow):
             vat_theo_le.setToolTip("")
             return
         
-        # TVA théorique (BDD)
-        try:
-            if tour_nr in self._vat_theo_cache:
-                vat_val = self._vat_theo_cache.get(tour_nr)
-            else:
-                vat_val = self.tour_repo.get_theoretical_vat_percent_by_tournr(tour_nr)
-                self._vat_theo_cache[tour_nr] = vat_val
-
-            if vat_val is not None:
-                vat_theo_le.setText(self._format_percent(vat_val))
-                vat_theo_le.setToolTip(f"TVA théorique BDD = {vat_val}")
-            else:
-                vat_theo_le.setText("")
-                vat_theo_le.setToolTip("TVA théorique introuvable en BDD.")
-        except Exception as e:
+        if snap_error is not None:
             vat_theo_le.setText("")
-            vat_theo_le.setToolTip(f"Erreur BDD TVA: {e}")
-
-
-        try:
-            db_kosten = self.tour_repo.get_kosten_by_tournr(tour_nr)
-        except Exception as e:
+            vat_theo_le.setToolTip(f"Erreur BDD TVA: {snap_error}")
             amount_le.setStyleSheet("background-color: #ffe6e6;")
-            amount_le.setToolTip(f"Erreur BDD: {e}")
+            amount_le.setToolTip(f"Erreur BDD: {snap_error}")
             return
 
+        # TVA théorique (BDD)
+        vat_val = snap.vat_percent
+        if vat_val is not None:
+            vat_theo_le.setText(self._format_percent(vat_val))
+            vat_theo_le.setToolTip(f"TVA théorique BDD = {vat_val}")
+        else:
+            vat_theo_le.setText("")
+            vat_theo_le.setToolTip("TVA théorique introuvable en BDD.")
+
+        db_kosten = snap.kosten
+
         if db_kosten is None:
             dossier_le.setStyleSheet("background-color: #ffe6e6;")
             amount_le.setStyleSheet("background-color: #ffe6e6;")
@@ -2774,14 +2862,8 @@ class MainWindow(QMainWindow):
                 return
 
         self.pdf_table.setRowCount(0)
-
-        try:
-            pdf_files = [f for f in sorted(os.listdir(folder)) if f.lower().endswith(".pdf")]
-        except Exception as e:
-            QMessageBox.critical(self, "Erreur", f"Impossible de lire le dossier :\n{folder}\n\n{e}")
-            return
-
-        self.pdf_table.setRowCount(0)
+        # nouveau répertoire : données des dossiers relues en base
+        self.tour_snapshots.invalidate()
 
         try:
             pdf_files = [f for f in sorted(os.listdir(folder)) if f.lower().endswith(".pdf")]
@@ -2847,15 +2929,6 @@ class MainWindow(QMainWindow):
             self.pdf_table.setItem(row, 1, QTableWidgetItem(iban))
             self.pdf_table.setItem(row, 2, QTableWidgetItem(bic))
 
-        # filtres + refresh states
-        self.apply_left_filter_to_table()
-        self.refresh_left_table_processing_states()
-        self.apply_left_filter_to_table()
-
-        self.current_pdf_path = None
-        self.clear_fields()
-
-
         # Appliquer le filtre courant (pending/validated/errors)
         if hasattr(self, "apply_left_filter_to_table"):
             self.apply_left_filter_to_table()
@@ -3193,21 +3266,23 @@ class MainWindow(QMainWindow):
 
             it.setToolTip(tooltip or "")
 
-    def refresh_left_row_processing_state(self, row: int):
+    def _left_row_saved_check(self, row: int):
+        """
+        Vérifications locales (JSON sauvegardé) d'une ligne de gauche.
+        Retourne (state, tooltip) si la ligne est déjà tranchée, sinon (iban, bic, tournrs) à valider en base.
+        """
         it0 = self.pdf_table.item(row, 0)
 
         if not it0:
-            return
+            return None
         pdf_path = it0.data(Qt.UserRole)
         if not pdf_path:
-            self._set_left_row_visual(row, "unknown", "")
-            return
+            return ("unknown", "")
 
         data = self._read_saved_invoice_json(pdf_path)
         if not data:
             # pas encore sauvegardé => neutre
-            self._set_left_row_visual(row, "unknown", "Non sauvegardé.")
-            return
+            return ("unknown", "Non sauvegardé.")
         
         # Tag "supprime" => toujours en erreurs
         tags = data.get("tags") or []
@@ -3217,51 +3292,48 @@ class MainWindow(QMainWindow):
 
         if "supprime" in tags_norm:
             it0.setData(Qt.UserRole + 3, 1)  # flag "deleted"
-            self._set_left_row_visual(row, "error", "Tag 'supprime' : fichier marqué comme supprimé.")
-            return
+            return ("error", "Tag 'supprime' : fichier marqué comme supprimé.")
 
         iban = str(data.get("iban") or "").strip()
         bic = str(data.get("bic") or "").strip()
         tournrs = self._extract_tournrs_from_saved(data)
 
         if not iban or not bic:
-            self._set_left_row_visual(row, "error", "IBAN/BIC manquant dans le JSON.")
-            return
+            return ("error", "IBAN/BIC manquant dans le JSON.")
         if not tournrs:
-            self._set_left_row_visual(row, "error", "Aucun dossier (TourNr) dans le JSON.")
-            return
+            return ("error", "Aucun dossier (TourNr) dans le JSON.")
 
-        # 1) transporteur trouvé par iban/bic ?
-        try:
-            rec = self.transporter_repo.find_transporter_by_bank(iban, bic)
-        except Exception as e:
-            self._set_left_row_visual(row, "error", f"Erreur SQL transporteur: {e}")
-            return
+        return (iban, bic, tournrs)
 
-        if not rec:
-            self._set_left_row_visual(row, "error", "Transporteur introuvable en base pour cet IBAN/BIC.")
-            return
+    def refresh_left_rows_processing_states(self, rows):
+        """
+        Couleur / état des lignes de gauche : contrôles JSON ligne par ligne,
+        puis transporteur + dossiers vérifiés en base pour TOUTES les lignes en une fois.
+        """
+        to_validate = []   # (row, (iban, bic, tournrs))
+        for row in rows:
+            res = self._left_row_saved_check(row)
+            if res is None:
+                continue
+            if len(res) == 2:
+                self._set_left_row_visual(row, *res)
+            else:
+                to_validate.append((row, res))
 
-        # 2) tous les dossiers existent dans xxatour ?
-        try:
-            found = self.tour_repo.get_existing_tournrs_in_xxatour(tournrs)
-            missing = sorted(set(tournrs) - set(found))
-        except Exception as e:
-            self._set_left_row_visual(row, "error", f"Erreur SQL xxatour: {e}")
+        if not to_validate:
             return
 
-        if missing:
-            more = "" if len(missing) <= 6 else f" (+{len(missing)-6})"
-            self._set_left_row_visual(row, "error", f"Dossier(s) manquant(s) en xxatour: {', '.join(missing[:6])}{more}")
-            return
+        states = self.processing_state_service.validate([res for _, res in to_validate])
+        for (row, _), st in zip(to_validate, states):
+            self._set_left_row_visual(row, st.state, st.tooltip)
 
-        self._set_left_row_visual(row, "ok", "OK : transporteur trouvé + tous les dossiers présents en base.")
+    def refresh_left_row_processing_state(self, row: int):
+        self.refresh_left_rows_processing_states([row])
 
     def refresh_left_table_processing_states(self):
         if not hasattr(self, "pdf_table") or self.pdf_table is None:
             return
-        for row in range(self.pdf_table.rowCount()):
-            self.refresh_left_row_processing_state(row)
+        self.refresh_left_rows_processing_states(range(self.pdf_table.rowCount()))
 
     def _add_fee_row(self, gebnr: str, bez: str, amount: str = ""):
         row = self.fees_table.rowCount()
@@ -3483,6 +3555,7 @@ class MainWindow(QMainWindow):
 
             # rebuild table (sans trous)
             self.folder_table.setRowCount(0)
+            self.tour_snapshots.prefetch(dossier for dossier, _ in kept)
             for dossier, amount in kept:
                 self._add_folder_row(dossier=dossier, amount=amount)
 
@@ -4091,26 +4164,12 @@ class MainWindow(QMainWindow):
         return dict(out)
 
     def _get_required_orders_by_tour(self, tours: set[str]) -> dict[str, set[str]]:
-        """Retour: {tour_nr -> set(auf_nr)} depuis la BDD (via get_palette_details_with_trajet_by_tournrs)."""
-        key = tuple(sorted(tours))
-        if getattr(self, "_req_orders_cache_key", None) == key:
-            return getattr(self, "_req_orders_cache", {}) or {}
-
-        req = defaultdict(set)
+        """Retour: {tour_nr -> set(auf_nr)} depuis la BDD (snapshots des dossiers, en cache)."""
         try:
-            rows = self.tour_repo.get_palette_details_with_trajet_by_tournrs(list(tours)) or []
+            snaps = self.tour_snapshots.get_many(tours)
         except Exception:
-            rows = []
-
-        for r in rows:
-            tour = str(r.get("Dossier") or "").strip()
-            auf  = str(r.get("AufNr") or "").strip()
-            if tour and auf:
-                req[tour].add(auf)
-
-        self._req_orders_cache_key = key
-        self._req_orders_cache = dict(req)
-        return self._req_orders_cache
+            snaps = {}
+        return {t: set(snap.auf_nrs) for t, snap in snaps.items() if snap.auf_nrs}
 
     def _check_all_orders_have_cmr(self) -> tuple[bool, dict[str, list[str]]]:
         """
@@ -4479,4 +4538,94 @@ class LinkPostProcessWorker(QObject):
                 errors.append(f"{name} -> {e}")
 
         self.progress.emit(total, f"BDD/JSON {total}/{total}")
-        self.finished.emit(downloaded_names, errors, canceled)
\ No newline at end of file
+        self.finished.emit(downloaded_names, errors, canceled)
+
+
+class BatchOcrWorker(QObject):
+    progress = Signal(int, str)        # (index, label)
+    result = Signal(dict)              # résultat d'un PDF (voir batch_pipeline.process_pdf)
+    finished = Signal(int, int, bool)  # (processed, errors, canceled)
+
+    def __init__(self, jobs: list[tuple[str, ...]], parent=None):
+        super().__init__(parent)
+        self.jobs = jobs or []
+        self._cancelled = False
+
+    @Slot()
+    def cancel(self):
+        self._cancelled = True
+
+    @Slot()
+    def run(self):
+        processed = 0
+        errors = 0
+        total = len(self.jobs)
+
+        for i, res in enumerate(run_batch(self.jobs, should_cancel=lambda: self._cancelled), start=1):
+            if res.get("ok"):
+                processed += 1
+            else:
+                errors += 1
+            self.result.emit(res)
+            self.progress.emit(i, f"OCR {i}/{total}\n{os.path.basename(res.get('pdf_path') or '')}")
+
+        self.finished.emit(processed, errors, self._cancelled)
+
+
+class OcrStreamWorker(QObject):
+    page_ready = Signal(object)    # PageText (ordre des pages)
+    finished = Signal(str, bool)   # (erreur ou "", canceled)
+
+    def __init__(self, pdf_path: str, parent=None):
+        super().__init__(parent)
+        self.pdf_path = pdf_path
+        self._cancelled = False
+
+    @Slot()
+    def cancel(self):
+        self._cancelled = True
+
+    @Slot()
+    def run(self):
+        error = ""
+        pages = iter_pages_from_pdf(self.pdf_path)
+        try:
+            for page in pages:
+                if self._cancelled:
+                    break
+                self.page_ready.emit(page)
+        except Exception as e:
+            error = str(e)
+        finally:
+            pages.close()
+
+        self.finished.emit(error, self._cancelled)
+
+
+class RegionLearnWorker(QObject):
+    finished = Signal(str)   # erreur ou ""
+
+    def __init__(self, pdf_path: str, supplier_key: str, values: dict, skip_fields: set, parent=None):
+        super().__init__(parent)
+        self.pdf_path = pdf_path
+        self.supplier_key = supplier_key
+        self.values = values
+        self.skip_fields = skip_fields
+
+    @Slot()
+    def run(self):
+        error = ""
+        try:
+            new_regions = learn_field_regions(self.pdf_path, self.values, skip_fields=self.skip_fields)
+            if new_regions:
+                # fusion avec la version la plus récente du modèle (sauvegardé entre-temps)
+                update_supplier_model(
+                    self.supplier_key,
+                    lambda current: {
+                        **current,
+                        "regions": merge_regions(current.get("regions") or {}, new_regions),
+                    },
+                )
+        except Exception as e:
+            error = str(e)
+        self.finished.emit(error)